@@ -1,12 +1,18 @@
-"""Alma Item Update blueprint"""
+"""Alma Item Update blueprint
+
+Services are imported when a trigger first runs, so loading the function app doesn't
+pull in the Alma client, storage SDKs and their models before the host is ready.
+"""
 
 import azure.functions as func
 
 from alma_item_checks_update_service.config import (
     UPDATE_QUEUE,
+    UPDATE_BATCH_QUEUE,
+    UPDATE_ASYNC_QUEUE,
+    UPDATE_MANIFEST_QUEUE,
     STORAGE_CONNECTION_SETTING_NAME,
 )
-from alma_item_checks_update_service.services.update_service import UpdateService
 
 bp: func.Blueprint = func.Blueprint()
 
@@ -24,5 +30,71 @@ def alma_item_update(itemmsg: func.QueueMessage) -> None:
     Args:
         itemmsg (func.QueueMessage): Queue message
     """
+    from alma_item_checks_update_service.services.update_service import UpdateService
+
     update_service = UpdateService(itemmsg)
     update_service.update_item()
+
+
+@bp.function_name("alma_item_update_batch")
+@bp.queue_trigger(
+    arg_name="batchmsg",
+    queue_name=UPDATE_BATCH_QUEUE,
+    connection=STORAGE_CONNECTION_SETTING_NAME,
+)
+def alma_item_update_batch(batchmsg: func.QueueMessage) -> None:
+    """
+    Alma Item Update batch blueprint
+
+    Args:
+        batchmsg (func.QueueMessage): Queue message holding a list of update messages
+    """
+    from alma_item_checks_update_service.services.batch_service import (
+        BatchUpdateService,
+    )
+
+    batch_service = BatchUpdateService.from_queue_message(batchmsg)
+    batch_service.process()
+
+
+@bp.function_name("alma_item_update_manifest")
+@bp.queue_trigger(
+    arg_name="manifestmsg",
+    queue_name=UPDATE_MANIFEST_QUEUE,
+    connection=STORAGE_CONNECTION_SETTING_NAME,
+)
+def alma_item_update_manifest(manifestmsg: func.QueueMessage) -> None:
+    """
+    Alma Item Update blueprint for bulk runs read from a manifest blob
+
+    Args:
+        manifestmsg (func.QueueMessage): Queue message naming the manifest blob
+    """
+    from alma_item_checks_update_service.services.manifest_service import (
+        ManifestUpdateService,
+    )
+
+    manifest_service = ManifestUpdateService.from_queue_message(manifestmsg)
+    if manifest_service is not None:
+        manifest_service.process()
+
+
+@bp.function_name("alma_item_update_async")
+@bp.queue_trigger(
+    arg_name="itemmsg",
+    queue_name=UPDATE_ASYNC_QUEUE,
+    connection=STORAGE_CONNECTION_SETTING_NAME,
+)
+async def alma_item_update_async(itemmsg: func.QueueMessage) -> None:
+    """
+    Alma Item Update blueprint using the asyncio pipeline
+
+    Args:
+        itemmsg (func.QueueMessage): Queue message
+    """
+    from alma_item_checks_update_service.services.async_update_service import (
+        AsyncUpdateService,
+    )
+
+    update_service = AsyncUpdateService(itemmsg)
+    await update_service.update_item()
@@ -21,4 +21,179 @@ UPDATED_ITEMS_CONTAINER = os.getenv(
 
 REPORT_CONTAINER = os.getenv("REPORT_CONTAINER", "reports-container")
 
+DEAD_LETTER_CONTAINER = os.getenv(
+    "DEAD_LETTER_CONTAINER", "dead-letter-container"
+)  # Messages that can never be processed, with the reason
+
 API_CLIENT_TIMEOUT = int(os.getenv("API_CLIENT_TIMEOUT", 90))
+
+API_KEY_CACHE_TTL = int(
+    os.getenv("API_KEY_CACHE_TTL", 3600)
+)  # Seconds to cache an institution API key
+API_KEY_NEGATIVE_CACHE_TTL = int(
+    os.getenv("API_KEY_NEGATIVE_CACHE_TTL", 60)
+)  # Seconds to cache a failed API key lookup
+
+ALMA_CONNECTION_POOL_SIZE = int(
+    os.getenv("ALMA_CONNECTION_POOL_SIZE", 10)
+)  # Max pooled connections per institution's Alma client
+
+UPDATE_BATCH_QUEUE = os.getenv(
+    "UPDATE_BATCH_QUEUE", "update-batch-queue"
+)  # For batches of items that need Alma updates
+
+UPDATE_CONCURRENCY = int(
+    os.getenv("UPDATE_CONCURRENCY", 8)
+)  # Items updated in parallel per batch
+BATCH_TIME_BUDGET = float(
+    os.getenv("BATCH_TIME_BUDGET", 240)
+)  # Seconds a batch may run per invocation, updates in flight included
+BATCH_SCHEDULING = os.getenv(
+    "BATCH_SCHEDULING", "fair"
+)  # Batch message order: fair (round-robin across institutions) or fifo
+INSTITUTION_WEIGHTS = os.getenv(
+    "INSTITUTION_WEIGHTS", ""
+)  # Messages per fair scheduling round, e.g. "12=2,15=0.5"; others get 1
+ALMA_RATE_LIMIT_PER_SECOND = float(
+    os.getenv("ALMA_RATE_LIMIT_PER_SECOND", 5)
+)  # Alma calls per second per institution per worker; 0 disables
+ALMA_RATE_LIMIT_BURST = float(
+    os.getenv("ALMA_RATE_LIMIT_BURST", 5)
+)  # Alma calls allowed back to back per institution per worker
+
+UPDATE_ASYNC_QUEUE = os.getenv(
+    "UPDATE_ASYNC_QUEUE", "update-async-queue"
+)  # For items updated through the asyncio pipeline
+UPDATE_MANIFEST_QUEUE = os.getenv(
+    "UPDATE_MANIFEST_QUEUE", "update-manifest-queue"
+)  # For bulk runs whose items are read from a manifest blob
+
+MANIFEST_CONTAINER = os.getenv(
+    "MANIFEST_CONTAINER", "update-manifests"
+)  # JSON Lines manifests of item payloads, optionally gzipped
+MANIFEST_WINDOW = int(
+    os.getenv("MANIFEST_WINDOW", 64)
+)  # Manifest lines held in memory and updated together between checkpoints
+MANIFEST_TIME_BUDGET = float(
+    os.getenv("MANIFEST_TIME_BUDGET", 240)
+)  # Seconds a manifest run may take per invocation, updates in flight included
+
+CHECKPOINT_CONTAINER = os.getenv(
+    "CHECKPOINT_CONTAINER", "update-checkpoints"
+)  # Progress of long batches and manifest runs, for resuming them
+CHECKPOINT_INTERVAL = float(
+    os.getenv("CHECKPOINT_INTERVAL", 30)
+)  # Seconds between checkpoints of a long batch
+
+RETRY_MAX_ATTEMPTS = int(
+    os.getenv("RETRY_MAX_ATTEMPTS", 4)
+)  # Calls per API request, including the first
+RETRY_BASE_DELAY = float(
+    os.getenv("RETRY_BASE_DELAY", 1)
+)  # Seconds of backoff before the first retry
+RETRY_MAX_DELAY = float(
+    os.getenv("RETRY_MAX_DELAY", 30)
+)  # Cap on a single backoff, in seconds
+RETRY_TOTAL_BUDGET = float(
+    os.getenv("RETRY_TOTAL_BUDGET", 120)
+)  # Cap on one request's time, attempt timeouts included; below function timeout
+
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(
+    os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5)
+)  # Consecutive Alma failures that open an institution's breaker
+CIRCUIT_BREAKER_RESET_TIMEOUT = float(
+    os.getenv("CIRCUIT_BREAKER_RESET_TIMEOUT", 60)
+)  # Seconds a breaker stays open before a probe is let through
+
+ALMA_CONCURRENCY_MAX = int(
+    os.getenv("ALMA_CONCURRENCY_MAX", 16)
+)  # Ceiling for in-flight Alma updates per institution per worker; 0 disables
+ALMA_CONCURRENCY_MIN = int(
+    os.getenv("ALMA_CONCURRENCY_MIN", 1)
+)  # Floor the adaptive limit backs off to
+ALMA_CONCURRENCY_INITIAL = int(
+    os.getenv("ALMA_CONCURRENCY_INITIAL", 4)
+)  # In-flight Alma updates allowed before any latency has been observed
+ALMA_CONCURRENCY_LATENCY_TARGET = float(
+    os.getenv("ALMA_CONCURRENCY_LATENCY_TARGET", 2)
+)  # Seconds an Alma update takes at most while the limit is allowed to grow
+ALMA_CONCURRENCY_DECREASE_FACTOR = float(
+    os.getenv("ALMA_CONCURRENCY_DECREASE_FACTOR", 0.5)
+)  # Multiplier applied to the limit on throttling, failures or slow responses
+ALMA_CONCURRENCY_MAX_WAIT = float(
+    os.getenv("ALMA_CONCURRENCY_MAX_WAIT", 60)
+)  # Seconds an update waits for a free slot before it is retried
+MESSAGE_TIME_RESERVE = float(
+    os.getenv("MESSAGE_TIME_RESERVE", ALMA_CONCURRENCY_MAX_WAIT + RETRY_TOTAL_BUDGET)
+)  # Seconds of a time budget kept for updates in flight: slot wait plus retries
+
+UPDATE_DIFF_MODE = os.getenv(
+    "UPDATE_DIFF_MODE", "off"
+)  # Skip no-op Alma updates: off, fingerprint or live
+ITEM_PROJECTION = os.getenv(
+    "ITEM_PROJECTION", "full"
+)  # full: validate and send the whole payload; slim: cut bib_data to mms_id and title
+ITEM_FINGERPRINT_CACHE_SIZE = int(
+    os.getenv("ITEM_FINGERPRINT_CACHE_SIZE", 100000)
+)  # Items whose last update fingerprint is remembered per worker
+
+IDEMPOTENCY_BACKEND = os.getenv(
+    "IDEMPOTENCY_BACKEND", "off"
+)  # Job stage ledger for redelivered messages: off, memory or table
+IDEMPOTENCY_TABLE = os.getenv(
+    "IDEMPOTENCY_TABLE", "updateledger"
+)  # Table holding the job stage ledger
+
+REPORT_MODE = os.getenv(
+    "REPORT_MODE", "item"
+)  # item: one report blob per job; aggregate: one report file per institution and run
+REPORT_FORMAT = os.getenv(
+    "REPORT_FORMAT", "jsonl"
+)  # Aggregated report file format: csv or jsonl
+REPORT_COMPRESSION = os.getenv(
+    "REPORT_COMPRESSION", "none"
+)  # Per-job report blob compression: none, gzip or zstd (needs zstandard)
+REPORT_FLUSH_ROWS = int(
+    os.getenv("REPORT_FLUSH_ROWS", 500)
+)  # Buffered report rows that trigger a write
+REPORT_FLUSH_BYTES = int(
+    os.getenv("REPORT_FLUSH_BYTES", 1048576)
+)  # Buffered report bytes that trigger a write; append blocks max out at 4 MiB
+REPORT_FLUSH_SECONDS = float(
+    os.getenv("REPORT_FLUSH_SECONDS", 30)
+)  # Max seconds a report row is buffered before it is written
+REPORT_MAX_BLOCKS = int(
+    os.getenv("REPORT_MAX_BLOCKS", 49000)
+)  # Blocks before a report file rolls over to a new part; the cap is 50,000
+
+NOTIFICATION_MODE = os.getenv(
+    "NOTIFICATION_MODE", "item"
+)  # item: one notification per job; coalesce: one summary per institution and run
+NOTIFICATION_MAX_JOBS = int(
+    os.getenv("NOTIFICATION_MAX_JOBS", 1000)
+)  # Jobs that trigger a coalesced notification
+NOTIFICATION_WINDOW_SECONDS = float(
+    os.getenv("NOTIFICATION_WINDOW_SECONDS", 30)
+)  # Max seconds a job waits for its coalesced notification
+
+PREFETCH_CONCURRENCY = int(
+    os.getenv("PREFETCH_CONCURRENCY", 8)
+)  # Item blobs downloaded in parallel ahead of a batch; 0 disables prefetch
+PREFETCH_BUFFER = int(
+    os.getenv("PREFETCH_BUFFER", 32)
+)  # Max prefetched item blobs held in memory per batch
+
+API_KEY_WARMUP_INSTITUTIONS = os.getenv(
+    "API_KEY_WARMUP_INSTITUTIONS", ""
+)  # Comma separated institution ids whose API keys are fetched at worker start
+API_KEY_WARMUP_CONCURRENCY = int(
+    os.getenv("API_KEY_WARMUP_CONCURRENCY", 8)
+)  # API keys fetched in parallel during warm-up
+
+METRICS_HOOKS = os.getenv(
+    "METRICS_HOOKS", ""
+)  # Pipeline metrics sinks, comma separated: log, memory, otel; empty disables
+
+JSON_CODEC = os.getenv(
+    "JSON_CODEC", "auto"
+)  # Message and payload JSON codec: auto (orjson if installed), orjson or stdlib
@@ -0,0 +1,110 @@
+"""Long-lived Alma API clients keyed by institution"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from wrlc_alma_api_client import AlmaApiClient  # type: ignore
+
+from alma_item_checks_update_service.config import (
+    ALMA_CONNECTION_POOL_SIZE,
+    API_CLIENT_TIMEOUT,
+)
+
+
+class AlmaClientRegistry:
+    """Thread-safe registry of Alma API clients, one per institution
+
+    Each client keeps its HTTP session (and keep-alive connections to the Alma
+    gateway) for the life of the worker. A client is rebuilt when the institution's
+    API key changes.
+    """
+
+    def __init__(self, pool_size: int) -> None:
+        """Initialize the registry
+
+        Args:
+            pool_size (int): max pooled connections per client session
+        """
+        self.pool_size: int = pool_size
+        self._clients: dict[int, tuple[str, AlmaApiClient]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get_client(self, institution_id: int, api_key: str) -> AlmaApiClient:
+        """Get the Alma API client for an institution
+
+        Args:
+            institution_id (int): institution id
+            api_key (str): institution api key
+
+        Returns:
+            AlmaApiClient: client for the institution
+        """
+        with self._lock:
+            entry: tuple[str, AlmaApiClient] | None = self._clients.get(institution_id)
+            if entry is not None and entry[0] == api_key:
+                return entry[1]
+
+            client: AlmaApiClient = AlmaApiClient(  # new or rotated api key
+                api_key=api_key, region="NA", timeout=API_CLIENT_TIMEOUT
+            )
+            self._configure_pool(client)
+            self._clients[institution_id] = (api_key, client)
+
+        if entry is not None:
+            self._close(entry[1])  # release the old key's connections
+
+        return client
+
+    def remove(self, institution_id: int) -> None:
+        """Drop an institution's client
+
+        Args:
+            institution_id (int): institution id
+        """
+        with self._lock:
+            entry: tuple[str, AlmaApiClient] | None = self._clients.pop(
+                institution_id, None
+            )
+
+        if entry is not None:
+            self._close(entry[1])
+
+    def clear(self) -> None:
+        """Drop all clients"""
+        with self._lock:
+            entries: list[tuple[str, AlmaApiClient]] = list(self._clients.values())
+            self._clients.clear()
+
+        for _, client in entries:
+            self._close(client)
+
+    def _configure_pool(self, client: AlmaApiClient) -> None:
+        """Size the connection pool of a client's HTTP session
+
+        Args:
+            client (AlmaApiClient): Alma API client
+        """
+        session = getattr(client, "session", None)
+        if not isinstance(session, requests.Session):  # client manages its own
+            return
+
+        adapter: HTTPAdapter = HTTPAdapter(
+            pool_connections=self.pool_size, pool_maxsize=self.pool_size
+        )
+        session.mount("https://", adapter)
+
+    def _close(self, client: AlmaApiClient) -> None:
+        """Close a client's HTTP session
+
+        Args:
+            client (AlmaApiClient): Alma API client
+        """
+        session = getattr(client, "session", None)
+        if isinstance(session, requests.Session):
+            session.close()
+
+
+alma_client_registry: AlmaClientRegistry = AlmaClientRegistry(
+    pool_size=ALMA_CONNECTION_POOL_SIZE
+)
@@ -0,0 +1,223 @@
+"""Process-wide cache for institution API keys"""
+
+import asyncio
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from alma_item_checks_update_service.config import (
+    API_KEY_CACHE_TTL,
+    API_KEY_NEGATIVE_CACHE_TTL,
+)
+from alma_item_checks_update_service.services.metrics import update_metrics
+
+
+@dataclass(frozen=True)
+class _CacheEntry:
+    """Cached API key lookup result"""
+
+    api_key: str | None
+    expires_at: float
+
+
+class ApiKeyCache:
+    """Thread-safe TTL cache for institution API keys
+
+    Successful lookups are kept for ``ttl`` seconds. Failed lookups (``None``) are
+    kept for ``negative_ttl`` seconds so a misconfigured institution doesn't hit the
+    Institution API on every message.
+
+    The stats are reported as api_key_cache_* gauges whenever a key is stored,
+    which is once per load, so a mostly-hitting cache costs nothing extra.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float) -> None:
+        """Initialize the cache
+
+        Args:
+            ttl (float): seconds to keep a found API key
+            negative_ttl (float): seconds to keep a failed lookup
+        """
+        self.ttl: float = ttl
+        self.negative_ttl: float = negative_ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: dict[int, _CacheEntry] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._load_locks: dict[int, threading.Lock] = {}
+        self._async_loads: dict[int, asyncio.Task[str | None]] = {}
+
+    def get_or_load(
+        self, institution_id: int, loader: Callable[[int], str | None]
+    ) -> str | None:
+        """Get an institution's API key, calling loader on a miss
+
+        Only one thread loads a given institution at a time; concurrent callers wait
+        for that lookup and share its result.
+
+        Args:
+            institution_id (int): institution id
+            loader (Callable[[int], str | None]): fetches the key on a cache miss
+
+        Returns:
+            str | None: institution api key or None
+        """
+        hit, api_key = self.lookup(institution_id)
+        if hit:
+            return api_key
+
+        with self._load_lock(institution_id):
+            # another thread may have loaded the key while we waited
+            hit, api_key = self.lookup(institution_id, count=False)
+            if hit:
+                return api_key
+
+            api_key = loader(institution_id)
+            self.set(institution_id, api_key)
+
+        return api_key
+
+    async def get_or_load_async(
+        self, institution_id: int, loader: Callable[[int], Awaitable[str | None]]
+    ) -> str | None:
+        """Get an institution's API key, awaiting loader on a miss
+
+        Only one task per event loop loads a given institution at a time; concurrent
+        callers await that lookup and share its result.
+
+        Args:
+            institution_id (int): institution id
+            loader (Callable[[int], Awaitable[str | None]]): fetches the key on a
+                cache miss
+
+        Returns:
+            str | None: institution api key or None
+        """
+        hit, api_key = self.lookup(institution_id)
+        if hit:
+            return api_key
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        with self._lock:
+            task: asyncio.Task[str | None] | None = self._async_loads.get(
+                institution_id
+            )
+            if task is None or task.done() or task.get_loop() is not loop:
+                task = loop.create_task(self._load_async(institution_id, loader))
+                self._async_loads[institution_id] = task
+
+        return await asyncio.shield(task)  # one caller's cancellation spares the rest
+
+    async def _load_async(
+        self, institution_id: int, loader: Callable[[int], Awaitable[str | None]]
+    ) -> str | None:
+        """Load an institution's API key into the cache
+
+        Args:
+            institution_id (int): institution id
+            loader (Callable[[int], Awaitable[str | None]]): fetches the key
+
+        Returns:
+            str | None: institution api key or None
+        """
+        try:
+            api_key: str | None = await loader(institution_id)
+            self.set(institution_id, api_key)
+            return api_key
+        finally:
+            with self._lock:
+                if self._async_loads.get(institution_id) is asyncio.current_task():
+                    del self._async_loads[institution_id]
+
+    def set(self, institution_id: int, api_key: str | None) -> None:
+        """Store an API key lookup result
+
+        Args:
+            institution_id (int): institution id
+            api_key (str | None): institution api key or None for a failed lookup
+        """
+        ttl: float = self.ttl if api_key is not None else self.negative_ttl
+        with self._lock:
+            self._entries[institution_id] = _CacheEntry(
+                api_key=api_key, expires_at=time.monotonic() + ttl
+            )
+
+        for name, value in self.stats().items():
+            update_metrics.gauge(f"api_key_cache_{name}", value, {})
+
+    def invalidate(self, institution_id: int) -> None:
+        """Drop an institution's cached API key
+
+        Args:
+            institution_id (int): institution id
+        """
+        with self._lock:
+            self._entries.pop(institution_id, None)
+
+    def clear(self) -> None:
+        """Drop all cached API keys and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self._async_loads.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        """Get cache counters
+
+        Returns:
+            dict[str, int]: hits, misses and current entry count
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+    def lookup(
+        self, institution_id: int, count: bool = True
+    ) -> tuple[bool, str | None]:
+        """Look up an unexpired entry without loading it
+
+        Args:
+            institution_id (int): institution id
+            count (bool): whether to update the hit/miss counters
+
+        Returns:
+            tuple[bool, str | None]: whether the entry was found, and its API key
+        """
+        with self._lock:
+            entry: _CacheEntry | None = self._entries.get(institution_id)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[institution_id]  # expired
+                entry = None
+
+            if count:
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+
+        if entry is None:
+            return False, None
+
+        return True, entry.api_key
+
+    def _load_lock(self, institution_id: int) -> threading.Lock:
+        """Get the lock that serializes loads for one institution
+
+        Args:
+            institution_id (int): institution id
+
+        Returns:
+            threading.Lock: per-institution load lock
+        """
+        with self._lock:
+            return self._load_locks.setdefault(institution_id, threading.Lock())
+
+
+api_key_cache: ApiKeyCache = ApiKeyCache(
+    ttl=API_KEY_CACHE_TTL, negative_ttl=API_KEY_NEGATIVE_CACHE_TTL
+)
@@ -0,0 +1,107 @@
+"""Fetch institution API keys when a worker starts"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from alma_item_checks_update_service.config import (
+    API_KEY_WARMUP_CONCURRENCY,
+    API_KEY_WARMUP_INSTITUTIONS,
+)
+from alma_item_checks_update_service.services.api_key_cache import api_key_cache
+
+
+def parse_institution_ids(value: str) -> list[int]:
+    """Parse a comma separated list of institution ids
+
+    Args:
+        value (str): e.g. "1, 2,3"
+
+    Returns:
+        list[int]: institution ids, skipping blanks and invalid entries
+    """
+    institution_ids: list[int] = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            institution_ids.append(int(entry))
+        except ValueError:
+            logging.warning(f"warm_api_keys: Invalid institution id {entry!r}")
+
+    return institution_ids
+
+
+def warm_api_keys(institution_ids: list[int], concurrency: int) -> dict[int, bool]:
+    """Load institutions' API keys into the key cache in parallel
+
+    Keys go through the cache's single-flight loader, so a message arriving for an
+    institution mid warm-up waits for that lookup instead of repeating it.
+    Institutions not warmed are still looked up on first use.
+
+    Args:
+        institution_ids (list[int]): institutions to warm
+        concurrency (int): max parallel Institution API calls
+
+    Returns:
+        dict[int, bool]: whether a key was found, by institution id
+    """
+    if not institution_ids:
+        return {}
+
+    from alma_item_checks_update_service.services.update_service import (  # heavy
+        UpdateService,
+    )
+
+    update_service: UpdateService = UpdateService()
+
+    with ThreadPoolExecutor(
+        max_workers=max(min(concurrency, len(institution_ids)), 1)
+    ) as executor:
+        api_keys: list[str | None] = list(
+            executor.map(
+                lambda institution_id: api_key_cache.get_or_load(
+                    institution_id, update_service.fetch_api_key
+                ),
+                institution_ids,
+            )
+        )
+
+    found: dict[int, bool] = {
+        institution_id: api_key is not None
+        for institution_id, api_key in zip(institution_ids, api_keys)
+    }
+    logging.info(
+        f"warm_api_keys: Loaded {sum(found.values())} of {len(found)} institution API keys"
+    )
+
+    return found
+
+
+def start_api_key_warmup(
+    institutions: str = API_KEY_WARMUP_INSTITUTIONS,
+    concurrency: int = API_KEY_WARMUP_CONCURRENCY,
+) -> threading.Thread | None:
+    """Warm the key cache in the background so worker start isn't delayed
+
+    Args:
+        institutions (str): comma separated institution ids
+        concurrency (int): max parallel Institution API calls
+
+    Returns:
+        threading.Thread | None: warm-up thread, or None if there's nothing to warm
+    """
+    institution_ids: list[int] = parse_institution_ids(institutions)
+    if not institution_ids:
+        return None
+
+    thread: threading.Thread = threading.Thread(
+        target=warm_api_keys,
+        args=(institution_ids, concurrency),
+        name="api-key-warmup",
+        daemon=True,
+    )
+    thread.start()
+
+    return thread
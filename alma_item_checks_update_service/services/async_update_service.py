@@ -0,0 +1,543 @@
+"""Asyncio service class for Alma Item Updates"""
+
+import asyncio
+import json
+import logging
+import math
+import time
+from collections.abc import Awaitable
+from functools import partial
+from typing import Any, TypeVar
+
+import azure.core.exceptions
+import azure.functions as func
+from wrlc_alma_api_client.models import Item  # type: ignore
+
+from alma_item_checks_update_service.config import (
+    API_CLIENT_TIMEOUT,
+    INSTITUTION_API_ENDPOINT,
+    INSTITUTION_API_KEY,
+    NOTIFICATION_QUEUE,
+    REPORT_CONTAINER,
+    UPDATE_ASYNC_QUEUE,
+    UPDATED_ITEMS_CONTAINER,
+)
+from alma_item_checks_update_service.services.api_key_cache import api_key_cache
+from alma_item_checks_update_service.services.circuit_breaker import (
+    CircuitBreaker,
+    alma_circuit_breakers,
+)
+from alma_item_checks_update_service.services.concurrency_limiter import (
+    ConcurrencyLimitTimeout,
+    alma_concurrency_limiter,
+)
+from alma_item_checks_update_service.services.compression import (
+    Compression,
+    DecompressionError,
+    compress,
+    read_payload_async,
+)
+from alma_item_checks_update_service.services.idempotency import Stage
+from alma_item_checks_update_service.services.item_diff import DiffMode
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.message_validation import (
+    InvalidMessageError,
+    UpdateMessage,
+    decode_message,
+    is_transient_storage_error,
+)
+from alma_item_checks_update_service.services.metrics import (
+    PipelineStage,
+    update_metrics,
+)
+from alma_item_checks_update_service.services.notification_coalescer import (
+    NotificationMode,
+)
+from alma_item_checks_update_service.services.report_writer import ReportMode
+from alma_item_checks_update_service.services.retry import retry_policy
+from alma_item_checks_update_service.services.storage import (
+    get_async_blob_service_client,
+    get_async_queue_client,
+)
+from alma_item_checks_update_service.services.update_service import (
+    UpdateOutcome,
+    UpdateService,
+    message_dimensions,
+    report_content_settings,
+)
+
+T = TypeVar("T")
+
+_http_session: Any = None  # aiohttp.ClientSession on the worker's event loop
+
+
+def get_http_session() -> Any:
+    """Get the worker's shared aiohttp session, creating it on first use
+
+    Returns:
+        aiohttp.ClientSession: shared HTTP session
+    """
+    global _http_session
+
+    if _http_session is None or _http_session.closed:
+        import aiohttp
+
+        _http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=API_CLIENT_TIMEOUT)
+        )
+
+    return _http_session
+
+
+async def timed(
+    stage: PipelineStage, awaitable: Awaitable[T], dimensions: dict[str, str]
+) -> T:
+    """Await something, timing it as a pipeline stage
+
+    Args:
+        stage (PipelineStage): stage
+        awaitable (Awaitable[T]): work to time
+        dimensions (dict[str, str]): metric dimensions for the message
+
+    Returns:
+        T: the awaitable's result
+    """
+    with update_metrics.stage(stage, dimensions):
+        return await awaitable
+
+
+async def _no_key() -> None:
+    """Stand in for the API key lookup when the Alma update is already done"""
+    return None
+
+
+class AsyncUpdateService:
+    """Asyncio service class for Alma Item Updates
+
+    Overlaps the blob download with the API key lookup, and the report upload with
+    the notification. The Alma client is synchronous, so the item PUT runs in a
+    worker thread through the same UpdateService code path as the sync trigger.
+    Requires the aiohttp package.
+    """
+
+    def __init__(self, itemmsg: func.QueueMessage | None = None) -> None:
+        """Initialize the service
+
+        Args:
+            itemmsg (func.QueueMessage | None): Queue message, or None when messages
+                are passed to process_message directly
+        """
+        self.itemmsg: func.QueueMessage | None = itemmsg
+        self.update_service: UpdateService = UpdateService()
+
+    async def update_item(self) -> UpdateOutcome:
+        """Update the item in Alma
+
+        Returns:
+            UpdateOutcome: result of processing the queue message
+        """
+        if self.itemmsg is None:
+            raise ValueError(
+                "AsyncUpdateService.update_item: No queue message provided"
+            )
+
+        body: bytes = self.itemmsg.get_body()
+
+        try:
+            message_data: dict[str, Any] = decode_message(body)  # get queued message
+        except InvalidMessageError as e:
+            return await asyncio.to_thread(
+                self.update_service.reject_undecodable, body, e
+            )
+
+        return await self.process_message(message_data)
+
+    async def process_message(self, message_data: dict[str, Any]) -> UpdateOutcome:
+        """Update the item in Alma for one decoded update message
+
+        Every exit path, an exception included, is recorded as an outcome metric.
+        Invalid messages are dead-lettered; other exceptions propagate so the queue
+        retries the message.
+
+        Args:
+            message_data (dict[str, Any]): message data
+
+        Returns:
+            UpdateOutcome: result of processing the message
+        """
+        dimensions: dict[str, str] = message_dimensions(message_data)
+        started: float = time.perf_counter()
+        outcome: UpdateOutcome = UpdateOutcome.ERROR
+        try:
+            outcome = await self.run_stages(message_data, dimensions)
+        except InvalidMessageError as e:
+            outcome = await asyncio.to_thread(
+                self.update_service.reject_message, message_data, e
+            )
+        finally:
+            update_metrics.outcome(outcome, time.perf_counter() - started, dimensions)
+
+        return outcome
+
+    async def run_stages(
+        self, message_data: dict[str, Any], dimensions: dict[str, str]
+    ) -> UpdateOutcome:
+        """Run the pipeline stages not yet completed for a message
+
+        Args:
+            message_data (dict[str, Any]): message data
+            dimensions (dict[str, str]): metric dimensions for the message
+
+        Returns:
+            UpdateOutcome: result of processing the message
+
+        Raises:
+            InvalidMessageError: if the message can never be processed
+        """
+        message: UpdateMessage = UpdateMessage.from_dict(message_data)  # validate
+        job_id: str = message.job_id
+
+        completed: set[Stage] = await asyncio.to_thread(  # stages done on redelivery
+            self.update_service.ledger.get, job_id
+        )
+        if Stage.NOTIFIED in completed:
+            logging.info(
+                f"AsyncUpdateService.update_item: Job {job_id} already processed"
+            )
+            return UpdateOutcome.ALREADY_PROCESSED
+
+        if Stage.REPORTED in completed:  # only the notification is left
+            await timed(
+                PipelineStage.NOTIFY, self.send_notification(message_data), dimensions
+            )
+            await self.mark_notified(message_data, job_id)
+            return UpdateOutcome.UPDATED
+
+        outcome, item = await self.update_alma(
+            job_id, message.institution_id, message_data, completed, dimensions
+        )
+        if item is None:
+            return outcome
+
+        await asyncio.gather(  # Save report blob and queue notification together
+            timed(
+                PipelineStage.REPORT,
+                self.save_report(item, job_id, message_data),
+                dimensions,
+            ),
+            timed(
+                PipelineStage.NOTIFY, self.send_notification(message_data), dimensions
+            ),
+        )
+        await self.mark_reported(message_data, job_id, Stage.REPORTED)
+        await self.mark_notified(message_data, job_id)
+
+        return outcome
+
+    async def update_alma(
+        self,
+        job_id: str,
+        institution_id: int,
+        message_data: dict[str, Any],
+        completed: set[Stage],
+        dimensions: dict[str, str],
+    ) -> tuple[UpdateOutcome, Item | None]:
+        """Fetch the item and update it in Alma unless already done
+
+        Args:
+            job_id (str): Job ID
+            institution_id (int): institution id
+            message_data (dict[str, Any]): message data
+            completed (set[Stage]): stages completed on earlier deliveries
+            dimensions (dict[str, str]): metric dimensions for the message
+
+        Returns:
+            tuple[UpdateOutcome, Item | None]: result of the update, and the item to
+                report on, or None if processing stops here
+
+        Raises:
+            InvalidMessageError: if the item blob is missing or incomplete
+        """
+        update_done: bool = Stage.UPDATED in completed  # don't repeat the Alma call
+
+        item_blob, api_key = await asyncio.gather(  # fetch blob and key together
+            timed(PipelineStage.FETCH, self.get_item_data(job_id), dimensions),
+            timed(PipelineStage.API_KEY, self.get_api_key(institution_id), dimensions)
+            if not update_done
+            else _no_key(),
+        )
+
+        full_item, mms_id, holding_id, item_pid = self.update_service.validate_item(
+            item_blob
+        )
+
+        item: Item = self.update_service.build_item(full_item)  # Create Item object
+
+        if update_done:
+            return UpdateOutcome.UPDATED, item
+
+        if api_key is None:
+            logging.error(
+                "AsyncUpdateService.update_item: No institution api key found"
+            )
+            return UpdateOutcome.NO_KEY, None
+
+        item_data_section: dict[str, Any] = full_item.get("item_data") or {}
+
+        if self.update_service.diff_mode != DiffMode.OFF and await timed(
+            PipelineStage.DIFF,
+            asyncio.to_thread(  # Skip the PUT if Alma already has these
+                self.update_service.is_unchanged,
+                institution_id,
+                api_key,
+                mms_id,
+                holding_id,
+                item_pid,
+                item_data_section,
+            ),
+            dimensions,
+        ):
+            outcome: UpdateOutcome = UpdateOutcome.UNCHANGED
+        else:
+            breaker: CircuitBreaker = alma_circuit_breakers.get(institution_id)
+            if not breaker.allow_request():  # Alma failing for institution, try later
+                await self.defer_message(message_data, breaker.retry_in())
+                return UpdateOutcome.DEFERRED, None
+
+            try:
+                updated: bool = await timed(
+                    PipelineStage.ALMA_UPDATE,
+                    asyncio.to_thread(  # Update Alma item record
+                        self.update_service.update_alma_item,
+                        institution_id,
+                        api_key,
+                        mms_id,
+                        holding_id,
+                        item_pid,
+                        item,
+                    ),
+                    dimensions,
+                )
+            except ConcurrencyLimitTimeout as e:  # Alma busy for institution
+                await self.defer_message(
+                    message_data, alma_concurrency_limiter.max_wait, str(e)
+                )
+                return UpdateOutcome.DEFERRED, None
+            if not updated:
+                return UpdateOutcome.ALMA_FAILED, None
+
+            self.update_service.remember_update(item_pid, item_data_section)
+            outcome = UpdateOutcome.UPDATED
+
+        await self.mark(job_id, Stage.UPDATED)
+
+        return outcome, item
+
+    async def mark(self, job_id: str, stage: Stage) -> None:
+        """Record a completed stage in the ledger off the event loop
+
+        Args:
+            job_id (str): Job ID
+            stage (Stage): completed stage
+        """
+        await asyncio.to_thread(self.update_service.ledger.mark, job_id, stage)
+
+    async def mark_reported(
+        self, message_data: dict[str, Any], job_id: str, stage: Stage
+    ) -> None:
+        """Record a stage as done once the message's report is written
+
+        Args:
+            message_data (dict[str, Any]): message data
+            job_id (str): Job id
+            stage (Stage): stage to record
+        """
+        await asyncio.to_thread(
+            self.update_service.mark_done, message_data, job_id, stage
+        )
+
+    async def mark_notified(self, message_data: dict[str, Any], job_id: str) -> None:
+        """Record the job as notified once it's announced and its report written
+
+        Args:
+            message_data (dict[str, Any]): message data
+            job_id (str): Job id
+        """
+        await asyncio.to_thread(
+            self.update_service.when_notified,
+            message_data,
+            partial(
+                self.update_service.mark_done, message_data, job_id, Stage.NOTIFIED
+            ),
+        )
+
+    async def defer_message(
+        self,
+        message_data: dict[str, Any],
+        delay: float,
+        reason: str = "Alma circuit open",
+    ) -> None:
+        """Re-enqueue a message so it becomes visible again after a delay
+
+        Args:
+            message_data (dict[str, Any]): message data
+            delay (float): seconds before the message is visible
+            reason (str): why the message is deferred, for the log
+        """
+        logging.warning(
+            f"AsyncUpdateService.update_item: {reason}, deferring job "
+            f"{message_data.get('job_id')} for {delay:.0f}s"
+        )
+        await get_async_queue_client(UPDATE_ASYNC_QUEUE).send_message(
+            json_codec.dumps(message_data), visibility_timeout=max(math.ceil(delay), 1)
+        )
+
+    async def get_item_data(self, job_id: str) -> dict[str, Any] | None:
+        """Get item details
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            dict[str, Any]: Item details or None
+
+        Raises:
+            DecompressionError: if the payload is corrupt, so the queue retries it
+            ImportError: for zstd payloads if zstandard isn't installed
+        """
+        blob_service_client = get_async_blob_service_client()
+
+        try:
+            downloader = await blob_service_client.get_blob_client(
+                container=UPDATED_ITEMS_CONTAINER, blob=job_id + ".json"
+            ).download_blob(decompress=False)
+            item: dict[str, Any] | None = json_codec.loads(
+                await read_payload_async(downloader)  # decompressed as it streams
+            )
+        except (DecompressionError, ImportError):  # not the item's fault; retry
+            raise
+        except (
+            ValueError,
+            json.JSONDecodeError,
+            azure.core.exceptions.ResourceNotFoundError,
+            azure.core.exceptions.ServiceRequestError,
+            Exception,
+        ) as e:
+            if is_transient_storage_error(e):  # let the queue retry the message
+                raise
+            logging.warning(
+                f"AsyncUpdateService.update_item: Failed to download item from storage service: {e}"
+            )
+            return None
+
+        if item is None:
+            logging.warning("AsyncUpdateService.update_item: No item provided")
+            return None
+
+        return item
+
+    async def get_api_key(self, institution_id: int) -> str | None:
+        """Get institution api key, using the process-wide key cache
+
+        Args:
+            institution_id (int): institution id
+
+        Returns:
+            str: institution api key or None
+        """
+        return await api_key_cache.get_or_load_async(institution_id, self.fetch_api_key)
+
+    async def fetch_api_key(self, institution_id: int) -> str | None:
+        """Fetch institution api key from the Institution API
+
+        Args:
+            institution_id (int): institution id
+
+        Returns:
+            str: institution api key or None
+        """
+        params: dict[str, Any] = {"code": INSTITUTION_API_KEY}
+        url: str = f"{INSTITUTION_API_ENDPOINT}/{institution_id}/api-key"
+
+        try:
+            api_key: str | None = await retry_policy.call_async(  # retry transient
+                self.request_api_key, url, params
+            )
+        except Exception as err:  # Handle HTTP error
+            logging.warning(
+                f"AsyncUpdateService.update_item: Failed to get API key: {err}"
+            )
+            return None
+
+        if api_key is None:  # Handle missing API key
+            logging.warning(
+                "AsyncUpdateService.update_item: No institution api key provided"
+            )
+            return None
+
+        return api_key
+
+    async def request_api_key(self, url: str, params: dict[str, Any]) -> str | None:
+        """Send one request to the Institution API
+
+        Args:
+            url (str): API key URL for the institution
+            params (dict[str, Any]): query parameters
+
+        Returns:
+            str: institution api key or None
+        """
+        async with get_http_session().get(url, params=params) as response:
+            response.raise_for_status()  # raise http errors as errors
+            return (await response.json())["api_key"]  # get the API key
+
+    async def save_report(
+        self, item: Item, job_id: str, message_data: dict[str, Any] | None = None
+    ) -> None:
+        """Save report data
+
+        Args:
+            item (Item): Item object
+            job_id (str): Job id
+            message_data (dict[str, Any] | None): message data, which picks the
+                aggregated report file
+        """
+        if self.update_service.report_mode == ReportMode.AGGREGATE:
+            await asyncio.to_thread(  # may append a full buffer to the report file
+                self.update_service.save_report, item, job_id, message_data
+            )
+            return
+
+        report_data: dict[str, Any] = self.update_service.build_report_data(item)
+        compression: Compression = self.update_service.report_compression
+        blob_client: Any = get_async_blob_service_client().get_blob_client(
+            container=REPORT_CONTAINER, blob=job_id + ".json"
+        )
+
+        if compression == Compression.NONE:
+            await blob_client.upload_blob(
+                json_codec.dumps_bytes(report_data), overwrite=True
+            )
+            return
+
+        await blob_client.upload_blob(
+            compress(json_codec.dumps_bytes(report_data), compression),
+            overwrite=True,
+            content_settings=report_content_settings(compression),
+        )
+
+    async def send_notification(self, message_data: dict[str, Any]) -> None:
+        """Send notification about update
+
+        Args:
+            message_data (dict[str, Any]): message data
+        """
+        if self.update_service.notification_mode == NotificationMode.COALESCE:
+            await asyncio.to_thread(  # may send a full group's summary
+                self.update_service.send_notification, message_data
+            )
+            return
+
+        await get_async_queue_client(NOTIFICATION_QUEUE).send_message(
+            json_codec.dumps(message_data)
+        )
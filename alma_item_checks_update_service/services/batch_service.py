@@ -0,0 +1,510 @@
+"""Service class for batches of Alma Item Updates"""
+
+import hashlib
+import logging
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+import azure.functions as func
+
+from alma_item_checks_update_service.config import (
+    BATCH_SCHEDULING,
+    BATCH_TIME_BUDGET,
+    CHECKPOINT_INTERVAL,
+    INSTITUTION_WEIGHTS,
+    MESSAGE_TIME_RESERVE,
+    PREFETCH_BUFFER,
+    PREFETCH_CONCURRENCY,
+    UPDATE_BATCH_QUEUE,
+    UPDATE_CONCURRENCY,
+)
+from alma_item_checks_update_service.services.checkpoint import (
+    BatchCursor,
+    CheckpointStore,
+)
+from alma_item_checks_update_service.services.dead_letter import dead_letter
+from alma_item_checks_update_service.services.fair_scheduler import (
+    SchedulingMode,
+    fair_order,
+    parse_weights,
+)
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.message_validation import (
+    InvalidMessageError,
+    InvalidReason,
+    decode_message,
+)
+from alma_item_checks_update_service.services.notification_coalescer import (
+    MAX_QUEUE_MESSAGE_BYTES,
+    queue_message_size,
+)
+from alma_item_checks_update_service.services.prefetcher import ItemPrefetcher
+from alma_item_checks_update_service.services.storage import get_queue_client
+from alma_item_checks_update_service.services.update_service import (
+    COMPLETED_OUTCOMES,
+    INVALID_OUTCOMES,
+    UpdateOutcome,
+    UpdateService,
+)
+
+SETTLED_OUTCOMES: frozenset[UpdateOutcome] = (  # nothing left for the batch to do
+    COMPLETED_OUTCOMES
+    | frozenset(INVALID_OUTCOMES.values())
+    | {UpdateOutcome.INVALID_MESSAGE}  # dead-lettered
+    | {UpdateOutcome.DEFERRED}  # re-enqueued on its own
+)
+
+
+@dataclass(frozen=True)
+class MessageResult:
+    """Result of processing one message in a batch"""
+
+    index: int
+    job_id: str | None
+    outcome: UpdateOutcome
+    error: str | None = None
+
+    @property
+    def succeeded(self) -> bool:
+        """Whether Alma now has the item's values"""
+        return self.outcome in COMPLETED_OUTCOMES
+
+
+def continuation_batches(
+    batch_id: str | None, messages: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """Split the messages a batch has left into batches that fit on the queue
+
+    Args:
+        batch_id (str | None): id of the batch being continued
+        messages (list[dict[str, Any]]): messages not yet done, in message order
+
+    Returns:
+        list[dict[str, Any]]: continuation batches, each with its own batch id
+    """
+    batch_data: dict[str, Any] = {
+        "batch_id": hashlib.sha256(
+            f"{batch_id}:{json_codec.dumps(messages)}".encode()
+        ).hexdigest()[:32],  # the same continuation gets the same id if re-sent
+        "messages": messages,
+    }
+    if len(messages) <= 1 or queue_message_size(batch_data) <= MAX_QUEUE_MESSAGE_BYTES:
+        return [batch_data]
+
+    half: int = len(messages) // 2
+    return continuation_batches(batch_id, messages[:half]) + continuation_batches(
+        batch_id, messages[half:]
+    )
+
+
+class BatchIncompleteError(Exception):
+    """Messages of a batch failed in a way a redelivery may fix
+
+    Raised once the rest of the batch is done, so the queue redelivers the batch
+    and it resumes from its cursor, retrying only the failed messages.
+    """
+
+    def __init__(self, batch_id: str | None, results: list[MessageResult]) -> None:
+        """Initialize the error
+
+        Args:
+            batch_id (str | None): batch id
+            results (list[MessageResult]): one result per message, in message order
+        """
+        failed: list[int] = [
+            result.index for result in results if result.outcome == UpdateOutcome.ERROR
+        ]
+        super().__init__(
+            f"Batch {batch_id}: {len(failed)} messages failed, at indexes {failed}"
+        )
+        self.results: list[MessageResult] = results
+
+
+def message_job_id(message_data: Any) -> str | None:
+    """Get a message's job id, whatever shape the message is in
+
+    Args:
+        message_data (Any): decoded update message
+
+    Returns:
+        str | None: job id, or None if the message has none
+    """
+    job_id: Any = message_data.get("job_id") if isinstance(message_data, dict) else None
+
+    return str(job_id) if job_id else None
+
+
+class BatchUpdateService:
+    """Service class for batches of Alma Item Updates
+
+    Every message goes through the same UpdateService pipeline, sharing the worker's
+    API key cache, Alma clients and storage service. A failure in one message is
+    recorded in its result and doesn't stop the rest of the batch.
+
+    With a concurrency above one, messages run on a thread pool; Alma calls are still
+    throttled per institution by the shared rate limiter. Item blobs are prefetched
+    concurrently so the updates don't wait on downloads one at a time.
+
+    In fair scheduling mode, messages are started round-robin across institutions
+    instead of in queue order, so one institution's run can't starve the others.
+
+    A batch with an id checkpoints its progress every checkpoint_interval seconds.
+    It stops starting messages time_reserve seconds before its time_budget is up,
+    so an update already in flight can wait for a slot and retry within the
+    budget. It then saves its cursor and re-enqueues the messages not yet done as
+    new batches, each within the queue's message size limit. A redelivered batch
+    skips the messages its cursor records as done. Messages that raised aren't
+    recorded as done: the batch finishes the rest, saves its cursor and raises, so
+    the queue redelivers it to retry them.
+    """
+
+    def __init__(
+        self,
+        messages: list[dict[str, Any]],
+        concurrency: int = UPDATE_CONCURRENCY,
+        prefetch_concurrency: int = PREFETCH_CONCURRENCY,
+        prefetch_buffer: int = PREFETCH_BUFFER,
+        scheduling: SchedulingMode | str = BATCH_SCHEDULING,
+        institution_weights: dict[str, float] | None = None,
+        batch_id: str | None = None,
+        resume: bool = False,
+        time_budget: float = BATCH_TIME_BUDGET,
+        time_reserve: float = MESSAGE_TIME_RESERVE,
+        checkpoint_interval: float = CHECKPOINT_INTERVAL,
+        checkpoints: CheckpointStore | None = None,
+    ) -> None:
+        """Initialize the service
+
+        Args:
+            messages (list[dict[str, Any]]): decoded update messages
+            concurrency (int): max messages processed in parallel
+            prefetch_concurrency (int): max item blobs downloaded in parallel ahead
+                of the updates, 0 to download each as its message is processed
+            prefetch_buffer (int): max prefetched item blobs held in memory
+            scheduling (SchedulingMode | str): order messages are processed in
+            institution_weights (dict[str, float] | None): fair scheduling weight by
+                institution id, defaults to INSTITUTION_WEIGHTS
+            batch_id (str | None): id the batch is checkpointed under, None to
+                process it in one go without checkpoints
+            resume (bool): whether an earlier run may have saved a checkpoint
+            time_budget (float): seconds to spend before continuing in a new
+                message, 0 for no limit
+            time_reserve (float): seconds of the budget kept for a message that
+                has started, so it can finish before the budget is up
+            checkpoint_interval (float): seconds between checkpoints
+            checkpoints (CheckpointStore | None): where progress is saved
+        """
+        self.messages: list[dict[str, Any]] = messages
+        self.concurrency: int = max(concurrency, 1)
+        self.prefetch_concurrency: int = prefetch_concurrency
+        self.prefetch_buffer: int = prefetch_buffer
+        self.scheduling: SchedulingMode = SchedulingMode(scheduling)
+        self.institution_weights: dict[str, float] = (
+            parse_weights(INSTITUTION_WEIGHTS)
+            if institution_weights is None
+            else institution_weights
+        )
+        self.batch_id: str | None = batch_id
+        self.resume: bool = resume
+        self.time_budget: float = time_budget
+        self.time_reserve: float = time_reserve
+        self.checkpoint_interval: float = checkpoint_interval
+        self.checkpoints: CheckpointStore = checkpoints or CheckpointStore()
+        self.cursor: BatchCursor = BatchCursor(len(messages))
+        self._started: float = time.monotonic()
+        self._last_save: float = self._started  # checkpoint interval counts from here
+        self._saved: bool = False  # whether this run saved a checkpoint
+        self._begun: bool = False  # whether this run started a message
+
+    @classmethod
+    def from_queue_message(cls, batchmsg: func.QueueMessage) -> "BatchUpdateService":
+        """Create a batch from a queue message of the form {"messages": [...]}
+
+        A body that isn't a batch is dead-lettered and gives an empty batch, so the
+        queue doesn't retry it. Invalid messages within a batch are dead-lettered
+        one by one as they are processed.
+
+        Args:
+            batchmsg (func.QueueMessage): Queue message
+
+        Returns:
+            BatchUpdateService: batch service for the message's update messages
+        """
+        body: bytes = batchmsg.get_body()
+
+        try:
+            batch_data: Any = decode_message(body)
+            if not isinstance(batch_data, dict) or not isinstance(
+                batch_data.get("messages", []), list
+            ):
+                raise InvalidMessageError(
+                    InvalidReason.NOT_AN_OBJECT, "Batch has no list of messages"
+                )
+        except InvalidMessageError as e:
+            logging.error(f"BatchUpdateService.from_queue_message: {e}")
+            dead_letter(e, body.decode(errors="replace"))
+            return cls([])
+
+        redelivered: bool = (
+            isinstance(batchmsg.dequeue_count, int) and batchmsg.dequeue_count > 1
+        )
+
+        return cls(
+            batch_data.get("messages", []),
+            batch_id=str(
+                batch_data.get("batch_id") or hashlib.sha256(body).hexdigest()[:32]
+            ),
+            resume="batch_id" in batch_data or redelivered,  # else nothing to load
+        )
+
+    def process(self) -> list[MessageResult]:
+        """Process every message in the batch
+
+        Returns:
+            list[MessageResult]: one result per message, in message order
+
+        Raises:
+            BatchIncompleteError: if any message raised, once the rest are done
+        """
+        self._started = self._last_save = time.monotonic()
+        if self.batch_id is not None and self.resume:
+            self.load_cursor()
+        if self.cursor.done:
+            logging.info(
+                f"BatchUpdateService.process: Batch {self.batch_id} already processed"
+            )
+
+        update_service: UpdateService = UpdateService(buffered=True)
+
+        try:
+            if self.prefetch_concurrency > 0 and len(self.messages) > 1:
+                with ItemPrefetcher(  # download item blobs ahead of the updates
+                    update_service.download_item_data,
+                    self.job_ids(),
+                    max_workers=self.prefetch_concurrency,
+                    max_buffered=self.prefetch_buffer,
+                ) as prefetcher:
+                    update_service.prefetcher = prefetcher
+                    results: list[MessageResult] = self.process_messages(update_service)
+            else:
+                results = self.process_messages(update_service)
+        finally:
+            update_service.flush_buffered()  # the batch's rows are written with it
+
+        succeeded: int = sum(result.succeeded for result in results)
+        logging.info(
+            f"BatchUpdateService.process: {succeeded} of {len(results)} items updated"
+        )
+
+        if any(result.outcome == UpdateOutcome.CONTINUED for result in results):
+            self.save_cursor()
+            self.continue_later()  # which retries the failed messages too
+        elif any(result.outcome == UpdateOutcome.ERROR for result in results):
+            if self.batch_id is not None:
+                self.save_cursor()
+            raise BatchIncompleteError(self.batch_id, results)
+        elif self._saved or (self.resume and not self.cursor.done):
+            # a redelivery of the finished batch can skip it outright
+            self.cursor.done = True
+            self.save_cursor()
+
+        return results
+
+    def process_messages(self, update_service: UpdateService) -> list[MessageResult]:
+        """Process every message not yet done, in parallel if the concurrency allows
+
+        Args:
+            update_service (UpdateService): shared update service
+
+        Returns:
+            list[MessageResult]: one result per message, in message order
+        """
+        order: list[int] = self.processing_order()
+        results: list[MessageResult] = [
+            MessageResult(
+                index,
+                message_job_id(self.messages[index]),
+                UpdateOutcome.ALREADY_PROCESSED,
+            )
+            for index in order
+            if self.cursor.is_done(index)  # O(1) skip of work done by earlier runs
+        ]
+        order = [index for index in order if not self.cursor.is_done(index)]
+
+        if self.concurrency == 1 or len(order) <= 1:
+            results.extend(
+                self.record(update_service, map(self.start(update_service), order))
+            )
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.concurrency, len(order))
+            ) as executor:  # work queue is FIFO, so messages start in order
+                results.extend(
+                    self.record(
+                        update_service, executor.map(self.start(update_service), order)
+                    )
+                )
+
+        return sorted(results, key=lambda result: result.index)
+
+    def start(self, update_service: UpdateService) -> Callable[[int], MessageResult]:
+        """Get the function that processes a message unless the batch is out of time
+
+        Args:
+            update_service (UpdateService): shared update service
+
+        Returns:
+            Callable[[int], MessageResult]: processes the message at an index
+        """
+
+        def run(index: int) -> MessageResult:
+            message_data: dict[str, Any] = self.messages[index]
+            if self.out_of_time():  # leave the rest for a continuation message
+                return MessageResult(
+                    index, message_job_id(message_data), UpdateOutcome.CONTINUED
+                )
+            self._begun = True
+
+            return self.process_message(update_service, index, message_data)
+
+        return run
+
+    def record(
+        self, update_service: UpdateService, results: Iterator[MessageResult]
+    ) -> Iterator[MessageResult]:
+        """Mark settled messages done in the cursor as their results come in
+
+        Args:
+            update_service (UpdateService): shared update service, whose buffered
+                rows are written before each cursor save
+            results (Iterator[MessageResult]): results, as they finish
+
+        Yields:
+            MessageResult: each result
+        """
+        for result in results:
+            if result.outcome in SETTLED_OUTCOMES:  # failures are left to retry
+                self.cursor.complete(result.index)
+                if (
+                    self.batch_id is not None
+                    and time.monotonic() - self._last_save >= self.checkpoint_interval
+                ):
+                    update_service.flush_buffered()  # never save ahead of the rows
+                    self.save_cursor()
+            yield result
+
+    def out_of_time(self) -> bool:
+        """Whether the batch has too little of its time budget left for a message
+
+        A run always starts at least one message, so a reserve as long as the
+        budget still makes progress.
+
+        Returns:
+            bool: True to stop starting messages
+        """
+        return (
+            self.batch_id is not None
+            and self.time_budget > 0
+            and self._begun
+            and time.monotonic() - self._started >= self.time_budget - self.time_reserve
+        )
+
+    def load_cursor(self) -> None:
+        """Load the batch's cursor saved by an earlier run, if any"""
+        try:
+            self.cursor = BatchCursor.from_dict(
+                len(self.messages), self.checkpoints.load(f"batches/{self.batch_id}")
+            )
+        except (TypeError, ValueError) as e:
+            logging.warning(
+                f"BatchUpdateService.load_cursor: Ignoring unreadable checkpoint "
+                f"for batch {self.batch_id}: {e}"
+            )
+
+    def save_cursor(self) -> None:
+        """Save the batch's cursor"""
+        self.checkpoints.save(f"batches/{self.batch_id}", self.cursor.to_dict())
+        self._last_save = time.monotonic()
+        self._saved = True
+
+    def continue_later(self) -> None:
+        """Re-enqueue the messages not yet done as new batches
+
+        Each continuation gets a batch id of its own, since its cursor counts its
+        own messages, and holds as many messages as fit in one queue message.
+        """
+        remaining: list[dict[str, Any]] = [
+            message_data
+            for index, message_data in enumerate(self.messages)
+            if not self.cursor.is_done(index)
+        ]
+        batches: list[dict[str, Any]] = continuation_batches(self.batch_id, remaining)
+        logging.info(
+            f"BatchUpdateService.process: Batch {self.batch_id} out of time, "
+            f"continuing {len(remaining)} messages in {len(batches)} batches"
+        )
+
+        queue_client = get_queue_client(UPDATE_BATCH_QUEUE)
+        for batch_data in batches:
+            queue_client.send_message(json_codec.dumps(batch_data))
+
+    def processing_order(self) -> list[int]:
+        """Get the order to process the batch's messages in
+
+        Returns:
+            list[int]: message indexes
+        """
+        if self.scheduling == SchedulingMode.FAIR:
+            return fair_order(self.messages, self.institution_weights)
+
+        return list(range(len(self.messages)))
+
+    def job_ids(self) -> list[str]:
+        """Get the job ids still to process, in processing order
+
+        Returns:
+            list[str]: job ids of well-formed messages
+        """
+        job_ids: list[str | None] = [
+            message_job_id(self.messages[index])
+            for index in self.processing_order()
+            if not self.cursor.is_done(index)
+        ]
+
+        return [job_id for job_id in job_ids if job_id is not None]
+
+    def process_message(
+        self, update_service: UpdateService, index: int, message_data: dict[str, Any]
+    ) -> MessageResult:
+        """Process one message, isolating any exception it raises
+
+        Args:
+            update_service (UpdateService): shared update service
+            index (int): position of the message in the batch
+            message_data (dict[str, Any]): message data
+
+        Returns:
+            MessageResult: result for the message
+        """
+        job_id: str | None = (
+            message_data.get("job_id") if isinstance(message_data, dict) else None
+        )
+
+        try:
+            outcome: UpdateOutcome = update_service.process_message(message_data)
+        except Exception as e:  # one bad message must not poison the batch
+            logging.error(
+                f"BatchUpdateService.process_message: Failed to process message "
+                f"{index} (job id {job_id}): {e}"
+            )
+            return MessageResult(
+                index=index, job_id=job_id, outcome=UpdateOutcome.ERROR, error=str(e)
+            )
+        finally:
+            if update_service.prefetcher is not None and job_id:
+                update_service.prefetcher.discard(str(job_id))  # free unused payload
+
+        return MessageResult(index=index, job_id=job_id, outcome=outcome)
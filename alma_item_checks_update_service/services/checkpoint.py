@@ -0,0 +1,152 @@
+"""Checkpoints that let long runs resume after a timeout, crash or continuation"""
+
+import logging
+from collections.abc import Iterable
+from typing import Any
+
+import azure.core.exceptions
+
+from alma_item_checks_update_service.config import CHECKPOINT_CONTAINER
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.storage import get_blob_service_client
+
+
+class CheckpointStore:
+    """JSON checkpoints kept as blobs, one per run"""
+
+    def __init__(self, container: str = CHECKPOINT_CONTAINER) -> None:
+        """Initialize the store
+
+        Args:
+            container (str): container holding the checkpoint blobs
+        """
+        self.container: str = container
+
+    def load(self, name: str) -> dict[str, Any] | None:
+        """Load a run's checkpoint
+
+        Args:
+            name (str): run name, e.g. "batches/<batch id>"
+
+        Returns:
+            dict[str, Any] | None: saved checkpoint, or None if there is none
+        """
+        try:
+            data: bytes = (
+                get_blob_service_client()
+                .get_blob_client(container=self.container, blob=f"{name}.json")
+                .download_blob()
+                .readall()
+            )
+        except azure.core.exceptions.ResourceNotFoundError:
+            return None
+
+        try:
+            checkpoint: Any = json_codec.loads(data)
+        except ValueError as e:
+            logging.warning(f"CheckpointStore: Ignoring unreadable {name}: {e}")
+            return None
+
+        return checkpoint if isinstance(checkpoint, dict) else None
+
+    def save(self, name: str, checkpoint: dict[str, Any]) -> None:
+        """Save a run's checkpoint, replacing any earlier one
+
+        Args:
+            name (str): run name
+            checkpoint (dict[str, Any]): checkpoint
+        """
+        get_blob_service_client().get_blob_client(
+            container=self.container, blob=f"{name}.json"
+        ).upload_blob(json_codec.dumps_bytes(checkpoint), overwrite=True)
+
+
+class BatchCursor:
+    """Which messages of a batch are done
+
+    Messages finish out of order on a thread pool, so the cursor keeps the index
+    every message before which is done, plus the indexes done beyond it. Messages
+    are tracked by index, so a batch holding the same job twice, or messages without
+    a job id, is counted right. Both checks are O(1) per message, and the saved
+    cursor stays compact however far the batch has got.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        next_index: int = 0,
+        completed: Iterable[int] = (),
+        done: bool = False,
+    ) -> None:
+        """Initialize the cursor
+
+        Args:
+            size (int): messages in the batch
+            next_index (int): every message before this index is done
+            completed (Iterable[int]): indexes done at or after next_index
+            done (bool): whether the whole batch is done
+        """
+        self.size: int = size
+        self.next_index: int = next_index
+        self.completed: set[int] = {index for index in completed if index >= next_index}
+        self.done: bool = done
+
+    @classmethod
+    def from_dict(cls, size: int, data: Any) -> "BatchCursor":
+        """Load a cursor saved by to_dict
+
+        Args:
+            size (int): messages in the batch
+            data (Any): saved cursor
+
+        Returns:
+            BatchCursor: cursor, at the start if data isn't one
+        """
+        if not isinstance(data, dict):
+            return cls(size)
+
+        return cls(
+            size,
+            next_index=int(data.get("next_index", 0)),
+            completed=(
+                index
+                for index in data.get("completed") or []
+                if isinstance(index, int) and not isinstance(index, bool)
+            ),  # anything else is from an older cursor; redone, which is safe
+            done=bool(data.get("done", False)),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """Get the cursor as a JSON-ready dict
+
+        Returns:
+            dict[str, Any]: cursor
+        """
+        return {
+            "next_index": self.next_index,
+            "completed": sorted(self.completed),
+            "done": self.done,
+        }
+
+    def is_done(self, index: int) -> bool:
+        """Whether a message was done by an earlier run
+
+        Args:
+            index (int): message index
+
+        Returns:
+            bool: True to skip the message
+        """
+        return self.done or index < self.next_index or index in self.completed
+
+    def complete(self, index: int) -> None:
+        """Record a message as done
+
+        Args:
+            index (int): message index
+        """
+        self.completed.add(index)
+
+        while self.next_index in self.completed:
+            self.completed.discard(self.next_index)  # covered by next_index now
+            self.next_index += 1
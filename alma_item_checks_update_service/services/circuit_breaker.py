@@ -0,0 +1,197 @@
+"""Per-institution circuit breakers for the Alma API"""
+
+import logging
+import threading
+import time
+from enum import StrEnum
+
+from alma_item_checks_update_service.config import (
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    CIRCUIT_BREAKER_RESET_TIMEOUT,
+)
+from alma_item_checks_update_service.services.metrics import update_metrics
+
+
+class BreakerState(StrEnum):
+    """Circuit breaker state"""
+
+    CLOSED = "closed"  # calls flow normally
+    OPEN = "open"  # calls are refused until reset_timeout passes
+    HALF_OPEN = "half_open"  # one probe call decides whether to close again
+
+
+STATE_GAUGE_VALUES: dict[BreakerState, int] = {  # alma_circuit_breaker_state
+    BreakerState.CLOSED: 0,
+    BreakerState.HALF_OPEN: 1,
+    BreakerState.OPEN: 2,
+}
+
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker
+
+    Opens after ``failure_threshold`` consecutive failures. Once ``reset_timeout``
+    seconds have passed, a single probe call is let through; its success closes the
+    breaker and its failure reopens it. Every transition is logged and reported as
+    the alma_circuit_breaker_state gauge: 0 closed, 1 half open, 2 open.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        dimensions: dict[str, str] | None = None,
+    ) -> None:
+        """Initialize the breaker
+
+        Args:
+            name (str): name used in log messages
+            failure_threshold (int): consecutive failures that open the breaker
+            reset_timeout (float): seconds to stay open before probing
+            dimensions (dict[str, str] | None): metric dimensions, e.g. institution
+        """
+        self.name: str = name
+        self.dimensions: dict[str, str] = dimensions or {}
+        self.failure_threshold: int = max(failure_threshold, 1)
+        self.reset_timeout: float = reset_timeout
+        self.state: BreakerState = BreakerState.CLOSED
+        self.failures: int = 0
+        self._opened_at: float = 0.0
+        self._probe_in_flight: bool = False
+        self._lock: threading.Lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Whether a call may go ahead now
+
+        Returns:
+            bool: True to make the call, False to defer it
+        """
+        with self._lock:
+            if self.state == BreakerState.CLOSED:
+                return True
+
+            if self.state == BreakerState.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._transition(BreakerState.HALF_OPEN)
+
+            if self._probe_in_flight:  # half-open: one probe at a time
+                return False
+
+            self._probe_in_flight = True
+            return True
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker will let a probe through
+
+        Returns:
+            float: seconds to wait, 0 if calls are allowed now
+        """
+        with self._lock:
+            if self.state != BreakerState.OPEN:
+                return 0.0
+
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self) -> None:
+        """Record a successful call"""
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != BreakerState.CLOSED:
+                self._transition(BreakerState.CLOSED)
+
+    def record_skipped(self) -> None:
+        """Record that an allowed call was never made, freeing a half-open probe"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Record a failed call"""
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if (
+                self.state == BreakerState.HALF_OPEN
+                or self.failures >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                if self.state != BreakerState.OPEN:
+                    self._transition(BreakerState.OPEN)
+
+    def _transition(self, state: BreakerState) -> None:
+        """Change state, log it and report it; caller holds the lock
+
+        Args:
+            state (BreakerState): new state
+        """
+        logging.warning(
+            f"CircuitBreaker: {self.name} {self.state} -> {state} "
+            f"after {self.failures} consecutive failures"
+        )
+        self.state = state
+        update_metrics.gauge(
+            "alma_circuit_breaker_state", STATE_GAUGE_VALUES[state], self.dimensions
+        )
+
+
+class CircuitBreakerRegistry:
+    """Circuit breakers keyed by institution"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        """Initialize the registry
+
+        Args:
+            failure_threshold (int): consecutive failures that open a breaker
+            reset_timeout (float): seconds a breaker stays open before probing
+        """
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self._breakers: dict[int, CircuitBreaker] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, institution_id: int) -> CircuitBreaker:
+        """Get an institution's breaker, creating it closed on first use
+
+        Args:
+            institution_id (int): institution id
+
+        Returns:
+            CircuitBreaker: the institution's breaker
+        """
+        with self._lock:
+            if institution_id not in self._breakers:
+                self._breakers[institution_id] = CircuitBreaker(
+                    name=f"alma:{institution_id}",
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout,
+                    dimensions={"institution_id": str(institution_id)},
+                )
+
+            return self._breakers[institution_id]
+
+    def stats(self) -> dict[int, dict[str, str | int]]:
+        """Get every breaker's state and consecutive failure count
+
+        Returns:
+            dict[int, dict[str, str | int]]: state and failures by institution id
+        """
+        with self._lock:
+            breakers: dict[int, CircuitBreaker] = dict(self._breakers)
+
+        return {
+            institution_id: {"state": str(breaker.state), "failures": breaker.failures}
+            for institution_id, breaker in breakers.items()
+        }
+
+    def clear(self) -> None:
+        """Drop all breakers"""
+        with self._lock:
+            self._breakers.clear()
+
+
+alma_circuit_breakers: CircuitBreakerRegistry = CircuitBreakerRegistry(
+    failure_threshold=CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_BREAKER_RESET_TIMEOUT,
+)
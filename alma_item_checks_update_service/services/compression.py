@@ -0,0 +1,259 @@
+"""Compressed blob payloads: gzip or zstd, or plain JSON
+
+A payload's format comes from the magic bytes its first chunk starts with, so
+compressed and plain blobs can share a container, and a blob whose Content-Encoding
+property is wrong is still read right. The content encoding only decides when the
+first chunk is too short to tell. Downloads are decompressed chunk by chunk as they
+stream in.
+
+Blobs must be downloaded with decompress=False. Otherwise the SDK decodes each ranged
+chunk of a blob with a Content-Encoding on its own, which fails for any blob larger
+than max_single_get_size.
+
+zstd needs the zstandard package, the "zstd" extra. It is imported on first use, so
+workers that only ever see gzip or plain payloads run without it.
+"""
+
+import gzip
+import logging
+import zlib
+from collections.abc import AsyncIterable, Iterable, Iterator
+from enum import StrEnum
+from typing import Any
+
+GZIP_MAGIC: bytes = b"\x1f\x8b"
+ZSTD_MAGIC: bytes = b"\x28\xb5\x2f\xfd"
+
+
+class Compression(StrEnum):
+    """Blob payload compression"""
+
+    NONE = "none"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+class DecompressionError(Exception):
+    """A payload couldn't be decompressed as the format it claims to be"""
+
+
+def load_zstd() -> Any:
+    """Import the zstandard package
+
+    Returns:
+        Any: the zstandard module
+
+    Raises:
+        ImportError: if zstandard isn't installed
+    """
+    import zstandard  # type: ignore[import-not-found]  # optional extra
+
+    return zstandard
+
+
+def detect(head: bytes, content_encoding: str | None = None) -> Compression:
+    """Work out how a payload is compressed
+
+    Args:
+        head (bytes): the payload's first bytes
+        content_encoding (str | None): the blob's Content-Encoding property
+
+    Returns:
+        Compression: compression, NONE for plain payloads
+    """
+    encoding: str = (content_encoding or "").strip().lower()
+    declared: Compression = Compression.NONE
+    if encoding in ("gzip", "x-gzip"):
+        declared = Compression.GZIP
+    elif encoding == "zstd":
+        declared = Compression.ZSTD
+
+    if head.startswith(GZIP_MAGIC):
+        found: Compression = Compression.GZIP
+    elif head.startswith(ZSTD_MAGIC):
+        found = Compression.ZSTD
+    elif len(head) < len(ZSTD_MAGIC):  # too short to tell
+        return declared
+    else:
+        found = Compression.NONE
+
+    if encoding and found != declared:
+        logging.warning(
+            f"compression.detect: Content-Encoding {content_encoding!r} but the "
+            f"payload is {found}, reading it as {found}"
+        )
+
+    return found
+
+
+def content_encoding(downloader: Any) -> str | None:
+    """Get a downloading blob's Content-Encoding property
+
+    Args:
+        downloader (Any): StorageStreamDownloader, sync or async
+
+    Returns:
+        str | None: content encoding, or None if the blob has none
+    """
+    properties: Any = getattr(downloader, "properties", None)
+    settings: Any = getattr(properties, "content_settings", None)
+    encoding: Any = getattr(settings, "content_encoding", None)
+
+    return encoding if isinstance(encoding, str) else None
+
+
+class StreamDecompressor:
+    """Decompresses a payload chunk by chunk
+
+    The format is decided on the first non-empty chunk. Concatenated gzip members
+    and zstd frames are decompressed one after the other, as the formats allow.
+    """
+
+    def __init__(self, content_encoding: str | None = None) -> None:
+        """Initialize the decompressor
+
+        Args:
+            content_encoding (str | None): the blob's Content-Encoding property
+        """
+        self.content_encoding: str | None = content_encoding
+        self.compression: Compression | None = None  # known after the first chunk
+        self._decoder: Any = None
+
+    def decompress(self, chunk: bytes) -> bytes:
+        """Decompress the next chunk
+
+        Args:
+            chunk (bytes): raw chunk
+
+        Returns:
+            bytes: payload bytes, possibly empty until the decoder has enough input
+
+        Raises:
+            DecompressionError: if the chunk isn't valid for the payload's format
+            ImportError: for zstd payloads if zstandard isn't installed
+        """
+        if self.compression is None:
+            if not chunk:
+                return b""
+            self.compression = detect(chunk, self.content_encoding)
+            self._decoder = self.new_decoder()
+
+        if self._decoder is None:
+            return chunk
+
+        try:
+            data: list[bytes] = [self._decoder.decompress(chunk)]
+            while self._decoder.eof and self._decoder.unused_data:  # next member
+                unused: bytes = self._decoder.unused_data
+                self._decoder = self.new_decoder()
+                data.append(self._decoder.decompress(unused))
+        except Exception as e:  # zlib.error, zstandard.ZstdError
+            raise DecompressionError(f"Corrupt {self.compression} payload: {e}") from e
+
+        return b"".join(data)
+
+    def flush(self) -> bytes:
+        """Get any payload bytes the decoder still holds
+
+        Returns:
+            bytes: remaining payload bytes
+
+        Raises:
+            DecompressionError: if the payload is corrupt
+        """
+        if self._decoder is None:
+            return b""
+
+        try:
+            return self._decoder.flush()
+        except Exception as e:  # zlib.error, zstandard.ZstdError
+            raise DecompressionError(f"Corrupt {self.compression} payload: {e}") from e
+
+    def new_decoder(self) -> Any:
+        """Start a decoder for one gzip member or zstd frame
+
+        Returns:
+            Any: decompression object, None for plain payloads
+
+        Raises:
+            ImportError: for zstd payloads if zstandard isn't installed
+        """
+        if self.compression == Compression.GZIP:
+            return zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        if self.compression == Compression.ZSTD:
+            return load_zstd().ZstdDecompressor().decompressobj()
+
+        return None
+
+
+def decompress_chunks(
+    chunks: Iterable[bytes], content_encoding: str | None = None
+) -> Iterator[bytes]:
+    """Decompress a payload as it streams in
+
+    Args:
+        chunks (Iterable[bytes]): raw chunks
+        content_encoding (str | None): the blob's Content-Encoding property
+
+    Yields:
+        bytes: payload bytes
+    """
+    decompressor: StreamDecompressor = StreamDecompressor(content_encoding)
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+
+    yield decompressor.flush()
+
+
+def read_payload(downloader: Any) -> bytes:
+    """Download a blob's payload, decompressing it as it streams in
+
+    Args:
+        downloader (Any): StorageStreamDownloader from download_blob(decompress=False)
+
+    Returns:
+        bytes: payload bytes
+    """
+    return b"".join(
+        decompress_chunks(downloader.chunks(), content_encoding(downloader))
+    )
+
+
+async def read_payload_async(downloader: Any) -> bytes:
+    """Download a blob's payload, decompressing it as it streams in
+
+    Args:
+        downloader (Any): async StorageStreamDownloader from
+            download_blob(decompress=False)
+
+    Returns:
+        bytes: payload bytes
+    """
+    decompressor: StreamDecompressor = StreamDecompressor(content_encoding(downloader))
+    chunks: AsyncIterable[bytes] = downloader.chunks()
+    data: list[bytes] = [decompressor.decompress(chunk) async for chunk in chunks]
+    data.append(decompressor.flush())
+
+    return b"".join(data)
+
+
+def compress(data: bytes, compression: Compression | str) -> bytes:
+    """Compress a payload
+
+    Args:
+        data (bytes): payload bytes
+        compression (Compression | str): compression to apply
+
+    Returns:
+        bytes: compressed bytes, or data itself for NONE
+
+    Raises:
+        ImportError: for zstd if zstandard isn't installed
+    """
+    compression = Compression(compression)
+    if compression == Compression.GZIP:
+        return gzip.compress(data, mtime=0)  # same bytes for the same report
+    if compression == Compression.ZSTD:
+        return load_zstd().ZstdCompressor().compress(data)
+
+    return data
@@ -0,0 +1,331 @@
+"""Per-institution adaptive concurrency limits for Alma API calls
+
+Each institution gets an in-flight limit tuned by additive increase, multiplicative
+decrease (AIMD). While Alma answers within the latency target and few calls fail, a
+window of successful calls raises the limit by about one. Throttling, transient
+failures or latency over the target cut it by a factor, at most once per round
+trip so one burst of errors doesn't collapse the limit to the floor.
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from enum import StrEnum
+
+from alma_item_checks_update_service.config import (
+    ALMA_CONCURRENCY_DECREASE_FACTOR,
+    ALMA_CONCURRENCY_INITIAL,
+    ALMA_CONCURRENCY_LATENCY_TARGET,
+    ALMA_CONCURRENCY_MAX,
+    ALMA_CONCURRENCY_MAX_WAIT,
+    ALMA_CONCURRENCY_MIN,
+)
+from alma_item_checks_update_service.services.metrics import update_metrics
+from alma_item_checks_update_service.services.retry import (
+    get_status_code,
+    is_retryable,
+)
+
+SMOOTHING: float = 0.2  # weight of the newest sample in the rolling averages
+MAX_ERROR_RATE: float = 0.1  # rolling failure rate above which the limit won't grow
+
+
+class LimitSignal(StrEnum):
+    """What a finished call says about Alma's capacity"""
+
+    SUCCESS = "success"  # answered; latency decides whether there is headroom
+    THROTTLED = "throttled"  # 429 Too Many Requests
+    FAILED = "failed"  # timeout, connection error or server error
+    IGNORED = "ignored"  # rejected because of the item itself, not Alma's load
+
+
+class ConcurrencyLimitTimeout(Exception):
+    """No call slot freed up for an institution within the allowed wait
+
+    Not a TimeoutError: Alma was never called, so the call isn't retried in place
+    or counted against the circuit breaker. The message is deferred instead.
+    """
+
+
+class CallTimer:
+    """Times one Alma call for its latency sample"""
+
+    def __init__(self) -> None:
+        """Start the clock"""
+        self.started: float = time.monotonic()
+
+    def restart(self) -> None:
+        """Start the clock again, leaving out local waits before the call is sent"""
+        self.started = time.monotonic()
+
+    def elapsed(self) -> float:
+        """Get the seconds since the clock started
+
+        Returns:
+            float: elapsed seconds
+        """
+        return time.monotonic() - self.started
+
+
+def classify(exc: BaseException | None) -> LimitSignal:
+    """Turn the outcome of an Alma call into a limit signal
+
+    Args:
+        exc (BaseException | None): exception raised by the call, None on success
+
+    Returns:
+        LimitSignal: signal
+    """
+    if exc is None:
+        return LimitSignal.SUCCESS
+    if get_status_code(exc) == 429:
+        return LimitSignal.THROTTLED
+    if is_retryable(exc):
+        return LimitSignal.FAILED
+
+    return LimitSignal.IGNORED
+
+
+class AdaptiveLimit:
+    """Thread-safe AIMD in-flight limit for one institution"""
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_target: float,
+        decrease_factor: float,
+    ) -> None:
+        """Initialize the limit
+
+        Args:
+            name (str): name used in log messages
+            initial (int): starting limit
+            minimum (int): floor for the limit
+            maximum (int): ceiling for the limit
+            latency_target (float): seconds a healthy call takes at most
+            decrease_factor (float): multiplier applied when backing off
+        """
+        self.name: str = name
+        self.minimum: int = max(minimum, 1)
+        self.maximum: int = max(maximum, self.minimum)
+        self.limit: float = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target: float = latency_target
+        self.decrease_factor: float = min(max(decrease_factor, 0.1), 0.9)
+        self.in_flight: int = 0
+        self.latency: float | None = None  # rolling average call latency
+        self.error_rate: float = 0.0  # rolling share of throttled or failed calls
+        self._last_decrease: float = float("-inf")
+        self._condition: threading.Condition = threading.Condition()
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Take a call slot, blocking while the institution is at its limit
+
+        Args:
+            timeout (float | None): seconds to wait at most, None to wait forever
+
+        Returns:
+            bool: True if a slot was taken
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self.in_flight < int(self.limit), timeout
+            ):
+                return False
+            self.in_flight += 1
+
+            return True
+
+    def release(self, seconds: float, signal: LimitSignal) -> int | None:
+        """Give a call slot back and adjust the limit
+
+        Args:
+            seconds (float): how long the call took
+            signal (LimitSignal): what the call's outcome says about Alma
+
+        Returns:
+            int | None: the new limit if it changed, else None
+        """
+        with self._condition:
+            self.in_flight -= 1
+            before: int = int(self.limit)
+
+            if signal != LimitSignal.IGNORED:
+                self.latency = (
+                    seconds
+                    if self.latency is None
+                    else SMOOTHING * seconds + (1 - SMOOTHING) * self.latency
+                )
+                failed: float = 1.0 if signal != LimitSignal.SUCCESS else 0.0
+                self.error_rate = SMOOTHING * failed + (1 - SMOOTHING) * self.error_rate
+
+                if signal != LimitSignal.SUCCESS or self.latency > self.latency_target:
+                    self._decrease(signal)
+                elif self.error_rate <= MAX_ERROR_RATE:
+                    self.limit = min(self.limit + 1 / self.limit, float(self.maximum))
+
+            self._condition.notify_all()
+
+            after: int = int(self.limit)
+
+        return after if after != before else None
+
+    def _decrease(self, signal: LimitSignal) -> None:
+        """Back off multiplicatively, once per round trip; caller holds the lock
+
+        Args:
+            signal (LimitSignal): why the limit is cut
+        """
+        now: float = time.monotonic()
+        if now - self._last_decrease < (self.latency or 0.0):
+            return  # calls already in flight predate the last cut
+
+        self._last_decrease = now
+        limit: float = max(self.limit * self.decrease_factor, float(self.minimum))
+        if int(limit) < int(self.limit):
+            logging.warning(
+                f"ConcurrencyLimiter: {self.name} limit {int(self.limit)} -> "
+                f"{int(limit)} after {signal} (latency {self.latency or 0.0:.2f}s, "
+                f"error rate {self.error_rate:.0%})"
+            )
+        self.limit = limit
+
+
+class ConcurrencyLimiter:
+    """Adaptive limits keyed by institution
+
+    A maximum of zero or less disables limiting.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_target: float,
+        decrease_factor: float,
+        max_wait: float,
+    ) -> None:
+        """Initialize the limiter
+
+        Args:
+            initial (int): starting limit per institution
+            minimum (int): floor for each limit
+            maximum (int): ceiling for each limit
+            latency_target (float): seconds a healthy Alma call takes at most
+            decrease_factor (float): multiplier applied when backing off
+            max_wait (float): seconds a call waits for a slot before giving up
+        """
+        self.initial: int = initial
+        self.minimum: int = minimum
+        self.maximum: int = maximum
+        self.latency_target: float = latency_target
+        self.decrease_factor: float = decrease_factor
+        self.max_wait: float = max_wait
+        self._limits: dict[int, AdaptiveLimit] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, institution_id: int) -> AdaptiveLimit:
+        """Get an institution's limit, creating it at the initial value on first use
+
+        Args:
+            institution_id (int): institution id
+
+        Returns:
+            AdaptiveLimit: the institution's limit
+        """
+        with self._lock:
+            if institution_id not in self._limits:
+                self._limits[institution_id] = AdaptiveLimit(
+                    name=f"alma:{institution_id}",
+                    initial=self.initial,
+                    minimum=self.minimum,
+                    maximum=self.maximum,
+                    latency_target=self.latency_target,
+                    decrease_factor=self.decrease_factor,
+                )
+
+            return self._limits[institution_id]
+
+    @contextmanager
+    def slot(self, institution_id: int) -> Iterator[CallTimer]:
+        """Make one Alma call within the institution's limit
+
+        The call's latency is timed from when the slot is taken. Callers that wait
+        on something local after that, such as a rate-limit token, restart the
+        timer just before the call, so the wait doesn't read as Alma being slow.
+
+        Args:
+            institution_id (int): institution id
+
+        Yields:
+            CallTimer: the call's timer
+
+        Raises:
+            ConcurrencyLimitTimeout: if no slot frees up within max_wait
+        """
+        if self.maximum <= 0:
+            yield CallTimer()
+            return
+
+        limit: AdaptiveLimit = self.get(institution_id)
+        if not limit.acquire(self.max_wait):
+            raise ConcurrencyLimitTimeout(
+                f"No Alma call slot for institution {institution_id} "
+                f"within {self.max_wait:g}s"
+            )
+
+        error: BaseException | None = None
+        timer: CallTimer = CallTimer()
+        try:
+            yield timer
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            changed: int | None = limit.release(timer.elapsed(), classify(error))
+            if changed is not None:
+                update_metrics.gauge(
+                    "alma_concurrency_limit",
+                    changed,
+                    {"institution_id": str(institution_id)},
+                )
+
+    def stats(self) -> dict[int, dict[str, float | int | None]]:
+        """Get every institution's limit and what drives it
+
+        Returns:
+            dict[int, dict[str, float | int | None]]: limit, in-flight calls,
+                rolling latency and error rate by institution id
+        """
+        with self._lock:
+            limits: dict[int, AdaptiveLimit] = dict(self._limits)
+
+        return {
+            institution_id: {
+                "limit": int(limit.limit),
+                "in_flight": limit.in_flight,
+                "latency": limit.latency,
+                "error_rate": limit.error_rate,
+            }
+            for institution_id, limit in limits.items()
+        }
+
+    def clear(self) -> None:
+        """Drop all limits"""
+        with self._lock:
+            self._limits.clear()
+
+
+alma_concurrency_limiter: ConcurrencyLimiter = ConcurrencyLimiter(
+    initial=ALMA_CONCURRENCY_INITIAL,
+    minimum=ALMA_CONCURRENCY_MIN,
+    maximum=ALMA_CONCURRENCY_MAX,
+    latency_target=ALMA_CONCURRENCY_LATENCY_TARGET,
+    decrease_factor=ALMA_CONCURRENCY_DECREASE_FACTOR,
+    max_wait=ALMA_CONCURRENCY_MAX_WAIT,
+)
@@ -0,0 +1,52 @@
+"""Dead-letter container for messages that can never be processed"""
+
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any
+
+from alma_item_checks_update_service.config import DEAD_LETTER_CONTAINER
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.message_validation import (
+    InvalidMessageError,
+)
+from alma_item_checks_update_service.services.storage import get_storage_service
+
+
+def dead_letter(
+    error: InvalidMessageError,
+    payload: Any,
+    container: str = DEAD_LETTER_CONTAINER,
+) -> str:
+    """Save an invalid message with the reason it was rejected
+
+    The message is consumed once this returns; if the write fails the exception
+    propagates, so the queue redelivers the message instead of losing it.
+
+    Args:
+        error (InvalidMessageError): why the message was rejected
+        payload (Any): original message, decoded or as the raw body text
+        container (str): dead-letter container
+
+    Returns:
+        str: name of the dead-letter blob
+    """
+    now: datetime = datetime.now(timezone.utc)
+    blob_name: str = f"{now:%Y-%m-%d}/{error.reason}/{uuid.uuid4()}.json"
+
+    get_storage_service().upload_blob_data(
+        container_name=container,
+        blob_name=blob_name,
+        data=json_codec.dumps(
+            {
+                "reason": str(error.reason),
+                "error": str(error),
+                "dead_lettered_at": now.isoformat(),
+                "payload": payload,
+            },
+            default=str,
+        ),
+    )
+    logging.warning(f"DeadLetter: Message saved to {container}/{blob_name}")
+
+    return blob_name
@@ -0,0 +1,105 @@
+"""Fair ordering of update messages across institutions
+
+All institutions share the update queues, so a large check run from one library
+would otherwise hold up every other library's jobs fetched alongside it. Messages
+are reordered by deficit round-robin (DRR) keyed by institution. Each round, every
+institution with messages waiting earns its weight in credit and spends one credit
+per message it sends. An institution with a few jobs is therefore served within
+about one round however many jobs the others have queued.
+"""
+
+import logging
+from collections import deque
+from enum import StrEnum
+from typing import Any
+
+DEFAULT_WEIGHT: float = 1.0  # messages per round for institutions without a weight
+
+
+class SchedulingMode(StrEnum):
+    """Order in which a batch's messages are processed"""
+
+    FIFO = "fifo"  # as they were queued
+    FAIR = "fair"  # deficit round-robin across institutions
+
+
+def parse_weights(value: str) -> dict[str, float]:
+    """Parse a comma separated list of institution weights
+
+    Args:
+        value (str): e.g. "12=2, 15=0.5"
+
+    Returns:
+        dict[str, float]: weight by institution id, skipping blanks, invalid
+            entries and weights not above zero
+    """
+    weights: dict[str, float] = {}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        institution_id, _, weight = entry.partition("=")
+        try:
+            weights[str(int(institution_id))] = float(weight)
+        except ValueError:
+            logging.warning(f"parse_weights: Invalid institution weight {entry!r}")
+
+    return {key: weight for key, weight in weights.items() if weight > 0}
+
+
+def institution_key(message_data: Any) -> str | None:
+    """Get the institution a message is scheduled under
+
+    Args:
+        message_data (Any): decoded update message
+
+    Returns:
+        str | None: institution id, None for messages without one
+    """
+    if not isinstance(message_data, dict):
+        return None
+
+    institution_id: Any = message_data.get("institution_id")
+    try:
+        return str(int(institution_id))
+    except (TypeError, ValueError):
+        return None if institution_id is None else str(institution_id)
+
+
+def fair_order(
+    messages: list[Any], weights: dict[str, float] | None = None
+) -> list[int]:
+    """Order messages by deficit round-robin across institutions
+
+    Institutions take turns in the order they first appear, and each keeps its own
+    messages in queue order. A weight of 2 sends two messages per round and a weight
+    of 0.5 sends one every other round. Messages without an institution are
+    scheduled together, as if they were one more institution.
+
+    Args:
+        messages (list[Any]): decoded update messages, in queue order
+        weights (dict[str, float] | None): messages per round by institution id
+
+    Returns:
+        list[int]: indexes of the messages in processing order
+    """
+    weights = weights or {}
+    queues: dict[str | None, deque[int]] = {}
+    for index, message_data in enumerate(messages):
+        queues.setdefault(institution_key(message_data), deque()).append(index)
+
+    deficits: dict[str | None, float] = dict.fromkeys(queues, 0.0)
+    active: deque[str | None] = deque(queues)
+    order: list[int] = []
+
+    while active:
+        key: str | None = active.popleft()
+        queue: deque[int] = queues[key]
+        deficits[key] += weights.get(key, DEFAULT_WEIGHT) if key else DEFAULT_WEIGHT
+        while queue and deficits[key] >= 1:
+            order.append(queue.popleft())
+            deficits[key] -= 1
+        if queue:
+            active.append(key)  # back of the line for the next round
+
+    return order
@@ -0,0 +1,217 @@
+"""Idempotency ledger recording which stages of each update job have completed"""
+
+import hashlib
+import re
+import threading
+from enum import StrEnum
+from typing import Protocol
+
+import azure.core.exceptions
+from azure.data.tables import TableClient, UpdateMode
+
+from alma_item_checks_update_service.config import (
+    IDEMPOTENCY_BACKEND,
+    IDEMPOTENCY_TABLE,
+    STORAGE_CONNECTION_STRING,
+)
+
+
+class Stage(StrEnum):
+    """Completed stage of an update job, in pipeline order"""
+
+    UPDATED = "updated"  # Alma has the item's values
+    REPORTED = "reported"  # report written
+    NOTIFIED = "notified"  # notification queued
+
+
+TABLE_KEY_MAX_BYTES: int = 1024  # PartitionKey and RowKey limit
+TABLE_KEY_UNSAFE: re.Pattern[str] = re.compile(  # disallowed in keys, plus the escape
+    r"[%/\\#?\x00-\x1f\x7f-\x9f]"
+)
+
+
+def table_key(job_id: str) -> str:
+    """Turn a job id into a valid Azure Table PartitionKey and RowKey
+
+    Characters tables reject are percent-escaped, so ordinary job ids are used as
+    they are. Ids still too long for a key are replaced by their SHA-256 digest.
+
+    Args:
+        job_id (str): Job ID
+
+    Returns:
+        str: table key
+    """
+    key: str = TABLE_KEY_UNSAFE.sub(lambda match: f"%{ord(match[0]):02X}", job_id)
+    if len(key.encode()) > TABLE_KEY_MAX_BYTES:
+        return hashlib.sha256(job_id.encode()).hexdigest()
+
+    return key
+
+
+class IdempotencyStore(Protocol):
+    """Records completed stages per job_id so redelivered messages can resume"""
+
+    def get(self, job_id: str) -> set[Stage]:
+        """Get a job's completed stages
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            set[Stage]: completed stages, empty for an unseen job
+        """
+        ...
+
+    def mark(self, job_id: str, stage: Stage) -> None:
+        """Record that a job completed a stage
+
+        Args:
+            job_id (str): Job ID
+            stage (Stage): completed stage
+        """
+        ...
+
+
+class NullIdempotencyStore:
+    """Store that records nothing, for when the ledger is disabled"""
+
+    def get(self, job_id: str) -> set[Stage]:
+        """Get a job's completed stages; always empty"""
+        return set()
+
+    def mark(self, job_id: str, stage: Stage) -> None:
+        """Ignore a completed stage"""
+
+
+class InMemoryIdempotencyStore:
+    """Thread-safe in-process store, for tests and local runs"""
+
+    def __init__(self) -> None:
+        """Initialize the store"""
+        self._stages: dict[str, set[Stage]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, job_id: str) -> set[Stage]:
+        """Get a job's completed stages
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            set[Stage]: completed stages, empty for an unseen job
+        """
+        with self._lock:
+            return set(self._stages.get(job_id, ()))
+
+    def mark(self, job_id: str, stage: Stage) -> None:
+        """Record that a job completed a stage
+
+        Args:
+            job_id (str): Job ID
+            stage (Stage): completed stage
+        """
+        with self._lock:
+            self._stages.setdefault(job_id, set()).add(stage)
+
+
+class TableIdempotencyStore:
+    """Store backed by an Azure Storage table, one entity per job
+
+    Lookups are single point reads by PartitionKey and RowKey, both the job's
+    table_key. Each stage is a boolean property merged into the job's entity.
+    """
+
+    def __init__(self, table_client: TableClient) -> None:
+        """Initialize the store
+
+        Args:
+            table_client (TableClient): client for the ledger table
+        """
+        self.table_client: TableClient = table_client
+        self._table_ready: bool = False
+
+    def get(self, job_id: str) -> set[Stage]:
+        """Get a job's completed stages
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            set[Stage]: completed stages, empty for an unseen job
+        """
+        key: str = table_key(job_id)
+        try:
+            entity = self.table_client.get_entity(partition_key=key, row_key=key)
+        except azure.core.exceptions.ResourceNotFoundError:  # new job or no table
+            return set()
+
+        return {stage for stage in Stage if entity.get(stage.value)}
+
+    def mark(self, job_id: str, stage: Stage) -> None:
+        """Record that a job completed a stage
+
+        Args:
+            job_id (str): Job ID
+            stage (Stage): completed stage
+        """
+        self._ensure_table()
+        key: str = table_key(job_id)
+        self.table_client.upsert_entity(
+            {"PartitionKey": key, "RowKey": key, stage.value: True},
+            mode=UpdateMode.MERGE,
+        )
+
+    def _ensure_table(self) -> None:
+        """Create the ledger table on first write if it doesn't exist"""
+        if self._table_ready:
+            return
+
+        try:
+            self.table_client.create_table()
+        except azure.core.exceptions.ResourceExistsError:
+            pass
+
+        self._table_ready = True
+
+
+_ledger: IdempotencyStore | None = None
+_ledger_lock: threading.Lock = threading.Lock()
+
+
+def get_ledger() -> IdempotencyStore:
+    """Get the worker's idempotency ledger, creating it on first use
+
+    IDEMPOTENCY_BACKEND selects "off" (the default), "memory" or "table".
+
+    Returns:
+        IdempotencyStore: shared ledger
+    """
+    global _ledger
+
+    with _ledger_lock:
+        if _ledger is None:
+            if IDEMPOTENCY_BACKEND == "table":
+                _ledger = TableIdempotencyStore(
+                    TableClient.from_connection_string(
+                        str(STORAGE_CONNECTION_STRING), table_name=IDEMPOTENCY_TABLE
+                    )
+                )
+            elif IDEMPOTENCY_BACKEND == "memory":
+                _ledger = InMemoryIdempotencyStore()
+            elif IDEMPOTENCY_BACKEND == "off":
+                _ledger = NullIdempotencyStore()
+            else:
+                raise ValueError(
+                    f"Unknown IDEMPOTENCY_BACKEND: {IDEMPOTENCY_BACKEND!r}"
+                )
+
+        return _ledger
+
+
+def reset_ledger() -> None:
+    """Drop the shared ledger so the next call creates a new one"""
+    global _ledger
+
+    with _ledger_lock:
+        _ledger = None
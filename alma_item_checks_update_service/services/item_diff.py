@@ -0,0 +1,119 @@
+"""Detect item updates that wouldn't change anything in Alma"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from enum import StrEnum
+from typing import Any
+
+from alma_item_checks_update_service.config import ITEM_FINGERPRINT_CACHE_SIZE
+
+
+class DiffMode(StrEnum):
+    """How to detect no-op updates"""
+
+    OFF = "off"  # always send the update
+    FINGERPRINT = "fingerprint"  # compare with the last update this worker sent
+    LIVE = "live"  # compare with the item currently in Alma
+
+
+def item_fingerprint(item_data: dict[str, Any]) -> str:
+    """Hash an item_data section independent of key order
+
+    Args:
+        item_data (dict[str, Any]): item_data section of an item payload
+
+    Returns:
+        str: hex digest
+    """
+    canonical: str = json.dumps(
+        item_data, sort_keys=True, separators=(",", ":"), default=str
+    )
+
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def payload_matches(payload: Any, live: Any) -> bool:
+    """Whether every value in the payload already matches the live record
+
+    Fields the live record has but the payload doesn't are ignored, and a None
+    payload value matches a missing live field.
+
+    Args:
+        payload (Any): value from the update payload
+        live (Any): corresponding value from the live record
+
+    Returns:
+        bool: True if sending the payload would change nothing
+    """
+    if isinstance(payload, dict):
+        if live is None:
+            live = {}
+        if not isinstance(live, dict):
+            return False
+        return all(
+            payload_matches(value, live.get(key)) for key, value in payload.items()
+        )
+
+    if isinstance(payload, list):
+        return (
+            isinstance(live, list)
+            and len(payload) == len(live)
+            and all(payload_matches(p, v) for p, v in zip(payload, live))
+        )
+
+    return payload == live
+
+
+class FingerprintCache:
+    """Thread-safe LRU map of item_pid to the fingerprint of its last update"""
+
+    def __init__(self, max_size: int) -> None:
+        """Initialize the cache
+
+        Args:
+            max_size (int): max items remembered
+        """
+        self.max_size: int = max_size
+        self._fingerprints: OrderedDict[str, str] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, item_pid: str) -> str | None:
+        """Get the fingerprint of an item's last update
+
+        Args:
+            item_pid (str): item PID
+
+        Returns:
+            str | None: fingerprint or None if unknown
+        """
+        with self._lock:
+            fingerprint: str | None = self._fingerprints.get(item_pid)
+            if fingerprint is not None:
+                self._fingerprints.move_to_end(item_pid)
+
+        return fingerprint
+
+    def set(self, item_pid: str, fingerprint: str) -> None:
+        """Remember the fingerprint of an item's latest update
+
+        Args:
+            item_pid (str): item PID
+            fingerprint (str): fingerprint of the item_data sent
+        """
+        with self._lock:
+            self._fingerprints[item_pid] = fingerprint
+            self._fingerprints.move_to_end(item_pid)
+            while len(self._fingerprints) > self.max_size:
+                self._fingerprints.popitem(last=False)  # least recently used
+
+    def clear(self) -> None:
+        """Forget all fingerprints"""
+        with self._lock:
+            self._fingerprints.clear()
+
+
+item_fingerprints: FingerprintCache = FingerprintCache(
+    max_size=ITEM_FINGERPRINT_CACHE_SIZE
+)
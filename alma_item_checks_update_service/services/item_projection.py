@@ -0,0 +1,42 @@
+"""Projection of item payloads onto the sections an Alma item update needs"""
+
+from enum import StrEnum
+from typing import Any
+
+BIB_FIELDS: tuple[str, ...] = ("mms_id", "title")  # address and report the item
+
+
+class ItemProjection(StrEnum):
+    """Which parts of an item payload are validated and sent to Alma"""
+
+    FULL = "full"  # every section as the processor wrote it
+    SLIM = "slim"  # bib_data cut down to BIB_FIELDS
+
+
+def project_item(
+    full_item: dict[str, Any], projection: ItemProjection
+) -> dict[str, Any]:
+    """Get the sections of an item payload to build the Item model from
+
+    Alma treats an item's bib_data as read-only, so the slim projection drops
+    everything but the fields used to address and report the item. That skips
+    validating MARC-derived bib data on every message. holding_data and item_data
+    are always kept whole, because Alma updates them from the PUT body.
+
+    Args:
+        full_item (dict[str, Any]): item details from blob
+        projection (ItemProjection): which parts to keep
+
+    Returns:
+        dict[str, Any]: Item model fields
+    """
+    bib_data: Any = full_item.get("bib_data")
+    if projection == ItemProjection.SLIM and isinstance(bib_data, dict):
+        bib_data = {field: bib_data[field] for field in BIB_FIELDS if field in bib_data}
+
+    return {
+        "bib_data": bib_data,
+        "holding_data": full_item.get("holding_data"),
+        "item_data": full_item.get("item_data"),
+        "link": full_item.get("link"),
+    }
@@ -0,0 +1,177 @@
+"""JSON encoding and decoding, through orjson when it is installed"""
+
+import json
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from alma_item_checks_update_service.config import JSON_CODEC
+
+JsonInput = bytes | bytearray | memoryview | str
+
+
+class JsonCodec(Protocol):
+    """Encodes and decodes JSON documents"""
+
+    name: str
+
+    def loads(self, data: JsonInput) -> Any:
+        """Decode a document
+
+        Args:
+            data (JsonInput): UTF-8 bytes or text
+
+        Returns:
+            Any: decoded document
+        """
+        ...
+
+    def dumps(self, obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+        """Encode a document as text
+
+        Args:
+            obj (Any): document
+            default (Callable[[Any], Any] | None): converts values JSON can't hold
+
+        Returns:
+            str: compact JSON
+        """
+        ...
+
+    def dumps_bytes(
+        self, obj: Any, default: Callable[[Any], Any] | None = None
+    ) -> bytes:
+        """Encode a document as UTF-8 bytes
+
+        Args:
+            obj (Any): document
+            default (Callable[[Any], Any] | None): converts values JSON can't hold
+
+        Returns:
+            bytes: compact JSON
+        """
+        ...
+
+
+class StdlibJsonCodec:
+    """Codec using the json module"""
+
+    name: str = "stdlib"
+
+    def loads(self, data: JsonInput) -> Any:
+        """Decode a document
+
+        Args:
+            data (JsonInput): UTF-8 bytes or text
+
+        Returns:
+            Any: decoded document
+        """
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+
+        return json.loads(data)  # bytes are decoded by json itself
+
+    def dumps(self, obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+        """Encode a document as text
+
+        Args:
+            obj (Any): document
+            default (Callable[[Any], Any] | None): converts values JSON can't hold
+
+        Returns:
+            str: compact JSON
+        """
+        return json.dumps(obj, default=default, separators=(",", ":"))
+
+    def dumps_bytes(
+        self, obj: Any, default: Callable[[Any], Any] | None = None
+    ) -> bytes:
+        """Encode a document as UTF-8 bytes
+
+        Args:
+            obj (Any): document
+            default (Callable[[Any], Any] | None): converts values JSON can't hold
+
+        Returns:
+            bytes: compact JSON
+        """
+        return self.dumps(obj, default).encode()
+
+
+class OrjsonJsonCodec:
+    """Codec using orjson, which parses bytes without decoding them to str first
+
+    Requires the orjson package. Its errors subclass ValueError and TypeError like
+    the json module's, so callers catch the same exceptions whichever codec runs.
+    """
+
+    name: str = "orjson"
+
+    def __init__(self) -> None:
+        """Load orjson"""
+        import orjson
+
+        self.orjson: Any = orjson
+        self.options: int = orjson.OPT_NON_STR_KEYS  # int keys, like json.dumps
+
+    def loads(self, data: JsonInput) -> Any:
+        """Decode a document
+
+        Args:
+            data (JsonInput): UTF-8 bytes or text
+
+        Returns:
+            Any: decoded document
+        """
+        return self.orjson.loads(data)
+
+    def dumps(self, obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+        """Encode a document as text
+
+        Args:
+            obj (Any): document
+            default (Callable[[Any], Any] | None): converts values JSON can't hold
+
+        Returns:
+            str: compact JSON
+        """
+        return self.dumps_bytes(obj, default).decode()
+
+    def dumps_bytes(
+        self, obj: Any, default: Callable[[Any], Any] | None = None
+    ) -> bytes:
+        """Encode a document as UTF-8 bytes
+
+        Args:
+            obj (Any): document
+            default (Callable[[Any], Any] | None): converts values JSON can't hold
+
+        Returns:
+            bytes: compact JSON
+        """
+        return self.orjson.dumps(obj, default=default, option=self.options)
+
+
+def build_codec(name: str) -> JsonCodec:
+    """Build a codec by name
+
+    Args:
+        name (str): "auto" for orjson when installed, else "orjson" or "stdlib"
+
+    Returns:
+        JsonCodec: codec
+    """
+    if name == "stdlib":
+        return StdlibJsonCodec()
+    if name == "orjson":
+        return OrjsonJsonCodec()
+    if name != "auto":
+        raise ValueError(f"Unknown JSON codec: {name!r}")
+
+    try:
+        return OrjsonJsonCodec()
+    except ImportError:  # optional dependency
+        return StdlibJsonCodec()
+
+
+json_codec: JsonCodec = build_codec(JSON_CODEC)
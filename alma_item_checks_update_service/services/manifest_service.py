@@ -0,0 +1,562 @@
+"""Service class for bulk runs read from a manifest of item payloads
+
+One queue message names a JSON Lines manifest blob, optionally gzip or zstd
+compressed, with one item per line:
+
+    {"job_id": "job-1", "institution_id": 12, "item": {...item payload...}}
+
+The manifest is streamed in ranged reads and updated a window of lines at a time, so
+memory stays bounded however large the run. Every line goes through the same
+UpdateService pipeline as a queued item, taking its payload from the manifest instead
+of downloading a blob per item. Progress is checkpointed after every window, and a
+redelivered or continued message resumes from the last checkpoint.
+
+A run is pinned to the manifest blob's ETag: checkpoints are kept per ETag, and
+continuations only read that version. A manifest uploaded again under the same name
+is a new run, and one replaced mid-run is dead-lettered rather than resumed from a
+checkpoint that no longer matches its lines.
+
+Plain manifests resume with a ranged read from the checkpoint's offset. Compressed
+ones can't be entered mid-stream, so each continuation downloads and decompresses
+the manifest from byte 0 again, skipping the lines done. Over many continuations
+that rereads the manifest once per message; compress only manifests small enough,
+or with a long enough MANIFEST_TIME_BUDGET, to finish in a few messages.
+"""
+
+import logging
+import math
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from typing import Any
+
+import azure.core.exceptions
+import azure.functions as func
+from azure.core import MatchConditions
+from azure.storage.blob import BlobClient
+
+from alma_item_checks_update_service.config import (
+    MANIFEST_CONTAINER,
+    MANIFEST_TIME_BUDGET,
+    MANIFEST_WINDOW,
+    MESSAGE_TIME_RESERVE,
+    UPDATE_CONCURRENCY,
+    UPDATE_MANIFEST_QUEUE,
+)
+from alma_item_checks_update_service.services.checkpoint import CheckpointStore
+from alma_item_checks_update_service.services.circuit_breaker import (
+    alma_circuit_breakers,
+)
+from alma_item_checks_update_service.services.compression import (
+    Compression,
+    StreamDecompressor,
+    content_encoding,
+)
+from alma_item_checks_update_service.services.dead_letter import dead_letter
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.message_validation import (
+    InvalidMessageError,
+    InvalidReason,
+    decode_message,
+)
+from alma_item_checks_update_service.services.prefetcher import PreloadedItems
+from alma_item_checks_update_service.services.storage import (
+    get_blob_service_client,
+    get_queue_client,
+)
+from alma_item_checks_update_service.services.update_service import (
+    UpdateOutcome,
+    UpdateService,
+)
+
+
+@dataclass(frozen=True)
+class ManifestLine:
+    """One line of a manifest"""
+
+    number: int  # zero-based line number
+    end: int  # offset in the blob just past the line; 0 for compressed manifests
+    data: bytes
+
+
+@dataclass
+class ManifestCheckpoint:
+    """How far through a manifest a run has got"""
+
+    line: int = 0  # lines done
+    offset: int = 0  # bytes of the blob done, for uncompressed manifests
+    compressed: bool = False  # resumed by skipping lines rather than seeking
+    done: bool = False
+    outcomes: dict[str, int] = field(default_factory=dict)  # running totals
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "ManifestCheckpoint":
+        """Load a checkpoint saved by to_dict
+
+        Args:
+            data (Any): decoded checkpoint blob
+
+        Returns:
+            ManifestCheckpoint: checkpoint, from the start if data isn't one
+        """
+        if not isinstance(data, dict):
+            return cls()
+
+        return cls(
+            line=int(data.get("line", 0)),
+            offset=int(data.get("offset", 0)),
+            compressed=bool(data.get("compressed", False)),
+            done=bool(data.get("done", False)),
+            outcomes=dict(data.get("outcomes") or {}),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """Get the checkpoint as a JSON-ready dict
+
+        Returns:
+            dict[str, Any]: checkpoint
+        """
+        return asdict(self)
+
+    def advance(
+        self, lines: list[ManifestLine], outcomes: list[UpdateOutcome], compressed: bool
+    ) -> None:
+        """Move the checkpoint past lines that are done
+
+        Args:
+            lines (list[ManifestLine]): lines done, in manifest order
+            outcomes (list[UpdateOutcome]): their outcomes
+            compressed (bool): whether the manifest is gzipped
+        """
+        if not lines:
+            return
+
+        self.line = lines[-1].number + 1
+        self.offset = 0 if compressed else lines[-1].end
+        self.compressed = compressed
+        totals: Counter[str] = Counter(self.outcomes)
+        totals.update(map(str, outcomes))
+        self.outcomes = dict(totals)
+
+
+class ManifestReader:
+    """Splits a manifest blob's bytes into lines, decompressing them if need be
+
+    Only the current chunk and one partial line are held at a time. Whether the
+    manifest is compressed is known once the first chunk has been read.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        first_line: int = 0,
+        offset: int = 0,
+        content_encoding: str | None = None,
+    ) -> None:
+        """Initialize the reader
+
+        Args:
+            chunks (Iterable[bytes]): the blob's bytes from offset, in any sizes
+            first_line (int): number of the first line in chunks
+            offset (int): offset in the blob chunks start at; a compressed
+                manifest is always read from 0
+            content_encoding (str | None): the blob's Content-Encoding property
+        """
+        self.chunks: Iterable[bytes] = chunks
+        self.first_line: int = first_line
+        self.offset: int = offset
+        self.content_encoding: str | None = content_encoding
+        self.compressed: bool = False
+
+    def __iter__(self) -> Iterator[ManifestLine]:
+        """Read the manifest line by line
+
+        Yields:
+            ManifestLine: each non-blank line
+        """
+        number: int = self.first_line
+        position: int = self.offset  # blob offset of buffer[0], uncompressed only
+        buffer: bytes = b""
+
+        for data in self.decompress(self.chunks):
+            buffer += data
+            start: int = 0
+            while (end := buffer.find(b"\n", start)) >= 0:
+                line: bytes = buffer[start:end].strip()
+                if line:
+                    yield ManifestLine(
+                        number=number,
+                        end=0 if self.compressed else position + end + 1,
+                        data=line,
+                    )
+                number += 1
+                start = end + 1
+            position += start
+            buffer = buffer[start:]
+
+        if buffer.strip():  # last line without a newline
+            yield ManifestLine(
+                number=number,
+                end=0 if self.compressed else position + len(buffer),
+                data=buffer.strip(),
+            )
+
+    def decompress(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Decompress the chunks if the manifest is gzip or zstd compressed
+
+        Args:
+            chunks (Iterable[bytes]): raw chunks
+
+        Yields:
+            bytes: manifest bytes
+        """
+        if self.offset:  # only plain manifests are read from an offset
+            yield from chunks
+            return
+
+        decompressor: StreamDecompressor = StreamDecompressor(self.content_encoding)
+        for chunk in chunks:
+            data: bytes = decompressor.decompress(chunk)
+            self.compressed = decompressor.compression not in (None, Compression.NONE)
+            yield data
+
+        yield decompressor.flush()
+
+
+class ManifestUpdateService:
+    """Service class for bulk runs read from a manifest of item payloads
+
+    A run that doesn't finish within the time budget, or meets an institution whose
+    circuit breaker is open, saves its checkpoint and re-enqueues its message to
+    carry on from there. The budget is checked before each line starts, keeping
+    time_reserve seconds back so a line already in flight can wait for a slot and
+    retry before the budget is up.
+    """
+
+    def __init__(
+        self,
+        message_data: dict[str, Any],
+        concurrency: int = UPDATE_CONCURRENCY,
+        window: int = MANIFEST_WINDOW,
+        time_budget: float = MANIFEST_TIME_BUDGET,
+        time_reserve: float = MESSAGE_TIME_RESERVE,
+        container: str = MANIFEST_CONTAINER,
+        checkpoints: CheckpointStore | None = None,
+    ) -> None:
+        """Initialize the service
+
+        Args:
+            message_data (dict[str, Any]): manifest message naming the manifest blob,
+                with institution_id and run_id defaults for its lines
+            concurrency (int): max lines updated in parallel
+            window (int): lines read and updated between checkpoints
+            time_budget (float): seconds to spend before continuing in a new
+                message, 0 for no limit
+            time_reserve (float): seconds of the budget kept for a line that has
+                started, so it can finish before the budget is up
+            container (str): container holding manifests
+            checkpoints (CheckpointStore | None): where progress is saved
+        """
+        self.message_data: dict[str, Any] = message_data
+        self.manifest: str = str(message_data["manifest"])
+        self.concurrency: int = max(concurrency, 1)
+        self.window: int = max(window, 1)
+        self.time_budget: float = time_budget
+        self.time_reserve: float = time_reserve
+        self.container: str = container
+        self.checkpoints: CheckpointStore = checkpoints or CheckpointStore()
+        self.etag: str | None = message_data.get("etag")  # run's manifest version
+        self._started: float = time.monotonic()
+        self._begun: bool = False  # whether this run started a line
+
+    @classmethod
+    def from_queue_message(
+        cls, manifestmsg: func.QueueMessage
+    ) -> "ManifestUpdateService | None":
+        """Create the service from a queue message of the form {"manifest": ...}
+
+        A message that names no manifest is dead-lettered, so the queue doesn't retry
+        it.
+
+        Args:
+            manifestmsg (func.QueueMessage): Queue message
+
+        Returns:
+            ManifestUpdateService | None: service for the manifest, or None
+        """
+        body: bytes = manifestmsg.get_body()
+
+        try:
+            message_data: Any = decode_message(body)
+            if not isinstance(message_data, dict) or not message_data.get("manifest"):
+                raise InvalidMessageError(
+                    InvalidReason.MISSING_MANIFEST, "No manifest blob provided"
+                )
+        except InvalidMessageError as e:
+            logging.error(f"ManifestUpdateService.from_queue_message: {e}")
+            dead_letter(e, body.decode(errors="replace"))
+            return None
+
+        return cls(message_data)
+
+    def process(self) -> ManifestCheckpoint:
+        """Update the manifest's items from the last checkpoint on
+
+        Returns:
+            ManifestCheckpoint: where the run got to, with its outcome totals
+        """
+        self.pin_version()
+        checkpoint: ManifestCheckpoint = self.load_checkpoint()
+        if checkpoint.done:
+            logging.info(
+                f"ManifestUpdateService.process: {self.manifest} already processed"
+            )
+            return checkpoint
+
+        update_service: UpdateService = UpdateService(buffered=True)
+        items: PreloadedItems = PreloadedItems()
+        update_service.prefetcher = items  # payloads come from the manifest
+        update_service.requeue_deferred = False  # the manifest resumes instead
+
+        try:
+            self.process_lines(update_service, items, checkpoint)
+        except InvalidMessageError as e:  # manifest replaced during the run
+            logging.error(f"ManifestUpdateService.process: {e}")
+            dead_letter(e, self.message_data)
+            return checkpoint
+        finally:
+            update_service.flush_buffered()
+
+        logging.info(
+            f"ManifestUpdateService.process: {self.manifest} "
+            f"{'done' if checkpoint.done else 'continued'} after {checkpoint.line} "
+            f"lines: {checkpoint.outcomes}"
+        )
+
+        return checkpoint
+
+    def process_lines(
+        self,
+        update_service: UpdateService,
+        items: PreloadedItems,
+        checkpoint: ManifestCheckpoint,
+    ) -> None:
+        """Update windows of lines, checkpointing after each
+
+        An exception leaves the checkpoint at the last complete window, so the
+        redelivered message repeats at most one window.
+
+        Args:
+            update_service (UpdateService): shared update service
+            items (PreloadedItems): holds each line's payload for the pipeline
+            checkpoint (ManifestCheckpoint): where to start, advanced in place
+        """
+        self._started = time.monotonic()
+        self._begun = False
+        reader: ManifestReader = self.open_manifest(checkpoint)
+        lines: Iterator[ManifestLine] = (
+            line for line in reader if line.number >= checkpoint.line
+        )  # a compressed manifest is reread from the start
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while window := list(islice(lines, self.window)):
+                outcomes: list[UpdateOutcome] = list(
+                    executor.map(
+                        lambda line: self.process_line(update_service, items, line),
+                        window,
+                    )
+                )
+
+                done: int = next(
+                    (
+                        index
+                        for index, outcome in enumerate(outcomes)
+                        if outcome in (UpdateOutcome.DEFERRED, UpdateOutcome.CONTINUED)
+                    ),
+                    len(window),
+                )  # lines start in order, so only ones after a stop are left over
+                checkpoint.advance(window[:done], outcomes[:done], reader.compressed)
+                update_service.flush_buffered()  # never checkpoint ahead of the rows
+                self.save_checkpoint(checkpoint)
+
+                if done < len(window) and outcomes[done] == UpdateOutcome.DEFERRED:
+                    # Alma failing for an institution, try later
+                    self.continue_later(alma_circuit_breakers.reset_timeout)
+                    return
+                if done < len(window) or self.out_of_time():
+                    self.continue_later(0)
+                    return
+
+        checkpoint.done = True
+        self.save_checkpoint(checkpoint)
+
+    def process_line(
+        self, update_service: UpdateService, items: PreloadedItems, line: ManifestLine
+    ) -> UpdateOutcome:
+        """Update the item on one manifest line, unless the run is out of time
+
+        Args:
+            update_service (UpdateService): shared update service
+            items (PreloadedItems): holds the line's payload for the pipeline
+            line (ManifestLine): manifest line
+
+        Returns:
+            UpdateOutcome: result of processing the line, CONTINUED if it's left
+                for a continuation message
+        """
+        if self.out_of_time():
+            return UpdateOutcome.CONTINUED
+        self._begun = True
+
+        try:
+            entry: Any = decode_message(line.data)
+        except InvalidMessageError as e:
+            return update_service.reject_undecodable(line.data, e)
+
+        if not isinstance(entry, dict):
+            return update_service.process_message(entry)  # rejected as invalid
+
+        message_data: dict[str, Any] = {
+            key: value for key, value in entry.items() if key != "item"
+        }
+        for key in ("institution_id", "run_id"):  # defaults from the run's message
+            if message_data.get(key) is None and key in self.message_data:
+                message_data[key] = self.message_data[key]
+
+        job_id: str = str(message_data.get("job_id"))
+        items.add(job_id, entry.get("item"))
+        try:
+            return update_service.process_message(message_data)
+        finally:
+            items.discard(job_id)  # if the message was rejected before fetching
+
+    def out_of_time(self) -> bool:
+        """Whether the run has too little of its time budget left for a line
+
+        A run always starts at least one line, so a reserve as long as the budget
+        still makes progress.
+
+        Returns:
+            bool: True to stop starting lines
+        """
+        return (
+            self.time_budget > 0
+            and self._begun
+            and time.monotonic() - self._started >= self.time_budget - self.time_reserve
+        )
+
+    def open_manifest(self, checkpoint: ManifestCheckpoint) -> ManifestReader:
+        """Start streaming the manifest from the checkpoint
+
+        Args:
+            checkpoint (ManifestCheckpoint): where the run got to
+
+        Returns:
+            ManifestReader: reader over the rest of the manifest
+
+        Raises:
+            InvalidMessageError: if the manifest no longer has the run's ETag
+        """
+        offset: int = 0 if checkpoint.compressed else checkpoint.offset
+        if checkpoint.compressed and checkpoint.line:
+            logging.info(
+                f"ManifestUpdateService.open_manifest: {self.manifest} is compressed, "
+                f"rereading it to skip {checkpoint.line} lines already done"
+            )
+
+        try:
+            downloader: Any = self.blob_client().download_blob(
+                offset=offset or None,
+                decompress=False,  # ranged chunks can't be decoded one by one
+                etag=self.pin_version(),
+                match_condition=MatchConditions.IfNotModified,
+            )
+        except azure.core.exceptions.ResourceModifiedError as e:
+            raise InvalidMessageError(
+                InvalidReason.MANIFEST_CHANGED,
+                f"Manifest {self.manifest} changed since its run started",
+            ) from e
+        except azure.core.exceptions.HttpResponseError as e:
+            if e.status_code != 416:  # 416: checkpoint is already at the end
+                raise
+            return ManifestReader([], first_line=checkpoint.line, offset=offset)
+
+        return ManifestReader(
+            downloader.chunks(),  # ranged reads of max_chunk_get_size each
+            first_line=0 if offset == 0 else checkpoint.line,
+            offset=offset,
+            content_encoding=content_encoding(downloader),
+        )
+
+    def blob_client(self) -> BlobClient:
+        """Get the manifest's blob client
+
+        Returns:
+            BlobClient: manifest blob client
+        """
+        return get_blob_service_client().get_blob_client(
+            container=self.container, blob=self.manifest
+        )
+
+    def pin_version(self) -> str:
+        """Get the ETag of the manifest version this run reads
+
+        The first message of a run takes the blob's current ETag and passes it on
+        in its continuation messages.
+
+        Returns:
+            str: manifest ETag
+        """
+        if self.etag is None:
+            self.etag = str(self.blob_client().get_blob_properties().etag)
+            self.message_data["etag"] = self.etag
+
+        return self.etag
+
+    def checkpoint_name(self) -> str:
+        """Get the name of the run's checkpoint, one per manifest version
+
+        Returns:
+            str: checkpoint name
+        """
+        version: str = self.pin_version().strip('"')  # ETags are quoted
+
+        return f"manifests/{self.manifest}/{version}"
+
+    def load_checkpoint(self) -> ManifestCheckpoint:
+        """Load the manifest's checkpoint
+
+        Returns:
+            ManifestCheckpoint: saved checkpoint, or the start of the manifest
+        """
+        try:
+            return ManifestCheckpoint.from_dict(
+                self.checkpoints.load(self.checkpoint_name())
+            )
+        except (TypeError, ValueError) as e:
+            logging.warning(
+                f"ManifestUpdateService.load_checkpoint: Ignoring unreadable "
+                f"checkpoint for {self.manifest}: {e}"
+            )
+            return ManifestCheckpoint()
+
+    def save_checkpoint(self, checkpoint: ManifestCheckpoint) -> None:
+        """Save the manifest's checkpoint
+
+        Args:
+            checkpoint (ManifestCheckpoint): where the run got to
+        """
+        self.checkpoints.save(self.checkpoint_name(), checkpoint.to_dict())
+
+    def continue_later(self, delay: float) -> None:
+        """Re-enqueue the manifest message to carry on from the checkpoint
+
+        Args:
+            delay (float): seconds before the message becomes visible
+        """
+        get_queue_client(UPDATE_MANIFEST_QUEUE).send_message(
+            json_codec.dumps(self.message_data), visibility_timeout=math.ceil(delay)
+        )
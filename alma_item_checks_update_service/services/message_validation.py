@@ -0,0 +1,156 @@
+"""Typed schema for update messages and classification of failures
+
+A message that can never succeed raises InvalidMessageError, a permanent failure
+that is dead-lettered without retries. Any other exception is transient and is left
+to propagate so the queue redelivers the message.
+"""
+
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Any
+
+import azure.core.exceptions
+
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.retry import is_retryable
+
+TRANSIENT_STORAGE_EXCEPTIONS: tuple[type[BaseException], ...] = (
+    azure.core.exceptions.ServiceRequestError,  # couldn't reach storage
+    azure.core.exceptions.ServiceResponseError,  # connection dropped mid-response
+)
+
+
+class InvalidReason(StrEnum):
+    """Why a message can never be processed"""
+
+    MALFORMED_JSON = "malformed_json"
+    NOT_AN_OBJECT = "not_an_object"
+    MISSING_JOB_ID = "missing_job_id"
+    MISSING_INSTITUTION_ID = "missing_institution_id"
+    INVALID_INSTITUTION_ID = "invalid_institution_id"
+    ITEM_NOT_FOUND = "item_not_found"  # item blob missing or empty
+    MISSING_IDS = "missing_ids"  # item blob lacks mms_id, holding_id or pid
+    MISSING_MANIFEST = "missing_manifest"  # bulk run message names no manifest blob
+    MANIFEST_CHANGED = "manifest_changed"  # manifest blob replaced during its run
+
+
+class InvalidMessageError(ValueError):
+    """A message that fails the same way however often it is retried"""
+
+    def __init__(self, reason: InvalidReason, detail: str) -> None:
+        """Initialize the error
+
+        Args:
+            reason (InvalidReason): why the message is invalid
+            detail (str): human readable description
+        """
+        super().__init__(detail)
+        self.reason: InvalidReason = reason
+
+
+@dataclass(frozen=True)
+class UpdateMessage:
+    """Validated update message"""
+
+    job_id: str
+    institution_id: int
+    run_id: str | None = None
+
+    @classmethod
+    def from_dict(cls, message_data: Any) -> "UpdateMessage":
+        """Validate a decoded update message
+
+        Args:
+            message_data (Any): decoded message
+
+        Returns:
+            UpdateMessage: typed message
+
+        Raises:
+            InvalidMessageError: if the message can never be processed
+        """
+        if not isinstance(message_data, dict):
+            raise InvalidMessageError(
+                InvalidReason.NOT_AN_OBJECT, "Message is not a JSON object"
+            )
+
+        job_id: Any = message_data.get("job_id")
+        if (
+            isinstance(job_id, bool)
+            or not isinstance(job_id, (str, int))
+            or job_id == ""
+        ):
+            raise InvalidMessageError(
+                InvalidReason.MISSING_JOB_ID, "No job id provided"
+            )
+
+        institution_id: Any = message_data.get("institution_id")
+        if institution_id is None:
+            raise InvalidMessageError(
+                InvalidReason.MISSING_INSTITUTION_ID, "No institution id provided"
+            )
+
+        return cls(
+            job_id=str(job_id),
+            institution_id=parse_institution_id(institution_id),
+            run_id=(
+                str(message_data["run_id"])
+                if message_data.get("run_id") is not None
+                else None
+            ),
+        )
+
+
+def parse_institution_id(value: Any) -> int:
+    """Convert an institution id to an int
+
+    Args:
+        value (Any): institution id from a message, an int or a string of digits
+
+    Returns:
+        int: institution id
+
+    Raises:
+        InvalidMessageError: if the value isn't an integer
+    """
+    if not isinstance(value, bool) and isinstance(value, (int, str)):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+
+    raise InvalidMessageError(
+        InvalidReason.INVALID_INSTITUTION_ID, f"Invalid institution id: {value!r}"
+    )
+
+
+def decode_message(body: str | bytes) -> Any:
+    """Decode a queue message body, straight from bytes
+
+    Args:
+        body (str | bytes): message body
+
+    Returns:
+        Any: decoded JSON
+
+    Raises:
+        InvalidMessageError: if the body isn't JSON
+    """
+    try:
+        return json_codec.loads(body)
+    except ValueError as e:  # JSONDecodeError and UnicodeDecodeError
+        raise InvalidMessageError(
+            InvalidReason.MALFORMED_JSON, f"Message is not valid JSON: {e}"
+        ) from e
+
+
+def is_transient_storage_error(exc: BaseException) -> bool:
+    """Whether a storage call failed for reasons unrelated to the blob asked for
+
+    Args:
+        exc (BaseException): exception raised by a storage call
+
+    Returns:
+        bool: True if the call should be retried rather than the blob given up on
+    """
+    return isinstance(exc, TRANSIENT_STORAGE_EXCEPTIONS) or is_retryable(exc)
@@ -0,0 +1,365 @@
+"""Per-stage timings and outcome counts for the update pipeline"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from enum import StrEnum
+from typing import Any, Protocol
+
+from alma_item_checks_update_service.config import METRICS_HOOKS
+
+
+class PipelineStage(StrEnum):
+    """Timed stage of the update pipeline"""
+
+    FETCH = "fetch"  # item blob download
+    API_KEY = "api_key"  # institution API key lookup
+    DIFF = "diff"  # no-op update check
+    ALMA_UPDATE = "alma_update"  # Alma item PUT, retries included
+    REPORT = "report"  # report write
+    NOTIFY = "notify"  # notification
+
+
+class MetricsHook(Protocol):
+    """Receives pipeline measurements"""
+
+    def record_stage(
+        self, stage: PipelineStage, seconds: float, dimensions: dict[str, str]
+    ) -> None:
+        """Record how long a stage took
+
+        Args:
+            stage (PipelineStage): stage
+            seconds (float): duration, failures included
+            dimensions (dict[str, str]): e.g. institution id
+        """
+        ...
+
+    def record_outcome(
+        self, outcome: str, seconds: float, dimensions: dict[str, str]
+    ) -> None:
+        """Record how a message ended
+
+        Args:
+            outcome (str): outcome label, e.g. "updated" or "no_key"
+            seconds (float): time spent on the message
+            dimensions (dict[str, str]): e.g. institution id
+        """
+        ...
+
+    def record_gauge(self, name: str, value: float, dimensions: dict[str, str]) -> None:
+        """Record the current value of something that goes up and down
+
+        Args:
+            name (str): gauge name, e.g. "alma_concurrency_limit"
+            value (float): current value
+            dimensions (dict[str, str]): e.g. institution id
+        """
+        ...
+
+
+class LoggingMetricsHook:
+    """Logs measurements with their values as log record attributes
+
+    Application Insights (through the Azure Monitor OpenTelemetry exporter) stores
+    log record attributes as custom dimensions, so these can be queried as
+    customDimensions.stage, customDimensions.duration_ms and so on.
+    """
+
+    def record_stage(
+        self, stage: PipelineStage, seconds: float, dimensions: dict[str, str]
+    ) -> None:
+        """Log a stage duration
+
+        Args:
+            stage (PipelineStage): stage
+            seconds (float): duration
+            dimensions (dict[str, str]): extra dimensions
+        """
+        logging.info(
+            f"UpdateMetrics: stage {stage} took {seconds * 1000:.1f} ms",
+            extra={"stage": str(stage), "duration_ms": seconds * 1000, **dimensions},
+        )
+
+    def record_outcome(
+        self, outcome: str, seconds: float, dimensions: dict[str, str]
+    ) -> None:
+        """Log a message outcome
+
+        Args:
+            outcome (str): outcome label
+            seconds (float): time spent on the message
+            dimensions (dict[str, str]): extra dimensions
+        """
+        logging.info(
+            f"UpdateMetrics: outcome {outcome} after {seconds * 1000:.1f} ms",
+            extra={"outcome": outcome, "duration_ms": seconds * 1000, **dimensions},
+        )
+
+    def record_gauge(self, name: str, value: float, dimensions: dict[str, str]) -> None:
+        """Log a gauge value
+
+        Args:
+            name (str): gauge name
+            value (float): current value
+            dimensions (dict[str, str]): extra dimensions
+        """
+        logging.info(
+            f"UpdateMetrics: {name} is {value:g}",
+            extra={"gauge": name, "value": value, **dimensions},
+        )
+
+
+class InMemoryMetricsHook:
+    """Thread-safe hook keeping outcome counters, stage samples and gauge values"""
+
+    def __init__(self) -> None:
+        """Initialize the hook"""
+        self.outcomes: Counter[str] = Counter()
+        self.stages: dict[PipelineStage, list[float]] = {}
+        self.gauges: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def record_stage(
+        self, stage: PipelineStage, seconds: float, dimensions: dict[str, str]
+    ) -> None:
+        """Keep a stage duration
+
+        Args:
+            stage (PipelineStage): stage
+            seconds (float): duration
+            dimensions (dict[str, str]): ignored
+        """
+        with self._lock:
+            self.stages.setdefault(stage, []).append(seconds)
+
+    def record_outcome(
+        self, outcome: str, seconds: float, dimensions: dict[str, str]
+    ) -> None:
+        """Count a message outcome
+
+        Args:
+            outcome (str): outcome label
+            seconds (float): ignored
+            dimensions (dict[str, str]): ignored
+        """
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def record_gauge(self, name: str, value: float, dimensions: dict[str, str]) -> None:
+        """Keep a gauge's latest value
+
+        Args:
+            name (str): gauge name
+            value (float): current value
+            dimensions (dict[str, str]): part of the key, with the name
+        """
+        with self._lock:
+            self.gauges[(name, tuple(sorted(dimensions.items())))] = value
+
+
+class OpenTelemetryMetricsHook:
+    """Records measurements as OpenTelemetry instruments
+
+    Requires the opentelemetry-api package; with the Azure Monitor exporter
+    configured, they appear in Application Insights as custom metrics.
+    """
+
+    def __init__(self) -> None:
+        """Create the instruments"""
+        from opentelemetry import metrics  # type: ignore[import-not-found]
+
+        meter: Any = metrics.get_meter("alma_item_checks_update_service")
+        self.stage_duration: Any = meter.create_histogram(
+            "alma_update.stage.duration", unit="ms", description="Stage duration"
+        )
+        self.message_duration: Any = meter.create_histogram(
+            "alma_update.message.duration", unit="ms", description="Message duration"
+        )
+        self.outcomes: Any = meter.create_counter(
+            "alma_update.outcomes", description="Messages by outcome"
+        )
+        self.gauges: dict[str, Any] = {}
+        self._meter: Any = meter
+
+    def record_stage(
+        self, stage: PipelineStage, seconds: float, dimensions: dict[str, str]
+    ) -> None:
+        """Record a stage duration
+
+        Args:
+            stage (PipelineStage): stage
+            seconds (float): duration
+            dimensions (dict[str, str]): extra attributes
+        """
+        self.stage_duration.record(
+            seconds * 1000, attributes={"stage": str(stage), **dimensions}
+        )
+
+    def record_outcome(
+        self, outcome: str, seconds: float, dimensions: dict[str, str]
+    ) -> None:
+        """Count a message outcome and record its duration
+
+        Args:
+            outcome (str): outcome label
+            seconds (float): time spent on the message
+            dimensions (dict[str, str]): extra attributes
+        """
+        attributes: dict[str, str] = {"outcome": outcome, **dimensions}
+        self.outcomes.add(1, attributes=attributes)
+        self.message_duration.record(seconds * 1000, attributes=attributes)
+
+    def record_gauge(self, name: str, value: float, dimensions: dict[str, str]) -> None:
+        """Set a synchronous gauge, created on first use
+
+        Args:
+            name (str): gauge name
+            value (float): current value
+            dimensions (dict[str, str]): extra attributes
+        """
+        if name not in self.gauges:  # create_gauge needs opentelemetry-api 1.23+
+            self.gauges[name] = self._meter.create_gauge(f"alma_update.{name}")
+        self.gauges[name].set(value, attributes=dimensions)
+
+
+class Metrics:
+    """Fans measurements out to the registered hooks
+
+    With no hooks registered, stage() hands back a shared no-op context manager, so
+    disabled instrumentation costs one attribute check per stage.
+    """
+
+    def __init__(self, hooks: list[MetricsHook] | None = None) -> None:
+        """Initialize the dispatcher
+
+        Args:
+            hooks (list[MetricsHook] | None): hooks to notify
+        """
+        self.hooks: list[MetricsHook] = list(hooks or [])
+
+    def stage(
+        self, stage: PipelineStage, dimensions: dict[str, str]
+    ) -> AbstractContextManager[None]:
+        """Time the enclosed block as a stage
+
+        Args:
+            stage (PipelineStage): stage
+            dimensions (dict[str, str]): e.g. institution id
+
+        Returns:
+            AbstractContextManager[None]: timing context
+        """
+        if not self.hooks:
+            return _DISABLED
+
+        return self._timed(stage, dimensions)
+
+    def outcome(self, outcome: str, seconds: float, dimensions: dict[str, str]) -> None:
+        """Record how a message ended
+
+        Args:
+            outcome (str): outcome label
+            seconds (float): time spent on the message
+            dimensions (dict[str, str]): e.g. institution id
+        """
+        for hook in self.hooks:
+            self._notify(hook.record_outcome, outcome, seconds, dimensions)
+
+    def gauge(self, name: str, value: float, dimensions: dict[str, str]) -> None:
+        """Record the current value of a gauge
+
+        Args:
+            name (str): gauge name
+            value (float): current value
+            dimensions (dict[str, str]): e.g. institution id
+        """
+        for hook in self.hooks:
+            self._notify(hook.record_gauge, name, value, dimensions)
+
+    def add_hook(self, hook: MetricsHook) -> None:
+        """Register a hook
+
+        Args:
+            hook (MetricsHook): hook to notify
+        """
+        self.hooks.append(hook)
+
+    def clear(self) -> None:
+        """Unregister every hook"""
+        self.hooks.clear()
+
+    @contextmanager
+    def _timed(
+        self, stage: PipelineStage, dimensions: dict[str, str]
+    ) -> Iterator[None]:
+        """Time a block and report it to every hook
+
+        Args:
+            stage (PipelineStage): stage
+            dimensions (dict[str, str]): extra dimensions
+
+        Yields:
+            None
+        """
+        started: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds: float = time.perf_counter() - started
+            for hook in self.hooks:
+                self._notify(hook.record_stage, stage, seconds, dimensions)
+
+    @staticmethod
+    def _notify(record: Any, *args: Any) -> None:
+        """Call a hook, never letting it break the pipeline
+
+        Args:
+            record (Any): hook method
+            *args (Any): measurement
+        """
+        try:
+            record(*args)
+        except Exception as e:
+            logging.warning(f"Metrics: hook failed: {e}")
+
+
+_DISABLED: AbstractContextManager[None] = nullcontext()
+
+
+def build_hooks(names: str) -> list[MetricsHook]:
+    """Build hooks from a comma separated list of names
+
+    A hook whose optional dependency isn't installed is logged and skipped, so a
+    metrics setting never stops the function app from loading.
+
+    Args:
+        names (str): any of "log", "memory" and "otel"
+
+    Returns:
+        list[MetricsHook]: hooks
+
+    Raises:
+        ValueError: if a name isn't a known hook
+    """
+    factories: dict[str, type] = {
+        "log": LoggingMetricsHook,
+        "memory": InMemoryMetricsHook,
+        "otel": OpenTelemetryMetricsHook,
+    }
+    hooks: list[MetricsHook] = []
+    for name in filter(None, (name.strip() for name in names.split(","))):
+        if name not in factories:
+            raise ValueError(f"Unknown metrics hook: {name!r}")
+        try:
+            hooks.append(factories[name]())
+        except ImportError as e:  # optional dependency
+            logging.error(f"build_hooks: Skipping metrics hook {name!r}: {e}")
+
+    return hooks
+
+
+update_metrics: Metrics = Metrics(build_hooks(METRICS_HOOKS))
@@ -0,0 +1,291 @@
+"""Coalesced notifications, one summary message per institution and run"""
+
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from enum import StrEnum
+from typing import Any
+
+from alma_item_checks_update_service.config import (
+    NOTIFICATION_MAX_JOBS,
+    NOTIFICATION_QUEUE,
+    NOTIFICATION_WINDOW_SECONDS,
+    REPORT_CONTAINER,
+)
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.report_writer import report_writer
+from alma_item_checks_update_service.services.storage import get_storage_service
+
+MAX_QUEUE_MESSAGE_BYTES: int = 64 * 1024  # Azure queue limit, after base64 encoding
+
+
+class NotificationMode(StrEnum):
+    """How updates are announced on the notification queue"""
+
+    ITEM = "item"  # one message per job
+    COALESCE = "coalesce"  # one summary per institution and run
+
+
+def queue_message_size(message: dict[str, Any]) -> int:
+    """Get a message's size on the queue once JSON and base64 encoded
+
+    Args:
+        message (dict[str, Any]): message content
+
+    Returns:
+        int: encoded size in bytes
+    """
+    return 4 * math.ceil(len(json.dumps(message).encode()) / 3)
+
+
+def group_key(message_data: dict[str, Any]) -> tuple[str, str | None]:
+    """Get the group a job is announced with
+
+    Args:
+        message_data (dict[str, Any]): message data
+
+    Returns:
+        tuple[str, str | None]: institution id and run id
+    """
+    return str(message_data.get("institution_id")), message_data.get("run_id")
+
+
+class NotificationGroup:
+    """Jobs waiting for one summary notification"""
+
+    def __init__(self) -> None:
+        """Initialize the group"""
+        self.job_ids: list[str] = []
+        self.reports: set[str] = set()
+        self.started: float = time.monotonic()
+        self.on_sent: list[Callable[[], None]] = []  # run once the summary is sent
+
+
+class NotificationCoalescer:
+    """Thread-safe coalescer that sends one summary per institution and run
+
+    A group's summary is sent once it holds ``max_jobs`` jobs or its oldest job has
+    waited ``window`` seconds; a background thread enforces the window. Summaries list
+    the job ids and the aggregated report files, which are written first. A summary
+    too large for the queue moves its job ids to a blob and points at it instead.
+    Jobs not yet announced are lost if the worker process dies, so callers record a
+    job as notified through after_send, and only batch and manifest runs coalesce,
+    flushing before their message is acknowledged. Single messages are announced one
+    by one.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int,
+        window: float,
+        queue_name: str = NOTIFICATION_QUEUE,
+        container: str = REPORT_CONTAINER,
+    ) -> None:
+        """Initialize the coalescer
+
+        Args:
+            max_jobs (int): jobs per group that trigger a summary
+            window (float): max seconds a job waits; 0 disables the background send
+            queue_name (str): notification queue
+            container (str): container for job id lists too large for the queue
+        """
+        self.max_jobs: int = max(max_jobs, 1)
+        self.window: float = window
+        self.queue_name: str = queue_name
+        self.container: str = container
+        self._groups: dict[tuple[str, str | None], NotificationGroup] = {}
+        self._sending: dict[tuple[str, str | None], NotificationGroup] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._send_lock: threading.Lock = threading.Lock()  # one flush at a time
+        self._sender: threading.Thread | None = None
+
+    def add(self, message_data: dict[str, Any], report_blob: str | None = None) -> None:
+        """Add an updated job, sending its group's summary if the group is full
+
+        Args:
+            message_data (dict[str, Any]): message data
+            report_blob (str | None): aggregated report file holding the job's row
+        """
+        key: tuple[str, str | None] = group_key(message_data)
+
+        with self._lock:
+            group: NotificationGroup = self._groups.setdefault(key, NotificationGroup())
+            group.job_ids.append(str(message_data.get("job_id")))
+            if report_blob is not None:
+                group.reports.add(report_blob)
+            full: bool = len(group.job_ids) >= self.max_jobs
+
+        self._start_sender()
+
+        if full:
+            self.flush(key)
+
+    def after_send(
+        self, message_data: dict[str, Any], callback: Callable[[], None]
+    ) -> None:
+        """Call back once the summary announcing a job has been sent
+
+        Args:
+            message_data (dict[str, Any]): message data of a job already added
+            callback (Callable[[], None]): called after the send, or right away if
+                the job's group has nothing waiting
+        """
+        key: tuple[str, str | None] = group_key(message_data)
+        with self._lock:
+            group: NotificationGroup | None = self._groups.get(
+                key, self._sending.get(key)
+            )
+            if group is not None:
+                group.on_sent.append(callback)
+                return
+
+        callback()
+
+    def flush(self, key: tuple[str, str | None] | None = None) -> None:
+        """Send pending summaries now
+
+        Flushes run one at a time, so after_send can wait on a send in progress.
+        If a send fails, its jobs and those of the groups after it stay pending.
+
+        Args:
+            key (tuple[str, str | None] | None): institution id and run id, or None
+                for every group
+        """
+        with self._send_lock:
+            with self._lock:
+                keys: list[tuple[str, str | None]] = (
+                    [key] if key is not None else list(self._groups)
+                )
+                pending: dict[tuple[str, str | None], NotificationGroup] = {
+                    k: self._groups.pop(k) for k in keys if k in self._groups
+                }
+                self._sending.update(pending)
+
+            try:
+                for (institution_id, run_id), group in pending.items():
+                    self._send(institution_id, run_id, group)
+                    with self._lock:
+                        del self._sending[(institution_id, run_id)]
+                    for callback in group.on_sent:
+                        callback()
+            finally:
+                for k in pending:
+                    with self._lock:
+                        unsent: NotificationGroup | None = self._sending.pop(k, None)
+                    if unsent is not None:
+                        self._restore(k, unsent)  # retry next flush
+
+    def flush_due(self) -> None:
+        """Send the summary of every group whose oldest job has waited the window"""
+        now: float = time.monotonic()
+        with self._lock:
+            due: list[tuple[str, str | None]] = [
+                key
+                for key, group in self._groups.items()
+                if now - group.started >= self.window
+            ]
+
+        for key in due:
+            try:
+                self.flush(key)
+            except Exception as e:  # retried on the next pass
+                logging.warning(
+                    f"NotificationCoalescer.flush_due: Failed to send notification for {key}: {e}"
+                )
+
+    def pending_jobs(self) -> int:
+        """Count jobs not yet announced
+
+        Returns:
+            int: pending jobs across all groups
+        """
+        with self._lock:
+            return sum(len(group.job_ids) for group in self._groups.values())
+
+    def clear(self) -> None:
+        """Drop pending jobs"""
+        with self._lock:
+            self._groups.clear()
+            self._sending.clear()
+
+    def _send(
+        self, institution_id: str, run_id: str | None, group: NotificationGroup
+    ) -> None:
+        """Send one group's summary
+
+        Args:
+            institution_id (str): institution id
+            run_id (str | None): run id
+            group (NotificationGroup): jobs to announce
+        """
+        reports: list[str] = []
+        for report_blob in sorted(group.reports):  # rows must exist before the notice
+            report_writer.flush(report_blob)
+            reports.extend(report_writer.blob_names(report_blob))
+
+        summary: dict[str, Any] = {
+            "institution_id": institution_id,
+            "run_id": run_id,
+            "count": len(group.job_ids),
+            "job_ids": group.job_ids,
+            "reports": reports,
+        }
+
+        storage_service = get_storage_service()  # shared service
+
+        if queue_message_size(summary) > MAX_QUEUE_MESSAGE_BYTES:  # point at a blob
+            blob_name: str = (
+                f"notifications/{institution_id}/{run_id or 'none'}/{uuid.uuid4()}.json"
+            )
+            storage_service.upload_blob_data(
+                container_name=self.container,
+                blob_name=blob_name,
+                data=json_codec.dumps(summary.pop("job_ids")),
+            )
+            summary["job_ids_blob"] = {"container": self.container, "blob": blob_name}
+
+        storage_service.send_queue_message(
+            queue_name=self.queue_name, message_content=summary
+        )
+
+    def _restore(self, key: tuple[str, str | None], group: NotificationGroup) -> None:
+        """Put jobs that failed to send back in front of any newer jobs
+
+        Args:
+            key (tuple[str, str | None]): institution id and run id
+            group (NotificationGroup): jobs that failed to send
+        """
+        with self._lock:
+            newer: NotificationGroup | None = self._groups.get(key)
+            if newer is not None:
+                group.job_ids.extend(newer.job_ids)
+                group.reports |= newer.reports
+                group.on_sent.extend(newer.on_sent)
+            self._groups[key] = group
+
+    def _start_sender(self) -> None:
+        """Start the background thread that sends due summaries, once per coalescer"""
+        if self.window <= 0 or self._sender is not None:
+            return
+
+        with self._lock:
+            if self._sender is None:
+                self._sender = threading.Thread(
+                    target=self._run_sender, name="notification-sender", daemon=True
+                )
+                self._sender.start()
+
+    def _run_sender(self) -> None:
+        """Send due summaries until the process exits"""
+        while True:
+            time.sleep(self.window / 2)
+            self.flush_due()
+
+
+notification_coalescer: NotificationCoalescer = NotificationCoalescer(
+    max_jobs=NOTIFICATION_MAX_JOBS, window=NOTIFICATION_WINDOW_SECONDS
+)
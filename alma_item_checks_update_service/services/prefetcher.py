@@ -0,0 +1,203 @@
+"""Concurrent prefetch of item payload blobs for a batch of jobs"""
+
+import threading
+from collections import deque
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Protocol
+
+ItemLoader = Callable[[str], dict[str, Any] | None]
+
+
+class ItemSource(Protocol):
+    """Hands out item payloads loaded ahead of the update stage"""
+
+    def take(self, job_id: str) -> tuple[bool, dict[str, Any] | None]:
+        """Take a job's payload
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            tuple[bool, dict[str, Any] | None]: whether the source had the job, and
+                the payload (None if it couldn't be loaded)
+        """
+        ...
+
+    def discard(self, job_id: str) -> None:
+        """Drop a job's payload if it was never taken
+
+        Args:
+            job_id (str): Job ID
+        """
+        ...
+
+
+class PreloadedItems:
+    """Thread-safe holder for payloads that came with their jobs, e.g. in a manifest"""
+
+    def __init__(self) -> None:
+        """Initialize the holder"""
+        self._items: dict[str, dict[str, Any] | None] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def add(self, job_id: str, item: dict[str, Any] | None) -> None:
+        """Hold a job's payload until it is taken
+
+        Args:
+            job_id (str): Job ID
+            item (dict[str, Any] | None): payload, None if the job came without one
+        """
+        with self._lock:
+            self._items[job_id] = item
+
+    def take(self, job_id: str) -> tuple[bool, dict[str, Any] | None]:
+        """Take a job's payload
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            tuple[bool, dict[str, Any] | None]: whether the job was held, and its
+                payload
+        """
+        with self._lock:
+            if job_id not in self._items:
+                return False, None
+
+            return True, self._items.pop(job_id)
+
+    def discard(self, job_id: str) -> None:
+        """Drop a job's payload if it was never taken
+
+        Args:
+            job_id (str): Job ID
+        """
+        with self._lock:
+            self._items.pop(job_id, None)
+
+
+class ItemPrefetcher:
+    """Downloads item payloads ahead of the update stage with bounded parallelism
+
+    Jobs are downloaded in the order given, at most ``max_workers`` at a time. At most
+    ``max_buffered`` payloads are downloaded or in flight without having been taken,
+    so memory stays bounded however large the batch. A job taken before its download
+    started is left to the caller to load.
+    """
+
+    def __init__(
+        self,
+        loader: ItemLoader,
+        job_ids: Iterable[str],
+        max_workers: int,
+        max_buffered: int,
+    ) -> None:
+        """Initialize the prefetcher and start downloading
+
+        Args:
+            loader (ItemLoader): downloads and parses one job's payload
+            job_ids (Iterable[str]): jobs to prefetch, in processing order
+            max_workers (int): max concurrent downloads
+            max_buffered (int): max payloads downloaded or in flight but not taken
+        """
+        self.loader: ItemLoader = loader
+        self._pending: deque[str] = deque(dict.fromkeys(job_ids))  # unique, in order
+        self._futures: dict[str, Future[dict[str, Any] | None]] = {}
+        self._slots: threading.Semaphore = threading.Semaphore(max(max_buffered, 1))
+        self._lock: threading.Lock = threading.Lock()
+        self._closed: threading.Event = threading.Event()
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max(max_workers, 1), thread_name_prefix="prefetch"
+        )
+        self._dispatcher: threading.Thread = threading.Thread(
+            target=self._dispatch, name="prefetch-dispatch", daemon=True
+        )
+        self._dispatcher.start()
+
+    def __enter__(self) -> "ItemPrefetcher":
+        """Use the prefetcher as a context manager
+
+        Returns:
+            ItemPrefetcher: this prefetcher
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop prefetching on leaving the context"""
+        self.close()
+
+    def take(self, job_id: str) -> tuple[bool, dict[str, Any] | None]:
+        """Take a job's payload, waiting for its download if it is in flight
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            tuple[bool, dict[str, Any] | None]: whether the payload was prefetched,
+                and the payload (None if it couldn't be loaded)
+        """
+        future: Future[dict[str, Any] | None] | None = self._claim(job_id)
+        if future is None:
+            return False, None
+
+        try:
+            return True, future.result()
+        finally:
+            self._slots.release()
+
+    def discard(self, job_id: str) -> None:
+        """Drop a job's payload if it was never taken, freeing its buffer slot
+
+        Args:
+            job_id (str): Job ID
+        """
+        future: Future[dict[str, Any] | None] | None = self._claim(job_id)
+        if future is not None:
+            future.cancel()
+            self._slots.release()
+
+    def close(self) -> None:
+        """Stop downloading and drop every payload not taken"""
+        self._closed.set()
+        with self._lock:
+            self._pending.clear()
+            futures: list[Future[dict[str, Any] | None]] = list(self._futures.values())
+            self._futures.clear()
+
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._dispatcher.join()
+
+    def _claim(self, job_id: str) -> Future[dict[str, Any] | None] | None:
+        """Remove a job from the prefetcher
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            Future | None: the job's download, or None if it never started
+        """
+        with self._lock:
+            future: Future[dict[str, Any] | None] | None = self._futures.pop(
+                job_id, None
+            )
+            if future is None and job_id in self._pending:
+                self._pending.remove(job_id)  # caller loads it instead
+
+        return future
+
+    def _dispatch(self) -> None:
+        """Start downloads in order as buffer slots free up"""
+        while not self._closed.is_set():
+            if not self._slots.acquire(timeout=0.1):  # buffer full
+                continue
+
+            with self._lock:
+                if not self._pending or self._closed.is_set():
+                    self._slots.release()
+                    return
+
+                job_id: str = self._pending.popleft()
+                self._futures[job_id] = self._executor.submit(self.loader, job_id)
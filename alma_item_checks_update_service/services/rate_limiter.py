@@ -0,0 +1,98 @@
+"""Per-institution rate limiting for Alma API calls"""
+
+import threading
+import time
+
+from alma_item_checks_update_service.config import (
+    ALMA_RATE_LIMIT_BURST,
+    ALMA_RATE_LIMIT_PER_SECOND,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket
+
+    Callers reserve a token up front and sleep off any deficit outside the lock, so
+    waiting threads are released in arrival order at ``rate`` per second.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        """Initialize the bucket
+
+        Args:
+            rate (float): tokens added per second
+            burst (float): bucket capacity
+        """
+        self.rate: float = rate
+        self.burst: float = max(burst, 1.0)
+        self._tokens: float = self.burst
+        self._updated: float = time.monotonic()
+        self._lock: threading.Lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, blocking until it is available
+
+        Returns:
+            float: seconds spent waiting
+        """
+        with self._lock:
+            now: float = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            wait: float = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+class RateLimiter:
+    """Token buckets keyed by institution
+
+    A rate of zero or less disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        """Initialize the limiter
+
+        Args:
+            rate (float): requests per second per institution
+            burst (float): requests allowed back to back per institution
+        """
+        self.rate: float = rate
+        self.burst: float = burst
+        self._buckets: dict[int, TokenBucket] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def acquire(self, institution_id: int) -> float:
+        """Wait for permission to make one request for an institution
+
+        Args:
+            institution_id (int): institution id
+
+        Returns:
+            float: seconds spent waiting
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            bucket: TokenBucket = self._buckets.setdefault(
+                institution_id, TokenBucket(self.rate, self.burst)
+            )
+
+        return bucket.acquire()
+
+    def clear(self) -> None:
+        """Drop all buckets"""
+        with self._lock:
+            self._buckets.clear()
+
+
+alma_rate_limiter: RateLimiter = RateLimiter(
+    rate=ALMA_RATE_LIMIT_PER_SECOND, burst=ALMA_RATE_LIMIT_BURST
+)
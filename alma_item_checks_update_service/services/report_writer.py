@@ -0,0 +1,459 @@
+"""Aggregated report files, one per institution and run"""
+
+import csv
+import io
+import logging
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from enum import StrEnum
+from typing import Any
+
+import azure.core.exceptions
+from azure.core import MatchConditions
+
+from alma_item_checks_update_service.config import (
+    REPORT_CONTAINER,
+    REPORT_FLUSH_BYTES,
+    REPORT_FLUSH_ROWS,
+    REPORT_FLUSH_SECONDS,
+    REPORT_FORMAT,
+    REPORT_MAX_BLOCKS,
+)
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.storage import get_blob_service_client
+
+REPORT_COLUMNS: tuple[str, ...] = (  # CSV header, in order
+    "Job ID",
+    "Title",
+    "Barcode",
+    "Item Call Number",
+    "Internal Note 1",
+    "Provenance Code",
+)
+
+
+class ReportMode(StrEnum):
+    """Where report rows are written"""
+
+    ITEM = "item"  # one JSON blob per job
+    AGGREGATE = "aggregate"  # rows appended to one file per institution and run
+
+
+class ReportFormat(StrEnum):
+    """Aggregated report file format"""
+
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
+def report_blob_name(
+    message_data: dict[str, Any], report_format: ReportFormat | str
+) -> str:
+    """Get the aggregated report file for an update message
+
+    Messages carrying a run_id share that run's file; others are grouped by UTC day.
+
+    Args:
+        message_data (dict[str, Any]): message data
+        report_format (ReportFormat | str): file format, used as the extension
+
+    Returns:
+        str: blob name
+    """
+    run_id: str = str(
+        message_data.get("run_id") or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    )
+
+    return f"{message_data.get('institution_id')}/{run_id}.{report_format}"
+
+
+def part_blob_name(blob_name: str, part: int, report_format: ReportFormat | str) -> str:
+    """Get the name of one part of a report file
+
+    Args:
+        blob_name (str): report file
+        part (int): part number, 0 for the file itself
+        report_format (ReportFormat | str): file format, used as the extension
+
+    Returns:
+        str: blob name of the part
+    """
+    if part == 0:
+        return blob_name
+
+    return f"{blob_name.removesuffix(f'.{report_format}')}.{part}.{report_format}"
+
+
+def encode_row(row: dict[str, Any], report_format: ReportFormat) -> str:
+    """Encode one report row as a line of the report file
+
+    Args:
+        row (dict[str, Any]): report data
+        report_format (ReportFormat): file format
+
+    Returns:
+        str: encoded row, newline terminated
+    """
+    if report_format == ReportFormat.JSONL:
+        return json_codec.dumps(row) + "\n"
+
+    buffer: io.StringIO = io.StringIO()
+    csv.DictWriter(
+        buffer, fieldnames=REPORT_COLUMNS, restval="", extrasaction="ignore"
+    ).writerow(row)
+
+    return buffer.getvalue()
+
+
+def csv_header() -> str:
+    """Get the CSV header line
+
+    Returns:
+        str: header, newline terminated
+    """
+    buffer: io.StringIO = io.StringIO()
+    csv.writer(buffer).writerow(REPORT_COLUMNS)
+
+    return buffer.getvalue()
+
+
+class ReportBuffer:
+    """Rows waiting to be appended to one report file"""
+
+    def __init__(self) -> None:
+        """Initialize the buffer"""
+        self.lines: list[str] = []
+        self.size: int = 0
+        self.started: float = time.monotonic()
+        self.on_written: list[Callable[[], None]] = []  # run once the rows are written
+
+
+class ReportWriter:
+    """Thread-safe writer that buffers report rows and appends them to append blobs
+
+    A file's rows are written in one append block once it holds ``max_rows`` rows or
+    ``max_bytes`` bytes, or its oldest row is ``max_age`` seconds old. A background
+    thread enforces the age limit, so rows buffered by the last message of a run are
+    still written. Rows not yet written are lost if the worker process dies, so
+    callers record a job's report as done through after_write, and only batch and
+    manifest runs buffer rows, flushing them before their message is acknowledged.
+    Single messages write their row at once.
+
+    An append blob holds at most 50,000 blocks, so once a file has ``max_blocks``
+    blocks later rows go to a new part, ``1/run.1.csv`` after ``1/run.csv`` and so on.
+    """
+
+    def __init__(
+        self,
+        report_format: ReportFormat | str,
+        max_rows: int,
+        max_bytes: int,
+        max_age: float,
+        max_blocks: int = REPORT_MAX_BLOCKS,
+        container: str = REPORT_CONTAINER,
+    ) -> None:
+        """Initialize the writer
+
+        Args:
+            report_format (ReportFormat | str): file format
+            max_rows (int): buffered rows per file that trigger a write
+            max_bytes (int): buffered bytes per file that trigger a write
+            max_age (float): max seconds a row is buffered; 0 disables the
+                background flush
+            max_blocks (int): blocks a file holds before rows go to its next part
+            container (str): container holding the report files
+        """
+        self.report_format: ReportFormat = ReportFormat(report_format)
+        self.max_rows: int = max(max_rows, 1)
+        self.max_bytes: int = max_bytes
+        self.max_age: float = max_age
+        self.max_blocks: int = max_blocks
+        self.container: str = container
+        self._buffers: dict[str, ReportBuffer] = {}
+        self._created: set[str] = set()  # blobs known to exist
+        self._parts: dict[str, int] = {}  # part each file's rows are appended to
+        self._full: set[str] = set()  # parts at max_blocks
+        self._writing: dict[str, ReportBuffer] = {}  # taken by the running flush
+        self._lock: threading.Lock = threading.Lock()
+        self._write_lock: threading.Lock = threading.Lock()  # one flush at a time
+        self._flusher: threading.Thread | None = None
+
+    def add(self, blob_name: str, row: dict[str, Any]) -> None:
+        """Buffer a row, writing the file's rows if a threshold is reached
+
+        Args:
+            blob_name (str): report file
+            row (dict[str, Any]): report data
+        """
+        full: bool = self._buffer(blob_name, row)
+
+        self._start_flusher()
+
+        if full:
+            self.flush(blob_name)
+
+    def write(self, blob_name: str, row: dict[str, Any]) -> None:
+        """Write a row now, with any rows already buffered for its file
+
+        Args:
+            blob_name (str): report file
+            row (dict[str, Any]): report data
+        """
+        self._buffer(blob_name, row)
+        self.flush(blob_name)
+
+    def after_write(self, blob_name: str, callback: Callable[[], None]) -> None:
+        """Call back once every row buffered so far for a file has been written
+
+        Args:
+            blob_name (str): report file
+            callback (Callable[[], None]): called after the write, or right away if
+                the file has no rows waiting
+        """
+        with self._lock:
+            buffer: ReportBuffer | None = self._buffers.get(
+                blob_name, self._writing.get(blob_name)
+            )
+            if buffer is not None:
+                buffer.on_written.append(callback)
+                return
+
+        callback()
+
+    def flush(self, blob_name: str | None = None) -> None:
+        """Write buffered rows now
+
+        Flushes run one at a time, so after_write can wait on a write in progress.
+        If a write fails, its rows and those of the files after it stay buffered.
+
+        Args:
+            blob_name (str | None): report file, or None for every file
+        """
+        with self._write_lock:
+            with self._lock:
+                names: list[str] = (
+                    [blob_name] if blob_name is not None else list(self._buffers)
+                )
+                pending: dict[str, ReportBuffer] = {
+                    name: self._buffers.pop(name)
+                    for name in names
+                    if name in self._buffers
+                }
+                self._writing.update(pending)
+
+            try:
+                for name, buffer in pending.items():
+                    self._append(name, "".join(buffer.lines))
+                    with self._lock:
+                        del self._writing[name]
+                    for callback in buffer.on_written:
+                        callback()
+            finally:
+                for name in pending:
+                    with self._lock:
+                        unwritten: ReportBuffer | None = self._writing.pop(name, None)
+                    if unwritten is not None:
+                        self._restore(name, unwritten)  # keep rows for the next flush
+
+    def flush_due(self) -> None:
+        """Write the rows of every file whose oldest row has reached max_age"""
+        now: float = time.monotonic()
+        with self._lock:
+            due: list[str] = [
+                name
+                for name, buffer in self._buffers.items()
+                if now - buffer.started >= self.max_age
+            ]
+
+        for name in due:
+            try:
+                self.flush(name)
+            except Exception as e:  # retried on the next pass
+                logging.warning(
+                    f"ReportWriter.flush_due: Failed to write report {name}: {e}"
+                )
+
+    def blob_names(self, blob_name: str) -> list[str]:
+        """Get the parts of a report file written so far by this writer
+
+        Args:
+            blob_name (str): report file
+
+        Returns:
+            list[str]: the file and any parts after it, in order
+        """
+        with self._lock:
+            last: int = self._parts.get(blob_name, 0)
+
+        return [
+            part_blob_name(blob_name, part, self.report_format)
+            for part in range(last + 1)
+        ]
+
+    def pending_rows(self) -> int:
+        """Count rows not yet written
+
+        Returns:
+            int: buffered rows across all files
+        """
+        with self._lock:
+            return sum(len(buffer.lines) for buffer in self._buffers.values())
+
+    def clear(self) -> None:
+        """Drop buffered rows and forget which blobs exist"""
+        with self._lock:
+            self._buffers.clear()
+            self._writing.clear()
+            self._created.clear()
+            self._parts.clear()
+            self._full.clear()
+
+    def _buffer(self, blob_name: str, row: dict[str, Any]) -> bool:
+        """Buffer a row
+
+        Args:
+            blob_name (str): report file
+            row (dict[str, Any]): report data
+
+        Returns:
+            bool: whether the file's buffer has reached a threshold
+        """
+        line: str = encode_row(row, self.report_format)
+
+        with self._lock:
+            buffer: ReportBuffer = self._buffers.setdefault(blob_name, ReportBuffer())
+            buffer.lines.append(line)
+            buffer.size += len(line.encode())
+            return len(buffer.lines) >= self.max_rows or buffer.size >= self.max_bytes
+
+    def _append(self, blob_name: str, data: str) -> None:
+        """Append data to the report file's current part, starting a new one when full
+
+        A part is full once an append reports ``max_blocks`` committed blocks, or if
+        the service refuses a block because the part is at its cap. Writers in other
+        processes still append to a part until they see it full, which the margin
+        below the cap leaves room for.
+
+        Args:
+            blob_name (str): report file
+            data (str): encoded rows
+        """
+        part: int = self._parts.get(blob_name, 0)
+        while True:
+            name: str = part_blob_name(blob_name, part, self.report_format)
+            if name not in self._full:
+                try:
+                    blocks: int = self._append_part(name, data)
+                except azure.core.exceptions.HttpResponseError as e:
+                    if getattr(e, "error_code", None) != "BlockCountExceedsLimit":
+                        raise
+                    self._full.add(name)
+                else:
+                    with self._lock:
+                        self._parts[blob_name] = part
+                    if blocks >= self.max_blocks:
+                        self._full.add(name)  # the next write starts a new part
+                    return
+            part += 1
+
+    def _append_part(self, blob_name: str, data: str) -> int:
+        """Append data to a report file, creating it first if needed
+
+        A CSV file's header goes in the same block as its first rows, appended only
+        while the file is still empty. A failed first append then leaves the file
+        empty, and the retry writes the header again.
+
+        Args:
+            blob_name (str): report file or part
+            data (str): encoded rows
+
+        Returns:
+            int: blocks committed to the file, 0 if the service didn't say
+        """
+        blob_client: Any = get_blob_service_client().get_blob_client(
+            container=self.container, blob=blob_name
+        )
+
+        if blob_name not in self._created:
+            try:
+                blob_client.create_append_blob(
+                    etag="*", match_condition=MatchConditions.IfMissing
+                )
+            except azure.core.exceptions.ResourceExistsError:
+                pass
+
+            if self.report_format == ReportFormat.CSV:  # header once per file
+                try:
+                    result: Any = blob_client.append_block(
+                        (csv_header() + data).encode(), appendpos_condition=0
+                    )
+                except azure.core.exceptions.HttpResponseError as e:
+                    if e.status_code != 412:  # 412: the file already has rows
+                        raise
+                else:
+                    self._created.add(blob_name)
+                    return committed_blocks(result)
+
+        result = blob_client.append_block(data.encode())
+        self._created.add(blob_name)
+
+        return committed_blocks(result)
+
+    def _restore(self, blob_name: str, buffer: ReportBuffer) -> None:
+        """Put rows that failed to write back in front of any newer rows
+
+        Args:
+            blob_name (str): report file
+            buffer (ReportBuffer): rows that failed to write
+        """
+        with self._lock:
+            newer: ReportBuffer | None = self._buffers.get(blob_name)
+            if newer is not None:
+                buffer.lines.extend(newer.lines)
+                buffer.size += newer.size
+                buffer.on_written.extend(newer.on_written)
+            self._buffers[blob_name] = buffer
+
+    def _start_flusher(self) -> None:
+        """Start the background thread that writes aged rows, once per writer"""
+        if self.max_age <= 0 or self._flusher is not None:
+            return
+
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run_flusher, name="report-flusher", daemon=True
+                )
+                self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        """Write aged rows until the process exits"""
+        while True:
+            time.sleep(self.max_age / 2)
+            self.flush_due()
+
+
+def committed_blocks(result: Any) -> int:
+    """Get the committed block count from an append_block response
+
+    Args:
+        result (Any): append_block response
+
+    Returns:
+        int: blocks committed to the blob, 0 if the response doesn't say
+    """
+    count: Any = (
+        result.get("blob_committed_block_count") if isinstance(result, dict) else None
+    )
+
+    return count if isinstance(count, int) else 0
+
+
+report_writer: ReportWriter = ReportWriter(
+    report_format=REPORT_FORMAT,
+    max_rows=REPORT_FLUSH_ROWS,
+    max_bytes=REPORT_FLUSH_BYTES,
+    max_age=REPORT_FLUSH_SECONDS,
+)
@@ -0,0 +1,239 @@
+"""Retry policy for Alma and Institution API calls"""
+
+import asyncio
+import email.utils
+import random
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from typing import Any, TypeVar
+
+import requests
+from wrlc_alma_api_client.exceptions import (  # type: ignore
+    InvalidInputError,
+    NotFoundError,
+)
+
+from alma_item_checks_update_service.config import (
+    API_CLIENT_TIMEOUT,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY,
+    RETRY_TOTAL_BUDGET,
+)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES: frozenset[int] = frozenset({408, 429, 500, 502, 503, 504})
+FATAL_EXCEPTIONS: tuple[type[BaseException], ...] = (NotFoundError, InvalidInputError)
+TRANSIENT_EXCEPTIONS: tuple[type[BaseException], ...] = (
+    requests.exceptions.Timeout,
+    requests.exceptions.ConnectionError,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+def get_status_code(exc: BaseException) -> int | None:
+    """Get the HTTP status code carried by an exception, if any
+
+    Args:
+        exc (BaseException): exception raised by an API call
+
+    Returns:
+        int | None: HTTP status code or None
+    """
+    for attr in ("status_code", "status"):  # Alma client, aiohttp
+        status: Any = getattr(exc, attr, None)
+        if isinstance(status, int):
+            return status
+
+    response: Any = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether an API call that raised exc is worth retrying
+
+    Not-found and invalid-input errors are fatal. Timeouts, connection errors,
+    throttling and server errors are retryable, including when they are the cause
+    of a wrapping exception.
+
+    Args:
+        exc (BaseException): exception raised by an API call
+
+    Returns:
+        bool: whether to retry
+    """
+    if isinstance(exc, FATAL_EXCEPTIONS):
+        return False
+
+    status: int | None = get_status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+
+    cause: BaseException | None = exc
+    while cause is not None:  # e.g. a client error wrapping a requests Timeout
+        if isinstance(cause, TRANSIENT_EXCEPTIONS):
+            return True
+        cause = cause.__cause__ or cause.__context__
+
+    return False
+
+
+def get_retry_after(exc: BaseException) -> float | None:
+    """Get the delay requested by a Retry-After response header
+
+    Args:
+        exc (BaseException): exception raised by an API call
+
+    Returns:
+        float | None: seconds to wait, or None if no usable header was sent
+    """
+    response: Any = getattr(exc, "response", None)
+    headers: Any = getattr(response, "headers", None) or getattr(exc, "headers", None)
+    if not headers:
+        return None
+
+    value: str | None = headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)  # delay in seconds
+    except ValueError:
+        pass
+
+    try:
+        retry_at: datetime = email.utils.parsedate_to_datetime(value)  # HTTP date
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """Jittered exponential backoff with a total time budget
+
+    Honors Retry-After when the server sends one. Gives up early rather than start
+    an attempt that could run past the budget, counting the attempt's own timeout,
+    so retries always finish inside the function timeout.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        budget: float,
+        attempt_timeout: float = 0.0,
+    ) -> None:
+        """Initialize the policy
+
+        Args:
+            max_attempts (int): max calls, including the first
+            base_delay (float): backoff before the first retry, in seconds
+            max_delay (float): cap on a single backoff, in seconds
+            budget (float): cap on total time spent across all attempts, in seconds
+            attempt_timeout (float): longest one call can take, in seconds
+        """
+        self.max_attempts: int = max(max_attempts, 1)
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.budget: float = budget
+        self.attempt_timeout: float = max(attempt_timeout, 0.0)
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call func, retrying retryable failures
+
+        Args:
+            func (Callable[..., T]): function to call
+            *args (Any): positional arguments for func
+            **kwargs (Any): keyword arguments for func
+
+        Returns:
+            T: func's return value
+
+        Raises:
+            Exception: the last exception once retrying stops
+        """
+        started: float = time.monotonic()
+        attempt: int = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay: float | None = self.next_delay(e, attempt, started)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(
+        self, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any
+    ) -> T:
+        """Await func, retrying retryable failures
+
+        Args:
+            func (Callable[..., Awaitable[T]]): coroutine function to call
+            *args (Any): positional arguments for func
+            **kwargs (Any): keyword arguments for func
+
+        Returns:
+            T: func's return value
+
+        Raises:
+            Exception: the last exception once retrying stops
+        """
+        started: float = time.monotonic()
+        attempt: int = 1
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay: float | None = self.next_delay(e, attempt, started)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def next_delay(
+        self, exc: BaseException, attempt: int, started: float
+    ) -> float | None:
+        """Decide how long to wait before the next attempt
+
+        Args:
+            exc (BaseException): exception raised by the last attempt
+            attempt (int): number of the attempt that failed, starting at 1
+            started (float): time.monotonic() when the first attempt started
+
+        Returns:
+            float | None: seconds to wait, or None to stop retrying
+        """
+        if attempt >= self.max_attempts or not is_retryable(exc):
+            return None
+
+        delay: float | None = get_retry_after(exc)
+        if delay is None:
+            backoff: float = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+            delay = random.uniform(0, backoff)  # nosec B311 - jitter, not crypto
+
+        elapsed: float = time.monotonic() - started
+        if elapsed + delay + self.attempt_timeout > self.budget:
+            return None  # the next attempt could overrun the budget
+
+        return delay
+
+
+retry_policy: RetryPolicy = RetryPolicy(
+    max_attempts=RETRY_MAX_ATTEMPTS,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY,
+    budget=RETRY_TOTAL_BUDGET,
+    attempt_timeout=API_CLIENT_TIMEOUT,
+)
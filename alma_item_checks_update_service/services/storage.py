@@ -0,0 +1,145 @@
+"""Shared storage clients for the worker process"""
+
+import threading
+from typing import Any
+
+from azure.storage.blob import BlobServiceClient
+from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+from wrlc_azure_storage_service import StorageService  # type: ignore
+
+from alma_item_checks_update_service.config import STORAGE_CONNECTION_STRING
+
+_storage_service: StorageService | None = None
+_storage_lock: threading.Lock = threading.Lock()
+_queue_clients: dict[str, QueueClient] = {}
+_blob_service_client: BlobServiceClient | None = None
+_async_clients: dict[str, Any] = {}  # async clients live on the worker's event loop
+
+
+def get_storage_service() -> StorageService:
+    """Get the worker's shared storage service, creating it on first use
+
+    The service (and the blob/queue clients and HTTP connections behind it) lives for
+    the whole worker process, so warm invocations skip connection string parsing and
+    TCP/TLS setup.
+
+    Returns:
+        StorageService: shared storage service
+    """
+    global _storage_service
+
+    if _storage_service is None:
+        with _storage_lock:
+            if _storage_service is None:  # another thread may have created it
+                _storage_service = StorageService(
+                    storage_connection_string=STORAGE_CONNECTION_STRING
+                )
+
+    return _storage_service
+
+
+def reset_storage_service() -> None:
+    """Drop the shared storage clients so the next call creates new ones"""
+    global _storage_service, _blob_service_client
+
+    with _storage_lock:
+        _storage_service = None
+        _blob_service_client = None
+        _queue_clients.clear()
+        _async_clients.clear()
+
+
+def get_queue_client(queue_name: str) -> QueueClient:
+    """Get the worker's shared client for a queue, creating it on first use
+
+    For queue operations StorageService doesn't cover, such as sending a message with
+    a visibility delay. Messages are base64 encoded, matching what queue triggers
+    expect.
+
+    Args:
+        queue_name (str): queue name
+
+    Returns:
+        QueueClient: shared queue client
+    """
+    with _storage_lock:
+        if queue_name not in _queue_clients:
+            _queue_clients[queue_name] = QueueClient.from_connection_string(
+                str(STORAGE_CONNECTION_STRING),
+                queue_name,
+                message_encode_policy=TextBase64EncodePolicy(),
+            )
+
+        return _queue_clients[queue_name]
+
+
+def get_blob_service_client() -> BlobServiceClient:
+    """Get the worker's shared blob service client, creating it on first use
+
+    For blob operations StorageService doesn't cover, such as append blobs.
+
+    Returns:
+        BlobServiceClient: shared blob service client
+    """
+    global _blob_service_client
+
+    with _storage_lock:
+        if _blob_service_client is None:
+            _blob_service_client = BlobServiceClient.from_connection_string(
+                str(STORAGE_CONNECTION_STRING)
+            )
+
+        return _blob_service_client
+
+
+def get_async_blob_service_client() -> Any:
+    """Get the worker's shared async blob service client, creating it on first use
+
+    Requires the aiohttp package. The client is bound to the worker's event loop.
+
+    Returns:
+        azure.storage.blob.aio.BlobServiceClient: shared async blob service client
+    """
+    if "blob" not in _async_clients:
+        from azure.storage.blob.aio import BlobServiceClient
+
+        _async_clients["blob"] = BlobServiceClient.from_connection_string(
+            str(STORAGE_CONNECTION_STRING)
+        )
+
+    return _async_clients["blob"]
+
+
+def get_async_queue_client(queue_name: str) -> Any:
+    """Get the worker's shared async client for a queue, creating it on first use
+
+    Messages are base64 encoded, matching what queue triggers expect. Requires the
+    aiohttp package.
+
+    Args:
+        queue_name (str): queue name
+
+    Returns:
+        azure.storage.queue.aio.QueueClient: shared async queue client
+    """
+    key: str = "queue:" + queue_name
+    if key not in _async_clients:
+        from azure.storage.queue import TextBase64EncodePolicy
+        from azure.storage.queue.aio import QueueClient
+
+        _async_clients[key] = QueueClient.from_connection_string(
+            str(STORAGE_CONNECTION_STRING),
+            queue_name,
+            message_encode_policy=TextBase64EncodePolicy(),
+        )
+
+    return _async_clients[key]
+
+
+async def close_async_clients() -> None:
+    """Close and drop the shared async storage clients"""
+    clients: list[Any] = list(_async_clients.values())
+    _async_clients.clear()
+
+    for client in clients:
+        await client.close()
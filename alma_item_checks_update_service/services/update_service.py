@@ -2,11 +2,17 @@
 
 import json
 import logging
+import math
+import time
+from collections.abc import Callable
+from enum import StrEnum
+from functools import partial
 from typing import Any
 
 import azure.core.exceptions
 import azure.functions as func
 import requests
+from azure.storage.blob import BlobClient, ContentSettings
 from wrlc_alma_api_client import AlmaApiClient  # type: ignore
 from wrlc_alma_api_client.exceptions import (  # type: ignore
     NotFoundError,
@@ -20,48 +26,428 @@ from alma_item_checks_update_service.config import (
     API_CLIENT_TIMEOUT,
     INSTITUTION_API_ENDPOINT,
     INSTITUTION_API_KEY,
+    ITEM_PROJECTION,
     NOTIFICATION_QUEUE,
-    STORAGE_CONNECTION_STRING,
     UPDATED_ITEMS_CONTAINER,
     REPORT_CONTAINER,
+    NOTIFICATION_MODE,
+    REPORT_COMPRESSION,
+    REPORT_MODE,
+    UPDATE_DIFF_MODE,
+    UPDATE_QUEUE,
 )
+from alma_item_checks_update_service.services.alma_client_registry import (
+    alma_client_registry,
+)
+from alma_item_checks_update_service.services.api_key_cache import api_key_cache
+from alma_item_checks_update_service.services.circuit_breaker import (
+    BreakerState,
+    CircuitBreaker,
+    alma_circuit_breakers,
+)
+from alma_item_checks_update_service.services.concurrency_limiter import (
+    ConcurrencyLimitTimeout,
+    alma_concurrency_limiter,
+)
+from alma_item_checks_update_service.services.compression import (
+    Compression,
+    DecompressionError,
+    compress,
+    read_payload,
+)
+from alma_item_checks_update_service.services.dead_letter import dead_letter
+from alma_item_checks_update_service.services.idempotency import (
+    IdempotencyStore,
+    Stage,
+    get_ledger,
+)
+from alma_item_checks_update_service.services.item_diff import (
+    DiffMode,
+    item_fingerprint,
+    item_fingerprints,
+    payload_matches,
+)
+from alma_item_checks_update_service.services.item_projection import (
+    ItemProjection,
+    project_item,
+)
+from alma_item_checks_update_service.services.json_codec import json_codec
+from alma_item_checks_update_service.services.message_validation import (
+    InvalidMessageError,
+    InvalidReason,
+    UpdateMessage,
+    decode_message,
+    is_transient_storage_error,
+)
+from alma_item_checks_update_service.services.metrics import (
+    PipelineStage,
+    update_metrics,
+)
+from alma_item_checks_update_service.services.rate_limiter import alma_rate_limiter
+from alma_item_checks_update_service.services.notification_coalescer import (
+    NotificationMode,
+    notification_coalescer,
+)
+from alma_item_checks_update_service.services.prefetcher import ItemSource
+from alma_item_checks_update_service.services.report_writer import (
+    ReportMode,
+    report_blob_name,
+    report_writer,
+)
+from alma_item_checks_update_service.services.retry import is_retryable, retry_policy
+from alma_item_checks_update_service.services.storage import (
+    get_blob_service_client,
+    get_queue_client,
+    get_storage_service,
+)
+
+AUTH_ERROR_STATUS_CODES: frozenset[int] = frozenset({401, 403})
+
+
+class UpdateOutcome(StrEnum):
+    """Result of processing one update message"""
+
+    UPDATED = "updated"
+    MISSING_JOB_ID = "missing_job_id"
+    ITEM_NOT_FOUND = "item_not_found"
+    MISSING_IDS = "missing_ids"
+    MISSING_INSTITUTION_ID = "missing_institution_id"
+    NO_KEY = "no_key"
+    ALMA_FAILED = "alma_failed"
+    DEFERRED = "deferred"  # circuit breaker open or no Alma call slot free
+    UNCHANGED = "unchanged"  # Alma already has the item's values
+    ALREADY_PROCESSED = "already_processed"  # redelivered after completing
+    INVALID_MESSAGE = "invalid_message"  # malformed body or institution id
+    CONTINUED = "continued"  # left for a continuation message, out of time
+    ERROR = "error"  # unexpected exception
+
+
+COMPLETED_OUTCOMES: frozenset[UpdateOutcome] = frozenset(
+    {UpdateOutcome.UPDATED, UpdateOutcome.UNCHANGED, UpdateOutcome.ALREADY_PROCESSED}
+)
+
+INVALID_OUTCOMES: dict[InvalidReason, UpdateOutcome] = {  # others are INVALID_MESSAGE
+    InvalidReason.MISSING_JOB_ID: UpdateOutcome.MISSING_JOB_ID,
+    InvalidReason.MISSING_INSTITUTION_ID: UpdateOutcome.MISSING_INSTITUTION_ID,
+    InvalidReason.ITEM_NOT_FOUND: UpdateOutcome.ITEM_NOT_FOUND,
+    InvalidReason.MISSING_IDS: UpdateOutcome.MISSING_IDS,
+}
 
 
 # noinspection PyMethodMayBeStatic
 class UpdateService:
     """Service class for Alma Item Updates"""
 
-    def __init__(self, itemmsg: func.QueueMessage) -> None:
+    def __init__(
+        self,
+        itemmsg: func.QueueMessage | None = None,
+        diff_mode: DiffMode | str = UPDATE_DIFF_MODE,
+        ledger: IdempotencyStore | None = None,
+        report_mode: ReportMode | str = REPORT_MODE,
+        notification_mode: NotificationMode | str = NOTIFICATION_MODE,
+        item_projection: ItemProjection | str = ITEM_PROJECTION,
+        report_compression: Compression | str = REPORT_COMPRESSION,
+        buffered: bool = False,
+    ) -> None:
         """Initialize the service
 
         Args:
-            itemmsg (func.QueueMessage): Queue message
+            itemmsg (func.QueueMessage | None): Queue message, or None when messages
+                are passed to process_message directly
+            diff_mode (DiffMode | str): how to detect updates that change nothing
+            ledger (IdempotencyStore | None): job stage ledger, defaults to the
+                worker's configured ledger
+            report_mode (ReportMode | str): one report blob per job, or rows
+                aggregated into one file per institution and run
+            notification_mode (NotificationMode | str): one notification per job,
+                or one summary per institution and run; only buffered runs coalesce
+            item_projection (ItemProjection | str): validate and send the whole
+                item payload, or only the parts an item update needs
+            report_compression (Compression | str): compression of per-job report
+                blobs
+            buffered (bool): buffer aggregated report rows and coalesce
+                notifications, for batch and manifest runs that flush before their
+                message is acknowledged
         """
-        self.itemmsg: func.QueueMessage = itemmsg
-
-    def update_item(self) -> None:
-        """Update the item in Alma"""
-        message_data: dict[str, Any] = json.loads(  # get queued message
-            self.itemmsg.get_body().decode()
+        self.itemmsg: func.QueueMessage | None = itemmsg
+        self.diff_mode: DiffMode = DiffMode(diff_mode)
+        self.ledger: IdempotencyStore = ledger if ledger is not None else get_ledger()
+        self.report_mode: ReportMode = ReportMode(report_mode)
+        self.notification_mode: NotificationMode = (
+            NotificationMode(notification_mode)
+            if buffered
+            else NotificationMode.ITEM  # a lone job has nothing to coalesce with
         )
+        self.item_projection: ItemProjection = ItemProjection(item_projection)
+        self.report_compression: Compression = Compression(report_compression)
+        self.buffered: bool = buffered
+        self.prefetcher: ItemSource | None = None  # set for batches and manifests
+        self.requeue_deferred: bool = True  # manifests resume from a checkpoint instead
 
-        job_id: str | None = message_data["job_id"]  # get job_id from message data
-        if job_id is None:
-            logging.error("UpdateService.update_item: No job id provided")
-            return
+    def update_item(self) -> UpdateOutcome:
+        """Update the item in Alma
 
-        full_item = self.get_item_data(job_id)  # get item details from blob
-        if full_item is None:
-            logging.error("UpdateService.update_item: Item not found")
-            return
+        Returns:
+            UpdateOutcome: result of processing the queue message
+        """
+        if self.itemmsg is None:
+            raise ValueError("UpdateService.update_item: No queue message provided")
+
+        body: bytes = self.itemmsg.get_body()
+
+        try:
+            message_data: dict[str, Any] = decode_message(body)  # get queued message
+        except InvalidMessageError as e:
+            return self.reject_undecodable(body, e)
+
+        return self.process_message(message_data)
+
+    def process_message(self, message_data: dict[str, Any]) -> UpdateOutcome:
+        """Update the item in Alma for one decoded update message
 
-        item: Item = Item(  # Create Item object from the full item data
-            bib_data=full_item.get("bib_data"),  # bib data
-            holding_data=full_item.get("holding_data"),  # holding data
-            item_data=full_item.get("item_data"),  # item data
-            link=full_item.get("link"),  # link
+        Every exit path, an exception included, is recorded as an outcome metric.
+        Invalid messages are dead-lettered; other exceptions propagate so the queue
+        retries the message.
+
+        Args:
+            message_data (dict[str, Any]): message data
+
+        Returns:
+            UpdateOutcome: result of processing the message
+        """
+        dimensions: dict[str, str] = message_dimensions(message_data)
+        started: float = time.perf_counter()
+        outcome: UpdateOutcome = UpdateOutcome.ERROR
+        try:
+            outcome = self.run_stages(message_data, dimensions)
+        except InvalidMessageError as e:
+            outcome = self.reject_message(message_data, e)
+        finally:
+            update_metrics.outcome(outcome, time.perf_counter() - started, dimensions)
+
+        return outcome
+
+    def run_stages(
+        self, message_data: dict[str, Any], dimensions: dict[str, str]
+    ) -> UpdateOutcome:
+        """Run the pipeline stages not yet completed for a message
+
+        Args:
+            message_data (dict[str, Any]): message data
+            dimensions (dict[str, str]): metric dimensions for the message
+
+        Returns:
+            UpdateOutcome: result of processing the message
+
+        Raises:
+            InvalidMessageError: if the message can never be processed
+        """
+        message: UpdateMessage = UpdateMessage.from_dict(message_data)  # validate
+        job_id: str = message.job_id
+
+        completed: set[Stage] = self.ledger.get(job_id)  # stages done on redelivery
+        if Stage.NOTIFIED in completed:
+            logging.info(f"UpdateService.update_item: Job {job_id} already processed")
+            return UpdateOutcome.ALREADY_PROCESSED
+
+        outcome: UpdateOutcome = UpdateOutcome.UPDATED
+        if Stage.REPORTED not in completed:
+            outcome = self.update_and_report(
+                message, message_data, completed, dimensions
+            )
+            if outcome not in COMPLETED_OUTCOMES:
+                return outcome
+
+        with update_metrics.stage(PipelineStage.NOTIFY, dimensions):
+            self.send_notification(message_data)  # Queue notification message
+        self.when_notified(  # and once its report row is written too
+            message_data, partial(self.mark_done, message_data, job_id, Stage.NOTIFIED)
         )
 
+        return outcome
+
+    def update_and_report(
+        self,
+        message: UpdateMessage,
+        message_data: dict[str, Any],
+        completed: set[Stage],
+        dimensions: dict[str, str],
+    ) -> UpdateOutcome:
+        """Fetch the item, update it in Alma unless already done, and save the report
+
+        Args:
+            message (UpdateMessage): validated message
+            message_data (dict[str, Any]): message data
+            completed (set[Stage]): stages completed on earlier deliveries
+            dimensions (dict[str, str]): metric dimensions for the message
+
+        Returns:
+            UpdateOutcome: result of the update
+
+        Raises:
+            InvalidMessageError: if the item blob is missing or incomplete
+        """
+        job_id: str = message.job_id
+        institution_id: int = message.institution_id
+
+        with update_metrics.stage(PipelineStage.FETCH, dimensions):
+            item_blob = self.get_item_data(job_id)  # get item details from blob
+        full_item, mms_id, holding_id, item_pid = self.validate_item(item_blob)
+
+        item: Item = self.build_item(full_item)  # Create Item object
+
+        outcome: UpdateOutcome = UpdateOutcome.UPDATED
+        if Stage.UPDATED not in completed:  # don't repeat the Alma call
+            with update_metrics.stage(PipelineStage.API_KEY, dimensions):
+                api_key: str | None = self.get_api_key(
+                    institution_id
+                )  # get API key for institution
+            if api_key is None:
+                logging.error("UpdateService.update_item: No institution api key found")
+                return UpdateOutcome.NO_KEY
+
+            item_data_section: dict[str, Any] = full_item.get("item_data") or {}
+
+            unchanged: bool = False
+            if self.diff_mode != DiffMode.OFF:
+                with update_metrics.stage(PipelineStage.DIFF, dimensions):
+                    unchanged = self.is_unchanged(  # Alma already has these values?
+                        institution_id,
+                        api_key,
+                        mms_id,
+                        holding_id,
+                        item_pid,
+                        item_data_section,
+                    )
+
+            if unchanged:  # Skip the PUT
+                outcome = UpdateOutcome.UNCHANGED
+            else:
+                breaker: CircuitBreaker = alma_circuit_breakers.get(institution_id)
+                if not breaker.allow_request():  # Alma failing, try later
+                    if self.requeue_deferred:
+                        self.defer_message(message_data, breaker.retry_in())
+                    return UpdateOutcome.DEFERRED
+
+                try:
+                    with update_metrics.stage(PipelineStage.ALMA_UPDATE, dimensions):
+                        updated: bool = self.update_alma_item(  # Update Alma record
+                            institution_id, api_key, mms_id, holding_id, item_pid, item
+                        )
+                except ConcurrencyLimitTimeout as e:  # Alma busy for institution
+                    if self.requeue_deferred:
+                        self.defer_message(
+                            message_data, alma_concurrency_limiter.max_wait, str(e)
+                        )
+                    return UpdateOutcome.DEFERRED
+                if not updated:
+                    return UpdateOutcome.ALMA_FAILED
+
+                self.remember_update(item_pid, item_data_section)
+
+            self.ledger.mark(job_id, Stage.UPDATED)
+
+        with update_metrics.stage(PipelineStage.REPORT, dimensions):
+            self.save_report(item, job_id, message_data)  # Save report
+        self.mark_done(message_data, job_id, Stage.REPORTED)
+
+        return outcome
+
+    def validate_item(
+        self, full_item: dict[str, Any] | None
+    ) -> tuple[dict[str, Any], str, str, str]:
+        """Check an item blob has the IDs Alma needs before any API is called
+
+        Args:
+            full_item (dict[str, Any] | None): item details from blob
+
+        Returns:
+            tuple[dict[str, Any], str, str, str]: item details, mms_id, holding_id,
+                item_pid
+
+        Raises:
+            InvalidMessageError: if the blob is missing or lacks an ID
+        """
+        if not isinstance(full_item, dict):
+            raise InvalidMessageError(InvalidReason.ITEM_NOT_FOUND, "Item not found")
+
+        mms_id, holding_id, item_pid = self.get_item_ids(full_item)
+
+        if not (mms_id and holding_id and item_pid):  # Handle missing data
+            raise InvalidMessageError(
+                InvalidReason.MISSING_IDS,
+                f"Missing required IDs - mms_id: {mms_id}, holding_id: {holding_id}, "
+                f"item_pid: {item_pid}",
+            )
+
+        return full_item, mms_id, holding_id, item_pid
+
+    def reject_message(self, payload: Any, error: InvalidMessageError) -> UpdateOutcome:
+        """Dead-letter a message that can never be processed
+
+        Args:
+            payload (Any): original message, decoded or as the raw body text
+            error (InvalidMessageError): why the message is invalid
+
+        Returns:
+            UpdateOutcome: outcome for the message
+        """
+        logging.error(f"UpdateService.update_item: {error}")
+        dead_letter(error, payload)
+
+        return INVALID_OUTCOMES.get(error.reason, UpdateOutcome.INVALID_MESSAGE)
+
+    def reject_undecodable(
+        self, body: bytes, error: InvalidMessageError
+    ) -> UpdateOutcome:
+        """Dead-letter a message body that couldn't be decoded, recording its outcome
+
+        process_message records the outcome of every message that decodes; this
+        covers the ones that never get that far.
+
+        Args:
+            body (bytes): message body as received
+            error (InvalidMessageError): why it couldn't be decoded
+
+        Returns:
+            UpdateOutcome: outcome for the message
+        """
+        started: float = time.perf_counter()
+        outcome: UpdateOutcome = UpdateOutcome.ERROR
+        try:
+            outcome = self.reject_message(body.decode(errors="replace"), error)
+        finally:
+            update_metrics.outcome(
+                outcome, time.perf_counter() - started, message_dimensions(None)
+            )
+
+        return outcome
+
+    def build_item(self, full_item: dict[str, Any]) -> Item:
+        """Create an Item object from the full item data
+
+        The Item is built once per message and used for both the Alma update and
+        the report.
+
+        Args:
+            full_item (dict[str, Any]): item details from blob
+
+        Returns:
+            Item: Item object
+        """
+        return Item(**project_item(full_item, self.item_projection))
+
+    def get_item_ids(
+        self, full_item: dict[str, Any]
+    ) -> tuple[str | None, str | None, str | None]:
+        """Extract the IDs Alma needs to address the item
+
+        Args:
+            full_item (dict[str, Any]): item details from blob
+
+        Returns:
+            tuple[str | None, str | None, str | None]: mms_id, holding_id, item_pid
+        """
         bib_data = full_item.get("bib_data", {})  # Extract bib data from item
         holding_data = full_item.get(
             "holding_data", {}
@@ -74,35 +460,55 @@ class UpdateService:
         holding_id = holding_data.get("holding_id")  # Get holding_id
         item_pid = item_data_section.get("pid")  # Get item_pid
 
-        if not all([mms_id, holding_id, item_pid]):  # Handle missing data
-            logging.error(
-                f"UpdateService.update_item: Missing required IDs - mms_id: {mms_id}, holding_id: {holding_id}, "
-                f"item_pid: {item_pid}"
-            )
-            return
+        return mms_id, holding_id, item_pid
 
-        institution_id: str | None = message_data.get(
-            "institution_id"
-        )  # get institution ID
-        if institution_id is None:
-            logging.error("UpdateService.update_item: No institution id provided")
-            return
+    def update_alma_item(
+        self,
+        institution_id: int,
+        api_key: str,
+        mms_id: str,
+        holding_id: str,
+        item_pid: str,
+        item: Item,
+    ) -> bool:
+        """Send the item update to Alma
 
-        api_key: str | None = self.get_api_key(
-            int(institution_id)
-        )  # get API key for institution
+        Args:
+            institution_id (int): institution id
+            api_key (str): institution api key
+            mms_id (str): MMS ID
+            holding_id (str): holding ID
+            item_pid (str): item PID
+            item (Item): Item object
 
-        alma_api_client: AlmaApiClient = AlmaApiClient(  # intialize Alma API client
-            api_key=str(api_key), region="NA", timeout=API_CLIENT_TIMEOUT
-        )
+        Returns:
+            bool: whether Alma accepted the update
+
+        Raises:
+            ConcurrencyLimitTimeout: if no call slot freed up, so Alma wasn't called
+        """
+        alma_api_client: AlmaApiClient = alma_client_registry.get_client(
+            institution_id, api_key
+        )  # get pooled Alma API client for institution
+
+        def send_update() -> None:
+            with alma_concurrency_limiter.slot(institution_id) as timer:  # adaptive cap
+                alma_rate_limiter.acquire(institution_id)  # token only once sending
+                timer.restart()  # time Alma, not the wait for a token
+                alma_api_client.items.update_item(  # Update Alma item record
+                    mms_id=mms_id,
+                    holding_id=holding_id,
+                    item_pid=item_pid,
+                    item_record_data=item,
+                )
+
+        breaker: CircuitBreaker = alma_circuit_breakers.get(institution_id)
 
         try:
-            alma_api_client.items.update_item(  # Update Alma item record
-                mms_id=mms_id,
-                holding_id=holding_id,
-                item_pid=item_pid,
-                item_record_data=item,
-            )
+            retry_policy.call(send_update)  # retry transient failures
+        except ConcurrencyLimitTimeout:  # no call made, so no verdict on Alma
+            breaker.record_skipped()
+            raise
         except (
             ValueError,
             NotFoundError,
@@ -110,15 +516,142 @@ class UpdateService:
             AlmaApiError,
             Exception,
         ) as e:
+            if is_retryable(e):  # Alma unavailable, not a problem with this item
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if getattr(e, "status_code", None) in AUTH_ERROR_STATUS_CODES:
+                api_key_cache.invalidate(institution_id)  # key was rejected
             logging.error(f"UpdateService.update_item: Failed to update item: {e}")
-            return
+            return False
+
+        breaker.record_success()
 
-        self.save_report(item, job_id)  # Save report blob
+        return True
 
-        self.send_notification(message_data)  # Queue notification message
+    def is_unchanged(
+        self,
+        institution_id: int,
+        api_key: str,
+        mms_id: str,
+        holding_id: str,
+        item_pid: str,
+        item_data: dict[str, Any],
+    ) -> bool:
+        """Whether updating the item would leave Alma unchanged
+
+        Args:
+            institution_id (int): institution id
+            api_key (str): institution api key
+            mms_id (str): MMS ID
+            holding_id (str): holding ID
+            item_pid (str): item PID
+            item_data (dict[str, Any]): item_data section of the update payload
+
+        Returns:
+            bool: True to skip the update
+        """
+        if self.diff_mode == DiffMode.OFF:
+            return False
+
+        if item_fingerprints.get(item_pid) == item_fingerprint(item_data):
+            logging.info(
+                f"UpdateService.update_item: Item {item_pid} unchanged since last update"
+            )
+            return True
+
+        if self.diff_mode != DiffMode.LIVE:
+            return False
+
+        if alma_circuit_breakers.get(institution_id).state != BreakerState.CLOSED:
+            return False  # leave Alma alone; the update path will defer
+
+        live_item: dict[str, Any] | None = self.get_live_item(
+            institution_id, api_key, mms_id, holding_id, item_pid
+        )
+        if live_item is None or not payload_matches(
+            item_data, live_item.get("item_data")
+        ):
+            return False
+
+        logging.info(f"UpdateService.update_item: Item {item_pid} already up to date")
+        self.remember_update(item_pid, item_data)
+
+        return True
+
+    def get_live_item(
+        self,
+        institution_id: int,
+        api_key: str,
+        mms_id: str,
+        holding_id: str,
+        item_pid: str,
+    ) -> dict[str, Any] | None:
+        """Get the item record currently in Alma
+
+        Args:
+            institution_id (int): institution id
+            api_key (str): institution api key
+            mms_id (str): MMS ID
+            holding_id (str): holding ID
+            item_pid (str): item PID
+
+        Returns:
+            dict[str, Any] | None: live item record or None if it couldn't be read
+        """
+        alma_api_client: AlmaApiClient = alma_client_registry.get_client(
+            institution_id, api_key
+        )
+        alma_rate_limiter.acquire(institution_id)  # reads count towards the limit
+
+        try:
+            live_item: Any = alma_api_client.items.get_item(
+                mms_id=mms_id, holding_id=holding_id, item_pid=item_pid
+            )
+        except Exception as e:  # fall back to sending the update
+            logging.warning(
+                f"UpdateService.update_item: Failed to get live item {item_pid}: {e}"
+            )
+            return None
+
+        if hasattr(live_item, "model_dump"):
+            return live_item.model_dump(mode="json")
+
+        return live_item if isinstance(live_item, dict) else None
+
+    def remember_update(self, item_pid: str, item_data: dict[str, Any]) -> None:
+        """Record the item_data last written for an item
+
+        Args:
+            item_pid (str): item PID
+            item_data (dict[str, Any]): item_data section sent to Alma
+        """
+        if self.diff_mode != DiffMode.OFF:
+            item_fingerprints.set(item_pid, item_fingerprint(item_data))
+
+    def defer_message(
+        self,
+        message_data: dict[str, Any],
+        delay: float,
+        reason: str = "Alma circuit open",
+    ) -> None:
+        """Re-enqueue a message so it becomes visible again after a delay
+
+        Args:
+            message_data (dict[str, Any]): message data
+            delay (float): seconds before the message is visible
+            reason (str): why the message is deferred, for the log
+        """
+        logging.warning(
+            f"UpdateService.update_item: {reason}, deferring job "
+            f"{message_data.get('job_id')} for {delay:.0f}s"
+        )
+        get_queue_client(UPDATE_QUEUE).send_message(
+            json_codec.dumps(message_data), visibility_timeout=max(math.ceil(delay), 1)
+        )
 
     def get_item_data(self, job_id: str) -> dict[str, Any] | None:
-        """Get item details
+        """Get item details, from the batch's prefetcher or manifest if it has them
 
         Args:
             job_id (str): Job ID
@@ -126,17 +659,39 @@ class UpdateService:
         Returns:
             dict[str, Any]: Item details or None
         """
-        storage_service: StorageService = StorageService(  # initialize storage service
-            storage_connection_string=STORAGE_CONNECTION_STRING
+        if self.prefetcher is not None:
+            prefetched, item = self.prefetcher.take(job_id)
+            if prefetched:
+                return item
+
+        return self.download_item_data(job_id)
+
+    def download_item_data(self, job_id: str) -> dict[str, Any] | None:
+        """Download item details
+
+        The blob's bytes are parsed directly, without decoding them to str first.
+        gzip and zstd payloads are decompressed as the download streams in.
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            dict[str, Any]: Item details or None
+
+        Raises:
+            DecompressionError: if the payload is corrupt, so the queue retries it
+            ImportError: for zstd payloads if zstandard isn't installed
+        """
+        blob_client: BlobClient = get_blob_service_client().get_blob_client(
+            container=UPDATED_ITEMS_CONTAINER, blob=job_id + ".json"
         )
 
         try:
-            item: dict[str, Any] | None = (
-                storage_service.download_blob_as_json(  # get item data from container
-                    container_name=UPDATED_ITEMS_CONTAINER,
-                    blob_name=job_id + ".json",
-                )
+            item: dict[str, Any] | None = json_codec.loads(  # get item data
+                read_payload(blob_client.download_blob(decompress=False))
             )
+        except (DecompressionError, ImportError):  # not the item's fault; retry
+            raise
         except (
             ValueError,
             json.JSONDecodeError,
@@ -144,6 +699,8 @@ class UpdateService:
             azure.core.exceptions.ServiceRequestError,
             Exception,
         ) as e:
+            if is_transient_storage_error(e):  # let the queue retry the message
+                raise
             logging.warning(
                 f"UpdateService.update_item: Failed to download item from storage service: {e}"
             )
@@ -156,10 +713,21 @@ class UpdateService:
         return item
 
     def get_api_key(self, institution_id: int) -> str | None:
-        """Get institution api key
+        """Get institution api key, using the process-wide key cache
 
         Args:
-            institution_id (str): institution id
+            institution_id (int): institution id
+
+        Returns:
+            str: institution api key or None
+        """
+        return api_key_cache.get_or_load(institution_id, self.fetch_api_key)
+
+    def fetch_api_key(self, institution_id: int) -> str | None:
+        """Fetch institution api key from the Institution API
+
+        Args:
+            institution_id (int): institution id
 
         Returns:
             str: institution api key or None
@@ -168,13 +736,9 @@ class UpdateService:
         url: str = f"{INSTITUTION_API_ENDPOINT}/{institution_id}/api-key"
 
         try:
-            response: requests.Response = (
-                requests.get(  # send request to Institution API
-                    url, params=params, timeout=API_CLIENT_TIMEOUT
-                )
+            api_key: str | None = retry_policy.call(  # retry transient failures
+                self.request_api_key, url, params
             )
-            response.raise_for_status()  # raise http errors as errors
-            api_key: str | None = response.json()["api_key"]  # get the API key
         except (requests.exceptions.HTTPError, Exception) as err:  # Handle HTTP error
             logging.warning(f"UpdateService.update_item: Failed to get API key: {err}")
             return None
@@ -187,18 +751,137 @@ class UpdateService:
 
         return api_key
 
-    def save_report(self, item: Item, job_id: str) -> None:
+    def request_api_key(self, url: str, params: dict[str, Any]) -> str | None:
+        """Send one request to the Institution API
+
+        Args:
+            url (str): API key URL for the institution
+            params (dict[str, Any]): query parameters
+
+        Returns:
+            str: institution api key or None
+        """
+        response: requests.Response = requests.get(  # send request to Institution API
+            url, params=params, timeout=API_CLIENT_TIMEOUT
+        )
+        response.raise_for_status()  # raise http errors as errors
+
+        return response.json()["api_key"]  # get the API key
+
+    def save_report(
+        self, item: Item, job_id: str, message_data: dict[str, Any] | None = None
+    ) -> None:
         """Save report data
 
         Args:
             item (Item): Item object
             job_id (str): Job id
+            message_data (dict[str, Any] | None): message data, which picks the
+                aggregated report file
         """
+        report_data: dict[str, Any] = self.build_report_data(item)
 
-        storage_service: StorageService = StorageService(  # Initialize storage service
-            storage_connection_string=STORAGE_CONNECTION_STRING
+        if self.report_mode == ReportMode.AGGREGATE:
+            blob_name: str = report_blob_name(
+                message_data or {}, report_writer.report_format
+            )
+            row: dict[str, Any] = {"Job ID": job_id, **report_data}
+            if self.buffered:  # appended in bulk
+                report_writer.add(blob_name, row)
+            else:
+                report_writer.write(blob_name, row)
+            return
+
+        if self.report_compression != Compression.NONE:
+            get_blob_service_client().get_blob_client(
+                container=REPORT_CONTAINER, blob=job_id + ".json"
+            ).upload_blob(
+                compress(json_codec.dumps_bytes(report_data), self.report_compression),
+                overwrite=True,
+                content_settings=report_content_settings(self.report_compression),
+            )
+            return
+
+        storage_service: StorageService = get_storage_service()  # shared service
+
+        storage_service.upload_blob_data(  # Save report to container
+            container_name=REPORT_CONTAINER,
+            blob_name=job_id + ".json",
+            data=json_codec.dumps(report_data),
         )
 
+    def when_reported(
+        self, message_data: dict[str, Any], callback: Callable[[], None]
+    ) -> None:
+        """Call back once the message's report is written
+
+        Aggregated report rows are buffered, so a job's report only counts as done,
+        in the ledger, once its rows have been appended to the report file.
+
+        Args:
+            message_data (dict[str, Any]): message data, which picks the
+                aggregated report file
+            callback (Callable[[], None]): called once the report is written
+        """
+        if self.report_mode == ReportMode.AGGREGATE:
+            report_writer.after_write(
+                report_blob_name(message_data, report_writer.report_format), callback
+            )
+            return
+
+        callback()
+
+    def when_notified(
+        self, message_data: dict[str, Any], callback: Callable[[], None]
+    ) -> None:
+        """Call back once the message's job has been announced
+
+        Coalesced notifications are sent as summaries, so a job only counts as
+        notified, in the ledger, once the summary listing it has been sent.
+
+        Args:
+            message_data (dict[str, Any]): message data
+            callback (Callable[[], None]): called once the job is announced
+        """
+        if self.notification_mode == NotificationMode.COALESCE:
+            notification_coalescer.after_send(message_data, callback)
+            return
+
+        callback()
+
+    def mark_done(
+        self, message_data: dict[str, Any], job_id: str, stage: Stage
+    ) -> None:
+        """Record a stage as done in the ledger once the message's report is written
+
+        Args:
+            message_data (dict[str, Any]): message data
+            job_id (str): Job id
+            stage (Stage): stage to record
+        """
+        self.when_reported(message_data, partial(self.ledger.mark, job_id, stage))
+
+    def flush_buffered(self) -> None:
+        """Write buffered report rows and send coalesced notifications now
+
+        Batch and manifest runs call it before they save their progress and before
+        their message is acknowledged, so nothing they buffered is lost if the
+        worker process is recycled.
+        """
+        if self.report_mode == ReportMode.AGGREGATE:
+            report_writer.flush()
+        if self.notification_mode == NotificationMode.COALESCE:
+            notification_coalescer.flush()
+
+    def build_report_data(self, item: Item) -> dict[str, Any]:
+        """Build the report row for an updated item
+
+        Args:
+            item (Item): Item object
+
+        Returns:
+            dict[str, Any]: report data
+        """
         report_data: dict[str, Any] = {  # Create report data
             "Title": item.bib_data.title,
             "Barcode": item.item_data.barcode,
@@ -211,11 +894,7 @@ class UpdateService:
         if item.item_data.provenance.desc:
             report_data["Provenance Code"] = item.item_data.provenance.desc
 
-        storage_service.upload_blob_data(  # Save report to container
-            container_name=REPORT_CONTAINER,
-            blob_name=job_id + ".json",
-            data=json.dumps(report_data),
-        )
+        return report_data
 
     def send_notification(self, message_data: dict[str, Any]) -> None:
         """Send notification about update
@@ -223,10 +902,47 @@ class UpdateService:
         Args:
             message_data (dict[str, Any]): message data
         """
-        storage_service: StorageService = StorageService(  # Initialize storage service
-            storage_connection_string=STORAGE_CONNECTION_STRING
-        )
+        if self.notification_mode == NotificationMode.COALESCE:  # sent as a summary
+            notification_coalescer.add(
+                message_data,
+                report_blob_name(message_data, report_writer.report_format)
+                if self.report_mode == ReportMode.AGGREGATE
+                else None,
+            )
+            return
+
+        storage_service: StorageService = get_storage_service()  # shared service
 
         storage_service.send_queue_message(  # Queue notification message
             queue_name=NOTIFICATION_QUEUE, message_content=message_data
         )
+
+
+def message_dimensions(message_data: Any) -> dict[str, str]:
+    """Get a message's metric dimensions, whatever shape the message is in
+
+    Args:
+        message_data (Any): decoded message
+
+    Returns:
+        dict[str, str]: metric dimensions
+    """
+    institution_id: Any = (
+        message_data.get("institution_id") if isinstance(message_data, dict) else None
+    )
+
+    return {"institution_id": str(institution_id)}
+
+
+def report_content_settings(compression: Compression) -> ContentSettings:
+    """Get the blob properties of a compressed per-job report
+
+    Args:
+        compression (Compression): report compression
+
+    Returns:
+        ContentSettings: JSON content, encoded with the compression
+    """
+    return ContentSettings(
+        content_type="application/json", content_encoding=str(compression)
+    )
@@ -0,0 +1 @@
+"""Performance benchmarks for alma_item_checks_update_service"""
@@ -0,0 +1,180 @@
+"""Cold-start import benchmark for the function app
+
+Runs ``python -X importtime -c "import function_app"`` in a fresh interpreter, prints
+the slowest imports and fails if the app's cumulative import time exceeds a budget.
+
+    python -m benchmarks.import_time --budget-ms 750
+"""
+
+import argparse
+import os
+import subprocess  # nosec B404
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+REPO_ROOT: Path = Path(__file__).resolve().parent.parent
+
+IMPORT_TIME_BUDGET_MS: float = float(os.getenv("IMPORT_TIME_BUDGET_MS", 750))
+
+HEAVY_MODULES: tuple[str, ...] = (  # must load on first use, not at app start
+    "wrlc_alma_api_client",
+    "wrlc_azure_storage_service",
+    "pydantic",
+    "requests",
+    "aiohttp",
+    "azure.storage.blob",
+    "azure.storage.queue",
+    "azure.data.tables",
+)
+
+
+@dataclass(frozen=True)
+class ImportTiming:
+    """One line of -X importtime output"""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> list[ImportTiming]:
+    """Parse -X importtime output
+
+    Args:
+        output (str): interpreter stderr
+
+    Returns:
+        list[ImportTiming]: one timing per imported module, in import order
+    """
+    timings: list[ImportTiming] = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields: list[str] = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name: str = fields[2].rstrip()
+        timings.append(
+            ImportTiming(
+                module=name.strip(),
+                self_us=int(fields[0]),
+                cumulative_us=int(fields[1]),
+                depth=(len(name) - len(name.lstrip())) // 2,
+            )
+        )
+
+    return timings
+
+
+def measure_imports(module: str = "function_app") -> list[ImportTiming]:
+    """Import a module in a fresh interpreter and time every import
+
+    Args:
+        module (str): module to import
+
+    Returns:
+        list[ImportTiming]: one timing per imported module, in import order
+    """
+    result: subprocess.CompletedProcess[str] = subprocess.run(  # nosec B603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    return parse_importtime(result.stderr)
+
+
+def imported_modules(module: str = "function_app") -> set[str]:
+    """Import a module in a fresh interpreter and list what ended up loaded
+
+    Args:
+        module (str): module to import
+
+    Returns:
+        set[str]: names in sys.modules after the import
+    """
+    result: subprocess.CompletedProcess[str] = subprocess.run(  # nosec B603
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module}; print(*sys.modules, sep=chr(10))",
+        ],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    return set(result.stdout.split())
+
+
+def cumulative_ms(timings: list[ImportTiming], module: str) -> float:
+    """Get a module's cumulative import time
+
+    Args:
+        timings (list[ImportTiming]): parsed timings
+        module (str): module name
+
+    Returns:
+        float: milliseconds spent importing the module and its dependencies
+    """
+    return next(t.cumulative_us for t in timings if t.module == module) / 1000
+
+
+def loaded_heavy_modules(timings: list[ImportTiming]) -> list[str]:
+    """Get the heavy modules an import pulled in
+
+    Args:
+        timings (list[ImportTiming]): parsed timings
+
+    Returns:
+        list[str]: heavy modules that were imported
+    """
+    imported: set[str] = {t.module for t in timings}
+
+    return [module for module in HEAVY_MODULES if module in imported]
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmark
+
+    Args:
+        argv (list[str] | None): command line arguments
+
+    Returns:
+        int: exit status, 1 if over budget or a heavy module is imported eagerly
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="function_app")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    runs: list[list[ImportTiming]] = [
+        measure_imports(args.module) for _ in range(max(args.repeat, 1))
+    ]
+    best: list[ImportTiming] = min(runs, key=lambda t: cumulative_ms(t, args.module))
+    total: float = cumulative_ms(best, args.module)
+
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for timing in sorted(best, key=lambda t: t.self_us, reverse=True)[: args.top]:
+        print(
+            f"{timing.self_us / 1000:9.1f} {timing.cumulative_us / 1000:9.1f}  "
+            f"{timing.module}"
+        )
+    print(f"\n{args.module}: {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    heavy: list[str] = loaded_heavy_modules(best)
+    if heavy:
+        print(f"Imported eagerly: {', '.join(heavy)}")
+
+    return 1 if total > args.budget_ms or heavy else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""CPU cost per item of building the Item model, full payload versus slim projection
+
+Times what every message pays between downloading the item blob and calling Alma:
+building the Item, serializing it for the PUT and building the report row.
+
+    python -m benchmarks.item_projection --items 2000
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any
+
+from benchmarks.json_codec import make_payload
+
+
+def cpu_per_item(
+    projection: str, payloads: list[dict[str, Any]], rounds: int
+) -> dict[str, float]:
+    """Measure CPU time per item for one projection
+
+    Args:
+        projection (str): "full" or "slim"
+        payloads (list[dict[str, Any]]): item payloads
+        rounds (int): passes over the payloads
+
+    Returns:
+        dict[str, float]: microseconds of CPU per item for each step and in total
+    """
+    from alma_item_checks_update_service.services.update_service import UpdateService
+
+    service: UpdateService = UpdateService(item_projection=projection)
+    spent: dict[str, float] = {"build": 0.0, "serialize": 0.0, "report": 0.0}
+
+    for _ in range(rounds):
+        for payload in payloads:
+            started: float = time.process_time()
+            item: Any = service.build_item(payload)
+            built: float = time.process_time()
+            if hasattr(item, "model_dump"):  # what the client sends to Alma
+                item.model_dump(mode="json", exclude_none=True)
+            serialized: float = time.process_time()
+            service.build_report_data(item)
+            reported: float = time.process_time()
+
+            spent["build"] += built - started
+            spent["serialize"] += serialized - built
+            spent["report"] += reported - serialized
+
+    count: int = len(payloads) * rounds
+    result: dict[str, float] = {
+        step: seconds / count * 1e6 for step, seconds in spent.items()
+    }
+    result["total"] = sum(result.values())
+
+    return result
+
+
+def run(items: int, rounds: int, marc_fields: int) -> dict[str, Any]:
+    """Compare the full and slim projections
+
+    Args:
+        items (int): distinct item payloads
+        rounds (int): passes over the payloads
+        marc_fields (int): MARC data fields in each payload's bib_data
+
+    Returns:
+        dict[str, Any]: per-item CPU microseconds for each projection
+    """
+    payloads: list[dict[str, Any]] = [
+        make_payload(n, marc_fields) for n in range(items)
+    ]
+
+    return {
+        "items": items,
+        "rounds": rounds,
+        "payload_bytes": len(json.dumps(payloads[0]).encode()),
+        "full": cpu_per_item("full", payloads, rounds),
+        "slim": cpu_per_item("slim", payloads, rounds),
+    }
+
+
+def print_report(result: dict[str, Any]) -> None:
+    """Print benchmark results as a table
+
+    Args:
+        result (dict[str, Any]): benchmark results
+    """
+    print(
+        f"{result['items']} items x {result['rounds']} rounds, "
+        f"{result['payload_bytes']} byte payloads (CPU us per item)\n"
+    )
+    print(f"{'projection':<12}{'build':>9}{'serialize':>11}{'report':>9}{'total':>9}")
+    for projection in ("full", "slim"):
+        stats: dict[str, float] = result[projection]
+        print(
+            f"{projection:<12}{stats['build']:>9.1f}{stats['serialize']:>11.1f}"
+            f"{stats['report']:>9.1f}{stats['total']:>9.1f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmark
+
+    Args:
+        argv (list[str] | None): command line arguments
+
+    Returns:
+        int: exit status
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--marc-fields", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    result: dict[str, Any] = run(args.items, args.rounds, args.marc_fields)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Micro-benchmark of the JSON codecs on representative item payloads
+
+Compares the old path (decode the body to str, then json.loads) with each codec
+decoding the bytes directly, and times encoding report rows.
+
+    python -m benchmarks.json_codec --rounds 2000
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+from benchmarks.stubs import make_item
+
+
+def make_payload(n: int = 0, marc_fields: int = 0) -> dict[str, Any]:
+    """Build an item payload, optionally with MARC-derived bib data
+
+    Args:
+        n (int): sequence number used to vary the values
+        marc_fields (int): MARC data fields to add to bib_data
+
+    Returns:
+        dict[str, Any]: item payload
+    """
+    payload: dict[str, Any] = make_item(f"23{n:010d}", n)
+    if marc_fields:
+        payload["bib_data"].update(
+            {
+                "author": "Benchmark, Author",
+                "isbn": "9780000000000",
+                "network_number": [f"(OCoLC){n}{i:06d}" for i in range(10)],
+                "anies": [
+                    "<record>"
+                    + "".join(
+                        f'<datafield tag="{500 + i % 400}" ind1=" " ind2=" ">'
+                        f'<subfield code="a">Note {i} for record {n}: '
+                        "Lorem ipsum dolor sit amet, consectetur adipiscing elit."
+                        "</subfield></datafield>"
+                        for i in range(marc_fields)
+                    )
+                    + "</record>"
+                ],
+            }
+        )
+
+    return payload
+
+
+def time_per_call(func: Callable[[], Any], rounds: int) -> float:
+    """Time a call, best of three runs
+
+    Args:
+        func (Callable[[], Any]): call to time
+        rounds (int): calls per run
+
+    Returns:
+        float: seconds per call
+    """
+    best: float = float("inf")
+    for _ in range(3):
+        started: float = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        best = min(best, (time.perf_counter() - started) / rounds)
+
+    return best
+
+
+def run(rounds: int, sizes: dict[str, int]) -> list[dict[str, Any]]:
+    """Time decoding and encoding with every available codec
+
+    Args:
+        rounds (int): calls per measurement
+        sizes (dict[str, int]): payload name to MARC data fields
+
+    Returns:
+        list[dict[str, Any]]: one row per payload, codec and operation
+    """
+    from alma_item_checks_update_service.services.json_codec import (
+        JsonCodec,
+        OrjsonJsonCodec,
+        StdlibJsonCodec,
+    )
+
+    codecs: list[JsonCodec] = [StdlibJsonCodec()]
+    try:
+        codecs.append(OrjsonJsonCodec())
+    except ImportError:
+        print("orjson isn't installed; timing the stdlib codec only", file=sys.stderr)
+
+    results: list[dict[str, Any]] = []
+    for name, marc_fields in sizes.items():
+        payload: dict[str, Any] = make_payload(1, marc_fields)
+        body: bytes = json.dumps(payload).encode()
+        row: dict[str, Any] = {"Job ID": "job", **payload["bib_data"]}
+        row_size: int = len(json.dumps(row).encode())
+
+        def record(
+            codec: str, operation: str, size: int, func: Callable[[], Any]
+        ) -> None:
+            seconds: float = time_per_call(func, rounds)
+            results.append(
+                {
+                    "payload": name,
+                    "bytes": size,
+                    "codec": codec,
+                    "operation": operation,
+                    "us": seconds * 1e6,
+                    "mb_s": size / seconds / 1e6 if seconds else 0.0,
+                }
+            )
+
+        record("str+json", "loads", len(body), lambda: json.loads(body.decode()))
+        for codec in codecs:
+            record(codec.name, "loads", len(body), lambda c=codec: c.loads(body))
+            record(codec.name, "dumps", row_size, lambda c=codec: c.dumps(row))
+
+    return results
+
+
+def print_report(results: list[dict[str, Any]]) -> None:
+    """Print benchmark results as a table
+
+    Args:
+        results (list[dict[str, Any]]): benchmark rows
+    """
+    print(f"{'payload':<10}{'bytes':>9}  {'codec':<10}{'op':<7}{'us':>10}{'MB/s':>9}")
+    for row in results:
+        print(
+            f"{row['payload']:<10}{row['bytes']:>9}  {row['codec']:<10}"
+            f"{row['operation']:<7}{row['us']:>10.1f}{row['mb_s']:>9.1f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmark
+
+    Args:
+        argv (list[str] | None): command line arguments
+
+    Returns:
+        int: exit status
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results: list[dict[str, Any]] = run(
+        args.rounds, {"minimal": 0, "typical": 40, "large": 400}
+    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""Local stand-ins for the Alma API, Institution API and Azure Storage"""
+
+import json
+import random
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import urlsplit, urlunsplit
+
+from azure.core.exceptions import ResourceNotFoundError
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+
+
+class StubBehavior:
+    """Latency and failure injected by a stub server"""
+
+    def __init__(
+        self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0
+    ) -> None:
+        """Initialize the behavior
+
+        Args:
+            latency_ms (float): base response latency
+            jitter_ms (float): extra latency, uniformly distributed up to this
+            error_rate (float): fraction of requests answered with a 503
+        """
+        self.latency_ms: float = latency_ms
+        self.jitter_ms: float = jitter_ms
+        self.error_rate: float = error_rate
+
+    def delay(self) -> None:
+        """Sleep for one response's latency"""
+        latency: float = self.latency_ms + random.uniform(0, self.jitter_ms)  # nosec B311
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def fails(self) -> bool:
+        """Whether the current request should fail
+
+        Returns:
+            bool: True to answer with a 503
+        """
+        return random.random() < self.error_rate  # nosec B311
+
+
+class StubServer:
+    """Threaded HTTP server running in the background"""
+
+    def __init__(self, handler: type[BaseHTTPRequestHandler], behavior: StubBehavior):
+        """Initialize the server on a free local port
+
+        Args:
+            handler (type[BaseHTTPRequestHandler]): request handler class
+            behavior (StubBehavior): latency and failures to inject
+        """
+        handler_class: type[BaseHTTPRequestHandler] = type(
+            handler.__name__, (handler,), {"behavior": behavior}
+        )
+        self.server: ThreadingHTTPServer = ThreadingHTTPServer(
+            ("127.0.0.1", 0), handler_class
+        )
+        self.server.daemon_threads = True
+        self.thread: threading.Thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubServer":
+        """Start serving
+
+        Returns:
+            StubServer: this server
+        """
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop serving"""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base handler that applies the server's latency and failures"""
+
+    behavior: StubBehavior = StubBehavior()
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real gateways
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Don't log every request"""
+
+    def respond(self, status: int, body: Any) -> None:
+        """Send a JSON response
+
+        Args:
+            status (int): HTTP status
+            body (Any): JSON body
+        """
+        data: bytes = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self) -> Any:
+        """Read the JSON request body
+
+        Returns:
+            Any: decoded body, or None if empty
+        """
+        length: int = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def inject(self) -> bool:
+        """Apply latency and maybe fail the request
+
+        Returns:
+            bool: True if a failure response was sent
+        """
+        self.behavior.delay()
+        if self.behavior.fails():
+            self.respond(503, {"errorsExist": True, "errorList": {"error": []}})
+            return True
+        return False
+
+
+class AlmaStubHandler(StubHandler):
+    """Alma items API: echoes PUT item records back, serves GETs with a stub item"""
+
+    def do_PUT(self) -> None:
+        """Update an item"""
+        body: Any = self.read_body()
+        if not self.inject():
+            self.respond(200, body)
+
+    def do_GET(self) -> None:
+        """Get an item"""
+        if not self.inject():
+            item_pid: str = self.path.split("?")[0].rstrip("/").split("/")[-1]
+            self.respond(200, make_item(item_pid))
+
+
+class InstitutionStubHandler(StubHandler):
+    """Institution API: GET /{institution_id}/api-key"""
+
+    def do_GET(self) -> None:
+        """Get an institution's API key"""
+        if not self.inject():
+            institution_id: str = self.path.split("?")[0].strip("/").split("/")[0]
+            self.respond(200, {"api_key": f"stub-key-{institution_id}"})
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Transport adapter that sends every request to another host
+
+    Mounted on an Alma client's session so the real client code talks to a stub
+    server, whatever base URL it builds.
+    """
+
+    def __init__(self, target: str, **kwargs: Any) -> None:
+        """Initialize the adapter
+
+        Args:
+            target (str): base URL requests are sent to
+            **kwargs (Any): HTTPAdapter arguments
+        """
+        super().__init__(**kwargs)
+        self.target = urlsplit(target)
+
+    def send(self, request: PreparedRequest, *args: Any, **kwargs: Any) -> Response:
+        """Rewrite the request's scheme and host, then send it
+
+        Args:
+            request (PreparedRequest): request to send
+            *args (Any): HTTPAdapter.send arguments
+            **kwargs (Any): HTTPAdapter.send keyword arguments
+
+        Returns:
+            Response: stub server response
+        """
+        url = urlsplit(str(request.url))
+        request.url = urlunsplit(
+            (self.target.scheme, self.target.netloc, url.path, url.query, "")
+        )
+        return super().send(request, *args, **kwargs)
+
+
+class InMemoryStorageService:
+    """Thread-safe in-memory stand-in for StorageService"""
+
+    def __init__(self, latency_ms: float = 0.0) -> None:
+        """Initialize the store
+
+        Args:
+            latency_ms (float): latency added to every call
+        """
+        self.latency_ms: float = latency_ms
+        self.blobs: dict[tuple[str, str], str] = {}
+        self.queues: dict[str, list[Any]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def download_blob_as_json(self, container_name: str, blob_name: str) -> Any:
+        """Download and parse a JSON blob
+
+        Args:
+            container_name (str): container
+            blob_name (str): blob
+
+        Returns:
+            Any: parsed blob, or None if it doesn't exist
+        """
+        self._delay()
+        with self._lock:
+            data: str | None = self.blobs.get((container_name, blob_name))
+
+        return json.loads(data) if data is not None else None
+
+    def upload_blob_data(
+        self, container_name: str, blob_name: str, data: Any, overwrite: bool = True
+    ) -> None:
+        """Upload a blob
+
+        Args:
+            container_name (str): container
+            blob_name (str): blob
+            data (Any): blob content
+            overwrite (bool): replace an existing blob
+        """
+        self._delay()
+        with self._lock:
+            self.blobs[(container_name, blob_name)] = (
+                data if isinstance(data, str) else json.dumps(data)
+            )
+
+    def get_blob_client(self, container: str, blob: str) -> "InMemoryBlobClient":
+        """Get a client for one blob, like BlobServiceClient.get_blob_client
+
+        Args:
+            container (str): container
+            blob (str): blob
+
+        Returns:
+            InMemoryBlobClient: blob client
+        """
+        return InMemoryBlobClient(self, container, blob)
+
+    def send_queue_message(self, queue_name: str, message_content: Any) -> None:
+        """Queue a message
+
+        Args:
+            queue_name (str): queue
+            message_content (Any): message
+        """
+        self._delay()
+        with self._lock:
+            self.queues.setdefault(queue_name, []).append(message_content)
+
+    def _delay(self) -> None:
+        """Sleep for one call's latency"""
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+
+
+class InMemoryBlobClient:
+    """Blob client reading from an InMemoryStorageService"""
+
+    def __init__(
+        self, storage_service: InMemoryStorageService, container: str, blob: str
+    ) -> None:
+        """Initialize the client
+
+        Args:
+            storage_service (InMemoryStorageService): backing store
+            container (str): container
+            blob (str): blob
+        """
+        self.storage_service: InMemoryStorageService = storage_service
+        self.key: tuple[str, str] = (container, blob)
+
+    def download_blob(self) -> "InMemoryBlobClient":
+        """Start a download; the client doubles as its downloader
+
+        Returns:
+            InMemoryBlobClient: this client
+        """
+        return self
+
+    def readall(self) -> bytes:
+        """Read the whole blob
+
+        Returns:
+            bytes: blob content
+
+        Raises:
+            ResourceNotFoundError: if the blob doesn't exist
+        """
+        self.storage_service._delay()
+        with self.storage_service._lock:
+            data: str | None = self.storage_service.blobs.get(self.key)
+
+        if data is None:
+            raise ResourceNotFoundError(f"Blob {self.key[1]} not found")
+
+        return data.encode()
+
+    def chunks(self) -> Iterator[bytes]:
+        """Read the blob as a stream of chunks
+
+        Yields:
+            bytes: blob content, in one chunk
+
+        Raises:
+            ResourceNotFoundError: if the blob doesn't exist
+        """
+        yield self.readall()
+
+
+def make_item(item_pid: str, n: int = 0) -> dict[str, Any]:
+    """Build an item payload like the ones in UPDATED_ITEMS_CONTAINER
+
+    Args:
+        item_pid (str): item PID
+        n (int): sequence number used to vary the values
+
+    Returns:
+        dict[str, Any]: item payload
+    """
+    return {
+        "bib_data": {"title": f"Benchmark Title {n}", "mms_id": f"99{n:010d}"},
+        "holding_data": {
+            "holding_id": f"22{n:010d}",
+            "library": {"value": "MAIN", "desc": "Main Library"},
+        },
+        "item_data": {
+            "pid": item_pid,
+            "barcode": f"3{n:011d}",
+            "alternative_call_number": f"BENCH {n}",
+            "internal_note_1": "benchmark",
+            "provenance": {"value": "BENCH", "desc": "Benchmark"},
+        },
+        "link": f"https://api-na.hosted.exlibrisgroup.com/almaws/v1/items/{item_pid}",
+    }
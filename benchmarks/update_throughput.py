@@ -0,0 +1,298 @@
+"""Throughput benchmark for the UpdateService pipeline
+
+Runs the real ``UpdateService.update_item`` path, including the Alma client, retries,
+rate limiting and circuit breakers, against local stub servers for the Alma and
+Institution APIs and an in-memory storage service. Reports items/sec, end-to-end
+latency percentiles and a per-stage breakdown.
+
+    python -m benchmarks.update_throughput --items 1000 --workers 16
+
+Settings are read from the environment when the service package is first imported,
+so run the benchmark as a script rather than importing it into a test session.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from unittest.mock import patch
+
+from benchmarks.stubs import (
+    AlmaStubHandler,
+    InMemoryStorageService,
+    InstitutionStubHandler,
+    RedirectAdapter,
+    StubBehavior,
+    StubServer,
+    make_item,
+)
+
+STAGES: tuple[str, ...] = (  # UpdateService methods timed as stages
+    "get_item_data",
+    "get_api_key",
+    "update_alma_item",
+    "save_report",
+    "send_notification",
+)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Get a nearest-rank percentile
+
+    Args:
+        samples (list[float]): samples, in any order
+        pct (float): percentile, 0-100
+
+    Returns:
+        float: the percentile, or 0 with no samples
+    """
+    if not samples:
+        return 0.0
+
+    ordered: list[float] = sorted(samples)
+    rank: int = max(math.ceil(pct / 100 * len(ordered)), 1)
+
+    return ordered[rank - 1]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Summarize latency samples in milliseconds
+
+    Args:
+        samples (list[float]): latencies in seconds
+
+    Returns:
+        dict[str, float]: count, mean, p50, p95, p99 and max
+    """
+    ms: list[float] = [sample * 1000 for sample in samples]
+
+    return {
+        "count": len(ms),
+        "mean": sum(ms) / len(ms) if ms else 0.0,
+        "p50": percentile(ms, 50),
+        "p95": percentile(ms, 95),
+        "p99": percentile(ms, 99),
+        "max": max(ms, default=0.0),
+    }
+
+
+class StageTimer:
+    """Thread-safe collection of per-stage latencies"""
+
+    def __init__(self) -> None:
+        """Initialize the timer"""
+        self.samples: dict[str, list[float]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Record one stage latency
+
+        Args:
+            stage (str): stage name
+            seconds (float): latency
+        """
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap a function so each call is recorded as a stage
+
+        Args:
+            stage (str): stage name
+            func (Callable[..., Any]): function to time
+
+        Returns:
+            Callable[..., Any]: timed function
+        """
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            started: float = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        return timed
+
+
+def configure_environment(args: argparse.Namespace, institution_url: str) -> None:
+    """Point the service's settings at the stubs before it is imported
+
+    Args:
+        args (argparse.Namespace): benchmark arguments
+        institution_url (str): Institution API stub URL
+    """
+    os.environ["INSTITUTION_API_ENDPOINT"] = institution_url
+    os.environ["INSTITUTION_API_KEY"] = "benchmark"
+    os.environ["ALMA_RATE_LIMIT_PER_SECOND"] = str(args.rate_limit)
+    os.environ["ALMA_RATE_LIMIT_BURST"] = str(max(args.rate_limit, 1))
+    os.environ.setdefault("RETRY_BASE_DELAY", "0.05")
+    os.environ.setdefault("RETRY_MAX_DELAY", "0.5")
+
+
+def run(args: argparse.Namespace, alma_url: str) -> dict[str, Any]:
+    """Push every item through UpdateService.update_item
+
+    Args:
+        args (argparse.Namespace): benchmark arguments
+        alma_url (str): Alma API stub URL
+
+    Returns:
+        dict[str, Any]: benchmark results
+    """
+    import azure.functions as func
+
+    from alma_item_checks_update_service.config import UPDATED_ITEMS_CONTAINER
+    from alma_item_checks_update_service.services import storage
+    from alma_item_checks_update_service.services.alma_client_registry import (
+        AlmaClientRegistry,
+    )
+    from alma_item_checks_update_service.services.update_service import UpdateService
+
+    storage_service: InMemoryStorageService = InMemoryStorageService(
+        latency_ms=args.storage_latency_ms
+    )
+    messages: list[bytes] = []
+    for n in range(args.items):
+        job_id: str = f"bench-{n}"
+        storage_service.upload_blob_data(
+            UPDATED_ITEMS_CONTAINER, job_id + ".json", make_item(f"23{n:010d}", n)
+        )
+        messages.append(
+            json.dumps(
+                {"job_id": job_id, "institution_id": str(n % args.institutions + 1)}
+            ).encode()
+        )
+
+    timer: StageTimer = StageTimer()
+    configure_pool: Callable[..., None] = AlmaClientRegistry._configure_pool
+
+    def redirect_pool(registry: AlmaClientRegistry, client: Any) -> None:
+        configure_pool(registry, client)
+        adapter: RedirectAdapter = RedirectAdapter(
+            alma_url,
+            pool_connections=registry.pool_size,
+            pool_maxsize=registry.pool_size,
+        )
+        client.session.mount("https://", adapter)
+        client.session.mount("http://", adapter)
+
+    def update(body: bytes) -> tuple[str, float]:
+        service: UpdateService = UpdateService(func.QueueMessage(body=body))
+        for stage in STAGES:
+            setattr(service, stage, timer.wrap(stage, getattr(service, stage)))
+
+        started: float = time.perf_counter()
+        try:
+            outcome: str = str(service.update_item())
+        except Exception:  # counted, not fatal to the run
+            outcome = "exception"
+
+        return outcome, time.perf_counter() - started
+
+    with (
+        patch.object(storage, "_storage_service", storage_service),
+        patch.object(storage, "_blob_service_client", storage_service),
+        patch.object(AlmaClientRegistry, "_configure_pool", redirect_pool),
+    ):
+        started: float = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results: list[tuple[str, float]] = list(executor.map(update, messages))
+        elapsed: float = time.perf_counter() - started
+
+    return {
+        "items": args.items,
+        "workers": args.workers,
+        "elapsed_s": elapsed,
+        "items_per_s": args.items / elapsed if elapsed else 0.0,
+        "outcomes": dict(Counter(outcome for outcome, _ in results)),
+        "latency_ms": summarize([latency for _, latency in results]),
+        "stages_ms": {
+            stage: summarize(timer.samples.get(stage, [])) for stage in STAGES
+        },
+    }
+
+
+def print_report(result: dict[str, Any]) -> None:
+    """Print benchmark results as a table
+
+    Args:
+        result (dict[str, Any]): benchmark results
+    """
+    print(
+        f"{result['items']} items, {result['workers']} workers: "
+        f"{result['items_per_s']:.1f} items/s in {result['elapsed_s']:.2f}s"
+    )
+    print(f"outcomes: {result['outcomes']}\n")
+    print(f"{'stage':<20}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    rows: dict[str, dict[str, float]] = {
+        "update_item": result["latency_ms"],
+        **result["stages_ms"],
+    }
+    for stage, stats in rows.items():
+        print(
+            f"{stage:<20}{stats['count']:>7.0f}{stats['mean']:>9.1f}"
+            f"{stats['p50']:>9.1f}{stats['p95']:>9.1f}{stats['p99']:>9.1f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmark
+
+    Args:
+        argv (list[str] | None): command line arguments
+
+    Returns:
+        int: exit status
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--institutions", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--alma-latency-ms", type=float, default=50)
+    parser.add_argument("--alma-jitter-ms", type=float, default=20)
+    parser.add_argument("--alma-error-rate", type=float, default=0.0)
+    parser.add_argument("--key-latency-ms", type=float, default=20)
+    parser.add_argument("--key-error-rate", type=float, default=0.0)
+    parser.add_argument("--storage-latency-ms", type=float, default=2)
+    parser.add_argument(
+        "--rate-limit", type=float, default=0, help="Alma calls/s per institution"
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+
+    with (
+        StubServer(
+            AlmaStubHandler,
+            StubBehavior(
+                args.alma_latency_ms, args.alma_jitter_ms, args.alma_error_rate
+            ),
+        ) as alma,
+        StubServer(
+            InstitutionStubHandler,
+            StubBehavior(args.key_latency_ms, error_rate=args.key_error_rate),
+        ) as institution,
+    ):
+        configure_environment(args, institution.url)
+        result: dict[str, Any] = run(args, alma.url)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,10 @@
 import azure.functions as func
 
 from alma_item_checks_update_service.blueprints.bp_update import bp as bp_update
+from alma_item_checks_update_service.services.api_key_warmup import start_api_key_warmup
 
 app = func.FunctionApp()
 
 app.register_blueprint(bp_update)
+
+start_api_key_warmup()  # fetch configured institutions' API keys
@@ -1,10 +1,16 @@
 """Integration tests for bp_update blueprint"""
+import asyncio
 import json
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 import pytest
 import azure.functions as func
 
-from alma_item_checks_update_service.blueprints.bp_update import alma_item_update
+from alma_item_checks_update_service.blueprints.bp_update import (
+    alma_item_update,
+    alma_item_update_async,
+    alma_item_update_batch,
+    alma_item_update_manifest,
+)
 
 
 class TestBpUpdate:
@@ -15,11 +21,10 @@ class TestBpUpdate:
         """Mock Azure Functions queue message fixture"""
         mock_msg = Mock(spec=func.QueueMessage)
         test_data = {"job_id": "integration-test-123", "institution_id": "67890"}
-        mock_msg.get_body.return_value = Mock()
-        mock_msg.get_body.return_value.decode.return_value = json.dumps(test_data)
+        mock_msg.get_body.return_value = json.dumps(test_data).encode()
         return mock_msg
 
-    @patch('alma_item_checks_update_service.blueprints.bp_update.UpdateService')
+    @patch('alma_item_checks_update_service.services.update_service.UpdateService')
     def test_alma_item_update_integration(self, mock_update_service_class, mock_queue_message):
         """Test the Azure Function entry point integration
 
@@ -41,14 +46,13 @@ class TestBpUpdate:
         # Verify update_item was called on the service instance
         mock_update_service_instance.update_item.assert_called_once()
 
-    @patch('alma_item_checks_update_service.blueprints.bp_update.UpdateService')
+    @patch('alma_item_checks_update_service.services.update_service.UpdateService')
     def test_alma_item_update_with_different_message(self, mock_update_service_class):
         """Test alma_item_update with a different queue message structure"""
         # Create a different mock message
         mock_msg = Mock(spec=func.QueueMessage)
         test_data = {"job_id": "different-test-456", "institution_id": "11111"}
-        mock_msg.get_body.return_value = Mock()
-        mock_msg.get_body.return_value.decode.return_value = json.dumps(test_data)
+        mock_msg.get_body.return_value = json.dumps(test_data).encode()
 
         # Setup mock UpdateService instance
         mock_update_service_instance = Mock()
@@ -61,7 +65,7 @@ class TestBpUpdate:
         mock_update_service_class.assert_called_once_with(mock_msg)
         mock_update_service_instance.update_item.assert_called_once()
 
-    @patch('alma_item_checks_update_service.blueprints.bp_update.UpdateService')
+    @patch('alma_item_checks_update_service.services.update_service.UpdateService')
     def test_alma_item_update_service_exception_propagates(self, mock_update_service_class):
         """Test that exceptions from UpdateService are properly propagated"""
         mock_msg = Mock(spec=func.QueueMessage)
@@ -78,3 +82,46 @@ class TestBpUpdate:
         # Verify the service was still properly instantiated and called
         mock_update_service_class.assert_called_once_with(mock_msg)
         mock_update_service_instance.update_item.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.batch_service.BatchUpdateService')
+    def test_alma_item_update_batch(self, mock_batch_service_class):
+        """Test the batch Azure Function entry point"""
+        mock_msg = Mock(spec=func.QueueMessage)
+        mock_batch_service_instance = Mock()
+        mock_batch_service_class.from_queue_message.return_value = mock_batch_service_instance
+
+        alma_item_update_batch(mock_msg)
+
+        mock_batch_service_class.from_queue_message.assert_called_once_with(mock_msg)
+        mock_batch_service_instance.process.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.manifest_service.ManifestUpdateService')
+    def test_alma_item_update_manifest(self, mock_manifest_service_class):
+        """Test the manifest Azure Function entry point"""
+        mock_msg = Mock(spec=func.QueueMessage)
+        mock_manifest_service_instance = Mock()
+        mock_manifest_service_class.from_queue_message.return_value = mock_manifest_service_instance
+
+        alma_item_update_manifest(mock_msg)
+
+        mock_manifest_service_class.from_queue_message.assert_called_once_with(mock_msg)
+        mock_manifest_service_instance.process.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.manifest_service.ManifestUpdateService')
+    def test_alma_item_update_manifest_invalid(self, mock_manifest_service_class):
+        """Test that a dead-lettered manifest message isn't processed"""
+        mock_manifest_service_class.from_queue_message.return_value = None
+
+        alma_item_update_manifest(Mock(spec=func.QueueMessage))
+
+    @patch('alma_item_checks_update_service.services.async_update_service.AsyncUpdateService')
+    def test_alma_item_update_async(self, mock_async_service_class, mock_queue_message):
+        """Test the asyncio Azure Function entry point"""
+        mock_async_service_instance = Mock()
+        mock_async_service_instance.update_item = AsyncMock()
+        mock_async_service_class.return_value = mock_async_service_instance
+
+        asyncio.run(alma_item_update_async(mock_queue_message))
+
+        mock_async_service_class.assert_called_once_with(mock_queue_message)
+        mock_async_service_instance.update_item.assert_awaited_once()
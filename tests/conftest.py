@@ -0,0 +1,42 @@
+"""Shared test fixtures"""
+import pytest
+
+from alma_item_checks_update_service.services.alma_client_registry import alma_client_registry
+from alma_item_checks_update_service.services.api_key_cache import api_key_cache
+from alma_item_checks_update_service.services.circuit_breaker import alma_circuit_breakers
+from alma_item_checks_update_service.services.concurrency_limiter import alma_concurrency_limiter
+from alma_item_checks_update_service.services.idempotency import reset_ledger
+from alma_item_checks_update_service.services.item_diff import item_fingerprints
+from alma_item_checks_update_service.services.metrics import update_metrics
+from alma_item_checks_update_service.services.notification_coalescer import notification_coalescer
+from alma_item_checks_update_service.services.rate_limiter import alma_rate_limiter
+from alma_item_checks_update_service.services.report_writer import report_writer
+from alma_item_checks_update_service.services.storage import reset_storage_service
+
+
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    """Reset process-wide caches so tests don't leak state into each other"""
+    api_key_cache.clear()
+    alma_client_registry.clear()
+    alma_rate_limiter.clear()
+    alma_circuit_breakers.clear()
+    alma_concurrency_limiter.clear()
+    item_fingerprints.clear()
+    report_writer.clear()
+    notification_coalescer.clear()
+    reset_storage_service()
+    reset_ledger()
+    update_metrics.clear()
+    yield
+    api_key_cache.clear()
+    alma_client_registry.clear()
+    alma_rate_limiter.clear()
+    alma_circuit_breakers.clear()
+    alma_concurrency_limiter.clear()
+    item_fingerprints.clear()
+    report_writer.clear()
+    notification_coalescer.clear()
+    reset_storage_service()
+    reset_ledger()
+    update_metrics.clear()
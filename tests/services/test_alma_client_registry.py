@@ -0,0 +1,69 @@
+"""Unit tests for AlmaClientRegistry"""
+from unittest.mock import Mock, patch
+
+import requests
+
+from alma_item_checks_update_service.services.alma_client_registry import AlmaClientRegistry
+
+
+class TestAlmaClientRegistry:
+    """Test class for AlmaClientRegistry"""
+
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_get_client_reuses_client(self, mock_alma_client):
+        """Test that an institution's client is built once and reused"""
+        registry = AlmaClientRegistry(pool_size=4)
+
+        first = registry.get_client(1, "key-1")
+        second = registry.get_client(1, "key-1")
+
+        assert first is second
+        mock_alma_client.assert_called_once_with(api_key="key-1", region="NA", timeout=90)
+
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_get_client_per_institution(self, mock_alma_client):
+        """Test that each institution gets its own client"""
+        mock_alma_client.side_effect = [Mock(), Mock()]
+        registry = AlmaClientRegistry(pool_size=4)
+
+        assert registry.get_client(1, "key-1") is not registry.get_client(2, "key-2")
+
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_get_client_rebuilds_on_key_change(self, mock_alma_client):
+        """Test that a rotated API key replaces the client and closes the old session"""
+        old_client, new_client = Mock(), Mock()
+        old_client.session = Mock(spec=requests.Session)
+        mock_alma_client.side_effect = [old_client, new_client]
+        registry = AlmaClientRegistry(pool_size=4)
+
+        registry.get_client(1, "old-key")
+        result = registry.get_client(1, "new-key")
+
+        assert result is new_client
+        old_client.session.close.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_get_client_sizes_session_pool(self, mock_alma_client):
+        """Test that the client's HTTP session gets a pool of the configured size"""
+        client = Mock()
+        client.session = requests.Session()
+        mock_alma_client.return_value = client
+        registry = AlmaClientRegistry(pool_size=7)
+
+        registry.get_client(1, "key-1")
+
+        adapter = client.session.get_adapter("https://api-na.hosted.exlibrisgroup.com")
+        assert adapter._pool_maxsize == 7
+
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_remove_and_clear(self, mock_alma_client):
+        """Test that removed clients are rebuilt on next use"""
+        registry = AlmaClientRegistry(pool_size=4)
+
+        registry.get_client(1, "key-1")
+        registry.remove(1)
+        registry.get_client(1, "key-1")
+        registry.clear()
+        registry.get_client(1, "key-1")
+
+        assert mock_alma_client.call_count == 3
@@ -0,0 +1,121 @@
+"""Unit tests for ApiKeyCache"""
+import asyncio
+import threading
+from unittest.mock import Mock, patch
+
+from alma_item_checks_update_service.services.api_key_cache import ApiKeyCache
+from alma_item_checks_update_service.services.metrics import InMemoryMetricsHook, update_metrics
+
+
+class TestApiKeyCache:
+    """Test class for ApiKeyCache"""
+
+    def test_get_or_load_miss_then_hit(self):
+        """Test that a loaded key is served from cache on the next call"""
+        cache = ApiKeyCache(ttl=60, negative_ttl=5)
+        loader = Mock(return_value="key-1")
+
+        assert cache.get_or_load(1, loader) == "key-1"
+        assert cache.get_or_load(1, loader) == "key-1"
+
+        loader.assert_called_once_with(1)
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    @patch('alma_item_checks_update_service.services.api_key_cache.time')
+    def test_entry_expires_after_ttl(self, mock_time):
+        """Test that a key is reloaded once its TTL has passed"""
+        mock_time.monotonic.return_value = 100.0
+        cache = ApiKeyCache(ttl=60, negative_ttl=5)
+        loader = Mock(side_effect=["old-key", "new-key"])
+
+        assert cache.get_or_load(1, loader) == "old-key"
+        mock_time.monotonic.return_value = 161.0
+        assert cache.get_or_load(1, loader) == "new-key"
+
+        assert loader.call_count == 2
+
+    @patch('alma_item_checks_update_service.services.api_key_cache.time')
+    def test_negative_result_uses_short_ttl(self, mock_time):
+        """Test that failed lookups are cached for negative_ttl only"""
+        mock_time.monotonic.return_value = 100.0
+        cache = ApiKeyCache(ttl=60, negative_ttl=5)
+        loader = Mock(side_effect=[None, "key-1"])
+
+        assert cache.get_or_load(1, loader) is None
+        mock_time.monotonic.return_value = 104.0
+        assert cache.get_or_load(1, loader) is None  # still negatively cached
+        mock_time.monotonic.return_value = 106.0
+        assert cache.get_or_load(1, loader) == "key-1"
+
+        assert loader.call_count == 2
+
+    def test_invalidate(self):
+        """Test that invalidate forces a reload"""
+        cache = ApiKeyCache(ttl=60, negative_ttl=5)
+        loader = Mock(side_effect=["old-key", "new-key"])
+
+        cache.get_or_load(1, loader)
+        cache.invalidate(1)
+
+        assert cache.get_or_load(1, loader) == "new-key"
+
+    def test_clear_resets_counters(self):
+        """Test that clear drops entries and counters"""
+        cache = ApiKeyCache(ttl=60, negative_ttl=5)
+        cache.get_or_load(1, Mock(return_value="key-1"))
+
+        cache.clear()
+
+        assert cache.stats() == {"hits": 0, "misses": 0, "size": 0}
+
+    def test_concurrent_misses_load_once(self):
+        """Test that concurrent callers share a single load"""
+        cache = ApiKeyCache(ttl=60, negative_ttl=5)
+        release = threading.Event()
+        loader = Mock(side_effect=lambda _: release.wait(1) and "key-1")
+        results: list[str | None] = []
+
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_load(1, loader)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        loader.assert_called_once_with(1)
+        assert results == ["key-1"] * 5
+
+    def test_concurrent_async_misses_load_once(self):
+        """Test that concurrent tasks share a single async load"""
+        cache = ApiKeyCache(ttl=60, negative_ttl=5)
+        calls = []
+
+        async def loader(institution_id):
+            calls.append(institution_id)
+            await asyncio.sleep(0.01)
+            return "key-1"
+
+        async def run():
+            return await asyncio.gather(*(cache.get_or_load_async(1, loader) for _ in range(5)))
+
+        assert asyncio.run(run()) == ["key-1"] * 5
+        assert calls == [1]
+        assert asyncio.run(cache.get_or_load_async(1, loader)) == "key-1"  # now cached
+        assert calls == [1]
+
+    def test_stats_reported_as_gauges_on_load(self):
+        """Test that loading a key reports the cache's stats to the metrics hooks"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+        cache = ApiKeyCache(ttl=60, negative_ttl=5)
+
+        cache.get_or_load(1, lambda _: "key-1")
+
+        assert hook.gauges == {
+            ("api_key_cache_hits", ()): 0,
+            ("api_key_cache_misses", ()): 1,
+            ("api_key_cache_size", ()): 1,
+        }
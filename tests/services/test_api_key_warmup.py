@@ -0,0 +1,60 @@
+"""Unit tests for API key warm-up"""
+import threading
+from unittest.mock import patch
+
+from alma_item_checks_update_service.services.api_key_cache import api_key_cache
+from alma_item_checks_update_service.services.api_key_warmup import (
+    parse_institution_ids,
+    start_api_key_warmup,
+    warm_api_keys,
+)
+
+
+class TestApiKeyWarmup:
+    """Test class for API key warm-up"""
+
+    def test_parse_institution_ids(self):
+        """Test that blanks and invalid entries are skipped"""
+        assert parse_institution_ids(" 1, 2,,abc,3 ") == [1, 2, 3]
+        assert parse_institution_ids("") == []
+
+    @patch('alma_item_checks_update_service.services.update_service.UpdateService')
+    def test_warm_api_keys(self, mock_update_service_class):
+        """Test that keys are fetched in parallel and cached"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fetch(institution_id):
+            barrier.wait()  # only passes once all three lookups run at once
+            return None if institution_id == 3 else f"key-{institution_id}"
+
+        mock_update_service_class.return_value.fetch_api_key.side_effect = fetch
+
+        assert warm_api_keys([1, 2, 3], concurrency=3) == {1: True, 2: True, 3: False}
+        assert api_key_cache.lookup(1, count=False) == (True, "key-1")
+        assert api_key_cache.lookup(3, count=False) == (True, None)  # negative cached
+
+    @patch('alma_item_checks_update_service.services.update_service.UpdateService')
+    def test_warm_api_keys_skips_cached(self, mock_update_service_class):
+        """Test that institutions already cached aren't fetched again"""
+        api_key_cache.set(1, "cached-key")
+        mock_update_service_class.return_value.fetch_api_key.return_value = "key-2"
+
+        warm_api_keys([1, 2], concurrency=2)
+
+        mock_update_service_class.return_value.fetch_api_key.assert_called_once_with(2)
+
+    def test_warm_api_keys_nothing_to_warm(self):
+        """Test that an empty list does nothing"""
+        assert warm_api_keys([], concurrency=4) == {}
+
+    @patch('alma_item_checks_update_service.services.api_key_warmup.warm_api_keys')
+    def test_start_api_key_warmup(self, mock_warm_api_keys):
+        """Test that warm-up runs in a background thread"""
+        thread = start_api_key_warmup("1,2", concurrency=4)
+        thread.join(timeout=5)
+
+        mock_warm_api_keys.assert_called_once_with([1, 2], 4)
+
+    def test_start_api_key_warmup_not_configured(self):
+        """Test that no thread is started without configured institutions"""
+        assert start_api_key_warmup("", concurrency=4) is None
@@ -0,0 +1,386 @@
+"""Unit tests for AsyncUpdateService"""
+import asyncio
+import gzip
+import json
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import azure.functions as func
+import pytest
+
+from alma_item_checks_update_service.services.api_key_cache import api_key_cache
+from alma_item_checks_update_service.services.async_update_service import AsyncUpdateService
+from alma_item_checks_update_service.services.circuit_breaker import alma_circuit_breakers
+from alma_item_checks_update_service.services.compression import Compression, DecompressionError
+from alma_item_checks_update_service.services.concurrency_limiter import ConcurrencyLimitTimeout
+from alma_item_checks_update_service.services.idempotency import InMemoryIdempotencyStore, Stage
+from alma_item_checks_update_service.services.item_diff import DiffMode
+from alma_item_checks_update_service.services.message_validation import InvalidReason
+from alma_item_checks_update_service.services.metrics import InMemoryMetricsHook, PipelineStage, update_metrics
+from alma_item_checks_update_service.services.notification_coalescer import NotificationMode
+from alma_item_checks_update_service.services.report_writer import ReportMode
+from alma_item_checks_update_service.services.update_service import UpdateOutcome, UpdateService
+
+
+async def async_chunks(*chunks):
+    """Stream chunks like an async blob downloader"""
+    for chunk in chunks:
+        yield chunk
+
+
+class TestAsyncUpdateService:
+    """Test class for AsyncUpdateService"""
+
+    @pytest.fixture
+    def mock_queue_message(self):
+        """Mock queue message fixture"""
+        mock_msg = Mock(spec=func.QueueMessage)
+        test_data = {"job_id": "test-job-123", "institution_id": "12345"}
+        mock_msg.get_body.return_value = json.dumps(test_data).encode()
+        return mock_msg
+
+    @pytest.fixture
+    def service(self, mock_queue_message):
+        """AsyncUpdateService fixture with the sync helpers mocked"""
+        service = AsyncUpdateService(mock_queue_message)
+        service.update_service = Mock()
+        service.update_service.diff_mode = DiffMode.OFF
+        service.update_service.ledger = InMemoryIdempotencyStore()
+        service.update_service.report_mode = ReportMode.ITEM
+        service.update_service.report_compression = Compression.NONE
+        service.update_service.notification_mode = NotificationMode.ITEM
+        service.update_service.get_item_ids.return_value = ("mms", "holding", "pid")
+        service.update_service.validate_item.side_effect = \
+            lambda full_item: UpdateService.validate_item(service.update_service, full_item)
+        service.update_service.reject_message.side_effect = \
+            lambda payload, error: UpdateService.reject_message(service.update_service, payload, error)
+        service.update_service.reject_undecodable.side_effect = \
+            lambda body, error: UpdateService.reject_undecodable(service.update_service, body, error)
+        service.update_service.update_alma_item.return_value = True
+        service.update_service.mark_done.side_effect = \
+            lambda message_data, job_id, stage: service.update_service.ledger.mark(job_id, stage)
+        service.update_service.when_notified.side_effect = lambda message_data, callback: callback()
+        return service
+
+    def test_update_item_success(self, service):
+        """Test the full async pipeline"""
+        with patch.object(service, 'get_item_data', AsyncMock(return_value={"item_data": {}})), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value="test-api-key")), \
+             patch.object(service, 'save_report', AsyncMock()) as mock_save_report, \
+             patch.object(service, 'send_notification', AsyncMock()) as mock_send_notification:
+
+            outcome = asyncio.run(service.update_item())
+
+        assert outcome == UpdateOutcome.UPDATED
+        service.update_service.update_alma_item.assert_called_once_with(
+            12345, "test-api-key", "mms", "holding", "pid", service.update_service.build_item.return_value
+        )
+        mock_save_report.assert_awaited_once_with(
+            service.update_service.build_item.return_value, "test-job-123",
+            {"job_id": "test-job-123", "institution_id": "12345"}
+        )
+        mock_send_notification.assert_awaited_once_with({"job_id": "test-job-123", "institution_id": "12345"})
+
+    def test_blob_and_key_fetched_concurrently(self, service):
+        """Test that the blob download and key lookup overlap"""
+        both_started = asyncio.Event()
+        started: list[str] = []
+
+        async def fetch(name, result):
+            started.append(name)
+            if len(started) == 2:
+                both_started.set()
+            await asyncio.wait_for(both_started.wait(), timeout=1)  # fails if run serially
+            return result
+
+        with patch.object(service, 'get_item_data', lambda job_id: fetch("blob", {"item_data": {}})), \
+             patch.object(service, 'get_api_key', lambda institution_id: fetch("key", "test-api-key")), \
+             patch.object(service, 'save_report', AsyncMock()), \
+             patch.object(service, 'send_notification', AsyncMock()):
+
+            assert asyncio.run(service.update_item()) == UpdateOutcome.UPDATED
+
+        assert sorted(started) == ["blob", "key"]
+
+    @pytest.mark.parametrize("message_data,item,api_key,alma_ok,expected", [
+        ({"job_id": None}, {}, "key", True, UpdateOutcome.MISSING_JOB_ID),
+        ({"job_id": "job", "institution_id": None}, {}, "key", True, UpdateOutcome.MISSING_INSTITUTION_ID),
+        ({"job_id": "job", "institution_id": "1"}, None, "key", True, UpdateOutcome.ITEM_NOT_FOUND),
+        ({"job_id": "job", "institution_id": "1"}, {}, None, True, UpdateOutcome.NO_KEY),
+        ({"job_id": "job", "institution_id": "1"}, {}, "key", False, UpdateOutcome.ALMA_FAILED),
+    ])
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
+    @patch('alma_item_checks_update_service.services.async_update_service.logging')
+    def test_process_message_failures(self, mock_logging, mock_dead_letter, service, message_data, item, api_key, alma_ok, expected):
+        """Test each early exit of the async pipeline"""
+        service.update_service.update_alma_item.return_value = alma_ok
+
+        with patch.object(service, 'get_item_data', AsyncMock(return_value=item)), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value=api_key)), \
+             patch.object(service, 'save_report', AsyncMock()) as mock_save_report:
+
+            assert asyncio.run(service.process_message(message_data)) == expected
+
+        mock_save_report.assert_not_awaited()
+
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
+    def test_process_message_missing_ids(self, mock_dead_letter, service):
+        """Test that missing Alma IDs stop the pipeline"""
+        service.update_service.get_item_ids.return_value = (None, "holding", "pid")
+
+        with patch.object(service, 'get_item_data', AsyncMock(return_value={})), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value="key")):
+
+            outcome = asyncio.run(service.process_message({"job_id": "job", "institution_id": "1"}))
+
+        assert outcome == UpdateOutcome.MISSING_IDS
+        mock_dead_letter.assert_called_once()
+
+    def test_process_message_unchanged(self, service):
+        """Test that an unchanged item skips the PUT but is still reported"""
+        service.update_service.diff_mode = DiffMode.FINGERPRINT
+        service.update_service.is_unchanged.return_value = True
+
+        with patch.object(service, 'get_item_data', AsyncMock(return_value={"item_data": {"pid": "pid"}})), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value="key")), \
+             patch.object(service, 'save_report', AsyncMock()) as mock_save_report, \
+             patch.object(service, 'send_notification', AsyncMock()) as mock_send_notification:
+
+            outcome = asyncio.run(service.process_message({"job_id": "job", "institution_id": "1"}))
+
+        assert outcome == UpdateOutcome.UNCHANGED
+        service.update_service.update_alma_item.assert_not_called()
+        mock_save_report.assert_awaited_once()
+        mock_send_notification.assert_awaited_once()
+
+    def test_process_message_records_stages(self, service):
+        """Test that a completed job is recorded and its redelivery skipped"""
+        with patch.object(service, 'get_item_data', AsyncMock(return_value={"item_data": {}})), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value="key")), \
+             patch.object(service, 'save_report', AsyncMock()), \
+             patch.object(service, 'send_notification', AsyncMock()) as mock_send_notification:
+
+            assert asyncio.run(service.process_message({"job_id": "job", "institution_id": "1"})) == UpdateOutcome.UPDATED
+            assert asyncio.run(
+                service.process_message({"job_id": "job", "institution_id": "1"})
+            ) == UpdateOutcome.ALREADY_PROCESSED
+
+        assert service.update_service.ledger.get("job") == set(Stage)
+        service.update_service.update_alma_item.assert_called_once()
+        mock_send_notification.assert_awaited_once()
+
+    def test_process_message_records_metrics(self, service):
+        """Test that the async pipeline times its stages and counts the outcome"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+
+        with patch.object(service, 'get_item_data', AsyncMock(return_value={"item_data": {}})), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value="key")), \
+             patch.object(service, 'save_report', AsyncMock()), \
+             patch.object(service, 'send_notification', AsyncMock()):
+
+            asyncio.run(service.process_message({"job_id": "job", "institution_id": "1"}))
+
+        assert hook.outcomes == {"updated": 1}
+        assert set(hook.stages) == {
+            PipelineStage.FETCH, PipelineStage.API_KEY, PipelineStage.ALMA_UPDATE,
+            PipelineStage.REPORT, PipelineStage.NOTIFY
+        }
+
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
+    def test_update_item_malformed_body(self, mock_dead_letter, service, mock_queue_message):
+        """Test that a body that isn't JSON is dead-lettered and its outcome counted"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+        mock_queue_message.get_body.return_value = b"not json"
+
+        assert asyncio.run(service.update_item()) == UpdateOutcome.INVALID_MESSAGE
+
+        error, payload = mock_dead_letter.call_args[0]
+        assert error.reason == InvalidReason.MALFORMED_JSON
+        assert payload == "not json"
+        assert hook.outcomes == {"invalid_message": 1}
+
+    def test_process_message_resumes_after_update(self, service):
+        """Test that a job redelivered after its Alma update only reports and notifies"""
+        service.update_service.ledger.mark("job", Stage.UPDATED)
+
+        with patch.object(service, 'get_item_data', AsyncMock(return_value={"item_data": {}})), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value="key")) as mock_get_api_key, \
+             patch.object(service, 'save_report', AsyncMock()) as mock_save_report, \
+             patch.object(service, 'send_notification', AsyncMock()) as mock_send_notification:
+
+            outcome = asyncio.run(service.process_message({"job_id": "job", "institution_id": "1"}))
+
+        assert outcome == UpdateOutcome.UPDATED
+        mock_get_api_key.assert_not_called()
+        service.update_service.update_alma_item.assert_not_called()
+        mock_save_report.assert_awaited_once()
+        mock_send_notification.assert_awaited_once()
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_queue_client')
+    def test_process_message_deferred_when_breaker_open(self, mock_get_queue_client, service):
+        """Test that an open breaker re-enqueues the message on the async queue"""
+        mock_get_queue_client.return_value.send_message = AsyncMock()
+        breaker = alma_circuit_breakers.get(1)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        with patch.object(service, 'get_item_data', AsyncMock(return_value={})), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value="key")):
+
+            outcome = asyncio.run(service.process_message({"job_id": "job", "institution_id": "1"}))
+
+        assert outcome == UpdateOutcome.DEFERRED
+        service.update_service.update_alma_item.assert_not_called()
+        mock_get_queue_client.assert_called_once_with("update-async-queue")
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_queue_client')
+    def test_process_message_deferred_when_no_slot(self, mock_get_queue_client, service):
+        """Test that a call slot timeout re-enqueues the message on the async queue"""
+        mock_get_queue_client.return_value.send_message = AsyncMock()
+        service.update_service.update_alma_item.side_effect = ConcurrencyLimitTimeout("no slot")
+
+        with patch.object(service, 'get_item_data', AsyncMock(return_value={})), \
+             patch.object(service, 'get_api_key', AsyncMock(return_value="key")):
+
+            outcome = asyncio.run(service.process_message({"job_id": "job", "institution_id": "1"}))
+
+        assert outcome == UpdateOutcome.DEFERRED
+        mock_get_queue_client.assert_called_once_with("update-async-queue")
+        assert service.update_service.ledger.get("job") == set()
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_blob_service_client')
+    def test_get_item_data_success(self, mock_get_client, service):
+        """Test the async blob download"""
+        downloader = Mock()
+        downloader.chunks.return_value = async_chunks(b'{"item_data": ', b'{"pid": "1"}}')
+        blob_client = mock_get_client.return_value.get_blob_client.return_value
+        blob_client.download_blob = AsyncMock(return_value=downloader)
+
+        result = asyncio.run(service.get_item_data("test-job-123"))
+
+        assert result == {"item_data": {"pid": "1"}}
+        mock_get_client.return_value.get_blob_client.assert_called_once_with(
+            container="updated-items-container", blob="test-job-123.json"
+        )
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_blob_service_client')
+    def test_get_item_data_gzip(self, mock_get_client, service):
+        """Test that a gzipped payload is decompressed as it streams in"""
+        data = gzip.compress(b'{"item_data": {"pid": "1"}}')
+        downloader = Mock()
+        downloader.chunks.return_value = async_chunks(data[:5], data[5:])
+        mock_get_client.return_value.get_blob_client.return_value.download_blob = AsyncMock(return_value=downloader)
+
+        result = asyncio.run(service.get_item_data("test-job-123"))
+
+        assert result == {"item_data": {"pid": "1"}}
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_blob_service_client')
+    def test_get_item_data_gzip_content_encoding(self, mock_get_client, service):
+        """Test that a gzip blob with Content-Encoding is downloaded raw and decoded across many chunks"""
+        data = gzip.compress(b'{"item_data": {"pid": "1"}}')
+        downloader = Mock()
+        downloader.properties.content_settings.content_encoding = "gzip"
+        downloader.chunks.return_value = async_chunks(*[data[i:i + 8] for i in range(0, len(data), 8)])
+        download_blob = AsyncMock(return_value=downloader)
+        mock_get_client.return_value.get_blob_client.return_value.download_blob = download_blob
+
+        assert asyncio.run(service.get_item_data("test-job-123")) == {"item_data": {"pid": "1"}}
+        download_blob.assert_called_once_with(decompress=False)
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_blob_service_client')
+    def test_get_item_data_corrupt_retried(self, mock_get_client, service):
+        """Test that a corrupt payload raises for the queue to retry"""
+        downloader = Mock()
+        downloader.chunks.return_value = async_chunks(b"\x1f\x8b" + b"not gzip at all")
+        mock_get_client.return_value.get_blob_client.return_value.download_blob = AsyncMock(return_value=downloader)
+
+        with pytest.raises(DecompressionError):
+            asyncio.run(service.get_item_data("test-job-123"))
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_blob_service_client')
+    @patch('alma_item_checks_update_service.services.async_update_service.logging')
+    def test_get_item_data_error(self, mock_logging, mock_get_client, service):
+        """Test that a failed blob download returns None"""
+        blob_client = mock_get_client.return_value.get_blob_client.return_value
+        blob_client.download_blob = AsyncMock(side_effect=Exception("Not found"))
+
+        assert asyncio.run(service.get_item_data("test-job-123")) is None
+        mock_logging.warning.assert_called_with(
+            "AsyncUpdateService.update_item: Failed to download item from storage service: Not found"
+        )
+
+    def test_get_api_key_uses_cache(self, service):
+        """Test that cached keys skip the Institution API"""
+        api_key_cache.set(12345, "cached-key")
+
+        with patch.object(service, 'fetch_api_key', AsyncMock()) as mock_fetch:
+            assert asyncio.run(service.get_api_key(12345)) == "cached-key"
+
+        mock_fetch.assert_not_awaited()
+
+    def test_get_api_key_populates_cache(self, service):
+        """Test that fetched keys are stored in the shared cache"""
+        with patch.object(service, 'fetch_api_key', AsyncMock(return_value="fresh-key")):
+            assert asyncio.run(service.get_api_key(12345)) == "fresh-key"
+
+        assert api_key_cache.lookup(12345) == (True, "fresh-key")
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_http_session')
+    def test_fetch_api_key(self, mock_get_session, service):
+        """Test the async Institution API call"""
+        response = MagicMock()
+        response.json = AsyncMock(return_value={"api_key": "test-api-key-123"})
+        mock_get_session.return_value.get.return_value.__aenter__ = AsyncMock(return_value=response)
+        mock_get_session.return_value.get.return_value.__aexit__ = AsyncMock(return_value=False)
+
+        assert asyncio.run(service.fetch_api_key(12345)) == "test-api-key-123"
+        response.raise_for_status.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_http_session')
+    @patch('alma_item_checks_update_service.services.async_update_service.logging')
+    def test_fetch_api_key_error(self, mock_logging, mock_get_session, service):
+        """Test that a failed Institution API call returns None"""
+        mock_get_session.return_value.get.side_effect = Exception("HTTP Error")
+
+        assert asyncio.run(service.fetch_api_key(12345)) is None
+        mock_logging.warning.assert_called_with("AsyncUpdateService.update_item: Failed to get API key: HTTP Error")
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_blob_service_client')
+    def test_save_report(self, mock_get_client, service):
+        """Test the async report upload"""
+        service.update_service.build_report_data.return_value = {"Title": "Test Book"}
+        blob_client = mock_get_client.return_value.get_blob_client.return_value
+        blob_client.upload_blob = AsyncMock()
+
+        asyncio.run(service.save_report(Mock(), "test-job-123"))
+
+        mock_get_client.return_value.get_blob_client.assert_called_once_with(
+            container="reports-container", blob="test-job-123.json"
+        )
+        blob_client.upload_blob.assert_awaited_once_with(b'{"Title":"Test Book"}', overwrite=True)
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_blob_service_client')
+    def test_save_report_compressed(self, mock_get_client, service):
+        """Test that a compressed report is uploaded with its content encoding"""
+        service.update_service.build_report_data.return_value = {"Title": "Test Book"}
+        service.update_service.report_compression = Compression.GZIP
+        blob_client = mock_get_client.return_value.get_blob_client.return_value
+        blob_client.upload_blob = AsyncMock()
+
+        asyncio.run(service.save_report(Mock(), "test-job-123"))
+
+        data = blob_client.upload_blob.call_args[0][0]
+        assert gzip.decompress(data) == b'{"Title":"Test Book"}'
+        assert blob_client.upload_blob.call_args[1]["content_settings"].content_encoding == "gzip"
+
+    @patch('alma_item_checks_update_service.services.async_update_service.get_async_queue_client')
+    def test_send_notification(self, mock_get_queue_client, service):
+        """Test the async notification message"""
+        mock_get_queue_client.return_value.send_message = AsyncMock()
+
+        asyncio.run(service.send_notification({"job_id": "test-job-123"}))
+
+        mock_get_queue_client.assert_called_once_with("notification-queue")
+        mock_get_queue_client.return_value.send_message.assert_awaited_once_with('{"job_id":"test-job-123"}')
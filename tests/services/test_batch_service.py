@@ -0,0 +1,368 @@
+"""Unit tests for BatchUpdateService"""
+import json
+import threading
+from unittest.mock import Mock, patch
+
+import azure.functions as func
+import pytest
+
+from alma_item_checks_update_service.services.batch_service import (
+    BatchIncompleteError,
+    BatchUpdateService,
+    MessageResult,
+    continuation_batches,
+)
+from alma_item_checks_update_service.services.message_validation import InvalidReason
+from alma_item_checks_update_service.services.notification_coalescer import (
+    MAX_QUEUE_MESSAGE_BYTES,
+    queue_message_size,
+)
+from alma_item_checks_update_service.services.update_service import UpdateOutcome
+
+
+class FakeCheckpointStore:
+    """Checkpoint store over an in-memory dict"""
+
+    def __init__(self, checkpoints=None):
+        self.checkpoints = checkpoints or {}
+        self.saves = []
+
+    def load(self, name):
+        return self.checkpoints.get(name)
+
+    def save(self, name, checkpoint):
+        self.checkpoints[name] = checkpoint
+        self.saves.append(checkpoint)
+
+
+class TestBatchUpdateService:
+    """Test class for BatchUpdateService"""
+
+    def test_from_queue_message(self):
+        """Test that a batch queue message is decoded into update messages"""
+        messages = [{"job_id": "job-1", "institution_id": "1"}, {"job_id": "job-2", "institution_id": "2"}]
+        mock_msg = Mock(spec=func.QueueMessage)
+        mock_msg.get_body.return_value = json.dumps({"messages": messages}).encode()
+
+        batch_service = BatchUpdateService.from_queue_message(mock_msg)
+
+        assert batch_service.messages == messages
+
+    @patch('alma_item_checks_update_service.services.batch_service.dead_letter')
+    def test_from_queue_message_malformed(self, mock_dead_letter):
+        """Test that an unreadable batch is dead-lettered instead of retried"""
+        mock_msg = Mock(spec=func.QueueMessage)
+        mock_msg.get_body.return_value = b'{"messages": {"job_id": "job-1"}}'
+
+        batch_service = BatchUpdateService.from_queue_message(mock_msg)
+
+        assert batch_service.messages == []
+        error, payload = mock_dead_letter.call_args[0]
+        assert error.reason == InvalidReason.NOT_AN_OBJECT
+        assert payload == '{"messages": {"job_id": "job-1"}}'
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_reports_each_message(self, mock_update_service_class):
+        """Test that every message gets a result in order"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.side_effect = [UpdateOutcome.UPDATED, UpdateOutcome.NO_KEY]
+
+        results = BatchUpdateService([
+            {"job_id": "job-1", "institution_id": "1"},
+            {"job_id": "job-2", "institution_id": "2"},
+        ]).process()
+
+        assert results == [
+            MessageResult(index=0, job_id="job-1", outcome=UpdateOutcome.UPDATED),
+            MessageResult(index=1, job_id="job-2", outcome=UpdateOutcome.NO_KEY),
+        ]
+        assert [result.succeeded for result in results] == [True, False]
+        mock_update_service_class.assert_called_once_with(buffered=True)  # one pipeline for the batch
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_fair_order(self, mock_update_service_class):
+        """Test that fair scheduling interleaves institutions but reports in message order"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.return_value = UpdateOutcome.UPDATED
+        messages = [
+            {"job_id": "job-1", "institution_id": "1"},
+            {"job_id": "job-2", "institution_id": "1"},
+            {"job_id": "job-3", "institution_id": "1"},
+            {"job_id": "job-4", "institution_id": "2"},
+        ]
+
+        results = BatchUpdateService(messages, concurrency=1, prefetch_concurrency=0,
+                                     scheduling="fair", institution_weights={}).process()
+
+        processed = [call[0][0]["job_id"] for call in mock_update_service.process_message.call_args_list]
+        assert processed == ["job-1", "job-4", "job-2", "job-3"]
+        assert [result.job_id for result in results] == ["job-1", "job-2", "job-3", "job-4"]
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_fifo_order(self, mock_update_service_class):
+        """Test that fifo scheduling keeps queue order"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.return_value = UpdateOutcome.UPDATED
+        messages = [
+            {"job_id": "job-1", "institution_id": "1"},
+            {"job_id": "job-2", "institution_id": "1"},
+            {"job_id": "job-3", "institution_id": "2"},
+        ]
+
+        BatchUpdateService(messages, concurrency=1, prefetch_concurrency=0, scheduling="fifo").process()
+
+        processed = [call[0][0]["job_id"] for call in mock_update_service.process_message.call_args_list]
+        assert processed == ["job-1", "job-2", "job-3"]
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_prefetches_item_blobs(self, mock_update_service_class):
+        """Test that a batch's item blobs are downloaded ahead through the prefetcher"""
+        mock_update_service = mock_update_service_class.return_value
+        downloaded = threading.Semaphore(0)
+
+        def download(job_id):
+            downloaded.release()
+            return {"job": job_id}
+
+        def process_message(message_data):
+            assert downloaded.acquire(timeout=5)  # prefetched before its turn
+            taken.append(mock_update_service.prefetcher.take(message_data["job_id"]))
+            return UpdateOutcome.UPDATED
+
+        taken = []
+        mock_update_service.download_item_data.side_effect = download
+        mock_update_service.process_message.side_effect = process_message
+
+        results = BatchUpdateService([
+            {"job_id": "job-1", "institution_id": "1"},
+            {"job_id": "job-2", "institution_id": "1"},
+        ], concurrency=1, prefetch_concurrency=2).process()
+
+        assert [result.succeeded for result in results] == [True, True]
+        assert taken == [(True, {"job": "job-1"}), (True, {"job": "job-2"})]
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_flushes_buffered_output(self, mock_update_service_class):
+        """Test that buffered report rows and notifications are sent before the batch completes"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.return_value = UpdateOutcome.UPDATED
+
+        BatchUpdateService([{"job_id": "job-1", "institution_id": "1"}]).process()
+
+        mock_update_service.flush_buffered.assert_called_once_with()
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_flushes_buffered_output_on_error(self, mock_update_service_class):
+        """Test that buffered output is sent even when the batch raises"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.side_effect = KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            BatchUpdateService([{"job_id": "job-1", "institution_id": "1"}]).process()
+
+        mock_update_service.flush_buffered.assert_called_once_with()
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    @patch('alma_item_checks_update_service.services.batch_service.logging')
+    def test_process_isolates_exceptions(self, mock_logging, mock_update_service_class):
+        """Test that an exception in one message doesn't stop the batch"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.side_effect = [ValueError("bad institution"), UpdateOutcome.UPDATED]
+
+        with pytest.raises(BatchIncompleteError) as raised:
+            BatchUpdateService([
+                {"job_id": "job-1", "institution_id": "abc"},
+                {"job_id": "job-2", "institution_id": "2"},
+            ]).process()
+
+        results = raised.value.results
+        assert results[0].outcome == UpdateOutcome.ERROR
+        assert results[0].error == "bad institution"
+        assert results[1].succeeded
+        assert "job id job-1" in mock_logging.error.call_args[0][0]
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_non_dict_message(self, mock_update_service_class):
+        """Test that a malformed entry is reported without a job id"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.side_effect = TypeError("not a dict")
+
+        with pytest.raises(BatchIncompleteError) as raised:
+            BatchUpdateService(["not-a-message"]).process()  # type: ignore[list-item]
+
+        results = raised.value.results
+        assert results[0].job_id is None
+        assert results[0].outcome == UpdateOutcome.ERROR
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_concurrently(self, mock_update_service_class):
+        """Test that messages run in parallel and results keep message order"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def process_message(message_data):
+            barrier.wait()  # only passes if all three run at once
+            return UpdateOutcome.UPDATED
+
+        mock_update_service_class.return_value.process_message.side_effect = process_message
+        messages = [{"job_id": f"job-{i}", "institution_id": "1"} for i in range(3)]
+
+        results = BatchUpdateService(messages, concurrency=3).process()
+
+        assert [result.job_id for result in results] == ["job-0", "job-1", "job-2"]
+        assert all(result.succeeded for result in results)
+
+    def test_from_queue_message_batch_id(self):
+        """Test that batches are checkpointed by id and only continuations or redeliveries resume"""
+        mock_msg = Mock(spec=func.QueueMessage)
+        mock_msg.get_body.return_value = b'{"messages": []}'
+        mock_msg.dequeue_count = 1
+
+        first = BatchUpdateService.from_queue_message(mock_msg)
+
+        assert first.batch_id and not first.resume
+
+        mock_msg.dequeue_count = 2
+
+        assert BatchUpdateService.from_queue_message(mock_msg).batch_id == first.batch_id
+        assert BatchUpdateService.from_queue_message(mock_msg).resume
+
+        mock_msg.dequeue_count = 1
+        mock_msg.get_body.return_value = b'{"batch_id": "b1", "messages": []}'
+
+        continued = BatchUpdateService.from_queue_message(mock_msg)
+
+        assert continued.batch_id == "b1" and continued.resume
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_resumes_from_checkpoint(self, mock_update_service_class):
+        """Test that a resumed batch skips the messages its cursor records as done"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.return_value = UpdateOutcome.UPDATED
+        messages = [{"job_id": f"job-{i}", "institution_id": "1"} for i in range(4)]
+        store = FakeCheckpointStore({"batches/b1": {"next_index": 1, "completed": [2], "done": False}})
+
+        results = BatchUpdateService(messages, batch_id="b1", resume=True, checkpoints=store).process()
+
+        processed = [call[0][0]["job_id"] for call in mock_update_service.process_message.call_args_list]
+        assert processed == ["job-1", "job-3"]
+        assert [result.outcome for result in results] == [
+            UpdateOutcome.ALREADY_PROCESSED, UpdateOutcome.UPDATED,
+            UpdateOutcome.ALREADY_PROCESSED, UpdateOutcome.UPDATED,
+        ]
+        assert store.checkpoints["batches/b1"] == {"next_index": 4, "completed": [], "done": True}
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_failures_left_for_redelivery(self, mock_update_service_class):
+        """Test that only settled messages are recorded and the batch raises to retry the rest"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.side_effect = [
+            UpdateOutcome.UPDATED, ConnectionError("storage down"), UpdateOutcome.ITEM_NOT_FOUND,
+            UpdateOutcome.ALMA_FAILED,
+        ]
+        messages = [{"job_id": f"job-{i}", "institution_id": "1"} for i in range(4)]
+        store = FakeCheckpointStore()
+
+        with pytest.raises(BatchIncompleteError, match=r"indexes \[1\]"):
+            BatchUpdateService(messages, concurrency=1, batch_id="b1", checkpoints=store).process()
+
+        assert store.checkpoints["batches/b1"] == {"next_index": 1, "completed": [2], "done": False}
+
+        mock_update_service.process_message.side_effect = None
+        mock_update_service.process_message.return_value = UpdateOutcome.UPDATED
+        mock_update_service.process_message.reset_mock()
+
+        BatchUpdateService(messages, batch_id="b1", resume=True, checkpoints=store).process()
+
+        processed = [call[0][0]["job_id"] for call in mock_update_service.process_message.call_args_list]
+        assert processed == ["job-1", "job-3"]
+        assert store.checkpoints["batches/b1"]["done"] is True
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_resumes_with_duplicate_job_ids(self, mock_update_service_class):
+        """Test that a batch holding the same job twice resumes by message, not job id"""
+        mock_update_service = mock_update_service_class.return_value
+        mock_update_service.process_message.return_value = UpdateOutcome.UPDATED
+        messages = [{"job_id": job_id, "institution_id": "1"} for job_id in ["job-1", "job-2", "job-1", "job-3"]]
+        store = FakeCheckpointStore({"batches/b1": {"next_index": 0, "completed": [2], "done": False}})
+
+        BatchUpdateService(messages, concurrency=1, batch_id="b1", resume=True, checkpoints=store).process()
+
+        processed = [call[0][0]["job_id"] for call in mock_update_service.process_message.call_args_list]
+        assert processed == ["job-1", "job-2", "job-3"]
+        assert store.checkpoints["batches/b1"] == {"next_index": 4, "completed": [], "done": True}
+
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_without_checkpoint_doesnt_save(self, mock_update_service_class):
+        """Test that a short first delivery finishes without writing a checkpoint"""
+        mock_update_service_class.return_value.process_message.return_value = UpdateOutcome.UPDATED
+        store = FakeCheckpointStore()
+
+        BatchUpdateService([{"job_id": "job-1", "institution_id": "1"}], batch_id="b1", checkpoints=store).process()
+
+        assert store.saves == []
+
+    @patch('alma_item_checks_update_service.services.batch_service.get_queue_client')
+    @patch('alma_item_checks_update_service.services.batch_service.time')
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_continues_when_out_of_time(self, mock_update_service_class, mock_time, mock_get_queue_client):
+        """Test that a batch out of time checkpoints periodically and re-enqueues the rest"""
+        clock = [0.0]
+        mock_time.monotonic.side_effect = lambda: clock[0]
+
+        def process_message(message_data):
+            clock[0] += 20  # each update takes 20 seconds
+            return UpdateOutcome.UPDATED
+
+        mock_update_service_class.return_value.process_message.side_effect = process_message
+        messages = [{"job_id": f"job-{i}", "institution_id": "1"} for i in range(5)]
+        store = FakeCheckpointStore()
+
+        results = BatchUpdateService(messages, concurrency=1, batch_id="b1", time_budget=60, time_reserve=0,
+                                     checkpoint_interval=30, checkpoints=store).process()
+
+        assert [result.outcome for result in results] == [UpdateOutcome.UPDATED] * 3 + [UpdateOutcome.CONTINUED] * 2
+        assert [saved["next_index"] for saved in store.saves] == [2, 3]
+        assert store.checkpoints["batches/b1"]["done"] is False
+        mock_get_queue_client.assert_called_once_with("update-batch-queue")
+        sent = json.loads(mock_get_queue_client.return_value.send_message.call_args[0][0])
+        assert sent["messages"] == messages[3:]
+        assert sent["batch_id"] != "b1"
+
+    @patch('alma_item_checks_update_service.services.batch_service.get_queue_client')
+    @patch('alma_item_checks_update_service.services.batch_service.time')
+    @patch('alma_item_checks_update_service.services.batch_service.UpdateService')
+    def test_process_reserves_time_for_messages_in_flight(self, mock_update_service_class, mock_time,
+                                                         mock_get_queue_client):
+        """Test that a batch stops starting messages early enough for one in flight to wait and retry"""
+        clock = [0.0]
+        mock_time.monotonic.side_effect = lambda: clock[0]
+
+        def process_message(message_data):
+            clock[0] += 20
+            return UpdateOutcome.UPDATED
+
+        mock_update_service_class.return_value.process_message.side_effect = process_message
+        messages = [{"job_id": f"job-{i}", "institution_id": "1"} for i in range(5)]
+
+        results = BatchUpdateService(messages, concurrency=1, batch_id="b1", time_budget=240, time_reserve=180,
+                                     checkpoints=FakeCheckpointStore()).process()
+
+        assert [result.outcome for result in results] == [UpdateOutcome.UPDATED] * 3 + [UpdateOutcome.CONTINUED] * 2
+
+        clock[0] = 0.0
+        results = BatchUpdateService(messages, concurrency=1, batch_id="b2", time_budget=60, time_reserve=120,
+                                     checkpoints=FakeCheckpointStore()).process()
+
+        assert [result.outcome for result in results] == [UpdateOutcome.UPDATED] + [UpdateOutcome.CONTINUED] * 4
+
+    def test_continuation_batches_fit_the_queue(self):
+        """Test that the messages a batch has left are split into batches within the queue limit"""
+        messages = [{"job_id": f"job-{i}", "institution_id": "1", "note": "x" * 1000} for i in range(150)]
+
+        batches = continuation_batches("b1", messages)
+
+        assert len(batches) > 1
+        assert all(queue_message_size(batch) <= MAX_QUEUE_MESSAGE_BYTES for batch in batches)
+        assert [message for batch in batches for message in batch["messages"]] == messages
+        assert len({batch["batch_id"] for batch in batches}) == len(batches)
+        assert continuation_batches("b1", messages) == batches
@@ -0,0 +1,104 @@
+"""Unit tests for checkpoint"""
+import json
+from unittest.mock import MagicMock, patch
+
+import azure.core.exceptions
+
+from alma_item_checks_update_service.services.checkpoint import BatchCursor, CheckpointStore
+
+
+class TestCheckpointStore:
+    """Test class for CheckpointStore"""
+
+    @patch('alma_item_checks_update_service.services.checkpoint.get_blob_service_client')
+    def test_save_and_load(self, mock_get_client):
+        """Test that a checkpoint is saved as a JSON blob and loaded back"""
+        mock_blob = mock_get_client.return_value.get_blob_client.return_value
+        store = CheckpointStore(container="checkpoints")
+
+        store.save("batches/b1", {"next_index": 3})
+
+        data = mock_blob.upload_blob.call_args[0][0]
+        assert json.loads(data) == {"next_index": 3}
+        assert mock_blob.upload_blob.call_args[1]["overwrite"] is True
+        mock_get_client.return_value.get_blob_client.assert_called_with(container="checkpoints",
+                                                                        blob="batches/b1.json")
+
+        mock_blob.download_blob.return_value.readall.return_value = data
+
+        assert store.load("batches/b1") == {"next_index": 3}
+
+    @patch('alma_item_checks_update_service.services.checkpoint.get_blob_service_client')
+    def test_load_missing_or_unreadable(self, mock_get_client):
+        """Test that a missing or unreadable checkpoint loads as None"""
+        mock_blob = MagicMock()
+        mock_get_client.return_value.get_blob_client.return_value = mock_blob
+        mock_blob.download_blob.side_effect = azure.core.exceptions.ResourceNotFoundError("not found")
+
+        assert CheckpointStore().load("batches/b1") is None
+
+        mock_blob.download_blob.side_effect = None
+        mock_blob.download_blob.return_value.readall.return_value = b'{not json'
+
+        assert CheckpointStore().load("batches/b1") is None
+
+
+class TestBatchCursor:
+    """Test class for BatchCursor"""
+
+    def test_complete_out_of_order(self):
+        """Test that the low-water mark only passes messages once everything before them is done"""
+        cursor = BatchCursor(4)
+
+        cursor.complete(1)
+        cursor.complete(2)
+
+        assert cursor.next_index == 0
+        assert cursor.to_dict() == {"next_index": 0, "completed": [1, 2], "done": False}
+        assert [cursor.is_done(index) for index in range(4)] == [False, True, True, False]
+
+        cursor.complete(0)
+
+        assert cursor.to_dict() == {"next_index": 3, "completed": [], "done": False}
+
+    def test_round_trip(self):
+        """Test that a saved cursor skips the same messages when loaded"""
+        cursor = BatchCursor(4)
+        cursor.complete(0)
+        cursor.complete(2)
+
+        loaded = BatchCursor.from_dict(4, json.loads(json.dumps(cursor.to_dict())))
+
+        assert [loaded.is_done(index) for index in range(4)] == [True, False, True, False]
+
+    def test_duplicate_job_ids(self):
+        """Test that messages are tracked by index, so the same job twice in a batch is counted right"""
+        cursor = BatchCursor(3)  # e.g. job ids ["a", "b", "a"]
+
+        cursor.complete(2)
+        cursor.complete(0)
+
+        assert cursor.to_dict() == {"next_index": 1, "completed": [2], "done": False}
+        assert [cursor.is_done(index) for index in range(3)] == [True, False, True]
+
+        cursor.complete(1)
+
+        assert cursor.to_dict() == {"next_index": 3, "completed": [], "done": False}
+
+    def test_from_dict_not_a_cursor(self):
+        """Test that anything but a saved cursor starts from the beginning"""
+        cursor = BatchCursor.from_dict(1, None)
+
+        assert not cursor.is_done(0)
+
+    def test_from_dict_job_id_cursor(self):
+        """Test that job ids saved by an older cursor are ignored, so those messages are redone"""
+        cursor = BatchCursor.from_dict(3, {"next_index": 1, "completed": ["job-2", True], "done": False})
+
+        assert [cursor.is_done(index) for index in range(3)] == [True, False, False]
+
+    def test_done(self):
+        """Test that a finished batch skips every message"""
+        cursor = BatchCursor.from_dict(2, {"next_index": 0, "completed": [], "done": True})
+
+        assert cursor.is_done(0) and cursor.is_done(1)
@@ -0,0 +1,125 @@
+"""Unit tests for the Alma circuit breakers"""
+from unittest.mock import patch
+
+from alma_item_checks_update_service.services.circuit_breaker import (
+    BreakerState,
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+)
+from alma_item_checks_update_service.services.metrics import InMemoryMetricsHook, update_metrics
+
+
+@patch('alma_item_checks_update_service.services.circuit_breaker.time')
+class TestCircuitBreaker:
+    """Test class for CircuitBreaker"""
+
+    def test_opens_after_threshold(self, mock_time):
+        """Test that consecutive failures open the breaker"""
+        mock_time.monotonic.return_value = 100.0
+        breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.allow_request()
+
+        breaker.record_failure()
+        assert breaker.state == BreakerState.OPEN
+        assert not breaker.allow_request()
+        assert breaker.retry_in() == 30
+
+    def test_success_resets_failures(self, mock_time):
+        """Test that a success in between keeps the breaker closed"""
+        mock_time.monotonic.return_value = 100.0
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == BreakerState.CLOSED
+
+    def test_half_open_allows_single_probe(self, mock_time):
+        """Test that only one probe goes through after the reset timeout"""
+        mock_time.monotonic.return_value = 100.0
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+
+        mock_time.monotonic.return_value = 131.0
+
+        assert breaker.allow_request()
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert not breaker.allow_request()  # probe already in flight
+
+    def test_skipped_probe_frees_slot(self, mock_time):
+        """Test that a probe whose call was never made lets the next one through"""
+        mock_time.monotonic.return_value = 100.0
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        mock_time.monotonic.return_value = 131.0
+        breaker.allow_request()
+
+        breaker.record_skipped()
+
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.allow_request()
+
+    def test_probe_success_closes(self, mock_time):
+        """Test that a successful probe closes the breaker"""
+        mock_time.monotonic.return_value = 100.0
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        mock_time.monotonic.return_value = 131.0
+        breaker.allow_request()
+
+        breaker.record_success()
+
+        assert breaker.state == BreakerState.CLOSED
+        assert breaker.allow_request()
+
+    def test_probe_failure_reopens(self, mock_time):
+        """Test that a failed probe reopens the breaker for a full timeout"""
+        mock_time.monotonic.return_value = 100.0
+        breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+        for _ in range(5):
+            breaker.record_failure()
+        mock_time.monotonic.return_value = 131.0
+        breaker.allow_request()
+
+        breaker.record_failure()
+
+        assert breaker.state == BreakerState.OPEN
+        assert breaker.retry_in() == 30
+
+
+class TestCircuitBreakerRegistry:
+    """Test class for CircuitBreakerRegistry"""
+
+    def test_breakers_per_institution(self):
+        """Test that institutions have independent breakers"""
+        registry = CircuitBreakerRegistry(failure_threshold=1, reset_timeout=30)
+
+        registry.get(1).record_failure()
+
+        assert registry.get(1) is registry.get(1)
+        assert not registry.get(1).allow_request()
+        assert registry.get(2).allow_request()
+        assert registry.stats() == {
+            1: {"state": "open", "failures": 1},
+            2: {"state": "closed", "failures": 0},
+        }
+
+    def test_transitions_reported_as_gauge(self):
+        """Test that every state change is reported as the institution's state gauge"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+        registry = CircuitBreakerRegistry(failure_threshold=1, reset_timeout=0)
+        key = ("alma_circuit_breaker_state", (("institution_id", "3"),))
+
+        registry.get(3).record_failure()
+        assert hook.gauges[key] == 2
+
+        assert registry.get(3).allow_request()  # probe after the reset timeout
+        assert hook.gauges[key] == 1
+
+        registry.get(3).record_success()
+        assert hook.gauges[key] == 0
@@ -0,0 +1,85 @@
+"""Unit tests for compression"""
+import gzip
+from unittest.mock import Mock, patch
+
+import pytest
+
+from alma_item_checks_update_service.services.compression import (
+    Compression,
+    DecompressionError,
+    StreamDecompressor,
+    compress,
+    decompress_chunks,
+    detect,
+    read_payload,
+)
+
+PAYLOAD = b'{"item_data": {"pid": "1", "barcode": "123"}}' * 50
+
+
+def split(data, size=7):
+    """Split bytes into chunks of the given size"""
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestCompression:
+    """Test class for compression"""
+
+    def test_detect(self):
+        """Test that magic bytes win and the content encoding only decides short heads"""
+        assert detect(b"\x1f\x8b\x08") == Compression.GZIP
+        assert detect(b"\x28\xb5\x2f\xfd") == Compression.ZSTD
+        assert detect(b'{"a": 1}') == Compression.NONE
+        assert detect(b"\x28\xb5\x2f\xfd", content_encoding="GZIP") == Compression.ZSTD
+        assert detect(b'{"a": 1}', content_encoding="gzip") == Compression.NONE
+        assert detect(b"", content_encoding="zstd") == Compression.ZSTD
+        assert detect(b"{}", content_encoding="x-gzip") == Compression.GZIP
+
+    def test_corrupt_gzip(self):
+        """Test that a corrupt gzip payload raises DecompressionError"""
+        with pytest.raises(DecompressionError):
+            b"".join(decompress_chunks([b"\x1f\x8b" + b"not gzip at all"]))
+
+    def test_plain_passes_through(self):
+        """Test that an uncompressed payload is returned as is"""
+        assert b"".join(decompress_chunks(split(PAYLOAD))) == PAYLOAD
+
+    def test_gzip_streamed(self):
+        """Test that gzip payloads, multi-member ones included, decompress chunk by chunk"""
+        data = gzip.compress(PAYLOAD) + gzip.compress(PAYLOAD)
+        decompressor = StreamDecompressor()
+
+        result = b"".join(decompressor.decompress(chunk) for chunk in [b""] + split(data)) + decompressor.flush()
+
+        assert result == PAYLOAD * 2
+        assert decompressor.compression == Compression.GZIP
+
+    def test_zstd_round_trip(self):
+        """Test that zstd payloads compress and decompress when zstandard is installed"""
+        pytest.importorskip("zstandard")
+        data = compress(PAYLOAD, Compression.ZSTD)
+
+        assert detect(data) == Compression.ZSTD
+        assert b"".join(decompress_chunks(split(data))) == PAYLOAD
+
+    def test_zstd_without_zstandard(self):
+        """Test that zstd fails loudly when zstandard isn't installed"""
+        with patch.dict("sys.modules", {"zstandard": None}):
+            with pytest.raises(ImportError):
+                compress(PAYLOAD, "zstd")
+            with pytest.raises(ImportError):
+                b"".join(decompress_chunks([b"\x28\xb5\x2f\xfd\x00"]))
+
+    def test_compress(self):
+        """Test that gzip output is deterministic and none leaves the payload alone"""
+        assert compress(PAYLOAD, "gzip") == compress(PAYLOAD, Compression.GZIP)
+        assert gzip.decompress(compress(PAYLOAD, "gzip")) == PAYLOAD
+        assert compress(PAYLOAD, Compression.NONE) is PAYLOAD
+
+    def test_read_payload(self):
+        """Test that a downloader's chunks and content encoding are used"""
+        downloader = Mock()
+        downloader.chunks.return_value = split(gzip.compress(PAYLOAD))
+        downloader.properties.content_settings.content_encoding = "gzip"
+
+        assert read_payload(downloader) == PAYLOAD
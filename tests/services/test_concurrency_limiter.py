@@ -0,0 +1,257 @@
+"""Unit tests for the adaptive Alma concurrency limits"""
+import threading
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from alma_item_checks_update_service.services.concurrency_limiter import (
+    AdaptiveLimit,
+    ConcurrencyLimiter,
+    ConcurrencyLimitTimeout,
+    LimitSignal,
+    classify,
+)
+from alma_item_checks_update_service.services.metrics import InMemoryMetricsHook, update_metrics
+
+
+class StatusError(Exception):
+    """Exception carrying an HTTP status code, like the Alma client's"""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def make_limit(**overrides):
+    """Build a limit with test defaults"""
+    settings = {
+        "name": "test",
+        "initial": 4,
+        "minimum": 1,
+        "maximum": 8,
+        "latency_target": 1.0,
+        "decrease_factor": 0.5,
+    }
+    settings.update(overrides)
+
+    return AdaptiveLimit(**settings)
+
+
+class TestClassify:
+    """Test class for classify"""
+
+    def test_signals(self):
+        """Test that outcomes map to the signal they give about Alma's load"""
+        assert classify(None) == LimitSignal.SUCCESS
+        assert classify(StatusError(429)) == LimitSignal.THROTTLED
+        assert classify(StatusError(503)) == LimitSignal.FAILED
+        assert classify(requests.exceptions.Timeout()) == LimitSignal.FAILED
+        assert classify(StatusError(400)) == LimitSignal.IGNORED
+
+
+@patch('alma_item_checks_update_service.services.concurrency_limiter.time')
+class TestAdaptiveLimit:
+    """Test class for AdaptiveLimit"""
+
+    def test_additive_increase(self, mock_time):
+        """Test that about a window of fast successes raises the limit by one"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit()
+
+        changes = []
+        for _ in range(5):
+            assert limit.acquire(0)
+            changes.append(limit.release(0.1, LimitSignal.SUCCESS))
+
+        assert changes == [None, None, None, None, 5]
+
+    def test_increase_capped(self, mock_time):
+        """Test that the limit never grows past the maximum"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit(initial=8)
+
+        limit.acquire(0)
+        limit.release(0.1, LimitSignal.SUCCESS)
+
+        assert limit.limit == 8
+
+    def test_multiplicative_decrease_on_throttling(self, mock_time):
+        """Test that a 429 halves the limit"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit(initial=8)
+
+        limit.acquire(0)
+
+        assert limit.release(0.1, LimitSignal.THROTTLED) == 4
+
+    def test_decrease_once_per_round_trip(self, mock_time):
+        """Test that a burst of errors cuts the limit once, not once per call"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit(initial=8)
+        for _ in range(3):
+            limit.acquire(0)
+
+        limit.release(0.5, LimitSignal.THROTTLED)
+        limit.release(0.5, LimitSignal.THROTTLED)
+        assert int(limit.limit) == 4
+
+        mock_time.monotonic.return_value = 101.0
+        limit.release(0.5, LimitSignal.FAILED)
+        assert int(limit.limit) == 2
+
+    def test_decrease_floor(self, mock_time):
+        """Test that the limit never falls below the minimum"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit(initial=1)
+
+        limit.acquire(0)
+        limit.release(0.1, LimitSignal.FAILED)
+
+        assert limit.limit == 1
+
+    def test_slow_responses_back_off(self, mock_time):
+        """Test that latency over the target cuts the limit even without errors"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit(initial=8)
+
+        limit.acquire(0)
+
+        assert limit.release(3.0, LimitSignal.SUCCESS) == 4
+        assert limit.latency == 3.0
+
+    def test_no_growth_while_error_rate_high(self, mock_time):
+        """Test that fast successes don't raise the limit right after failures"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit(initial=2, minimum=2)
+        limit.acquire(0)
+        limit.release(0.1, LimitSignal.FAILED)
+
+        for _ in range(3):
+            limit.acquire(0)
+            limit.release(0.1, LimitSignal.SUCCESS)
+
+        assert limit.limit == 2
+        assert limit.error_rate > 0.1
+
+    def test_ignored_leaves_limit(self, mock_time):
+        """Test that item errors neither move the limit nor the averages"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit()
+
+        limit.acquire(0)
+
+        assert limit.release(5.0, LimitSignal.IGNORED) is None
+        assert limit.limit == 4
+        assert limit.latency is None
+        assert limit.in_flight == 0
+
+    def test_acquire_blocks_at_limit(self, mock_time):
+        """Test that calls past the limit wait for a slot"""
+        mock_time.monotonic.return_value = 100.0
+        limit = make_limit(initial=1)
+
+        assert limit.acquire(0)
+        assert not limit.acquire(0)
+
+        limit.release(0.1, LimitSignal.IGNORED)
+
+        assert limit.acquire(0)
+
+
+class TestConcurrencyLimiter:
+    """Test class for ConcurrencyLimiter"""
+
+    @staticmethod
+    def make_limiter(**overrides):
+        """Build a limiter with test defaults"""
+        settings = {
+            "initial": 1,
+            "minimum": 1,
+            "maximum": 4,
+            "latency_target": 1.0,
+            "decrease_factor": 0.5,
+            "max_wait": 0.01,
+        }
+        settings.update(overrides)
+
+        return ConcurrencyLimiter(**settings)
+
+    def test_separate_limits_per_institution(self):
+        """Test that each institution gets its own limit"""
+        limiter = self.make_limiter()
+
+        assert limiter.get(1) is limiter.get(1)
+        assert limiter.get(1) is not limiter.get(2)
+
+    def test_slot_times_out(self):
+        """Test that a call gives up when the institution stays at its limit"""
+        limiter = self.make_limiter()
+
+        with limiter.slot(1):
+            with limiter.slot(2):  # other institutions aren't held up
+                pass
+            with pytest.raises(ConcurrencyLimitTimeout):
+                with limiter.slot(1):
+                    pass
+
+    def test_slot_classifies_errors(self):
+        """Test that an exception in the slot is re-raised and backs off the limit"""
+        limiter = self.make_limiter(initial=4)
+
+        with pytest.raises(StatusError):
+            with limiter.slot(1):
+                raise StatusError(429)
+
+        assert limiter.stats()[1] == {
+            "limit": 2,
+            "in_flight": 0,
+            "latency": pytest.approx(0, abs=0.1),
+            "error_rate": pytest.approx(0.2),
+        }
+
+    def test_limit_changes_recorded_as_gauge(self):
+        """Test that a changed limit is reported to the metrics hooks"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+        limiter = self.make_limiter()
+
+        for _ in range(2):
+            with limiter.slot(7):
+                pass
+
+        assert hook.gauges == {("alma_concurrency_limit", (("institution_id", "7"),)): 2}
+
+    def test_disabled(self):
+        """Test that a maximum of zero lets every call through untracked"""
+        limiter = self.make_limiter(maximum=0)
+
+        with limiter.slot(1), limiter.slot(1):
+            pass
+
+        assert limiter.stats() == {}
+
+    def test_limits_parallel_calls(self):
+        """Test that threads never exceed an institution's limit"""
+        limiter = self.make_limiter(initial=2, maximum=2, max_wait=5)
+        running = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def call():
+            nonlocal running, peak
+            with limiter.slot(1):
+                with lock:
+                    running += 1
+                    peak = max(peak, running)
+                threading.Event().wait(0.01)
+                with lock:
+                    running -= 1
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert peak <= 2
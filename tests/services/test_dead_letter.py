@@ -0,0 +1,27 @@
+"""Unit tests for the dead-letter container"""
+import json
+from unittest.mock import patch
+
+from alma_item_checks_update_service.services.dead_letter import dead_letter
+from alma_item_checks_update_service.services.message_validation import InvalidMessageError, InvalidReason
+
+
+class TestDeadLetter:
+    """Test class for dead_letter"""
+
+    @patch('alma_item_checks_update_service.services.dead_letter.get_storage_service')
+    def test_dead_letter(self, mock_storage_service):
+        """Test that the message is saved with its reason, grouped by day and reason"""
+        error = InvalidMessageError(InvalidReason.MISSING_JOB_ID, "No job id provided")
+
+        blob_name = dead_letter(error, {"institution_id": "1"}, container="dead")
+
+        kwargs = mock_storage_service.return_value.upload_blob_data.call_args.kwargs
+        assert kwargs["container_name"] == "dead"
+        assert kwargs["blob_name"] == blob_name
+        assert blob_name.split("/")[1] == "missing_job_id"
+        record = json.loads(kwargs["data"])
+        assert record["reason"] == "missing_job_id"
+        assert record["error"] == "No job id provided"
+        assert record["payload"] == {"institution_id": "1"}
+        assert "dead_lettered_at" in record
@@ -0,0 +1,49 @@
+"""Unit tests for fair scheduling across institutions"""
+from alma_item_checks_update_service.services.fair_scheduler import (
+    fair_order,
+    institution_key,
+    parse_weights,
+)
+
+
+def make_messages(*institution_ids):
+    """Build update messages for the given institutions, in queue order"""
+    return [{"job_id": f"job-{n}", "institution_id": institution_id}
+            for n, institution_id in enumerate(institution_ids)]
+
+
+class TestFairScheduler:
+    """Test class for the fair scheduler"""
+
+    def test_round_robin(self):
+        """Test that institutions take turns, each keeping its own queue order"""
+        messages = make_messages("1", "1", "1", "1", "2", "3", "2")
+
+        assert fair_order(messages) == [0, 4, 5, 1, 6, 2, 3]
+
+    def test_small_institution_not_starved(self):
+        """Test that a job queued behind a large run starts within one round"""
+        messages = make_messages(*["1"] * 5000, "2")
+
+        assert fair_order(messages).index(5000) == 1
+
+    def test_weights(self):
+        """Test that weights set how many messages an institution sends per round"""
+        messages = make_messages(*["1"] * 4, *["2"] * 4)
+
+        order = fair_order(messages, {"1": 2, "2": 0.5})
+
+        assert order[:4] == [0, 1, 2, 3]  # 2 per round while 2 sends every other round
+        assert order.count(4) == 1
+        assert sorted(order) == list(range(8))
+
+    def test_messages_without_institution(self):
+        """Test that messages without an institution are scheduled as one group"""
+        messages = ["not a message", {"job_id": "job-1"}, {"job_id": "job-2", "institution_id": 7}]
+
+        assert fair_order(messages) == [0, 2, 1]
+        assert institution_key(messages[2]) == institution_key({"institution_id": "7"}) == "7"
+
+    def test_parse_weights(self):
+        """Test that weights are parsed, skipping invalid entries"""
+        assert parse_weights(" 12=2, 15=0.5,,x=1, 16=0, 17") == {"12": 2.0, "15": 0.5}
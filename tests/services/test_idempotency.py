@@ -0,0 +1,143 @@
+"""Unit tests for the idempotency ledger"""
+from unittest.mock import Mock, patch
+
+import azure.core.exceptions
+import pytest
+from azure.data.tables import UpdateMode
+
+from alma_item_checks_update_service.services import idempotency
+from alma_item_checks_update_service.services.idempotency import (
+    InMemoryIdempotencyStore,
+    NullIdempotencyStore,
+    Stage,
+    TableIdempotencyStore,
+    get_ledger,
+    table_key,
+)
+
+
+class TestInMemoryIdempotencyStore:
+    """Test class for InMemoryIdempotencyStore"""
+
+    def test_unseen_job(self):
+        """Test that an unseen job has no completed stages"""
+        assert InMemoryIdempotencyStore().get("job") == set()
+
+    def test_mark(self):
+        """Test that marked stages are returned per job"""
+        store = InMemoryIdempotencyStore()
+        store.mark("job", Stage.REPORTED)
+        store.mark("job", Stage.UPDATED)
+        store.mark("other", Stage.NOTIFIED)
+
+        assert store.get("job") == {Stage.REPORTED, Stage.UPDATED}
+        assert store.get("other") == {Stage.NOTIFIED}
+
+    def test_get_returns_copy(self):
+        """Test that callers can't change the stored stages"""
+        store = InMemoryIdempotencyStore()
+        store.mark("job", Stage.UPDATED)
+        store.get("job").add(Stage.NOTIFIED)
+
+        assert store.get("job") == {Stage.UPDATED}
+
+
+class TestNullIdempotencyStore:
+    """Test class for NullIdempotencyStore"""
+
+    def test_records_nothing(self):
+        """Test that the disabled ledger never reports a completed stage"""
+        store = NullIdempotencyStore()
+        store.mark("job", Stage.NOTIFIED)
+
+        assert store.get("job") == set()
+
+
+class TestTableIdempotencyStore:
+    """Test class for TableIdempotencyStore"""
+
+    def test_get(self):
+        """Test that stage properties are read from the job's entity, unknown ones ignored"""
+        table_client = Mock()
+        table_client.get_entity.return_value = {
+            "PartitionKey": "job", "RowKey": "job", "fetched": True, "updated": True
+        }
+
+        assert TableIdempotencyStore(table_client).get("job") == {Stage.UPDATED}
+        table_client.get_entity.assert_called_once_with(partition_key="job", row_key="job")
+
+    def test_get_unseen_job(self):
+        """Test that a missing entity means no completed stages"""
+        table_client = Mock()
+        table_client.get_entity.side_effect = azure.core.exceptions.ResourceNotFoundError("missing")
+
+        assert TableIdempotencyStore(table_client).get("job") == set()
+
+    def test_mark(self):
+        """Test that a stage is merged into the job's entity"""
+        table_client = Mock()
+        store = TableIdempotencyStore(table_client)
+
+        store.mark("job", Stage.UPDATED)
+
+        table_client.upsert_entity.assert_called_once_with(
+            {"PartitionKey": "job", "RowKey": "job", "updated": True}, mode=UpdateMode.MERGE
+        )
+
+    def test_mark_escapes_job_id(self):
+        """Test that characters table keys reject are escaped in the entity keys"""
+        table_client = Mock()
+
+        TableIdempotencyStore(table_client).mark("run/1#a?b\\c%", Stage.UPDATED)
+
+        entity = table_client.upsert_entity.call_args[0][0]
+        assert entity["PartitionKey"] == entity["RowKey"] == "run%2F1%23a%3Fb%5Cc%25"
+
+    def test_table_key(self):
+        """Test that ordinary ids are kept and oversized ones hashed"""
+        assert table_key("job-123_a.b") == "job-123_a.b"
+        assert len(table_key("x" * 2000)) == 64
+
+    def test_mark_creates_table_once(self):
+        """Test that the table is created on the first write only"""
+        table_client = Mock()
+        table_client.create_table.side_effect = azure.core.exceptions.ResourceExistsError("exists")
+        store = TableIdempotencyStore(table_client)
+
+        store.mark("job", Stage.UPDATED)
+        store.mark("job", Stage.REPORTED)
+
+        table_client.create_table.assert_called_once()
+        assert table_client.upsert_entity.call_count == 2
+
+
+class TestGetLedger:
+    """Test class for get_ledger"""
+
+    @pytest.mark.parametrize("backend,expected", [
+        ("off", NullIdempotencyStore),
+        ("memory", InMemoryIdempotencyStore),
+    ])
+    def test_backends(self, backend, expected):
+        """Test that IDEMPOTENCY_BACKEND selects the store"""
+        with patch.object(idempotency, "IDEMPOTENCY_BACKEND", backend):
+            assert isinstance(get_ledger(), expected)
+
+    @patch("alma_item_checks_update_service.services.idempotency.TableClient")
+    def test_table_backend(self, mock_table_client):
+        """Test that the table backend uses the configured table"""
+        with patch.object(idempotency, "IDEMPOTENCY_BACKEND", "table"):
+            ledger = get_ledger()
+
+        assert isinstance(ledger, TableIdempotencyStore)
+        assert mock_table_client.from_connection_string.call_args.kwargs["table_name"] == "updateledger"
+
+    def test_shared(self):
+        """Test that the ledger is created once per worker"""
+        assert get_ledger() is get_ledger()
+
+    def test_unknown_backend(self):
+        """Test that an unknown backend is rejected"""
+        with patch.object(idempotency, "IDEMPOTENCY_BACKEND", "redis"):
+            with pytest.raises(ValueError):
+                get_ledger()
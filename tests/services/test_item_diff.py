@@ -0,0 +1,70 @@
+"""Unit tests for no-op update detection"""
+from alma_item_checks_update_service.services.item_diff import (
+    FingerprintCache,
+    item_fingerprint,
+    payload_matches,
+)
+
+
+class TestItemFingerprint:
+    """Test class for item_fingerprint"""
+
+    def test_independent_of_key_order(self):
+        """Test that key order doesn't change the fingerprint"""
+        assert item_fingerprint({"a": 1, "b": {"c": 2, "d": 3}}) == item_fingerprint({"b": {"d": 3, "c": 2}, "a": 1})
+
+    def test_changes_with_values(self):
+        """Test that a changed value changes the fingerprint"""
+        assert item_fingerprint({"barcode": "1"}) != item_fingerprint({"barcode": "2"})
+
+
+class TestPayloadMatches:
+    """Test class for payload_matches"""
+
+    def test_subset_matches(self):
+        """Test that extra live fields are ignored"""
+        payload = {"barcode": "123", "provenance": {"value": "P1"}}
+        live = {"barcode": "123", "pid": "9", "provenance": {"value": "P1", "desc": "Prov 1"}}
+
+        assert payload_matches(payload, live)
+
+    def test_changed_value(self):
+        """Test that a differing value is detected"""
+        assert not payload_matches({"internal_note_1": "new"}, {"internal_note_1": "old"})
+
+    def test_none_matches_missing(self):
+        """Test that a None payload value matches a field Alma omits"""
+        assert payload_matches({"internal_note_1": None, "provenance": {"value": None}}, {})
+
+    def test_lists(self):
+        """Test that lists must match element by element"""
+        assert payload_matches({"notes": [{"a": 1}]}, {"notes": [{"a": 1, "b": 2}]})
+        assert not payload_matches({"notes": [{"a": 1}]}, {"notes": []})
+
+    def test_type_mismatch(self):
+        """Test that a dict payload doesn't match a scalar live value"""
+        assert not payload_matches({"provenance": {"value": "P1"}}, {"provenance": "P1"})
+
+
+class TestFingerprintCache:
+    """Test class for FingerprintCache"""
+
+    def test_get_set(self):
+        """Test storing and reading fingerprints"""
+        cache = FingerprintCache(max_size=10)
+        cache.set("pid-1", "abc")
+
+        assert cache.get("pid-1") == "abc"
+        assert cache.get("pid-2") is None
+
+    def test_evicts_least_recently_used(self):
+        """Test that the cache stays within max_size"""
+        cache = FingerprintCache(max_size=2)
+        cache.set("pid-1", "a")
+        cache.set("pid-2", "b")
+        cache.get("pid-1")  # pid-2 is now least recently used
+        cache.set("pid-3", "c")
+
+        assert cache.get("pid-1") == "a"
+        assert cache.get("pid-2") is None
+        assert cache.get("pid-3") == "c"
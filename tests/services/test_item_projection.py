@@ -0,0 +1,30 @@
+"""Unit tests for item payload projection"""
+from alma_item_checks_update_service.services.item_projection import ItemProjection, project_item
+
+FULL_ITEM = {
+    "bib_data": {"mms_id": "99", "title": "Test Book", "author": "Author", "anies": ["<record/>"]},
+    "holding_data": {"holding_id": "22", "in_temp_location": True},
+    "item_data": {"pid": "23", "barcode": "123"},
+    "link": "https://api.example.com/item/23",
+}
+
+
+class TestItemProjection:
+    """Test class for project_item"""
+
+    def test_full(self):
+        """Test that the full projection keeps every section as is"""
+        assert project_item(FULL_ITEM, ItemProjection.FULL) == FULL_ITEM
+
+    def test_slim(self):
+        """Test that the slim projection cuts bib_data but keeps what Alma updates"""
+        projected = project_item(FULL_ITEM, ItemProjection.SLIM)
+
+        assert projected["bib_data"] == {"mms_id": "99", "title": "Test Book"}
+        assert projected["holding_data"] is FULL_ITEM["holding_data"]
+        assert projected["item_data"] is FULL_ITEM["item_data"]
+        assert projected["link"] == FULL_ITEM["link"]
+
+    def test_slim_missing_bib_data(self):
+        """Test that a payload without bib_data projects to None, like the full one"""
+        assert project_item({"item_data": {}}, ItemProjection.SLIM)["bib_data"] is None
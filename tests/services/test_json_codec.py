@@ -0,0 +1,65 @@
+"""Unit tests for the JSON codecs"""
+import json
+from unittest.mock import patch
+
+import pytest
+
+from alma_item_checks_update_service.services.json_codec import (
+    OrjsonJsonCodec,
+    StdlibJsonCodec,
+    build_codec,
+)
+
+CODECS = [StdlibJsonCodec, OrjsonJsonCodec]
+DOCUMENT = {"job_id": "job-1", "institution_id": 12, "title": "Café", "ids": [1, 2]}
+
+
+class TestJsonCodec:
+    """Test class for the JSON codecs"""
+
+    @pytest.fixture(params=CODECS, ids=lambda codec: codec.name)
+    def codec(self, request):
+        """Each codec, skipping orjson when it isn't installed"""
+        if request.param is OrjsonJsonCodec:
+            pytest.importorskip("orjson")
+        return request.param()
+
+    @pytest.mark.parametrize("data", [
+        json.dumps(DOCUMENT).encode(),
+        json.dumps(DOCUMENT),
+        bytearray(json.dumps(DOCUMENT).encode()),
+        memoryview(json.dumps(DOCUMENT).encode()),
+    ])
+    def test_loads(self, codec, data):
+        """Test that bytes and text decode to the same document"""
+        assert codec.loads(data) == DOCUMENT
+
+    def test_dumps(self, codec):
+        """Test that documents encode to compact JSON, as text or bytes"""
+        assert codec.dumps({"a": 1, "b": [1, 2]}) == '{"a":1,"b":[1,2]}'
+        assert codec.dumps_bytes(DOCUMENT) == codec.dumps(DOCUMENT).encode()
+        assert json.loads(codec.dumps(DOCUMENT)) == DOCUMENT
+
+    def test_dumps_default(self, codec):
+        """Test that default converts values JSON can't hold"""
+        assert codec.dumps({"value": {1}}, default=list) == '{"value":[1]}'
+        with pytest.raises(TypeError):
+            codec.dumps({"value": {1}})
+
+    def test_loads_invalid(self, codec):
+        """Test that invalid documents raise ValueError whichever codec runs"""
+        with pytest.raises(ValueError):
+            codec.loads(b"not json")
+
+    def test_build_codec(self):
+        """Test that codecs are built by name"""
+        assert isinstance(build_codec("stdlib"), StdlibJsonCodec)
+        with pytest.raises(ValueError, match="simdjson"):
+            build_codec("simdjson")
+
+    def test_build_codec_auto_falls_back(self):
+        """Test that auto uses the stdlib codec when orjson isn't installed"""
+        with patch.dict("sys.modules", {"orjson": None}):
+            assert isinstance(build_codec("auto"), StdlibJsonCodec)
+            with pytest.raises(ImportError):
+                build_codec("orjson")
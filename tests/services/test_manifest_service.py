@@ -0,0 +1,352 @@
+"""Unit tests for ManifestUpdateService"""
+import gzip
+import hashlib
+import json
+from unittest.mock import Mock, patch
+
+import azure.core.exceptions
+import azure.functions as func
+import pytest
+
+from alma_item_checks_update_service.services.manifest_service import (
+    ManifestCheckpoint,
+    ManifestReader,
+    ManifestUpdateService,
+)
+from alma_item_checks_update_service.services.message_validation import InvalidReason
+from alma_item_checks_update_service.services.update_service import UpdateOutcome
+
+
+class FakeBlob:
+    """Blob client over an in-memory dict, downloading in small ranged chunks
+
+    Like the SDK, chunks of a blob with a gzip Content-Encoding are decoded one by one
+    unless the download asks for decompress=False.
+    """
+
+    def __init__(self, blobs, name, chunk_size=16, encodings=None):
+        self.blobs = blobs
+        self.name = name
+        self.chunk_size = chunk_size
+        self.encodings = encodings if encodings is not None else {}
+        self.offsets = []
+
+    def get_blob_properties(self):
+        if self.name not in self.blobs:
+            raise azure.core.exceptions.ResourceNotFoundError("not found")
+        return Mock(etag=blob_etag(self.blobs[self.name]))
+
+    def download_blob(self, offset=None, etag=None, match_condition=None, decompress=True):
+        if self.name not in self.blobs:
+            raise azure.core.exceptions.ResourceNotFoundError("not found")
+        data = self.blobs[self.name]
+        if etag is not None and etag != blob_etag(data):
+            raise azure.core.exceptions.ResourceModifiedError("condition not met")
+        offset = offset or 0
+        if offset and offset >= len(data):
+            error = azure.core.exceptions.HttpResponseError("range not satisfiable")
+            error.status_code = 416
+            raise error
+        self.offsets.append(offset)
+        self.data = data[offset:]
+        encoding = self.encodings.get(self.name)
+        self.properties = Mock(content_settings=Mock(content_encoding=encoding))
+        self.decode = decompress and encoding == "gzip"
+        return self
+
+    def chunks(self):
+        chunks = (self.data[i:i + self.chunk_size] for i in range(0, len(self.data), self.chunk_size))
+        return (gzip.decompress(chunk) for chunk in chunks) if self.decode else chunks
+
+    def readall(self):
+        return self.data
+
+    def upload_blob(self, data, overwrite=False):
+        self.blobs[self.name] = data
+
+
+class FakeBlobService:
+    """Blob service client handing out FakeBlobs"""
+
+    def __init__(self):
+        self.blobs = {}
+        self.encodings = {}
+        self.clients = {}
+
+    def get_blob_client(self, container, blob):
+        self.clients[blob] = FakeBlob(self.blobs, blob, encodings=self.encodings)
+        return self.clients[blob]
+
+    def checkpoint(self, manifest):
+        return json.loads(self.blobs[checkpoint_blob(manifest, self.blobs[manifest])])
+
+
+def blob_etag(data):
+    """Quoted ETag of blob content"""
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+def checkpoint_blob(manifest, data):
+    """Name of the checkpoint blob for a version of a manifest"""
+    return f"manifests/{manifest}/{blob_etag(data).strip(chr(34))}.json"
+
+
+def make_manifest(count, compress=False):
+    """Build manifest bytes with one line per item"""
+    lines = [json.dumps({"job_id": f"job-{n}", "item": {"item_data": {"pid": str(n)}}}) for n in range(count)]
+    data = ("\n".join(lines) + "\n").encode()
+    return gzip.compress(data) if compress else data
+
+
+class TestManifestReader:
+    """Test class for ManifestReader"""
+
+    def test_lines_and_offsets(self):
+        """Test that lines are split across chunks and their end offsets tracked"""
+        data = b'{"a":1}\n\n{"b":2}\r\n{"c":3}'
+        chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+
+        lines = list(ManifestReader(chunks))
+
+        assert [(line.number, line.data) for line in lines] == [(0, b'{"a":1}'), (2, b'{"b":2}'), (3, b'{"c":3}')]
+        assert [line.end for line in lines] == [8, 18, len(data)]
+
+    def test_resume_from_offset(self):
+        """Test that reading from a line's end offset gives the rest of the manifest"""
+        data = make_manifest(5)
+        lines = list(ManifestReader([data]))
+
+        resumed = list(ManifestReader([data[lines[1].end:]], first_line=2, offset=lines[1].end))
+
+        assert resumed == lines[2:]
+
+    def test_gzip(self):
+        """Test that gzipped manifests, multi-member ones included, are decompressed"""
+        data = make_manifest(3, compress=True) + make_manifest(2, compress=True)
+        reader = ManifestReader(data[i:i + 10] for i in range(0, len(data), 10))
+
+        lines = list(reader)
+
+        assert reader.compressed
+        assert [json.loads(line.data)["job_id"] for line in lines] == ["job-0", "job-1", "job-2", "job-0", "job-1"]
+        assert {line.end for line in lines} == {0}
+
+
+    def test_zstd(self):
+        """Test that zstd manifests are decompressed when zstandard is installed"""
+        zstandard = pytest.importorskip("zstandard")
+        data = zstandard.ZstdCompressor().compress(make_manifest(3))
+        reader = ManifestReader(data[i:i + 10] for i in range(0, len(data), 10))
+
+        lines = list(reader)
+
+        assert reader.compressed
+        assert [json.loads(line.data)["job_id"] for line in lines] == ["job-0", "job-1", "job-2"]
+
+
+class TestManifestUpdateService:
+    """Test class for ManifestUpdateService"""
+
+    @pytest.fixture
+    def blob_service(self):
+        """Patch in an in-memory blob service"""
+        service = FakeBlobService()
+        with patch('alma_item_checks_update_service.services.manifest_service.get_blob_service_client',
+                   return_value=service), \
+             patch('alma_item_checks_update_service.services.checkpoint.get_blob_service_client',
+                   return_value=service):
+            yield service
+
+    @pytest.fixture
+    def mock_queue_client(self):
+        """Patch the queue client used for continuation messages"""
+        with patch('alma_item_checks_update_service.services.manifest_service.get_queue_client') as mock:
+            yield mock
+
+    @pytest.fixture
+    def update_service(self):
+        """Patch UpdateService, recording each message with the payload it was given"""
+        with patch('alma_item_checks_update_service.services.manifest_service.UpdateService') as mock_class:
+            instance = mock_class.return_value
+            instance.processed = []
+
+            def process_message(message_data):
+                taken = instance.prefetcher.take(message_data["job_id"])
+                instance.processed.append((message_data, taken))
+                return instance.outcomes.get(message_data["job_id"], UpdateOutcome.UPDATED)
+
+            instance.outcomes = {}
+            instance.process_message.side_effect = process_message
+            yield instance
+
+    def test_process(self, blob_service, update_service, mock_queue_client):
+        """Test that every line is updated with its payload and the run checkpointed as done"""
+        blob_service.blobs["run.jsonl"] = make_manifest(5)
+        service = ManifestUpdateService({"manifest": "run.jsonl", "institution_id": 7, "run_id": "r"},
+                                        concurrency=2, window=2)
+
+        checkpoint = service.process()
+
+        assert [message["job_id"] for message, _ in update_service.processed] == [f"job-{n}" for n in range(5)]
+        message, taken = update_service.processed[0]
+        assert message == {"job_id": "job-0", "institution_id": 7, "run_id": "r"}
+        assert taken == (True, {"item_data": {"pid": "0"}})
+        assert update_service.requeue_deferred is False
+        assert checkpoint.done and checkpoint.outcomes == {"updated": 5}
+        assert blob_service.checkpoint("run.jsonl")["done"] is True
+        mock_queue_client.assert_not_called()
+
+    def test_resume_after_crash(self, blob_service, update_service):
+        """Test that a redelivered message seeks past the checkpointed lines"""
+        blob_service.blobs["run.jsonl"] = make_manifest(6)
+        update_service.process_message.side_effect = [UpdateOutcome.UPDATED] * 3 + [RuntimeError("down")] * 3
+        service = ManifestUpdateService({"manifest": "run.jsonl"}, concurrency=1, window=2)
+
+        with pytest.raises(RuntimeError):
+            service.process()
+
+        saved = blob_service.checkpoint("run.jsonl")
+        assert saved["line"] == 2 and not saved["done"]
+
+        update_service.process_message.side_effect = lambda message_data: UpdateOutcome.UPDATED
+        update_service.process_message.reset_mock()
+        checkpoint = service.process()
+
+        resumed = [call[0][0]["job_id"] for call in update_service.process_message.call_args_list]
+        assert resumed == ["job-2", "job-3", "job-4", "job-5"]
+        assert blob_service.clients["run.jsonl"].offsets == [saved["offset"]]
+        assert checkpoint.outcomes == {"updated": 6}
+
+    def test_resume_compressed(self, blob_service, update_service):
+        """Test that a gzipped manifest resumes by skipping the lines already done"""
+        blob_service.blobs["run.jsonl.gz"] = make_manifest(4, compress=True)
+        blob_service.blobs[checkpoint_blob("run.jsonl.gz", blob_service.blobs["run.jsonl.gz"])] = json.dumps(
+            ManifestCheckpoint(line=3, compressed=True).to_dict()).encode()
+
+        ManifestUpdateService({"manifest": "run.jsonl.gz"}, window=2).process()
+
+        assert [message["job_id"] for message, _ in update_service.processed] == ["job-3"]
+        assert blob_service.clients["run.jsonl.gz"].offsets == [0]
+
+    def test_gzip_content_encoding(self, blob_service, update_service):
+        """Test that a gzipped manifest stored with Content-Encoding is read across many chunks"""
+        blob_service.blobs["run.jsonl.gz"] = make_manifest(6, compress=True)
+        blob_service.encodings["run.jsonl.gz"] = "gzip"
+
+        checkpoint = ManifestUpdateService({"manifest": "run.jsonl.gz"}, window=2).process()
+
+        assert [message["job_id"] for message, _ in update_service.processed] == [f"job-{n}" for n in range(6)]
+        assert checkpoint.done and checkpoint.compressed
+
+    def test_already_done(self, blob_service, update_service):
+        """Test that a finished manifest isn't read again"""
+        blob_service.blobs["run.jsonl"] = make_manifest(5)
+        blob_service.blobs[checkpoint_blob("run.jsonl", blob_service.blobs["run.jsonl"])] = json.dumps(
+            ManifestCheckpoint(line=5, done=True).to_dict()).encode()
+
+        checkpoint = ManifestUpdateService({"manifest": "run.jsonl"}).process()
+
+        assert checkpoint.done
+        update_service.process_message.assert_not_called()
+
+    def test_deferred_continues_later(self, blob_service, update_service, mock_queue_client):
+        """Test that an open breaker checkpoints before the deferred line and re-enqueues the run"""
+        blob_service.blobs["run.jsonl"] = make_manifest(6)
+        update_service.outcomes = {"job-3": UpdateOutcome.DEFERRED}
+        message_data = {"manifest": "run.jsonl"}
+
+        checkpoint = ManifestUpdateService(message_data, concurrency=1, window=2).process()
+
+        assert checkpoint.line == 3 and not checkpoint.done
+        assert checkpoint.outcomes == {"updated": 3}
+        sent = mock_queue_client.return_value.send_message.call_args
+        mock_queue_client.assert_called_once_with("update-manifest-queue")
+        assert json.loads(sent[0][0]) == {"manifest": "run.jsonl", "etag": blob_etag(blob_service.blobs["run.jsonl"])}
+        assert sent[1]["visibility_timeout"] > 0
+
+    def test_new_version_is_new_run(self, blob_service, update_service):
+        """Test that a manifest uploaded again under the same name isn't skipped as done"""
+        blob_service.blobs["run.jsonl"] = make_manifest(1)
+        ManifestUpdateService({"manifest": "run.jsonl"}).process()
+        blob_service.blobs["run.jsonl"] = make_manifest(2)
+
+        checkpoint = ManifestUpdateService({"manifest": "run.jsonl"}).process()
+
+        assert checkpoint.done and checkpoint.outcomes == {"updated": 2}
+
+    @patch('alma_item_checks_update_service.services.manifest_service.dead_letter')
+    def test_changed_manifest_dead_lettered(self, mock_dead_letter, blob_service, update_service):
+        """Test that a continuation of a manifest replaced mid-run isn't resumed"""
+        blob_service.blobs["run.jsonl"] = make_manifest(4)
+        message_data = {"manifest": "run.jsonl", "etag": blob_etag(blob_service.blobs["run.jsonl"])}
+        blob_service.blobs["run.jsonl"] = make_manifest(6)
+
+        checkpoint = ManifestUpdateService(message_data).process()
+
+        assert not checkpoint.done
+        update_service.process_message.assert_not_called()
+        assert mock_dead_letter.call_args[0][0].reason == InvalidReason.MANIFEST_CHANGED
+
+    @staticmethod
+    def slow_updates(mock_time, update_service, seconds):
+        """Make each update take some seconds on a fake clock"""
+        clock = [0.0]
+        mock_time.monotonic.side_effect = lambda: clock[0]
+        process_message = update_service.process_message.side_effect
+
+        def slow_process_message(message_data):
+            clock[0] += seconds
+            return process_message(message_data)
+
+        update_service.process_message.side_effect = slow_process_message
+
+    @patch('alma_item_checks_update_service.services.manifest_service.time')
+    def test_time_budget(self, mock_time, blob_service, update_service, mock_queue_client):
+        """Test that a run out of time mid-window checkpoints the lines done and continues in a new message"""
+        self.slow_updates(mock_time, update_service, 20)
+        blob_service.blobs["run.jsonl"] = make_manifest(6)
+
+        checkpoint = ManifestUpdateService({"manifest": "run.jsonl"}, concurrency=1, window=2, time_budget=60,
+                                           time_reserve=0).process()
+
+        assert checkpoint.line == 3 and not checkpoint.done
+        assert checkpoint.outcomes == {"updated": 3}
+        assert len(update_service.processed) == 3
+        assert mock_queue_client.return_value.send_message.call_args[1]["visibility_timeout"] == 0
+
+    @patch('alma_item_checks_update_service.services.manifest_service.time')
+    def test_time_reserved_for_lines_in_flight(self, mock_time, blob_service, update_service, mock_queue_client):
+        """Test that a run stops starting lines early enough for one in flight to wait and retry"""
+        self.slow_updates(mock_time, update_service, 20)
+        blob_service.blobs["run.jsonl"] = make_manifest(6)
+
+        checkpoint = ManifestUpdateService({"manifest": "run.jsonl"}, concurrency=1, time_budget=240,
+                                           time_reserve=180).process()
+
+        assert checkpoint.line == 3 and not checkpoint.done
+        mock_queue_client.return_value.send_message.assert_called_once()
+
+    def test_invalid_line_rejected(self, blob_service, update_service):
+        """Test that a line that isn't JSON is dead-lettered through the pipeline"""
+        blob_service.blobs["run.jsonl"] = b'not json\n' + make_manifest(1)
+        update_service.reject_undecodable.return_value = UpdateOutcome.INVALID_MESSAGE
+
+        checkpoint = ManifestUpdateService({"manifest": "run.jsonl"}).process()
+
+        payload, error = update_service.reject_undecodable.call_args[0]
+        assert payload == b"not json"
+        assert error.reason == InvalidReason.MALFORMED_JSON
+        assert checkpoint.outcomes == {"invalid_message": 1, "updated": 1}
+
+    @patch('alma_item_checks_update_service.services.manifest_service.dead_letter')
+    def test_from_queue_message(self, mock_dead_letter):
+        """Test that a manifest message is decoded and one without a manifest dead-lettered"""
+        mock_msg = Mock(spec=func.QueueMessage)
+        mock_msg.get_body.return_value = b'{"manifest": "run.jsonl", "institution_id": 7}'
+
+        assert ManifestUpdateService.from_queue_message(mock_msg).manifest == "run.jsonl"
+
+        mock_msg.get_body.return_value = b'{"institution_id": 7}'
+
+        assert ManifestUpdateService.from_queue_message(mock_msg) is None
+        assert mock_dead_letter.call_args[0][0].reason == InvalidReason.MISSING_MANIFEST
@@ -0,0 +1,65 @@
+"""Unit tests for update message validation"""
+import azure.core.exceptions
+import pytest
+import requests
+
+from alma_item_checks_update_service.services.message_validation import (
+    InvalidMessageError,
+    InvalidReason,
+    UpdateMessage,
+    decode_message,
+    is_transient_storage_error,
+)
+
+
+class TestMessageValidation:
+    """Test class for update message validation"""
+
+    @pytest.mark.parametrize("message_data,expected", [
+        ({"job_id": "job", "institution_id": "12"}, UpdateMessage("job", 12)),
+        ({"job_id": 7, "institution_id": 12, "run_id": "run"}, UpdateMessage("7", 12, "run")),
+    ])
+    def test_from_dict(self, message_data, expected):
+        """Test that valid messages are typed, institution ids as ints"""
+        assert UpdateMessage.from_dict(message_data) == expected
+
+    @pytest.mark.parametrize("message_data,reason", [
+        (["job"], InvalidReason.NOT_AN_OBJECT),
+        ({"institution_id": "1"}, InvalidReason.MISSING_JOB_ID),
+        ({"job_id": "", "institution_id": "1"}, InvalidReason.MISSING_JOB_ID),
+        ({"job_id": True, "institution_id": "1"}, InvalidReason.MISSING_JOB_ID),
+        ({"job_id": "job"}, InvalidReason.MISSING_INSTITUTION_ID),
+        ({"job_id": "job", "institution_id": "abc"}, InvalidReason.INVALID_INSTITUTION_ID),
+        ({"job_id": "job", "institution_id": 1.5}, InvalidReason.INVALID_INSTITUTION_ID),
+        ({"job_id": "job", "institution_id": False}, InvalidReason.INVALID_INSTITUTION_ID),
+    ])
+    def test_from_dict_invalid(self, message_data, reason):
+        """Test that each kind of invalid message is classified"""
+        with pytest.raises(InvalidMessageError) as exc_info:
+            UpdateMessage.from_dict(message_data)
+
+        assert exc_info.value.reason == reason
+
+    def test_decode_message(self):
+        """Test that bodies are decoded from str or bytes"""
+        assert decode_message('{"job_id": "job"}') == {"job_id": "job"}
+        assert decode_message(b'{"job_id": "job"}') == {"job_id": "job"}
+
+    @pytest.mark.parametrize("body", ["not json", b"\xff\xfe"])
+    def test_decode_message_malformed(self, body):
+        """Test that an undecodable body is a permanent failure"""
+        with pytest.raises(InvalidMessageError) as exc_info:
+            decode_message(body)
+
+        assert exc_info.value.reason == InvalidReason.MALFORMED_JSON
+
+    @pytest.mark.parametrize("exc,expected", [
+        (azure.core.exceptions.ServiceRequestError("unreachable"), True),
+        (azure.core.exceptions.ServiceResponseError("dropped"), True),
+        (requests.exceptions.ConnectionError("reset"), True),
+        (azure.core.exceptions.ResourceNotFoundError("missing"), False),
+        (ValueError("bad json"), False),
+    ])
+    def test_is_transient_storage_error(self, exc, expected):
+        """Test that only outages are retried, not missing or unreadable blobs"""
+        assert is_transient_storage_error(exc) is expected
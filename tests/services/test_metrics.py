@@ -0,0 +1,95 @@
+"""Unit tests for pipeline metrics"""
+import logging
+import sys
+from unittest.mock import Mock, patch
+
+import pytest
+
+from alma_item_checks_update_service.services.metrics import (
+    InMemoryMetricsHook,
+    LoggingMetricsHook,
+    Metrics,
+    PipelineStage,
+    build_hooks,
+)
+
+
+class TestMetrics:
+    """Test class for Metrics"""
+
+    def test_stage_disabled_is_shared_noop(self):
+        """Test that without hooks every stage gets the same no-op context"""
+        metrics = Metrics()
+
+        assert metrics.stage(PipelineStage.FETCH, {}) is metrics.stage(PipelineStage.NOTIFY, {})
+        with metrics.stage(PipelineStage.FETCH, {}):
+            pass
+
+    def test_stage_timed(self):
+        """Test that a stage is reported to every hook, even when it raises"""
+        hook = InMemoryMetricsHook()
+        metrics = Metrics([hook])
+
+        with metrics.stage(PipelineStage.FETCH, {"institution_id": "1"}):
+            pass
+        with pytest.raises(RuntimeError):
+            with metrics.stage(PipelineStage.FETCH, {"institution_id": "1"}):
+                raise RuntimeError("boom")
+
+        assert len(hook.stages[PipelineStage.FETCH]) == 2
+        assert all(seconds >= 0 for seconds in hook.stages[PipelineStage.FETCH])
+
+    def test_outcome(self):
+        """Test that outcomes are counted"""
+        hook = InMemoryMetricsHook()
+        metrics = Metrics([hook])
+
+        metrics.outcome("updated", 0.1, {})
+        metrics.outcome("updated", 0.2, {})
+        metrics.outcome("no_key", 0.1, {})
+
+        assert hook.outcomes == {"updated": 2, "no_key": 1}
+
+    @patch('alma_item_checks_update_service.services.metrics.logging')
+    def test_hook_failure_isolated(self, mock_logging):
+        """Test that a failing hook neither breaks the pipeline nor the other hooks"""
+        broken = Mock()
+        broken.record_outcome.side_effect = RuntimeError("sink down")
+        hook = InMemoryMetricsHook()
+        metrics = Metrics([broken, hook])
+
+        metrics.outcome("updated", 0.1, {})
+
+        assert hook.outcomes == {"updated": 1}
+        mock_logging.warning.assert_called_once()
+
+    def test_logging_hook_custom_dimensions(self, caplog):
+        """Test that the logging hook puts measurements on the log record"""
+        with caplog.at_level(logging.INFO):
+            LoggingMetricsHook().record_stage(PipelineStage.ALMA_UPDATE, 0.25, {"institution_id": "7"})
+
+        record = caplog.records[-1]
+        assert record.stage == "alma_update"
+        assert record.duration_ms == 250
+        assert record.institution_id == "7"
+
+    def test_build_hooks(self):
+        """Test that hooks are built from their configured names"""
+        hooks = build_hooks(" log, memory ,")
+
+        assert [type(hook) for hook in hooks] == [LoggingMetricsHook, InMemoryMetricsHook]
+        assert build_hooks("") == []
+
+    @patch('alma_item_checks_update_service.services.metrics.logging')
+    def test_build_hooks_missing_dependency(self, mock_logging):
+        """Test that a hook whose package isn't installed is skipped, not fatal"""
+        with patch.dict(sys.modules, {"opentelemetry": None}):  # import fails
+            hooks = build_hooks("log,otel")
+
+        assert [type(hook) for hook in hooks] == [LoggingMetricsHook]
+        mock_logging.error.assert_called_once()
+
+    def test_build_hooks_unknown(self):
+        """Test that an unknown hook name is rejected"""
+        with pytest.raises(ValueError, match="statsd"):
+            build_hooks("statsd")
@@ -0,0 +1,172 @@
+"""Unit tests for coalesced notifications"""
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+from alma_item_checks_update_service.services.notification_coalescer import (
+    MAX_QUEUE_MESSAGE_BYTES,
+    NotificationCoalescer,
+    queue_message_size,
+)
+
+
+class TestNotificationCoalescer:
+    """Test class for NotificationCoalescer"""
+
+    @pytest.fixture
+    def storage_service(self):
+        """Patch the shared storage service"""
+        with patch('alma_item_checks_update_service.services.notification_coalescer.get_storage_service') as mock_get:
+            yield mock_get.return_value
+
+    @pytest.fixture
+    def report_writer(self):
+        """Patch the report writer, each report file having one part"""
+        with patch('alma_item_checks_update_service.services.notification_coalescer.report_writer') as mock_writer:
+            mock_writer.blob_names.side_effect = lambda blob_name: [blob_name]
+            yield mock_writer
+
+    def test_sends_summary_when_full(self, storage_service, report_writer):
+        """Test that a full group sends one summary listing its jobs"""
+        coalescer = NotificationCoalescer(max_jobs=2, window=0)
+
+        coalescer.add({"job_id": "job-1", "institution_id": "1", "run_id": "run-7"}, "1/run-7.csv")
+        storage_service.send_queue_message.assert_not_called()
+        coalescer.add({"job_id": "job-2", "institution_id": "1", "run_id": "run-7"}, "1/run-7.csv")
+
+        storage_service.send_queue_message.assert_called_once_with(
+            queue_name="notification-queue",
+            message_content={
+                "institution_id": "1", "run_id": "run-7", "count": 2,
+                "job_ids": ["job-1", "job-2"], "reports": ["1/run-7.csv"],
+            },
+        )
+        report_writer.flush.assert_called_once_with("1/run-7.csv")  # report written first
+        assert coalescer.pending_jobs() == 0
+
+    def test_summary_lists_report_parts(self, storage_service, report_writer):
+        """Test that a report file rolled over to new parts is listed part by part"""
+        report_writer.blob_names.side_effect = lambda blob_name: [blob_name, "1/run-7.1.csv"]
+        coalescer = NotificationCoalescer(max_jobs=1, window=0)
+
+        coalescer.add({"job_id": "job-1", "institution_id": "1", "run_id": "run-7"}, "1/run-7.csv")
+
+        summary = storage_service.send_queue_message.call_args.kwargs["message_content"]
+        assert summary["reports"] == ["1/run-7.csv", "1/run-7.1.csv"]
+
+    def test_groups_by_institution_and_run(self, storage_service, report_writer):
+        """Test that jobs of different institutions and runs get separate summaries"""
+        coalescer = NotificationCoalescer(max_jobs=100, window=0)
+        coalescer.add({"job_id": "job-1", "institution_id": "1"})
+        coalescer.add({"job_id": "job-2", "institution_id": "2"})
+        coalescer.add({"job_id": "job-3", "institution_id": "1", "run_id": "run-7"})
+        coalescer.add({"job_id": "job-4", "institution_id": "1"})
+
+        coalescer.flush()
+
+        summaries = [call.kwargs["message_content"] for call in storage_service.send_queue_message.call_args_list]
+        assert sorted((s["institution_id"], s["run_id"] or "", s["job_ids"]) for s in summaries) == [
+            ("1", "", ["job-1", "job-4"]), ("1", "run-7", ["job-3"]), ("2", "", ["job-2"]),
+        ]
+
+    def test_overflow_to_blob(self, storage_service, report_writer):
+        """Test that a summary too large for the queue points at a blob of job ids"""
+        coalescer = NotificationCoalescer(max_jobs=10_000, window=0)
+        job_ids = [f"job-{'x' * 40}-{n}" for n in range(2000)]
+        for job_id in job_ids:
+            coalescer.add({"job_id": job_id, "institution_id": "1", "run_id": "run-7"})
+
+        coalescer.flush()
+
+        upload = storage_service.upload_blob_data.call_args.kwargs
+        assert upload["container_name"] == "reports-container"
+        assert upload["blob_name"].startswith("notifications/1/run-7/")
+        assert json.loads(upload["data"]) == job_ids
+        summary = storage_service.send_queue_message.call_args.kwargs["message_content"]
+        assert "job_ids" not in summary
+        assert summary["count"] == 2000
+        assert summary["job_ids_blob"] == {"container": "reports-container", "blob": upload["blob_name"]}
+        assert queue_message_size(summary) <= MAX_QUEUE_MESSAGE_BYTES
+
+    def test_failed_send_keeps_jobs(self, storage_service, report_writer):
+        """Test that jobs are kept for the next flush when the send fails"""
+        storage_service.send_queue_message.side_effect = [RuntimeError("queue down"), None]
+        coalescer = NotificationCoalescer(max_jobs=100, window=0)
+        coalescer.add({"job_id": "job-1", "institution_id": "1"})
+
+        with pytest.raises(RuntimeError):
+            coalescer.flush()
+        assert coalescer.pending_jobs() == 1
+
+        coalescer.flush()
+        assert coalescer.pending_jobs() == 0
+
+    def test_failed_send_keeps_later_groups(self, storage_service, report_writer):
+        """Test that groups after the one that failed to send keep their jobs too"""
+        storage_service.send_queue_message.side_effect = RuntimeError("queue down")
+        coalescer = NotificationCoalescer(max_jobs=100, window=0)
+        coalescer.add({"job_id": "job-1", "institution_id": "1"})
+        coalescer.add({"job_id": "job-2", "institution_id": "2"})
+
+        with pytest.raises(RuntimeError):
+            coalescer.flush()
+
+        assert coalescer.pending_jobs() == 2
+
+    def test_after_send_waits_for_summary(self, storage_service, report_writer):
+        """Test that a callback for a pending job runs once its summary is sent"""
+        storage_service.send_queue_message.side_effect = [RuntimeError("queue down"), None]
+        coalescer = NotificationCoalescer(max_jobs=100, window=0)
+        callback = Mock()
+        coalescer.add({"job_id": "job-1", "institution_id": "1"})
+        coalescer.after_send({"job_id": "job-1", "institution_id": "1"}, callback)
+        callback.assert_not_called()
+
+        with pytest.raises(RuntimeError):
+            coalescer.flush()
+        callback.assert_not_called()  # kept with the job for the next flush
+
+        coalescer.flush()
+        callback.assert_called_once_with()
+
+    def test_after_send_waits_for_send_in_progress(self, storage_service, report_writer):
+        """Test that a callback for a group being sent runs once the send finishes"""
+        coalescer = NotificationCoalescer(max_jobs=100, window=0)
+        callback = Mock()
+
+        def send_queue_message(**kwargs):
+            coalescer.after_send({"job_id": "job-1", "institution_id": "1"}, callback)
+            callback.assert_not_called()  # the summary isn't sent yet
+
+        storage_service.send_queue_message.side_effect = send_queue_message
+        coalescer.add({"job_id": "job-1", "institution_id": "1"})
+
+        coalescer.flush()
+
+        callback.assert_called_once_with()
+
+    def test_after_send_nothing_pending(self, storage_service, report_writer):
+        """Test that a callback runs at once when the job's group has nothing pending"""
+        coalescer = NotificationCoalescer(max_jobs=100, window=0)
+        callback = Mock()
+
+        coalescer.after_send({"job_id": "job-1", "institution_id": "1"}, callback)
+
+        callback.assert_called_once_with()
+
+    @patch('alma_item_checks_update_service.services.notification_coalescer.time')
+    def test_flush_due(self, mock_time, storage_service, report_writer):
+        """Test that only groups whose oldest job waited the window are sent"""
+        mock_time.monotonic.return_value = 100.0
+        coalescer = NotificationCoalescer(max_jobs=100, window=30)
+        coalescer._start_sender = lambda: None
+        coalescer.add({"job_id": "job-1", "institution_id": "1"})
+        mock_time.monotonic.return_value = 120.0
+        coalescer.add({"job_id": "job-2", "institution_id": "2"})
+
+        mock_time.monotonic.return_value = 131.0
+        coalescer.flush_due()
+
+        storage_service.send_queue_message.assert_called_once()
+        assert coalescer.pending_jobs() == 1
@@ -0,0 +1,103 @@
+"""Unit tests for ItemPrefetcher"""
+import threading
+import time
+
+from alma_item_checks_update_service.services.prefetcher import ItemPrefetcher
+
+
+def wait_for(condition, timeout=5.0):
+    """Wait until condition() is true"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class TestItemPrefetcher:
+    """Test class for ItemPrefetcher"""
+
+    def test_take_prefetched(self):
+        """Test that prefetched payloads are handed over by job id"""
+        loaded: list[str] = []
+
+        def loader(job_id):
+            loaded.append(job_id)
+            return {"job": job_id}
+
+        with ItemPrefetcher(loader, ["job-1", "job-2"], max_workers=2, max_buffered=2) as prefetcher:
+            wait_for(lambda: len(loaded) == 2)
+            assert prefetcher.take("job-2") == (True, {"job": "job-2"})
+            assert prefetcher.take("job-1") == (True, {"job": "job-1"})
+            assert prefetcher.take("job-1") == (False, None)  # already taken
+
+    def test_take_unknown_job(self):
+        """Test that a job outside the batch is left to the caller"""
+        with ItemPrefetcher(lambda job_id: {}, ["job-1"], max_workers=1, max_buffered=1) as prefetcher:
+            assert prefetcher.take("other") == (False, None)
+
+    def test_downloads_concurrently(self):
+        """Test that downloads overlap up to max_workers"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def loader(job_id):
+            barrier.wait()  # only passes once three downloads run at once
+            return {"job": job_id}
+
+        with ItemPrefetcher(loader, ["job-1", "job-2", "job-3"], max_workers=3, max_buffered=3) as prefetcher:
+            assert [prefetcher.take(job_id)[0] for job_id in ("job-1", "job-2", "job-3")] == [True] * 3
+
+    def test_buffer_is_bounded(self):
+        """Test that no more than max_buffered payloads are held before being taken"""
+        loaded: list[str] = []
+        job_ids = [f"job-{n}" for n in range(10)]
+
+        with ItemPrefetcher(lambda job_id: loaded.append(job_id), job_ids, max_workers=4,
+                            max_buffered=2) as prefetcher:
+            wait_for(lambda: len(loaded) == 2)
+            time.sleep(0.2)
+            assert len(loaded) == 2
+
+            for job_id in job_ids:  # taking frees slots for the rest
+                wait_for(lambda: job_id in loaded)
+                assert prefetcher.take(job_id)[0]
+
+        assert loaded == job_ids
+
+    def test_discard_frees_slot(self):
+        """Test that discarding an untaken payload lets the next download start"""
+        loaded: list[str] = []
+
+        with ItemPrefetcher(lambda job_id: loaded.append(job_id), ["job-1", "job-2"], max_workers=1,
+                            max_buffered=1) as prefetcher:
+            wait_for(lambda: loaded == ["job-1"])
+            prefetcher.discard("job-1")
+
+            wait_for(lambda: loaded == ["job-1", "job-2"])
+            assert prefetcher.take("job-2")[0]
+
+    def test_take_before_download_started(self):
+        """Test that a job whose download hasn't started is left to the caller and not downloaded"""
+        loaded: list[str] = []
+        release = threading.Event()
+
+        def loader(job_id):
+            release.wait(5)
+            loaded.append(job_id)
+
+        with ItemPrefetcher(loader, ["job-1", "job-2"], max_workers=1, max_buffered=1) as prefetcher:
+            assert prefetcher.take("job-2") == (False, None)
+            release.set()
+            assert prefetcher.take("job-1")[0]
+
+        assert loaded == ["job-1"]
+
+    def test_close_stops_downloads(self):
+        """Test that closing drops the remaining jobs"""
+        loaded: list[str] = []
+        prefetcher = ItemPrefetcher(lambda job_id: loaded.append(job_id), ["job-1", "job-2", "job-3"],
+                                    max_workers=1, max_buffered=1)
+
+        prefetcher.close()
+
+        assert prefetcher.take("job-3") == (False, None)
+        assert len(loaded) <= 1
@@ -0,0 +1,58 @@
+"""Unit tests for the Alma rate limiter"""
+from unittest.mock import patch
+
+from alma_item_checks_update_service.services.rate_limiter import RateLimiter, TokenBucket
+
+
+class TestTokenBucket:
+    """Test class for TokenBucket"""
+
+    @patch('alma_item_checks_update_service.services.rate_limiter.time')
+    def test_burst_then_wait(self, mock_time):
+        """Test that calls beyond the burst wait for refill"""
+        mock_time.monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=2, burst=2)
+
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 0.5  # one token short at 2 per second
+        assert bucket.acquire() == 1.0  # queued behind the previous caller
+
+        assert mock_time.sleep.call_count == 2
+
+    @patch('alma_item_checks_update_service.services.rate_limiter.time')
+    def test_refill_capped_at_burst(self, mock_time):
+        """Test that idle time doesn't accumulate more than burst tokens"""
+        mock_time.monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=1, burst=2)
+        bucket.acquire()
+        bucket.acquire()
+
+        mock_time.monotonic.return_value = 200.0  # long idle period
+
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 1.0
+
+
+class TestRateLimiter:
+    """Test class for RateLimiter"""
+
+    @patch('alma_item_checks_update_service.services.rate_limiter.time')
+    def test_buckets_per_institution(self, mock_time):
+        """Test that institutions don't share a bucket"""
+        mock_time.monotonic.return_value = 100.0
+        limiter = RateLimiter(rate=1, burst=1)
+
+        assert limiter.acquire(1) == 0.0
+        assert limiter.acquire(2) == 0.0
+        assert limiter.acquire(1) == 1.0
+
+    @patch('alma_item_checks_update_service.services.rate_limiter.time')
+    def test_disabled(self, mock_time):
+        """Test that a non-positive rate disables limiting"""
+        limiter = RateLimiter(rate=0, burst=1)
+
+        for _ in range(10):
+            assert limiter.acquire(1) == 0.0
+        mock_time.sleep.assert_not_called()
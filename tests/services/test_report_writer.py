@@ -0,0 +1,257 @@
+"""Unit tests for aggregated report files"""
+from unittest.mock import Mock, patch
+
+import azure.core.exceptions
+import pytest
+
+from alma_item_checks_update_service.services.report_writer import (
+    ReportFormat,
+    ReportWriter,
+    encode_row,
+    part_blob_name,
+    report_blob_name,
+)
+
+ROW = {"Job ID": "job-1", "Title": "Test Book", "Barcode": "123", "Item Call Number": "A1"}
+
+
+class TestReportEncoding:
+    """Test class for report file names and rows"""
+
+    def test_report_blob_name_by_run(self):
+        """Test that messages with a run_id share the run's file"""
+        assert report_blob_name({"institution_id": "1", "run_id": "run-7"}, ReportFormat.CSV) == "1/run-7.csv"
+
+    @patch('alma_item_checks_update_service.services.report_writer.datetime')
+    def test_report_blob_name_by_day(self, mock_datetime):
+        """Test that messages without a run_id are grouped by UTC day"""
+        mock_datetime.now.return_value.strftime.return_value = "2024-05-01"
+
+        assert report_blob_name({"institution_id": "1"}, ReportFormat.JSONL) == "1/2024-05-01.jsonl"
+
+    def test_part_blob_name(self):
+        """Test that parts after the first are numbered before the extension"""
+        assert part_blob_name("1/run-7.csv", 0, ReportFormat.CSV) == "1/run-7.csv"
+        assert part_blob_name("1/run-7.csv", 2, ReportFormat.CSV) == "1/run-7.2.csv"
+
+    def test_encode_jsonl(self):
+        """Test that a JSON Lines row is one JSON object per line"""
+        assert encode_row(ROW, ReportFormat.JSONL) == (
+            '{"Job ID":"job-1","Title":"Test Book","Barcode":"123","Item Call Number":"A1"}\n'
+        )
+
+    def test_encode_csv(self):
+        """Test that a CSV row follows the header's column order, blank for missing fields"""
+        assert encode_row({**ROW, "Title": "A, B"}, ReportFormat.CSV) == 'job-1,"A, B",123,A1,,\r\n'
+
+
+class TestReportWriter:
+    """Test class for ReportWriter"""
+
+    @pytest.fixture
+    def blob_client(self):
+        """Patch the shared blob service client, returning the blob client it hands out"""
+        with patch('alma_item_checks_update_service.services.report_writer.get_blob_service_client') as mock_get:
+            yield mock_get.return_value.get_blob_client.return_value
+
+    def test_buffers_until_row_limit(self, blob_client):
+        """Test that rows are written in one block once max_rows is reached"""
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=2, max_bytes=10_000, max_age=0)
+
+        writer.add("1/run.jsonl", ROW)
+        blob_client.append_block.assert_not_called()
+        writer.add("1/run.jsonl", ROW)
+
+        blob_client.create_append_blob.assert_called_once()
+        blob_client.append_block.assert_called_once_with((encode_row(ROW, ReportFormat.JSONL) * 2).encode())
+        assert writer.pending_rows() == 0
+
+    def test_flushes_at_byte_limit(self, blob_client):
+        """Test that a large buffer is written before max_rows is reached"""
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=10, max_age=0)
+
+        writer.add("1/run.jsonl", ROW)
+
+        blob_client.append_block.assert_called_once()
+
+    def test_csv_header_written_once(self, blob_client):
+        """Test that the header is written only by the flush that creates the file"""
+        writer = ReportWriter(ReportFormat.CSV, max_rows=1, max_bytes=10_000, max_age=0)
+
+        writer.add("1/run.csv", ROW)
+        writer.add("1/run.csv", ROW)
+
+        first, second = [call.args[0].decode() for call in blob_client.append_block.call_args_list]
+        assert first.startswith("Job ID,Title,Barcode")
+        assert not second.startswith("Job ID")
+        blob_client.create_append_blob.assert_called_once()
+
+    def test_existing_file_gets_no_header(self, blob_client):
+        """Test that appending to a file another worker already wrote rows to skips the header"""
+        blob_client.create_append_blob.side_effect = azure.core.exceptions.ResourceExistsError("exists")
+        not_empty = azure.core.exceptions.HttpResponseError("append position condition not met")
+        not_empty.status_code = 412
+        blob_client.append_block.side_effect = [not_empty, None]
+        writer = ReportWriter(ReportFormat.CSV, max_rows=1, max_bytes=10_000, max_age=0)
+
+        writer.add("1/run.csv", ROW)
+
+        assert blob_client.append_block.call_args_list[0].kwargs == {"appendpos_condition": 0}
+        blob_client.append_block.assert_called_with(encode_row(ROW, ReportFormat.CSV).encode())
+
+    def test_header_kept_when_first_append_fails(self, blob_client):
+        """Test that rows restored after a failed first append are written with the header"""
+        blob_client.append_block.side_effect = [azure.core.exceptions.ServiceRequestError("down"), None]
+        writer = ReportWriter(ReportFormat.CSV, max_rows=100, max_bytes=10_000, max_age=0)
+        writer.add("1/run.csv", ROW)
+
+        with pytest.raises(azure.core.exceptions.ServiceRequestError):
+            writer.flush()
+        blob_client.create_append_blob.side_effect = azure.core.exceptions.ResourceExistsError("exists")
+        writer.flush()
+
+        retried = blob_client.append_block.call_args_list[1]
+        assert retried.args[0].decode().startswith("Job ID,Title,Barcode")
+        assert retried.kwargs == {"appendpos_condition": 0}
+
+    @patch('alma_item_checks_update_service.services.report_writer.get_blob_service_client')
+    def test_rolls_over_at_max_blocks(self, mock_get):
+        """Test that a file at max_blocks gets no more rows and the next part gets a header"""
+        get_blob_client = mock_get.return_value.get_blob_client
+        get_blob_client.return_value.append_block.side_effect = [
+            {"blob_committed_block_count": 3}, {"blob_committed_block_count": 1},
+        ]
+        writer = ReportWriter(ReportFormat.CSV, max_rows=1, max_bytes=10_000, max_age=0, max_blocks=3)
+
+        writer.add("1/run.csv", ROW)
+        writer.add("1/run.csv", ROW)
+
+        assert [call.kwargs["blob"] for call in get_blob_client.call_args_list] == ["1/run.csv", "1/run.1.csv"]
+        second = get_blob_client.return_value.append_block.call_args_list[1]
+        assert second.args[0].decode().startswith("Job ID,Title,Barcode")
+        assert writer.blob_names("1/run.csv") == ["1/run.csv", "1/run.1.csv"]
+
+    @patch('alma_item_checks_update_service.services.report_writer.get_blob_service_client')
+    def test_rolls_over_at_block_cap(self, mock_get):
+        """Test that rows refused by a file at the service's block cap go to the next part"""
+        get_blob_client = mock_get.return_value.get_blob_client
+        at_cap = azure.core.exceptions.HttpResponseError("block count exceeds limit")
+        at_cap.error_code = "BlockCountExceedsLimit"
+        get_blob_client.return_value.create_append_blob.side_effect = [
+            azure.core.exceptions.ResourceExistsError("exists"), None,
+        ]
+        get_blob_client.return_value.append_block.side_effect = [at_cap, None]
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=1, max_bytes=10_000, max_age=0)
+
+        writer.add("1/run.jsonl", ROW)
+
+        assert [call.kwargs["blob"] for call in get_blob_client.call_args_list] == [
+            "1/run.jsonl", "1/run.1.jsonl",
+        ]
+        assert writer.pending_rows() == 0
+        assert writer.blob_names("1/run.jsonl") == ["1/run.jsonl", "1/run.1.jsonl"]
+
+    def test_write_appends_at_once(self, blob_client):
+        """Test that write appends the row without waiting for a threshold"""
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=10_000, max_age=30)
+        writer._start_flusher = Mock()
+
+        writer.write("1/run.jsonl", ROW)
+
+        blob_client.append_block.assert_called_once_with(encode_row(ROW, ReportFormat.JSONL).encode())
+        writer._start_flusher.assert_not_called()
+        assert writer.pending_rows() == 0
+
+    def test_flush_all_files(self, blob_client):
+        """Test that flush writes every file's buffered rows"""
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=10_000, max_age=0)
+        writer.add("1/run.jsonl", ROW)
+        writer.add("2/run.jsonl", ROW)
+
+        writer.flush()
+
+        assert blob_client.append_block.call_count == 2
+        assert writer.pending_rows() == 0
+
+    def test_failed_flush_keeps_rows(self, blob_client):
+        """Test that rows are kept for the next flush when the append fails"""
+        blob_client.append_block.side_effect = [azure.core.exceptions.ServiceRequestError("down"), None]
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=10_000, max_age=0)
+        writer.add("1/run.jsonl", ROW)
+
+        with pytest.raises(azure.core.exceptions.ServiceRequestError):
+            writer.flush()
+        assert writer.pending_rows() == 1
+
+        writer.flush()
+        assert writer.pending_rows() == 0
+
+    def test_failed_flush_keeps_later_files(self, blob_client):
+        """Test that files after the one that failed to write keep their rows too"""
+        blob_client.append_block.side_effect = azure.core.exceptions.ServiceRequestError("down")
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=10_000, max_age=0)
+        writer.add("1/run.jsonl", ROW)
+        writer.add("2/run.jsonl", ROW)
+
+        with pytest.raises(azure.core.exceptions.ServiceRequestError):
+            writer.flush()
+
+        assert writer.pending_rows() == 2
+
+    def test_after_write_waits_for_write_in_progress(self, blob_client):
+        """Test that a callback for rows being written runs once the write finishes"""
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=10_000, max_age=0)
+        callback = Mock()
+
+        def append_block(data):
+            writer.after_write("1/run.jsonl", callback)
+            callback.assert_not_called()  # the rows aren't written yet
+
+        blob_client.append_block.side_effect = append_block
+        writer.add("1/run.jsonl", ROW)
+
+        writer.flush()
+
+        callback.assert_called_once_with()
+
+    def test_after_write_waits_for_flush(self, blob_client):
+        """Test that a callback for a buffered file runs once its rows are appended"""
+        blob_client.append_block.side_effect = [azure.core.exceptions.ServiceRequestError("down"), None]
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=10_000, max_age=0)
+        callback = Mock()
+        writer.add("1/run.jsonl", ROW)
+        writer.after_write("1/run.jsonl", callback)
+        callback.assert_not_called()
+
+        with pytest.raises(azure.core.exceptions.ServiceRequestError):
+            writer.flush()
+        callback.assert_not_called()  # kept with the rows for the next flush
+
+        writer.flush()
+        callback.assert_called_once_with()
+
+    def test_after_write_nothing_buffered(self, blob_client):
+        """Test that a callback runs at once when the file has nothing buffered"""
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=1, max_bytes=10_000, max_age=0)
+        callback = Mock()
+        writer.add("1/run.jsonl", ROW)
+
+        writer.after_write("1/run.jsonl", callback)
+
+        callback.assert_called_once_with()
+
+    @patch('alma_item_checks_update_service.services.report_writer.time')
+    def test_flush_due(self, mock_time, blob_client):
+        """Test that only files whose oldest row reached max_age are written"""
+        mock_time.monotonic.return_value = 100.0
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=10_000, max_age=30)
+        writer._start_flusher = Mock()
+        writer.add("1/old.jsonl", ROW)
+        mock_time.monotonic.return_value = 120.0
+        writer.add("1/new.jsonl", ROW)
+
+        mock_time.monotonic.return_value = 131.0
+        writer.flush_due()
+
+        blob_client.append_block.assert_called_once()
+        assert writer.pending_rows() == 1
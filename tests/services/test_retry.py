@@ -0,0 +1,175 @@
+"""Unit tests for the retry policy"""
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+import requests
+from wrlc_alma_api_client.exceptions import AlmaApiError, InvalidInputError, NotFoundError
+
+from alma_item_checks_update_service.services.concurrency_limiter import ConcurrencyLimitTimeout
+from alma_item_checks_update_service.services.retry import (
+    RetryPolicy,
+    get_retry_after,
+    is_retryable,
+)
+
+
+def http_error(status_code, headers=None):
+    """Build a requests HTTPError carrying a response"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return requests.exceptions.HTTPError(f"{status_code} error", response=response)
+
+
+def alma_error(status_code):
+    """Build an AlmaApiError with a status code"""
+    error = AlmaApiError(f"{status_code} error")
+    error.status_code = status_code
+    return error
+
+
+class TestIsRetryable:
+    """Test class for error classification"""
+
+    @pytest.mark.parametrize("exc", [
+        requests.exceptions.Timeout("timed out"),
+        requests.exceptions.ConnectionError("reset"),
+        TimeoutError("timed out"),
+        http_error(429),
+        http_error(503),
+        alma_error(500),
+        alma_error(429),
+    ])
+    def test_retryable(self, exc):
+        """Test that transient errors are retryable"""
+        assert is_retryable(exc)
+
+    @pytest.mark.parametrize("exc", [
+        NotFoundError("missing"),
+        InvalidInputError("bad item"),
+        http_error(400),
+        http_error(404),
+        alma_error(401),
+        ValueError("bad value"),
+        AlmaApiError("no status"),
+        ConcurrencyLimitTimeout("no slot"),
+    ])
+    def test_fatal(self, exc):
+        """Test that permanent errors are not retried"""
+        assert not is_retryable(exc)
+
+    def test_wrapped_timeout_is_retryable(self):
+        """Test that a timeout wrapped by a client exception is retryable"""
+        try:
+            try:
+                raise requests.exceptions.ReadTimeout("timed out")
+            except requests.exceptions.ReadTimeout as e:
+                raise AlmaApiError("request failed") from e
+        except AlmaApiError as wrapped:
+            assert is_retryable(wrapped)
+
+
+class TestGetRetryAfter:
+    """Test class for Retry-After parsing"""
+
+    def test_seconds(self):
+        """Test a delay in seconds"""
+        assert get_retry_after(http_error(429, {"Retry-After": "7"})) == 7.0
+
+    def test_http_date_in_past(self):
+        """Test that an HTTP date in the past means no wait"""
+        assert get_retry_after(http_error(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+
+    def test_missing_or_invalid(self):
+        """Test that a missing or garbled header is ignored"""
+        assert get_retry_after(http_error(503)) is None
+        assert get_retry_after(http_error(503, {"Retry-After": "soon"})) is None
+        assert get_retry_after(ValueError("no response")) is None
+
+
+@patch('alma_item_checks_update_service.services.retry.time')
+class TestRetryPolicy:
+    """Test class for RetryPolicy"""
+
+    def test_success_after_retry(self, mock_time):
+        """Test that a transient failure is retried"""
+        mock_time.monotonic.return_value = 0.0
+        func = Mock(side_effect=[http_error(503), "ok"])
+
+        assert RetryPolicy(max_attempts=3, base_delay=1, max_delay=10, budget=60).call(func, "arg") == "ok"
+
+        assert func.call_count == 2
+        func.assert_called_with("arg")
+        assert 0 <= mock_time.sleep.call_args[0][0] <= 1
+
+    def test_fatal_error_not_retried(self, mock_time):
+        """Test that a fatal error is raised immediately"""
+        mock_time.monotonic.return_value = 0.0
+        func = Mock(side_effect=NotFoundError("missing"))
+
+        with pytest.raises(NotFoundError):
+            RetryPolicy(max_attempts=3, base_delay=1, max_delay=10, budget=60).call(func)
+
+        func.assert_called_once()
+        mock_time.sleep.assert_not_called()
+
+    def test_gives_up_after_max_attempts(self, mock_time):
+        """Test that retrying stops after max_attempts calls"""
+        mock_time.monotonic.return_value = 0.0
+        func = Mock(side_effect=http_error(503))
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            RetryPolicy(max_attempts=3, base_delay=1, max_delay=10, budget=60).call(func)
+
+        assert func.call_count == 3
+
+    def test_honors_retry_after(self, mock_time):
+        """Test that Retry-After replaces the backoff"""
+        mock_time.monotonic.return_value = 0.0
+        func = Mock(side_effect=[http_error(429, {"Retry-After": "5"}), "ok"])
+
+        RetryPolicy(max_attempts=3, base_delay=1, max_delay=10, budget=60).call(func)
+
+        mock_time.sleep.assert_called_once_with(5.0)
+
+    def test_stops_before_budget_overrun(self, mock_time):
+        """Test that a retry that would overrun the budget is not attempted"""
+        mock_time.monotonic.side_effect = [0.0, 50.0]
+        func = Mock(side_effect=http_error(429, {"Retry-After": "20"}))
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            RetryPolicy(max_attempts=5, base_delay=1, max_delay=10, budget=60).call(func)
+
+        func.assert_called_once()
+        mock_time.sleep.assert_not_called()
+
+    def test_budget_counts_attempt_timeout(self, mock_time):
+        """Test that a retry is skipped when its own timeout could overrun the budget"""
+        policy = RetryPolicy(max_attempts=5, base_delay=1, max_delay=1, budget=120, attempt_timeout=90)
+
+        mock_time.monotonic.return_value = 1.0  # failed fast: room for a full attempt
+        assert policy.next_delay(http_error(503), 1, 0.0) is not None
+
+        mock_time.monotonic.return_value = 40.0  # a 90s attempt would end past 120s
+        assert policy.next_delay(http_error(503), 1, 0.0) is None
+
+    def test_backoff_is_capped(self, mock_time):
+        """Test that exponential backoff never exceeds max_delay"""
+        mock_time.monotonic.return_value = 0.0
+        policy = RetryPolicy(max_attempts=10, base_delay=1, max_delay=4, budget=600)
+
+        delays = [policy.next_delay(http_error(503), attempt, 0.0) for attempt in range(1, 9)]
+
+        assert all(0 <= delay <= 4 for delay in delays)
+
+    @patch('alma_item_checks_update_service.services.retry.asyncio.sleep', new_callable=AsyncMock)
+    def test_call_async(self, mock_sleep, mock_time):
+        """Test retrying a coroutine function"""
+        mock_time.monotonic.return_value = 0.0
+        func = AsyncMock(side_effect=[TimeoutError("timed out"), "ok"])
+
+        result = asyncio.run(RetryPolicy(max_attempts=3, base_delay=1, max_delay=10, budget=60).call_async(func))
+
+        assert result == "ok"
+        mock_sleep.assert_awaited_once()
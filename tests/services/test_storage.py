@@ -0,0 +1,64 @@
+"""Unit tests for the shared storage service"""
+import threading
+from unittest.mock import patch
+
+from alma_item_checks_update_service.services.storage import (
+    get_blob_service_client,
+    get_queue_client,
+    get_storage_service,
+    reset_storage_service,
+)
+
+
+class TestStorage:
+    """Test class for the shared storage service"""
+
+    @patch('alma_item_checks_update_service.services.storage.StorageService')
+    def test_get_storage_service_is_shared(self, mock_storage_service):
+        """Test that the storage service is created once and reused"""
+        first = get_storage_service()
+        second = get_storage_service()
+
+        assert first is second
+        mock_storage_service.assert_called_once_with(storage_connection_string=None)
+
+    @patch('alma_item_checks_update_service.services.storage.StorageService')
+    def test_reset_storage_service(self, mock_storage_service):
+        """Test that reset forces a new storage service"""
+        get_storage_service()
+        reset_storage_service()
+        get_storage_service()
+
+        assert mock_storage_service.call_count == 2
+
+    @patch('alma_item_checks_update_service.services.storage.StorageService')
+    def test_get_storage_service_thread_safe(self, mock_storage_service):
+        """Test that concurrent first calls create a single storage service"""
+        threads = [threading.Thread(target=get_storage_service) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_storage_service.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.storage.QueueClient')
+    def test_get_queue_client_is_shared(self, mock_queue_client):
+        """Test that queue clients are created once per queue and base64 encode messages"""
+        first = get_queue_client("update-queue")
+        second = get_queue_client("update-queue")
+
+        assert first is second
+        mock_queue_client.from_connection_string.assert_called_once()
+        call_args = mock_queue_client.from_connection_string.call_args
+        assert call_args[0][1] == "update-queue"
+        assert call_args[1]["message_encode_policy"] is not None
+
+    @patch('alma_item_checks_update_service.services.storage.BlobServiceClient')
+    def test_get_blob_service_client_is_shared(self, mock_blob_service_client):
+        """Test that the blob service client is created once and dropped on reset"""
+        assert get_blob_service_client() is get_blob_service_client()
+        reset_storage_service()
+        get_blob_service_client()
+
+        assert mock_blob_service_client.from_connection_string.call_count == 2
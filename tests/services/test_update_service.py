@@ -1,4 +1,5 @@
 """Unit tests for UpdateService"""
+import gzip
 import json
 from unittest.mock import Mock, patch, MagicMock
 import pytest
@@ -8,7 +9,21 @@ import requests
 from wrlc_alma_api_client.exceptions import NotFoundError, InvalidInputError, AlmaApiError
 from wrlc_alma_api_client.models import Item
 
-from alma_item_checks_update_service.services.update_service import UpdateService
+from alma_item_checks_update_service.services.api_key_cache import api_key_cache
+from alma_item_checks_update_service.services.circuit_breaker import BreakerState, alma_circuit_breakers
+from alma_item_checks_update_service.services.compression import Compression, DecompressionError
+from alma_item_checks_update_service.services.concurrency_limiter import (
+    ConcurrencyLimiter,
+    ConcurrencyLimitTimeout,
+    alma_concurrency_limiter,
+)
+from alma_item_checks_update_service.services.idempotency import InMemoryIdempotencyStore, Stage
+from alma_item_checks_update_service.services.item_diff import DiffMode, item_fingerprint, item_fingerprints
+from alma_item_checks_update_service.services.message_validation import InvalidReason
+from alma_item_checks_update_service.services.metrics import InMemoryMetricsHook, PipelineStage, update_metrics
+from alma_item_checks_update_service.services.notification_coalescer import NotificationCoalescer, NotificationMode
+from alma_item_checks_update_service.services.report_writer import ReportFormat, ReportMode, ReportWriter
+from alma_item_checks_update_service.services.update_service import UpdateOutcome, UpdateService
 
 
 class TestUpdateService:
@@ -19,8 +34,7 @@ class TestUpdateService:
         """Mock queue message fixture"""
         mock_msg = Mock(spec=func.QueueMessage)
         test_data = {"job_id": "test-job-123", "institution_id": "12345"}
-        mock_msg.get_body.return_value = Mock()
-        mock_msg.get_body.return_value.decode.return_value = json.dumps(test_data)
+        mock_msg.get_body.return_value = json.dumps(test_data).encode()
         return mock_msg
 
     @pytest.fixture
@@ -50,7 +64,7 @@ class TestUpdateService:
         assert service.itemmsg == mock_queue_message
 
     @patch('alma_item_checks_update_service.services.update_service.Item')
-    @patch('alma_item_checks_update_service.services.update_service.AlmaApiClient')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
     @patch('alma_item_checks_update_service.services.update_service.logging')
     def test_update_item_success(self, mock_logging, mock_alma_client, mock_item_class, update_service, mock_item_data):
         """Test successful item update"""
@@ -69,8 +83,9 @@ class TestUpdateService:
             mock_client_instance = Mock()
             mock_alma_client.return_value = mock_client_instance
 
-            update_service.update_item()
+            outcome = update_service.update_item()
 
+            assert outcome == UpdateOutcome.UPDATED
             mock_get_item.assert_called_once_with("test-job-123")
             mock_get_api_key.assert_called_once_with(12345)
             mock_alma_client.assert_called_once_with(
@@ -94,24 +109,485 @@ class TestUpdateService:
                 item_pid="test-pid-123",
                 item_record_data=mock_item_instance
             )
-            mock_save_report.assert_called_once_with(mock_item_instance, "test-job-123")
+            mock_save_report.assert_called_once_with(
+                mock_item_instance, "test-job-123", {"job_id": "test-job-123", "institution_id": "12345"}
+            )
             mock_send_notification.assert_called_once()
 
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.update_service.alma_rate_limiter')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_acquires_rate_limit(self, mock_alma_client, mock_rate_limiter, mock_item_class,
+                                             update_service, mock_item_data):
+        """Test that the Alma call waits on the institution's rate limiter"""
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(update_service, 'save_report'), \
+             patch.object(update_service, 'send_notification'):
+
+            update_service.update_item()
+
+        mock_rate_limiter.acquire.assert_called_once_with(12345)
+
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.update_service.alma_rate_limiter')
+    @patch('alma_item_checks_update_service.services.update_service.alma_concurrency_limiter')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_takes_slot_before_token(self, mock_alma_client, mock_concurrency_limiter,
+                                                 mock_rate_limiter, mock_item_class, update_service, mock_item_data):
+        """Test that no rate-limit token is spent while waiting for a call slot"""
+        calls = Mock()
+        calls.attach_mock(mock_concurrency_limiter.slot, "slot")
+        calls.attach_mock(mock_rate_limiter.acquire, "acquire")
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(update_service, 'save_report'), \
+             patch.object(update_service, 'send_notification'):
+
+            update_service.update_item()
+
+        names = [name for name, _, _ in calls.mock_calls]
+        assert names.index("slot().__enter__") < names.index("acquire")
+
+    @patch('alma_item_checks_update_service.services.concurrency_limiter.time')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.update_service.alma_rate_limiter')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_token_wait_not_timed(self, mock_alma_client, mock_rate_limiter, mock_item_class,
+                                              mock_time, update_service, mock_item_data):
+        """Test that a slow rate-limit token doesn't count as Alma latency and cut the limit"""
+        clock = [100.0]
+        mock_time.monotonic.side_effect = lambda: clock[0]
+
+        def wait_for_token(institution_id):
+            clock[0] += 5.0  # well over the latency target
+
+        def alma_call(**kwargs):
+            clock[0] += 0.1
+
+        mock_rate_limiter.acquire.side_effect = wait_for_token
+        mock_alma_client.return_value.items.update_item.side_effect = alma_call
+        limiter = ConcurrencyLimiter(initial=4, minimum=1, maximum=16, latency_target=2.0,
+                                     decrease_factor=0.5, max_wait=5)
+
+        with patch('alma_item_checks_update_service.services.update_service.alma_concurrency_limiter', limiter), \
+             patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(update_service, 'save_report'), \
+             patch.object(update_service, 'send_notification'):
+
+            for _ in range(3):
+                assert update_service.update_item() == UpdateOutcome.UPDATED
+
+        stats = limiter.stats()[12345]
+        assert stats["latency"] == pytest.approx(0.1)
+        assert stats["limit"] >= 4
+
+    @patch('alma_item_checks_update_service.services.update_service.get_queue_client')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.update_service.alma_concurrency_limiter')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_deferred_when_no_slot(self, mock_alma_client, mock_concurrency_limiter, mock_item_class,
+                                               mock_get_queue_client, update_service, mock_item_data):
+        """Test that a slot timeout defers the message without retrying or tripping the breaker"""
+        mock_concurrency_limiter.max_wait = 5.0
+        mock_concurrency_limiter.slot.side_effect = ConcurrencyLimitTimeout("no slot")
+        breaker = alma_circuit_breakers.get(12345)
+        for _ in range(breaker.failure_threshold - 1):
+            breaker.record_failure()
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"):
+
+            assert update_service.update_item() == UpdateOutcome.DEFERRED
+
+        mock_concurrency_limiter.slot.assert_called_once()  # not retried in place
+        mock_alma_client.return_value.items.update_item.assert_not_called()
+        assert breaker.state == BreakerState.CLOSED
+        assert breaker.failures == breaker.failure_threshold - 1
+        assert mock_get_queue_client.return_value.send_message.call_args[1]["visibility_timeout"] == 5
+
+    @patch('alma_item_checks_update_service.services.retry.time')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_retries_transient_alma_error(self, mock_alma_client, mock_item_class, mock_time,
+                                                      update_service, mock_item_data):
+        """Test that a 503 from Alma is retried and the update completes"""
+        mock_time.monotonic.return_value = 0.0
+        error = AlmaApiError("Service Unavailable")
+        error.status_code = 503
+        mock_alma_client.return_value.items.update_item.side_effect = [error, None]
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(update_service, 'save_report'), \
+             patch.object(update_service, 'send_notification'):
+
+            assert update_service.update_item() == UpdateOutcome.UPDATED
+
+        assert mock_alma_client.return_value.items.update_item.call_count == 2
+        mock_time.sleep.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.retry.time')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_throttling_lowers_concurrency(self, mock_alma_client, mock_item_class, mock_time,
+                                                       update_service, mock_item_data):
+        """Test that a 429 from Alma backs off the institution's in-flight limit"""
+        mock_time.monotonic.return_value = 0.0
+        error = AlmaApiError("Too Many Requests")
+        error.status_code = 429
+        mock_alma_client.return_value.items.update_item.side_effect = [error, None]
+        initial = alma_concurrency_limiter.stats().get(12345, {}).get("limit", alma_concurrency_limiter.initial)
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(update_service, 'save_report'), \
+             patch.object(update_service, 'send_notification'):
+
+            assert update_service.update_item() == UpdateOutcome.UPDATED
+
+        assert alma_concurrency_limiter.stats()[12345]["limit"] < initial
+        assert alma_concurrency_limiter.stats()[12345]["in_flight"] == 0
+
+    @patch('alma_item_checks_update_service.services.update_service.get_queue_client')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_deferred_when_breaker_open(self, mock_alma_client, mock_item_class, mock_get_queue_client,
+                                                    update_service, mock_item_data):
+        """Test that an open breaker re-enqueues the message instead of calling Alma"""
+        breaker = alma_circuit_breakers.get(12345)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"):
+
+            assert update_service.update_item() == UpdateOutcome.DEFERRED
+
+        mock_alma_client.return_value.items.update_item.assert_not_called()
+        mock_get_queue_client.assert_called_once_with("update-queue")
+        sent = mock_get_queue_client.return_value.send_message.call_args
+        assert json.loads(sent[0][0]) == {"job_id": "test-job-123", "institution_id": "12345"}
+        assert 0 < sent[1]["visibility_timeout"] <= breaker.reset_timeout
+
+    @patch('alma_item_checks_update_service.services.update_service.get_queue_client')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_deferred_without_requeue(self, mock_alma_client, mock_item_class, mock_get_queue_client,
+                                                  update_service, mock_item_data):
+        """Test that a caller resuming deferred work itself gets no re-enqueued message"""
+        breaker = alma_circuit_breakers.get(12345)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        update_service.requeue_deferred = False
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"):
+
+            assert update_service.update_item() == UpdateOutcome.DEFERRED
+
+        mock_get_queue_client.assert_not_called()
+
+    @pytest.mark.parametrize("error,expected_failures", [(TimeoutError("timed out"), 1), (NotFoundError("gone"), 0)])
+    @patch('alma_item_checks_update_service.services.retry.time')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_breaker_counts_only_transient_errors(self, mock_alma_client, mock_item_class, mock_time,
+                                                              error, expected_failures, update_service,
+                                                              mock_item_data):
+        """Test that only Alma availability failures count towards opening the breaker"""
+        mock_time.monotonic.return_value = 0.0
+        mock_alma_client.return_value.items.update_item.side_effect = error
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"):
+
+            assert update_service.update_item() == UpdateOutcome.ALMA_FAILED
+
+        assert alma_circuit_breakers.get(12345).failures == expected_failures
+        assert alma_circuit_breakers.get(12345).state == BreakerState.CLOSED
+
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_fingerprint_skips_repeat(self, mock_alma_client, mock_item_class, mock_queue_message,
+                                                  mock_item_data):
+        """Test that re-sending an identical item skips the PUT but still reports and notifies"""
+        service = UpdateService(mock_queue_message, diff_mode=DiffMode.FINGERPRINT)
+
+        with patch.object(service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(service, 'save_report') as mock_save_report, \
+             patch.object(service, 'send_notification') as mock_send_notification:
+
+            assert service.update_item() == UpdateOutcome.UPDATED
+            assert service.update_item() == UpdateOutcome.UNCHANGED
+
+        mock_alma_client.return_value.items.update_item.assert_called_once()
+        assert mock_save_report.call_count == 2
+        assert mock_send_notification.call_count == 2
+        assert item_fingerprints.get("test-pid-123") == item_fingerprint(mock_item_data["item_data"])
+
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_records_stages(self, mock_alma_client, mock_item_class, mock_queue_message,
+                                        mock_item_data):
+        """Test that every stage is recorded and a redelivered job is skipped"""
+        ledger = InMemoryIdempotencyStore()
+        service = UpdateService(mock_queue_message, ledger=ledger)
+
+        with patch.object(service, 'get_item_data', return_value=mock_item_data) as mock_get_item, \
+             patch.object(service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(service, 'save_report'), \
+             patch.object(service, 'send_notification') as mock_send_notification:
+
+            assert service.update_item() == UpdateOutcome.UPDATED
+            assert service.update_item() == UpdateOutcome.ALREADY_PROCESSED
+
+        assert ledger.get("test-job-123") == set(Stage)
+        mock_get_item.assert_called_once()
+        mock_alma_client.return_value.items.update_item.assert_called_once()
+        mock_send_notification.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_resumes_after_update(self, mock_alma_client, mock_item_class, mock_queue_message,
+                                              mock_item_data):
+        """Test that a job redelivered after its Alma update doesn't update again"""
+        ledger = InMemoryIdempotencyStore()
+        ledger.mark("test-job-123", Stage.UPDATED)
+        service = UpdateService(mock_queue_message, ledger=ledger)
+
+        with patch.object(service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(service, 'get_api_key') as mock_get_api_key, \
+             patch.object(service, 'save_report') as mock_save_report, \
+             patch.object(service, 'send_notification') as mock_send_notification:
+
+            assert service.update_item() == UpdateOutcome.UPDATED
+
+        mock_get_api_key.assert_not_called()
+        mock_alma_client.return_value.items.update_item.assert_not_called()
+        mock_save_report.assert_called_once()
+        mock_send_notification.assert_called_once()
+
+    @patch('alma_item_checks_update_service.services.report_writer.get_blob_service_client')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_aggregated_report_recorded_once_written(self, mock_alma_client, mock_item_class,
+                                                                 mock_get_blob_client, mock_queue_message,
+                                                                 mock_item_data):
+        """Test that a buffered report row only counts as reported once it's appended"""
+        ledger = InMemoryIdempotencyStore()
+        service = UpdateService(mock_queue_message, ledger=ledger, buffered=True)
+        service.report_mode = ReportMode.AGGREGATE
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=1_000_000, max_age=0)
+
+        with patch('alma_item_checks_update_service.services.update_service.report_writer', writer), \
+             patch.object(service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(service, 'build_report_data', return_value={"Job ID": "test-job-123"}), \
+             patch.object(service, 'send_notification'):
+
+            assert service.update_item() == UpdateOutcome.UPDATED
+            assert ledger.get("test-job-123") == {Stage.UPDATED}
+
+            service.flush_buffered()
+
+        mock_get_blob_client.return_value.get_blob_client.return_value.append_block.assert_called_once()
+        assert ledger.get("test-job-123") == set(Stage)
+
+    @patch('alma_item_checks_update_service.services.report_writer.get_blob_service_client')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_aggregated_report_written_at_once(self, mock_alma_client, mock_item_class,
+                                                           mock_get_blob_client, mock_queue_message,
+                                                           mock_item_data):
+        """Test that a single message appends its report row before it returns"""
+        ledger = InMemoryIdempotencyStore()
+        service = UpdateService(mock_queue_message, ledger=ledger, report_mode="aggregate")
+        writer = ReportWriter(ReportFormat.JSONL, max_rows=100, max_bytes=1_000_000, max_age=0)
+
+        with patch('alma_item_checks_update_service.services.update_service.report_writer', writer), \
+             patch.object(service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(service, 'build_report_data', return_value={"Job ID": "test-job-123"}), \
+             patch.object(service, 'send_notification'):
+
+            assert service.update_item() == UpdateOutcome.UPDATED
+
+        mock_get_blob_client.return_value.get_blob_client.return_value.append_block.assert_called_once()
+        assert writer.pending_rows() == 0
+        assert ledger.get("test-job-123") == set(Stage)
+
+    @patch('alma_item_checks_update_service.services.notification_coalescer.get_storage_service')
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_coalesced_notification_recorded_once_sent(self, mock_alma_client, mock_item_class,
+                                                                   mock_get_storage_service, mock_queue_message,
+                                                                   mock_item_data):
+        """Test that a coalesced job only counts as notified once its summary is sent"""
+        ledger = InMemoryIdempotencyStore()
+        service = UpdateService(mock_queue_message, ledger=ledger, notification_mode="coalesce", buffered=True)
+        coalescer = NotificationCoalescer(max_jobs=100, window=0)
+
+        with patch('alma_item_checks_update_service.services.update_service.notification_coalescer', coalescer), \
+             patch.object(service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(service, 'save_report'):
+
+            assert service.update_item() == UpdateOutcome.UPDATED
+            assert ledger.get("test-job-123") == {Stage.UPDATED, Stage.REPORTED}
+
+            service.flush_buffered()
+
+        mock_get_storage_service.return_value.send_queue_message.assert_called_once()
+        assert ledger.get("test-job-123") == set(Stage)
+
+    def test_flush_buffered_item_modes(self, mock_queue_message):
+        """Test that nothing is flushed when reports and notifications aren't buffered"""
+        service = UpdateService(mock_queue_message)
+        service.report_mode = ReportMode.ITEM
+        service.notification_mode = NotificationMode.ITEM
+
+        with patch('alma_item_checks_update_service.services.update_service.report_writer') as mock_writer, \
+             patch('alma_item_checks_update_service.services.update_service.notification_coalescer') as mock_coalescer:
+            service.flush_buffered()
+
+        mock_writer.flush.assert_not_called()
+        mock_coalescer.flush.assert_not_called()
+
+    def test_update_item_resumes_after_report(self, mock_queue_message):
+        """Test that a job redelivered after its report only sends the notification"""
+        ledger = InMemoryIdempotencyStore()
+        ledger.mark("test-job-123", Stage.REPORTED)
+        service = UpdateService(mock_queue_message, ledger=ledger)
+
+        with patch.object(service, 'get_item_data') as mock_get_item, \
+             patch.object(service, 'save_report') as mock_save_report, \
+             patch.object(service, 'send_notification') as mock_send_notification:
+
+            assert service.update_item() == UpdateOutcome.UPDATED
+
+        mock_get_item.assert_not_called()
+        mock_save_report.assert_not_called()
+        mock_send_notification.assert_called_once_with({"job_id": "test-job-123", "institution_id": "12345"})
+        assert Stage.NOTIFIED in ledger.get("test-job-123")
+
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_failure_not_recorded_as_updated(self, mock_alma_client, mock_item_class,
+                                                         mock_queue_message, mock_item_data):
+        """Test that a failed Alma update leaves the job to be retried"""
+        ledger = InMemoryIdempotencyStore()
+        service = UpdateService(mock_queue_message, ledger=ledger)
+        mock_alma_client.return_value.items.update_item.side_effect = InvalidInputError("bad")
+
+        with patch.object(service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(service, 'get_api_key', return_value="test-api-key"):
+
+            assert service.update_item() == UpdateOutcome.ALMA_FAILED
+
+        assert ledger.get("test-job-123") == set()
+
+    @pytest.mark.parametrize("live_item_data,expected", [
+        ({"pid": "test-pid-123", "barcode": "123456789", "alternative_call_number": "TEST123",
+          "internal_note_1": "Test note", "provenance": {"value": "TEST_CODE", "desc": "Test Provenance"},
+          "creation_date": "2024-01-01Z"}, UpdateOutcome.UNCHANGED),
+        ({"pid": "test-pid-123", "barcode": "123456789", "alternative_call_number": "OLD",
+          "internal_note_1": "Test note", "provenance": {"value": "TEST_CODE"}}, UpdateOutcome.UPDATED),
+    ])
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_live_diff(self, mock_alma_client, mock_item_class, live_item_data, expected,
+                                   mock_queue_message, mock_item_data):
+        """Test that live diff mode compares the payload with the item in Alma"""
+        service = UpdateService(mock_queue_message, diff_mode=DiffMode.LIVE)
+        mock_alma_client.return_value.items.get_item.return_value = {"item_data": live_item_data}
+
+        with patch.object(service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(service, 'save_report'), \
+             patch.object(service, 'send_notification'):
+
+            assert service.update_item() == expected
+
+        mock_alma_client.return_value.items.get_item.assert_called_once_with(
+            mms_id="test-mms-123", holding_id="test-holding-123", item_pid="test-pid-123"
+        )
+        assert mock_alma_client.return_value.items.update_item.called is (expected == UpdateOutcome.UPDATED)
+
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    @patch('alma_item_checks_update_service.services.update_service.logging')
+    def test_update_item_live_diff_read_failure(self, mock_logging, mock_alma_client, mock_item_class,
+                                                mock_queue_message, mock_item_data):
+        """Test that a failed live read falls back to sending the update"""
+        service = UpdateService(mock_queue_message, diff_mode=DiffMode.LIVE)
+        mock_alma_client.return_value.items.get_item.side_effect = AlmaApiError("read failed")
+
+        with patch.object(service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(service, 'save_report'), \
+             patch.object(service, 'send_notification'):
+
+            assert service.update_item() == UpdateOutcome.UPDATED
+
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    def test_build_item_slim(self, mock_item_class, mock_queue_message, mock_item_data):
+        """Test that the slim projection builds the Item without the rest of bib_data"""
+        service = UpdateService(mock_queue_message, item_projection="slim")
+        mock_item_data["bib_data"]["anies"] = ["<record/>"]
+
+        assert service.build_item(mock_item_data) == mock_item_class.return_value
+        mock_item_class.assert_called_once_with(
+            bib_data={"title": "Test Book", "mms_id": "test-mms-123"},
+            holding_data=mock_item_data["holding_data"],
+            item_data=mock_item_data["item_data"],
+            link=mock_item_data["link"]
+        )
+
+    def test_build_item_slim_report(self, mock_queue_message, mock_item_data):
+        """Test that a slim Item still has every report field"""
+        full = UpdateService(mock_queue_message, item_projection="full")
+        slim = UpdateService(mock_queue_message, item_projection="slim")
+
+        assert slim.build_report_data(slim.build_item(mock_item_data)) == \
+            full.build_report_data(full.build_item(mock_item_data))
+
+    def test_invalid_diff_mode(self, mock_queue_message):
+        """Test that an unknown diff mode is rejected"""
+        with pytest.raises(ValueError):
+            UpdateService(mock_queue_message, diff_mode="sometimes")
+
+    def test_invalid_item_projection(self, mock_queue_message):
+        """Test that an unknown item projection is rejected"""
+        with pytest.raises(ValueError):
+            UpdateService(mock_queue_message, item_projection="tiny")
+
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_update_item_no_job_id(self, mock_logging, update_service):
+    def test_update_item_no_job_id(self, mock_logging, mock_dead_letter, update_service):
         """Test update_item with no job_id"""
         mock_queue_message = Mock(spec=func.QueueMessage)
         test_data = {"job_id": None}
-        mock_queue_message.get_body.return_value = Mock()
-        mock_queue_message.get_body.return_value.decode.return_value = json.dumps(test_data)
+        mock_queue_message.get_body.return_value = json.dumps(test_data).encode()
 
         service = UpdateService(mock_queue_message)
-        service.update_item()
 
+        assert service.update_item() == UpdateOutcome.MISSING_JOB_ID
         mock_logging.error.assert_called_with("UpdateService.update_item: No job id provided")
+        mock_dead_letter.assert_called_once()
+        assert mock_dead_letter.call_args[0][1] == test_data
 
+    def test_update_item_without_queue_message(self):
+        """Test update_item requires a queue message"""
+        with pytest.raises(ValueError, match="No queue message provided"):
+            UpdateService().update_item()
+
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_update_item_no_item_found(self, mock_logging, update_service):
+    def test_update_item_no_item_found(self, mock_logging, mock_dead_letter, update_service):
         """Test update_item when item is not found"""
         with patch.object(update_service, 'get_item_data') as mock_get_item:
             mock_get_item.return_value = None
@@ -120,15 +596,16 @@ class TestUpdateService:
 
             mock_logging.error.assert_called_with("UpdateService.update_item: Item not found")
 
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
     @patch('alma_item_checks_update_service.services.update_service.Item')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_update_item_no_institution_id(self, mock_logging, mock_item_class, update_service, mock_item_data):
+    def test_update_item_no_institution_id(self, mock_logging, mock_item_class, mock_dead_letter, update_service,
+                                           mock_item_data):
         """Test update_item when institution_id is None"""
         # Create a queue message without institution_id
         mock_queue_message = Mock(spec=func.QueueMessage)
         test_data = {"job_id": "test-job-123", "institution_id": None}
-        mock_queue_message.get_body.return_value = Mock()
-        mock_queue_message.get_body.return_value.decode.return_value = json.dumps(test_data)
+        mock_queue_message.get_body.return_value = json.dumps(test_data).encode()
 
         service = UpdateService(mock_queue_message)
 
@@ -141,9 +618,10 @@ class TestUpdateService:
             service.update_item()
 
         mock_logging.error.assert_called_with("UpdateService.update_item: No institution id provided")
+        mock_get_item.assert_not_called()  # rejected before any download
 
     @patch('alma_item_checks_update_service.services.update_service.Item')
-    @patch('alma_item_checks_update_service.services.update_service.AlmaApiClient')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
     @patch('alma_item_checks_update_service.services.update_service.logging')
     def test_update_item_api_error(self, mock_logging, mock_alma_client, mock_item_class, update_service, mock_item_data):
         """Test update_item with API error"""
@@ -170,41 +648,110 @@ class TestUpdateService:
             assert "UpdateService.update_item: Failed to update item:" in call_message
             assert "API Error" in call_message
 
-    @patch('alma_item_checks_update_service.services.update_service.StorageService')
-    def test_get_item_data_success(self, mock_storage_service, update_service, mock_item_data):
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    @patch('alma_item_checks_update_service.services.update_service.logging')
+    def test_update_item_no_api_key(self, mock_logging, mock_alma_client, mock_item_class, update_service,
+                                    mock_item_data):
+        """Test update_item stops when no API key is found"""
+        with patch.object(update_service, 'get_item_data') as mock_get_item, \
+             patch.object(update_service, 'get_api_key') as mock_get_api_key:
+
+            mock_get_item.return_value = mock_item_data
+            mock_get_api_key.return_value = None
+
+            update_service.update_item()
+
+            mock_alma_client.assert_not_called()
+            mock_logging.error.assert_called_with("UpdateService.update_item: No institution api key found")
+
+    @pytest.mark.parametrize("status_code,invalidated", [(401, True), (403, True), (400, False)])
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    @patch('alma_item_checks_update_service.services.update_service.logging')
+    def test_update_item_auth_error_invalidates_key(self, mock_logging, mock_alma_client, mock_item_class,
+                                                    status_code, invalidated, update_service, mock_item_data):
+        """Test that an API key rejected by Alma is dropped from the cache"""
+        api_key_cache.set(12345, "stale-key")
+
+        error = AlmaApiError("Rejected")
+        error.status_code = status_code
+        mock_alma_client.return_value.items.update_item.side_effect = error
+
+        with patch.object(update_service, 'get_item_data') as mock_get_item:
+            mock_get_item.return_value = mock_item_data
+            update_service.update_item()
+
+        assert (api_key_cache.stats()["size"] == 0) is invalidated
+
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
+    def test_get_item_data_success(self, mock_blob_service_client, update_service, mock_item_data):
         """Test successful get_item_data"""
-        mock_storage_instance = Mock()
-        mock_storage_instance.download_blob_as_json.return_value = mock_item_data
-        mock_storage_service.return_value = mock_storage_instance
+        mock_blob_client = mock_blob_service_client.return_value.get_blob_client.return_value
+        mock_blob_client.download_blob.return_value.chunks.return_value = [json.dumps(mock_item_data).encode()]
 
         result = update_service.get_item_data("test-job-123")
 
         assert result == mock_item_data
-        mock_storage_instance.download_blob_as_json.assert_called_once_with(
-            container_name="updated-items-container",
-            blob_name="test-job-123.json"
+        mock_blob_service_client.return_value.get_blob_client.assert_called_once_with(
+            container="updated-items-container",
+            blob="test-job-123.json"
+        )
+
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
+    def test_get_item_data_gzip(self, mock_blob_service_client, update_service, mock_item_data):
+        """Test that a gzipped payload is decompressed as it streams in"""
+        data = gzip.compress(json.dumps(mock_item_data).encode())
+        mock_blob_client = mock_blob_service_client.return_value.get_blob_client.return_value
+        mock_blob_client.download_blob.return_value.chunks.return_value = [data[:10], data[10:]]
+
+        assert update_service.get_item_data("test-job-123") == mock_item_data
+
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
+    def test_get_item_data_gzip_content_encoding(self, mock_blob_service_client, update_service, mock_item_data):
+        """Test that a gzip blob with Content-Encoding is downloaded raw and decoded across many chunks"""
+        data = gzip.compress(json.dumps(mock_item_data).encode())
+        downloader = mock_blob_service_client.return_value.get_blob_client.return_value.download_blob.return_value
+        downloader.properties.content_settings.content_encoding = "gzip"
+        downloader.chunks.return_value = [data[i:i + 8] for i in range(0, len(data), 8)]
+
+        assert update_service.get_item_data("test-job-123") == mock_item_data
+        mock_blob_service_client.return_value.get_blob_client.return_value.download_blob.assert_called_once_with(
+            decompress=False
         )
 
-    @patch('alma_item_checks_update_service.services.update_service.StorageService')
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
+    def test_get_item_data_undecodable_retried(self, mock_blob_service_client, update_service):
+        """Test that corrupt payloads and a missing zstandard raise for the queue to retry"""
+        mock_blob_client = mock_blob_service_client.return_value.get_blob_client.return_value
+        mock_blob_client.download_blob.return_value.chunks.return_value = [b"\x1f\x8b" + b"not gzip at all"]
+
+        with pytest.raises(DecompressionError):
+            update_service.get_item_data("test-job-123")
+
+        mock_blob_client.download_blob.return_value.chunks.return_value = [b"\x28\xb5\x2f\xfd\x00"]
+        with patch.dict("sys.modules", {"zstandard": None}):
+            with pytest.raises(ImportError):
+                update_service.get_item_data("test-job-123")
+
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_get_item_data_storage_error(self, mock_logging, mock_storage_service, update_service):
+    def test_get_item_data_storage_error(self, mock_logging, mock_blob_service_client, update_service):
         """Test get_item_data with storage error"""
-        mock_storage_instance = Mock()
-        mock_storage_instance.download_blob_as_json.side_effect = azure.core.exceptions.ResourceNotFoundError("Not found")
-        mock_storage_service.return_value = mock_storage_instance
+        mock_blob_client = mock_blob_service_client.return_value.get_blob_client.return_value
+        mock_blob_client.download_blob.side_effect = azure.core.exceptions.ResourceNotFoundError("Not found")
 
         result = update_service.get_item_data("test-job-123")
 
         assert result is None
         mock_logging.warning.assert_called_with("UpdateService.update_item: Failed to download item from storage service: Not found")
 
-    @patch('alma_item_checks_update_service.services.update_service.StorageService')
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_get_item_data_none_item(self, mock_logging, mock_storage_service, update_service):
+    def test_get_item_data_none_item(self, mock_logging, mock_blob_service_client, update_service):
         """Test get_item_data when item is None"""
-        mock_storage_instance = Mock()
-        mock_storage_instance.download_blob_as_json.return_value = None
-        mock_storage_service.return_value = mock_storage_instance
+        mock_blob_client = mock_blob_service_client.return_value.get_blob_client.return_value
+        mock_blob_client.download_blob.return_value.chunks.return_value = [b"null"]
 
         result = update_service.get_item_data("test-job-123")
 
@@ -224,6 +771,18 @@ class TestUpdateService:
         mock_requests.get.assert_called_once()
         mock_response.raise_for_status.assert_called_once()
 
+    @patch('alma_item_checks_update_service.services.update_service.requests')
+    def test_get_api_key_cached(self, mock_requests, update_service):
+        """Test that get_api_key only calls the Institution API once per institution"""
+        mock_response = Mock()
+        mock_response.json.return_value = {"api_key": "test-api-key-123"}
+        mock_requests.get.return_value = mock_response
+
+        assert update_service.get_api_key(12345) == "test-api-key-123"
+        assert UpdateService(Mock()).get_api_key(12345) == "test-api-key-123"
+
+        mock_requests.get.assert_called_once()
+
     @patch('alma_item_checks_update_service.services.update_service.requests')
     @patch('alma_item_checks_update_service.services.update_service.logging')
     def test_get_api_key_http_error(self, mock_logging, mock_requests, update_service):
@@ -240,6 +799,18 @@ class TestUpdateService:
         assert result is None
         mock_logging.warning.assert_called_with("UpdateService.update_item: Failed to get API key: HTTP Error")
 
+    @patch('alma_item_checks_update_service.services.retry.time')
+    @patch('alma_item_checks_update_service.services.update_service.requests')
+    def test_get_api_key_retries_timeout(self, mock_requests, mock_time, update_service):
+        """Test that an Institution API timeout is retried"""
+        mock_time.monotonic.return_value = 0.0
+        mock_response = Mock()
+        mock_response.json.return_value = {"api_key": "test-api-key-123"}
+        mock_requests.get.side_effect = [requests.exceptions.Timeout("timed out"), mock_response]
+
+        assert update_service.get_api_key(12345) == "test-api-key-123"
+        assert mock_requests.get.call_count == 2
+
     @patch('alma_item_checks_update_service.services.update_service.requests')
     @patch('alma_item_checks_update_service.services.update_service.logging')
     def test_get_api_key_none_response(self, mock_logging, mock_requests, update_service):
@@ -253,7 +824,7 @@ class TestUpdateService:
         assert result is None
         mock_logging.warning.assert_called_with("UpdateService.update_item: No institution api key provided")
 
-    @patch('alma_item_checks_update_service.services.update_service.StorageService')
+    @patch('alma_item_checks_update_service.services.update_service.get_storage_service')
     def test_send_notification_success(self, mock_storage_service, update_service):
         """Test successful send_notification"""
         mock_storage_instance = Mock()
@@ -275,7 +846,7 @@ class TestUpdateService:
         (Exception, "Generic exception")
     ])
     @patch('alma_item_checks_update_service.services.update_service.Item')
-    @patch('alma_item_checks_update_service.services.update_service.AlmaApiClient')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
     @patch('alma_item_checks_update_service.services.update_service.logging')
     def test_update_item_various_exceptions(self, mock_logging, mock_alma_client, mock_item_class,
                                           exception_type, error_message, update_service, mock_item_data):
@@ -307,29 +878,28 @@ class TestUpdateService:
         ValueError,
         json.JSONDecodeError,
         azure.core.exceptions.ResourceNotFoundError,
-        azure.core.exceptions.ServiceRequestError,
         Exception
     ])
-    @patch('alma_item_checks_update_service.services.update_service.StorageService')
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_get_item_data_various_exceptions(self, mock_logging, mock_storage_service,
+    def test_get_item_data_various_exceptions(self, mock_logging, mock_blob_service_client,
                                             exception_type, update_service):
         """Test get_item_data with various exception types"""
-        mock_storage_instance = Mock()
+        mock_blob_client = mock_blob_service_client.return_value.get_blob_client.return_value
         if exception_type == json.JSONDecodeError:
-            mock_storage_instance.download_blob_as_json.side_effect = exception_type("msg", "doc", 0)
+            mock_blob_client.download_blob.side_effect = exception_type("msg", "doc", 0)
         else:
-            mock_storage_instance.download_blob_as_json.side_effect = exception_type("Test error")
-        mock_storage_service.return_value = mock_storage_instance
+            mock_blob_client.download_blob.side_effect = exception_type("Test error")
 
         result = update_service.get_item_data("test-job-123")
 
         assert result is None
         mock_logging.warning.assert_called()
 
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
     @patch('alma_item_checks_update_service.services.update_service.Item')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_update_item_missing_mms_id(self, mock_logging, mock_item_class, update_service):
+    def test_update_item_missing_mms_id(self, mock_logging, mock_item_class, mock_dead_letter, update_service):
         """Test update_item with missing mms_id"""
         mock_item_data = {
             "bib_data": {"title": "Test Book"},  # No mms_id
@@ -350,9 +920,10 @@ class TestUpdateService:
             calls = mock_logging.error.call_args_list
             assert any("Missing required IDs" in str(call) for call in calls)
 
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
     @patch('alma_item_checks_update_service.services.update_service.Item')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_update_item_missing_holding_id(self, mock_logging, mock_item_class, update_service):
+    def test_update_item_missing_holding_id(self, mock_logging, mock_item_class, mock_dead_letter, update_service):
         """Test update_item with missing holding_id"""
         mock_item_data = {
             "bib_data": {"title": "Test Book", "mms_id": "test-mms-123"},
@@ -373,9 +944,10 @@ class TestUpdateService:
             calls = mock_logging.error.call_args_list
             assert any("Missing required IDs" in str(call) for call in calls)
 
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
     @patch('alma_item_checks_update_service.services.update_service.Item')
     @patch('alma_item_checks_update_service.services.update_service.logging')
-    def test_update_item_missing_item_pid(self, mock_logging, mock_item_class, update_service):
+    def test_update_item_missing_item_pid(self, mock_logging, mock_item_class, mock_dead_letter, update_service):
         """Test update_item with missing item_pid"""
         mock_item_data = {
             "bib_data": {"title": "Test Book", "mms_id": "test-mms-123"},
@@ -396,7 +968,7 @@ class TestUpdateService:
             calls = mock_logging.error.call_args_list
             assert any("Missing required IDs" in str(call) for call in calls)
 
-    @patch('alma_item_checks_update_service.services.update_service.StorageService')
+    @patch('alma_item_checks_update_service.services.update_service.get_storage_service')
     def test_save_report_with_all_fields(self, mock_storage_service, update_service):
         """Test save_report with all optional fields present"""
         mock_storage_instance = Mock()
@@ -431,7 +1003,31 @@ class TestUpdateService:
         }
         assert uploaded_data == expected_data
 
-    @patch('alma_item_checks_update_service.services.update_service.StorageService')
+    @patch('alma_item_checks_update_service.services.update_service.get_storage_service')
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
+    def test_save_report_compressed(self, mock_blob_service_client, mock_storage_service, update_service):
+        """Test that a compressed report is uploaded with its content encoding"""
+        update_service.report_compression = Compression.GZIP
+        mock_item = Mock()
+        mock_item.bib_data.title = "Test Book"
+        mock_item.item_data.barcode = "123"
+        mock_item.item_data.alternative_call_number = "CALL"
+        mock_item.item_data.internal_note_1 = ""
+        mock_item.item_data.provenance.desc = ""
+
+        update_service.save_report(mock_item, "test-job-123")
+
+        mock_blob_service_client.return_value.get_blob_client.assert_called_once_with(
+            container="reports-container", blob="test-job-123.json"
+        )
+        upload = mock_blob_service_client.return_value.get_blob_client.return_value.upload_blob.call_args
+        assert json.loads(gzip.decompress(upload[0][0])) == {
+            "Title": "Test Book", "Barcode": "123", "Item Call Number": "CALL"
+        }
+        assert upload[1]["content_settings"].content_encoding == "gzip"
+        mock_storage_service.assert_not_called()
+
+    @patch('alma_item_checks_update_service.services.update_service.get_storage_service')
     def test_save_report_with_minimal_fields(self, mock_storage_service, update_service):
         """Test save_report with only required fields"""
         mock_storage_instance = Mock()
@@ -464,7 +1060,7 @@ class TestUpdateService:
         }
         assert uploaded_data == expected_data
 
-    @patch('alma_item_checks_update_service.services.update_service.StorageService')
+    @patch('alma_item_checks_update_service.services.update_service.get_storage_service')
     def test_save_report_with_none_provenance_desc(self, mock_storage_service, update_service):
         """Test save_report with None provenance desc"""
         mock_storage_instance = Mock()
@@ -494,3 +1090,172 @@ class TestUpdateService:
             "Internal Note 1": "Note here"
         }
         assert uploaded_data == expected_data
+
+    @patch('alma_item_checks_update_service.services.update_service.report_writer')
+    @patch('alma_item_checks_update_service.services.update_service.get_storage_service')
+    def test_save_report_aggregated(self, mock_storage_service, mock_report_writer, mock_queue_message):
+        """Test that aggregate mode buffers a row in the run's report file for batch runs"""
+        mock_report_writer.report_format = "csv"
+        service = UpdateService(mock_queue_message, report_mode="aggregate", buffered=True)
+        mock_item = Mock()
+        mock_item.bib_data.title = "Test Book"
+        mock_item.item_data.barcode = "111222333"
+        mock_item.item_data.alternative_call_number = "ABC123"
+        mock_item.item_data.internal_note_1 = ""
+        mock_item.item_data.provenance.desc = None
+
+        service.save_report(mock_item, "test-job-123", {"job_id": "test-job-123", "institution_id": "1",
+                                                          "run_id": "run-7"})
+
+        mock_report_writer.add.assert_called_once_with("1/run-7.csv", {
+            "Job ID": "test-job-123", "Title": "Test Book", "Barcode": "111222333", "Item Call Number": "ABC123"
+        })
+        mock_report_writer.write.assert_not_called()
+        mock_storage_service.assert_not_called()
+
+    @patch('alma_item_checks_update_service.services.update_service.report_writer')
+    def test_save_report_aggregated_unbuffered(self, mock_report_writer, mock_queue_message):
+        """Test that a single message writes its row to the run's report file at once"""
+        mock_report_writer.report_format = "jsonl"
+        service = UpdateService(mock_queue_message, report_mode="aggregate")
+
+        with patch.object(service, 'build_report_data', return_value={"Title": "Test Book"}):
+            service.save_report(Mock(), "test-job-123", {"institution_id": "1", "run_id": "run-7"})
+
+        mock_report_writer.write.assert_called_once_with("1/run-7.jsonl", {"Job ID": "test-job-123",
+                                                                          "Title": "Test Book"})
+        mock_report_writer.add.assert_not_called()
+
+    @patch('alma_item_checks_update_service.services.update_service.notification_coalescer')
+    @patch('alma_item_checks_update_service.services.update_service.get_storage_service')
+    def test_send_notification_coalesced(self, mock_storage_service, mock_coalescer, mock_queue_message):
+        """Test that coalesce mode adds the job to its summary, pointing at the aggregated report"""
+        service = UpdateService(mock_queue_message, report_mode="aggregate", notification_mode="coalesce",
+                                buffered=True)
+        message_data = {"job_id": "test-job-123", "institution_id": "1", "run_id": "run-7"}
+
+        service.send_notification(message_data)
+
+        mock_coalescer.add.assert_called_once_with(message_data, "1/run-7.jsonl")
+        mock_storage_service.assert_not_called()
+
+    @patch('alma_item_checks_update_service.services.update_service.notification_coalescer')
+    @patch('alma_item_checks_update_service.services.update_service.get_storage_service')
+    def test_send_notification_single_message_not_coalesced(self, mock_storage_service, mock_coalescer,
+                                                            mock_queue_message):
+        """Test that a single message is announced on its own even in coalesce mode"""
+        service = UpdateService(mock_queue_message, notification_mode="coalesce")
+        message_data = {"job_id": "test-job-123", "institution_id": "1", "run_id": "run-7"}
+
+        service.send_notification(message_data)
+
+        assert service.notification_mode == NotificationMode.ITEM
+        mock_storage_service.return_value.send_queue_message.assert_called_once_with(
+            queue_name="notification-queue", message_content=message_data
+        )
+        mock_coalescer.add.assert_not_called()
+
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
+    def test_get_item_data_prefetched(self, mock_blob_service_client, update_service, mock_item_data):
+        """Test that a prefetched payload is used instead of downloading it again"""
+        update_service.prefetcher = Mock()
+        update_service.prefetcher.take.return_value = (True, mock_item_data)
+
+        assert update_service.get_item_data("test-job-123") == mock_item_data
+        mock_blob_service_client.assert_not_called()
+
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
+    def test_get_item_data_not_prefetched(self, mock_blob_service_client, update_service, mock_item_data):
+        """Test that a job the prefetcher didn't start is downloaded directly"""
+        update_service.prefetcher = Mock()
+        update_service.prefetcher.take.return_value = (False, None)
+        mock_blob_client = mock_blob_service_client.return_value.get_blob_client.return_value
+        mock_blob_client.download_blob.return_value.chunks.return_value = [json.dumps(mock_item_data).encode()]
+
+        assert update_service.get_item_data("test-job-123") == mock_item_data
+
+    @patch('alma_item_checks_update_service.services.update_service.Item')
+    @patch('alma_item_checks_update_service.services.alma_client_registry.AlmaApiClient')
+    def test_update_item_records_metrics(self, mock_alma_client, mock_item_class, update_service, mock_item_data):
+        """Test that each stage is timed and the outcome counted per institution"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value="test-api-key"), \
+             patch.object(update_service, 'save_report'), \
+             patch.object(update_service, 'send_notification'):
+
+            update_service.update_item()
+
+        assert hook.outcomes == {"updated": 1}
+        assert set(hook.stages) == {
+            PipelineStage.FETCH, PipelineStage.API_KEY, PipelineStage.ALMA_UPDATE,
+            PipelineStage.REPORT, PipelineStage.NOTIFY
+        }
+
+    def test_update_item_records_failure_outcome(self, update_service, mock_item_data):
+        """Test that early exits are counted under their outcome"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+
+        with patch.object(update_service, 'get_item_data', return_value=mock_item_data), \
+             patch.object(update_service, 'get_api_key', return_value=None):
+
+            update_service.update_item()
+
+        assert hook.outcomes == {"no_key": 1}
+        assert PipelineStage.ALMA_UPDATE not in hook.stages
+
+    def test_update_item_records_error_outcome(self, update_service):
+        """Test that an exception is counted as an error and still timed"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+
+        with patch.object(update_service, 'get_item_data', side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                update_service.update_item()
+
+        assert hook.outcomes == {"error": 1}
+        assert len(hook.stages[PipelineStage.FETCH]) == 1
+
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
+    def test_update_item_malformed_body(self, mock_dead_letter):
+        """Test that a body that isn't JSON is dead-lettered as it was received and its outcome counted"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+        mock_queue_message = Mock(spec=func.QueueMessage)
+        mock_queue_message.get_body.return_value = b"not json"
+
+        assert UpdateService(mock_queue_message).update_item() == UpdateOutcome.INVALID_MESSAGE
+
+        error, payload = mock_dead_letter.call_args[0]
+        assert error.reason == InvalidReason.MALFORMED_JSON
+        assert payload == "not json"
+        assert hook.outcomes == {"invalid_message": 1}
+
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
+    def test_process_message_invalid_institution_id(self, mock_dead_letter, update_service):
+        """Test that a non-integer institution id is rejected before any download"""
+        hook = InMemoryMetricsHook()
+        update_metrics.add_hook(hook)
+
+        with patch.object(update_service, 'get_item_data') as mock_get_item:
+            outcome = update_service.process_message({"job_id": "job", "institution_id": "abc"})
+
+        assert outcome == UpdateOutcome.INVALID_MESSAGE
+        assert mock_dead_letter.call_args[0][0].reason == InvalidReason.INVALID_INSTITUTION_ID
+        mock_get_item.assert_not_called()
+        assert hook.outcomes == {"invalid_message": 1}
+
+    @patch('alma_item_checks_update_service.services.update_service.dead_letter')
+    @patch('alma_item_checks_update_service.services.update_service.get_blob_service_client')
+    def test_update_item_transient_storage_error(self, mock_blob_service_client, mock_dead_letter, update_service):
+        """Test that a storage outage is re-raised for the queue to retry, not dead-lettered"""
+        mock_blob_client = mock_blob_service_client.return_value.get_blob_client.return_value
+        mock_blob_client.download_blob.side_effect = azure.core.exceptions.ServiceRequestError("unreachable")
+
+        with pytest.raises(azure.core.exceptions.ServiceRequestError):
+            update_service.update_item()
+
+        mock_dead_letter.assert_not_called()
@@ -0,0 +1,88 @@
+"""Unit tests for the benchmark harness stand-ins"""
+import requests
+
+from benchmarks.stubs import (
+    AlmaStubHandler,
+    InMemoryStorageService,
+    InstitutionStubHandler,
+    RedirectAdapter,
+    StubBehavior,
+    StubServer,
+)
+from benchmarks.json_codec import make_payload
+from benchmarks.json_codec import run as run_json_benchmark
+from benchmarks.item_projection import run as run_projection_benchmark
+from benchmarks.update_throughput import StageTimer, percentile, summarize
+
+
+class TestBenchmarkHarness:
+    """Test class for the benchmark harness"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        samples = list(range(1, 101))
+
+        assert percentile(samples, 50) == 50
+        assert percentile(samples, 99) == 99
+        assert percentile([], 50) == 0.0
+        assert summarize([0.001, 0.003])["p50"] == 1.0
+
+    def test_stage_timer(self):
+        """Test that wrapped calls are recorded, failures included"""
+        timer = StageTimer()
+        timed = timer.wrap("stage", lambda value: value * 2)
+
+        assert timed(2) == 4
+        assert len(timer.samples["stage"]) == 1
+
+    def test_institution_stub(self):
+        """Test that the Institution API stub serves keys"""
+        with StubServer(InstitutionStubHandler, StubBehavior()) as server:
+            response = requests.get(f"{server.url}/12/api-key", params={"code": "x"}, timeout=5)
+
+        assert response.json() == {"api_key": "stub-key-12"}
+
+    def test_redirect_to_alma_stub(self):
+        """Test that requests for the Alma gateway reach the stub, which echoes PUTs"""
+        with StubServer(AlmaStubHandler, StubBehavior()) as server, requests.Session() as session:
+            session.mount("https://", RedirectAdapter(server.url))
+            response = session.put(
+                "https://api-na.hosted.exlibrisgroup.com/almaws/v1/bibs/1/holdings/2/items/3",
+                json={"item_data": {"pid": "3"}}, timeout=5,
+            )
+
+        assert response.status_code == 200
+        assert response.json() == {"item_data": {"pid": "3"}}
+
+    def test_stub_error_rate(self):
+        """Test that injected failures answer with a 503"""
+        with StubServer(AlmaStubHandler, StubBehavior(error_rate=1.0)) as server:
+            response = requests.put(f"{server.url}/items/3", json={}, timeout=5)
+
+        assert response.status_code == 503
+
+    def test_in_memory_storage(self):
+        """Test the in-memory storage service"""
+        storage_service = InMemoryStorageService()
+        storage_service.upload_blob_data("container", "blob.json", {"a": 1})
+        storage_service.send_queue_message("queue", {"job_id": "1"})
+
+        assert storage_service.download_blob_as_json("container", "blob.json") == {"a": 1}
+        assert storage_service.download_blob_as_json("container", "missing.json") is None
+        assert storage_service.get_blob_client("container", "blob.json").download_blob().readall() == b'{"a": 1}'
+        assert storage_service.queues == {"queue": [{"job_id": "1"}]}
+
+    def test_json_codec_benchmark(self):
+        """Test that the codec micro-benchmark times every codec and operation"""
+        results = run_json_benchmark(rounds=1, sizes={"large": 10})
+
+        assert {(row["codec"], row["operation"]) for row in results} >= {
+            ("str+json", "loads"), ("stdlib", "loads"), ("stdlib", "dumps")
+        }
+        assert make_payload(1, marc_fields=10)["bib_data"]["anies"][0].count("<datafield") == 10
+
+    def test_item_projection_benchmark(self):
+        """Test that the projection benchmark measures both projections"""
+        result = run_projection_benchmark(items=2, rounds=1, marc_fields=5)
+
+        assert set(result["full"]) == set(result["slim"]) == {"build", "serialize", "report", "total"}
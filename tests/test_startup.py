@@ -0,0 +1,37 @@
+"""Cold-start tests for the function app
+
+Import time itself is measured by benchmarks/import_time.py, not here, as wall-clock
+budgets are at the mercy of the machine running the suite.
+"""
+from benchmarks.import_time import (
+    HEAVY_MODULES,
+    cumulative_ms,
+    imported_modules,
+    parse_importtime,
+)
+
+
+class TestStartup:
+    """Test class for function app import cost"""
+
+    def test_parse_importtime(self):
+        """Test that -X importtime output is parsed, skipping the header"""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:       300 |        420 | json\n"
+        )
+
+        timings = parse_importtime(output)
+
+        assert [(t.module, t.self_us, t.cumulative_us, t.depth) for t in timings] == [
+            ("json.decoder", 120, 120, 1), ("json", 300, 420, 0),
+        ]
+        assert cumulative_ms(timings, "json") == 0.42
+
+    def test_function_app_imports_lazily(self):
+        """Test that loading the function app doesn't import the heavy clients"""
+        modules = imported_modules("function_app")
+
+        assert "function_app" in modules
+        assert [module for module in HEAVY_MODULES if module in modules] == []